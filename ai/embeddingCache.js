@@ -0,0 +1,78 @@
+/**
+ * Embeddings avec cache (recherche sémantique, magasin vectoriel mémoire, assistant)
+ *
+ * ✅ Cache SQLite par contenu (db/embeddingCache.js) : texte inchangé = pas d'appel API
+ * ✅ LRU en mémoire pour les requêtes utilisateur (questions répétées)
+ * ✅ Taux de succès exposé sur /metrics (embedding_cache_lookups_total, embedding_cache_hit_ratio)
+ */
+
+const { LruCache } = require('../utils/lruCache');
+const { normalizeVector } = require('./embeddingMatrix');
+const { embeddingCacheKey, getCachedEmbeddings, putCachedEmbeddings } = require('../db/embeddingCache');
+const metrics = require('../monitoring/metrics');
+
+const QUERY_CACHE_SIZE = parseInt(process.env.EMBEDDING_QUERY_CACHE_SIZE, 10) || 1000;
+
+const queryCache = new LruCache({ max: QUERY_CACHE_SIZE });
+
+/**
+ * Embeddings normalisés de plusieurs textes : cache SQLite puis `embed` pour les absents.
+ * Une erreur de cache n'empêche jamais le calcul.
+ *
+ * @param {Object} db - base portant la table embedding_cache
+ * @param {string} model
+ * @param {string[]} texts
+ * @param {(texts: string[]) => Promise<number[][]>} embed - appel API (textes absents du cache)
+ * @returns {Promise<Array<Float32Array|null>>} dans l'ordre des textes
+ */
+async function cachedEmbeddings(db, model, texts, embed) {
+  const vectors = await getCachedEmbeddings(db, model, texts).catch((err) => {
+    console.warn('⚠️  Cache embeddings indisponible:', err.message);
+    return texts.map(() => null);
+  });
+
+  // Textes absents, dédoublonnés
+  const missing = new Map();
+  let misses = 0;
+  vectors.forEach((vector, i) => {
+    if (vector) return;
+    misses++;
+    if (!missing.has(texts[i])) missing.set(texts[i], []);
+    missing.get(texts[i]).push(i);
+  });
+  metrics.recordEmbeddingCacheLookup('sqlite', texts.length - misses, misses);
+  if (!missing.size) return vectors;
+
+  const missingTexts = [...missing.keys()];
+  const fresh = await embed(missingTexts);
+  missingTexts.forEach((text, i) => {
+    const normalized = normalizeVector(fresh[i]);
+    for (const index of missing.get(text)) vectors[index] = normalized;
+  });
+
+  await putCachedEmbeddings(db, model, missingTexts, fresh).catch((err) => {
+    console.warn('⚠️  Écriture cache embeddings échouée:', err.message);
+  });
+  return vectors;
+}
+
+/**
+ * Embedding normalisé d'une requête : LRU mémoire, puis cache SQLite, puis API.
+ * @param {(text: string) => Promise<number[]>} embedOne
+ * @returns {Promise<Float32Array|null>}
+ */
+async function cachedQueryEmbedding(db, model, text, embedOne) {
+  const key = embeddingCacheKey(model, text);
+  const hit = queryCache.get(key);
+  metrics.recordEmbeddingCacheLookup('memory', hit ? 1 : 0, hit ? 0 : 1);
+  if (hit) return hit;
+
+  const [vector] = await cachedEmbeddings(db, model, [text], (texts) => Promise.all(texts.map(embedOne)));
+  if (vector) queryCache.set(key, vector);
+  return vector;
+}
+
+module.exports = {
+  cachedEmbeddings,
+  cachedQueryEmbedding,
+};
@@ -0,0 +1,254 @@
+/**
+ * Matrice d'embeddings en mémoire contiguë (Float32Array) pour la recherche sémantique
+ *
+ * ✅ Vecteurs normalisés à l'écriture : cosine = produit scalaire
+ * ✅ Une seule allocation pour N vecteurs (pas d'objets JS par vecteur)
+ * ✅ Mise à jour incrémentale (upsert / remove en O(dim))
+ * ✅ Top-k par tas binaire (O(N·dim + N·log k))
+ *
+ * Format de stockage SQLite : BLOB float32 little-endian, dim × 4 octets.
+ */
+
+/**
+ * Normalise un vecteur (norme L2 = 1) dans un nouveau Float32Array.
+ * Retourne null pour un vecteur nul ou invalide.
+ */
+function normalizeVector(vector) {
+  const out = Float32Array.from(vector || []);
+  let norm = 0;
+  for (let i = 0; i < out.length; i++) norm += out[i] * out[i];
+  norm = Math.sqrt(norm);
+  if (!out.length || !Number.isFinite(norm) || norm === 0) return null;
+  for (let i = 0; i < out.length; i++) out[i] /= norm;
+  return out;
+}
+
+/**
+ * Float32Array → Buffer (BLOB SQLite)
+ */
+function vectorToBlob(vector) {
+  const f32 = vector instanceof Float32Array ? vector : Float32Array.from(vector);
+  return Buffer.from(f32.buffer, f32.byteOffset, f32.byteLength);
+}
+
+/**
+ * Buffer (BLOB SQLite) → Float32Array (copie alignée)
+ */
+function blobToVector(blob) {
+  const out = new Float32Array(blob.length / 4);
+  Buffer.from(out.buffer).set(blob);
+  return out;
+}
+
+/**
+ * Tas binaire min de taille bornée : conserve les k meilleurs scores.
+ */
+class TopK {
+  constructor(k) {
+    this.k = k;
+    this.scores = [];
+    this.items = [];
+  }
+
+  push(score, item) {
+    if (this.scores.length < this.k) {
+      this.scores.push(score);
+      this.items.push(item);
+      this._up(this.scores.length - 1);
+    } else if (score > this.scores[0]) {
+      this.scores[0] = score;
+      this.items[0] = item;
+      this._down(0);
+    }
+  }
+
+  // Seuil d'entrée dans le tas (−Infinity tant qu'il n'est pas plein)
+  floor() {
+    return this.scores.length < this.k ? -Infinity : this.scores[0];
+  }
+
+  /** @returns {Array<{score: number, item: any}>} trié par score décroissant */
+  sorted() {
+    return this.scores
+      .map((score, i) => ({ score, item: this.items[i] }))
+      .sort((a, b) => b.score - a.score);
+  }
+
+  _swap(i, j) {
+    [this.scores[i], this.scores[j]] = [this.scores[j], this.scores[i]];
+    [this.items[i], this.items[j]] = [this.items[j], this.items[i]];
+  }
+
+  _up(i) {
+    while (i > 0) {
+      const parent = (i - 1) >> 1;
+      if (this.scores[parent] <= this.scores[i]) break;
+      this._swap(i, parent);
+      i = parent;
+    }
+  }
+
+  _down(i) {
+    const n = this.scores.length;
+    for (;;) {
+      const l = 2 * i + 1;
+      const r = l + 1;
+      let smallest = i;
+      if (l < n && this.scores[l] < this.scores[smallest]) smallest = l;
+      if (r < n && this.scores[r] < this.scores[smallest]) smallest = r;
+      if (smallest === i) break;
+      this._swap(i, smallest);
+      i = smallest;
+    }
+  }
+}
+
+class EmbeddingMatrix {
+  /**
+   * @param {number} dim - dimension des vecteurs
+   * @param {number} [capacity] - nombre de lignes préallouées (doublé à la demande)
+   */
+  constructor(dim, capacity = 1024) {
+    this.dim = dim;
+    this.capacity = Math.max(1, capacity);
+    this.size = 0;
+    this.data = new Float32Array(this.capacity * dim);
+    this.keys = [];
+    this.slots = new Map();
+  }
+
+  _grow(minCapacity) {
+    let capacity = this.capacity;
+    while (capacity < minCapacity) capacity *= 2;
+    if (capacity === this.capacity) return;
+    const data = new Float32Array(capacity * this.dim);
+    data.set(this.data.subarray(0, this.size * this.dim));
+    this.data = data;
+    this.capacity = capacity;
+  }
+
+  has(key) {
+    return this.slots.has(key);
+  }
+
+  /**
+   * Ajoute ou remplace le vecteur d'une clé. Le vecteur doit être déjà normalisé
+   * (Float32Array ou Buffer float32 issu de la base).
+   */
+  upsert(key, vector) {
+    const source = Buffer.isBuffer(vector) ? blobToVector(vector) : vector;
+    if (!source || source.length !== this.dim) return false;
+
+    let slot = this.slots.get(key);
+    if (slot === undefined) {
+      this._grow(this.size + 1);
+      slot = this.size++;
+      this.slots.set(key, slot);
+      this.keys[slot] = key;
+    }
+    this.data.set(source, slot * this.dim);
+    return true;
+  }
+
+  /**
+   * Retire une clé : la dernière ligne prend sa place (matrice toujours compacte).
+   */
+  remove(key) {
+    const slot = this.slots.get(key);
+    if (slot === undefined) return false;
+    const last = this.size - 1;
+    if (slot !== last) {
+      const lastKey = this.keys[last];
+      this.data.copyWithin(slot * this.dim, last * this.dim, (last + 1) * this.dim);
+      this.keys[slot] = lastKey;
+      this.slots.set(lastKey, slot);
+    }
+    this.keys.length = last;
+    this.slots.delete(key);
+    this.size = last;
+    return true;
+  }
+
+  /**
+   * Vecteur d'une clé (vue sur la matrice, à copier si conservé).
+   */
+  get(key) {
+    const slot = this.slots.get(key);
+    if (slot === undefined) return null;
+    return this.data.subarray(slot * this.dim, (slot + 1) * this.dim);
+  }
+
+  /**
+   * Produit scalaire entre un vecteur requête et la ligne `slot`.
+   */
+  dot(query, slot) {
+    // 4 accumulateurs indépendants : le JIT pipeline les multiplications
+    const { dim, data } = this;
+    const base = slot * dim;
+    let s0 = 0;
+    let s1 = 0;
+    let s2 = 0;
+    let s3 = 0;
+    let i = 0;
+    for (; i + 3 < dim; i += 4) {
+      s0 += query[i] * data[base + i];
+      s1 += query[i + 1] * data[base + i + 1];
+      s2 += query[i + 2] * data[base + i + 2];
+      s3 += query[i + 3] * data[base + i + 3];
+    }
+    for (; i < dim; i++) s0 += query[i] * data[base + i];
+    return s0 + s1 + s2 + s3;
+  }
+
+  /**
+   * Les k clés les plus proches d'un vecteur requête normalisé (parcours exact).
+   * @param {Float32Array} query
+   * @param {number} k
+   * @param {Object} [options]
+   * @param {number} [options.threshold] - score minimal
+   * @param {(key: string) => boolean} [options.filter] - clés admissibles
+   * @returns {Array<{key: string, score: number}>}
+   */
+  topK(query, k, { threshold = -Infinity, filter = null } = {}) {
+    const { keys } = this;
+    const heap = new TopK(Math.max(1, k));
+
+    for (let slot = 0; slot < this.size; slot++) {
+      if (filter && !filter(keys[slot])) continue;
+      const score = this.dot(query, slot);
+      if (score >= threshold && score > heap.floor()) heap.push(score, keys[slot]);
+    }
+
+    return heap.sorted().map(({ score, item }) => ({ key: item, score }));
+  }
+
+  /**
+   * Top-k restreint à un ensemble de clés candidates (index ANN, filtres SQL).
+   * @param {Iterable<string>} candidates
+   */
+  topKAmong(query, k, candidates, { threshold = -Infinity, filter = null } = {}) {
+    const heap = new TopK(Math.max(1, k));
+
+    for (const key of candidates) {
+      const slot = this.slots.get(key);
+      if (slot === undefined || (filter && !filter(key))) continue;
+      const score = this.dot(query, slot);
+      if (score >= threshold && score > heap.floor()) heap.push(score, key);
+    }
+
+    return heap.sorted().map(({ score, item }) => ({ key: item, score }));
+  }
+
+  /** Octets occupés par les vecteurs (capacité allouée). */
+  byteLength() {
+    return this.data.byteLength;
+  }
+}
+
+module.exports = {
+  EmbeddingMatrix,
+  TopK,
+  normalizeVector,
+  vectorToBlob,
+  blobToVector,
+};
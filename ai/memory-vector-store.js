@@ -1,60 +1,326 @@
+/**
+ * Magasin vectoriel mémoire de l'assistant (/ask-openai, /search-memory)
+ *
+ * ✅ Ouverture paresseuse : base et matrices chargées au premier appel, pas au require
+ * ✅ Vecteurs float32 normalisés (BLOB) en matrices contiguës, une partition par source
+ * ✅ Top-k par tas (ai/embeddingMatrix.js) au lieu de parser chaque JSON à chaque requête
+ * ✅ Durée de vie des souvenirs (MEMORY_TTL_DAYS) et plafond par source (MEMORY_MAX_PER_SOURCE),
+ *    compactage au démarrage puis toutes les heures : la taille (et la latence) reste bornée
+ * ✅ Dédoublonnage : un même contenu dans une source rafraîchit le souvenir existant
+ */
+const crypto = require('crypto')
+const path = require('path')
 const { OpenAI } = require('openai')
-const sqlite3 = require('sqlite3').verbose()
-const db = new sqlite3.Database('./vector_memory.db')
-const openai = new OpenAI({ apiKey: process.env.OPENAI_API_KEY })
-
-// Crée la table si elle n'existe pas
-db.run(`
-  CREATE TABLE IF NOT EXISTS memory_vectors (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    source TEXT,
-    content TEXT,
-    embedding TEXT
-  )
-`)
+const { EmbeddingMatrix, TopK, normalizeVector, vectorToBlob, blobToVector } = require('./embeddingMatrix')
+const { cachedEmbeddings, cachedQueryEmbedding } = require('./embeddingCache')
+const { bumpSearchCacheGeneration } = require('../services/searchCache.service')
 
-// Convertit un texte en vecteur
-async function embedText(text) {
-  const response = await openai.embeddings.create({
-    model: 'text-embedding-ada-002',
-    input: text,
+const MEMORY_EMBEDDING_MODEL = 'text-embedding-ada-002'
+const MEMORY_DB_PATH = process.env.MEMORY_VECTOR_DB_PATH || './vector_memory.db'
+const MEMORY_TTL_DAYS = parseFloat(process.env.MEMORY_TTL_DAYS || '180') // 0 = pas d'expiration
+const MEMORY_MAX_PER_SOURCE = parseInt(process.env.MEMORY_MAX_PER_SOURCE, 10) || 20000
+const COMPACTION_INTERVAL_MS = 60 * 60 * 1000
+const DEFAULT_SOURCE = 'default'
+
+let openai = null
+let storePromise = null
+
+function getOpenAI() {
+  if (!openai) openai = new OpenAI({ apiKey: process.env.OPENAI_API_KEY })
+  return openai
+}
+
+// Cache d'embeddings partagé : table embedding_cache de la base principale
+function getCacheDb() {
+  return require('../db/index')
+}
+
+function run(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.run(sql, params, function (err) {
+      if (err) return reject(err)
+      resolve(this)
+    })
   })
-  return response.data[0].embedding
 }
 
-// Enregistre un vecteur dans la base
-async function buildMemoryStore(source, content) {
-  const embedding = await embedText(content)
-  const embeddingStr = JSON.stringify(embedding)
-  db.run(
-    `INSERT INTO memory_vectors (source, content, embedding) VALUES (?, ?, ?)`,
-    [source, content, embeddingStr]
-  )
+function all(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err)
+      resolve(rows || [])
+    })
+  })
 }
 
-// Recherche les vecteurs les plus proches
-async function queryMemoryStore(query, topK = 5) {
-  const queryEmbedding = await embedText(query)
+function get(db, sql, params = []) {
   return new Promise((resolve, reject) => {
-    db.all(`SELECT * FROM memory_vectors`, [], (err, rows) => {
+    db.get(sql, params, (err, row) => {
       if (err) return reject(err)
-      const scored = rows.map(row => {
-        const vector = JSON.parse(row.embedding)
-        const score = cosineSimilarity(queryEmbedding, vector)
-        return { ...row, score }
+      resolve(row)
+    })
+  })
+}
+
+function contentHash(content) {
+  return crypto.createHash('sha256').update(content).digest('hex')
+}
+
+function toTimestamp(value) {
+  return value ? Date.parse(`${value.replace(' ', 'T')}Z`) : 0
+}
+
+// Crée / met à niveau la table (anciennes lignes : embedding JSON, sans date)
+async function ensureSchema(db) {
+  await run(db, `
+    CREATE TABLE IF NOT EXISTS memory_vectors (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      source TEXT,
+      content TEXT,
+      embedding TEXT
+    )
+  `)
+  const columns = new Set((await all(db, 'PRAGMA table_info(memory_vectors)')).map((c) => c.name))
+  for (const [name, ddl] of [
+    ['content_hash', 'content_hash TEXT'],
+    ['dim', 'dim INTEGER'],
+    ['vector', 'vector BLOB'],
+    ['created_at', 'created_at DATETIME'],
+    ['expires_at', 'expires_at DATETIME'],
+  ]) {
+    if (!columns.has(name)) await run(db, `ALTER TABLE memory_vectors ADD COLUMN ${ddl}`)
+  }
+  await run(db, 'UPDATE memory_vectors SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL')
+  await run(db, `UPDATE memory_vectors SET source = '${DEFAULT_SOURCE}' WHERE source IS NULL`)
+
+  // Embeddings JSON → BLOB float32 normalisés
+  const legacy = await all(db, 'SELECT id, content, embedding FROM memory_vectors WHERE vector IS NULL')
+  for (const row of legacy) {
+    let vector = null
+    try {
+      vector = normalizeVector(JSON.parse(row.embedding))
+    } catch (_) {
+      // JSON invalide : souvenir supprimé ci-dessous
+    }
+    if (!vector) {
+      await run(db, 'DELETE FROM memory_vectors WHERE id = ?', [row.id])
+      continue
+    }
+    await run(
+      db,
+      'UPDATE memory_vectors SET vector = ?, dim = ?, content_hash = ?, embedding = NULL WHERE id = ?',
+      [vectorToBlob(vector), vector.length, contentHash(row.content || ''), row.id]
+    )
+  }
+  if (legacy.length) console.log(`✅ Mémoire vectorielle: ${legacy.length} embedding(s) JSON convertis`)
+
+  // Doublons hérités (même contenu, même source) : le plus récent est conservé
+  await run(db, `
+    DELETE FROM memory_vectors
+    WHERE id NOT IN (SELECT MAX(id) FROM memory_vectors GROUP BY source, content_hash)
+  `)
+  await run(db, 'CREATE UNIQUE INDEX IF NOT EXISTS idx_memory_vectors_source_hash ON memory_vectors(source, content_hash)')
+  await run(db, 'CREATE INDEX IF NOT EXISTS idx_memory_vectors_expires ON memory_vectors(expires_at)')
+}
+
+class MemoryStore {
+  constructor(db) {
+    this.db = db
+    this.partitions = new Map() // source → EmbeddingMatrix (clé = id du souvenir)
+    this.expiresAt = new Map() // id → timestamp ms (0 = jamais)
+    this.sourceOf = new Map() // id → source
+  }
+
+  partition(source, dim) {
+    let matrix = this.partitions.get(source)
+    if (!matrix) {
+      matrix = new EmbeddingMatrix(dim, 256)
+      this.partitions.set(source, matrix)
+    }
+    return matrix
+  }
+
+  add(id, source, vector, expiresAt) {
+    const matrix = this.partition(source, vector.length)
+    if (!matrix.upsert(id, vector)) return
+    this.sourceOf.set(id, source)
+    this.expiresAt.set(id, expiresAt)
+  }
+
+  remove(id) {
+    const source = this.sourceOf.get(id)
+    if (source === undefined) return
+    this.partitions.get(source).remove(id)
+    this.sourceOf.delete(id)
+    this.expiresAt.delete(id)
+  }
+
+  get size() {
+    return this.sourceOf.size
+  }
+
+  async load() {
+    const rows = await all(this.db, 'SELECT id, source, vector, expires_at FROM memory_vectors WHERE vector IS NOT NULL')
+    for (const row of rows) this.add(row.id, row.source, blobToVector(row.vector), toTimestamp(row.expires_at))
+    console.log(`🧠 Mémoire vectorielle chargée: ${this.size} souvenir(s), ${this.partitions.size} source(s)`)
+  }
+
+  /**
+   * Supprime les souvenirs expirés puis les plus anciens au-delà du plafond par source.
+   * @returns {Promise<number>} souvenirs supprimés
+   */
+  async compact() {
+    const doomed = await all(this.db, `
+      SELECT id FROM memory_vectors WHERE expires_at IS NOT NULL AND expires_at <= CURRENT_TIMESTAMP
+      UNION
+      SELECT id FROM (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY source ORDER BY created_at DESC, id DESC) AS rank
+        FROM memory_vectors
+      ) WHERE rank > ?
+    `, [MEMORY_MAX_PER_SOURCE])
+    if (!doomed.length) return 0
+
+    const ids = doomed.map((row) => row.id)
+    for (let start = 0; start < ids.length; start += 500) {
+      const chunk = ids.slice(start, start + 500)
+      await run(this.db, `DELETE FROM memory_vectors WHERE id IN (${chunk.map(() => '?').join(', ')})`, chunk)
+    }
+    ids.forEach((id) => this.remove(id))
+    bumpSearchCacheGeneration('memory_vectors')
+    console.log(`🧹 Mémoire vectorielle: ${ids.length} souvenir(s) expiré(s) ou en excès supprimé(s)`)
+    return ids.length
+  }
+}
+
+/**
+ * Magasin initialisé au premier appel (base, schéma, matrices, compactage périodique).
+ * @returns {Promise<MemoryStore>}
+ */
+function getMemoryStore() {
+  if (!storePromise) {
+    storePromise = (async () => {
+      const sqlite3 = require('sqlite3').verbose()
+      const db = await new Promise((resolve, reject) => {
+        const handle = new sqlite3.Database(path.resolve(MEMORY_DB_PATH), (err) => (err ? reject(err) : resolve(handle)))
       })
-      const sorted = scored.sort((a, b) => b.score - a.score).slice(0, topK)
-      resolve(sorted)
+      await ensureSchema(db)
+      const store = new MemoryStore(db)
+      await store.compact()
+      await store.load()
+      setInterval(() => {
+        store.compact().catch((err) => console.warn('⚠️  Compactage mémoire vectorielle:', err.message))
+      }, COMPACTION_INTERVAL_MS).unref()
+      return store
+    })().catch((err) => {
+      storePromise = null
+      throw err
     })
+  }
+  return storePromise
+}
+
+// Convertit des textes en vecteurs (un seul appel)
+async function embedTexts(texts) {
+  const response = await getOpenAI().embeddings.create({
+    model: MEMORY_EMBEDDING_MODEL,
+    input: texts,
   })
+  const vectors = new Array(texts.length)
+  for (const item of response.data) vectors[item.index] = item.embedding
+  return vectors
+}
+
+// Convertit un texte en vecteur
+async function embedText(text) {
+  const [embedding] = await embedTexts([text])
+  return embedding
+}
+
+/**
+ * Enregistre un souvenir (texte déjà vectorisé = cache, pas d'appel API ;
+ * contenu déjà présent dans la source = souvenir rafraîchi).
+ * @param {string} source
+ * @param {string} content
+ * @param {Object} [options]
+ * @param {number} [options.ttlDays] - durée de vie (défaut MEMORY_TTL_DAYS, 0 = illimitée)
+ * @returns {Promise<number|null>} id du souvenir
+ */
+async function buildMemoryStore(source, content, { ttlDays = MEMORY_TTL_DAYS } = {}) {
+  if (!content || !String(content).trim()) return null
+  const text = String(content)
+  const partition = source || DEFAULT_SOURCE
+
+  const [store, [vector]] = await Promise.all([
+    getMemoryStore(),
+    cachedEmbeddings(getCacheDb(), MEMORY_EMBEDDING_MODEL, [text], embedTexts),
+  ])
+  if (!vector) return null
+
+  const expires = ttlDays > 0 ? `datetime('now', '+${Number(ttlDays) * 86400} seconds')` : 'NULL'
+  const row = await get(store.db, `
+    INSERT INTO memory_vectors (source, content, content_hash, dim, vector, created_at, expires_at)
+    VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ${expires})
+    ON CONFLICT (source, content_hash) DO UPDATE SET
+      vector = excluded.vector, dim = excluded.dim, created_at = excluded.created_at, expires_at = excluded.expires_at
+    RETURNING id, expires_at
+  `, [partition, text, contentHash(text), vector.length, vectorToBlob(vector)])
+
+  store.add(row.id, partition, vector, toTimestamp(row.expires_at))
+  bumpSearchCacheGeneration('memory_vectors')
+  return row.id
+}
+
+/**
+ * Recherche les souvenirs les plus proches
+ * @param {string} query
+ * @param {number} [topK]
+ * @param {Object} [options]
+ * @param {string|string[]} [options.source] - partitions interrogées (défaut : toutes)
+ * @param {number} [options.minScore]
+ * @returns {Promise<Array<{id: number, source: string, content: string, created_at: string, score: number}>>}
+ */
+async function queryMemoryStore(query, topK = 5, { source, minScore = -Infinity } = {}) {
+  const [store, queryVector] = await Promise.all([
+    getMemoryStore(),
+    cachedQueryEmbedding(getCacheDb(), MEMORY_EMBEDDING_MODEL, query, embedText),
+  ])
+  if (!queryVector) return []
+
+  const sources = source ? [].concat(source) : [...store.partitions.keys()]
+  const now = Date.now()
+  const live = (id) => {
+    const expiresAt = store.expiresAt.get(id)
+    return !expiresAt || expiresAt > now
+  }
+
+  const heap = new TopK(Math.max(1, topK))
+  for (const name of sources) {
+    const matrix = store.partitions.get(name)
+    if (!matrix || matrix.dim !== queryVector.length) continue
+    for (const hit of matrix.topK(queryVector, topK, { threshold: minScore, filter: live })) {
+      if (hit.score > heap.floor()) heap.push(hit.score, hit.key)
+    }
+  }
+  const hits = heap.sorted()
+  if (!hits.length) return []
+
+  const rows = await all(
+    store.db,
+    `SELECT id, source, content, created_at FROM memory_vectors WHERE id IN (${hits.map(() => '?').join(', ')})`,
+    hits.map(({ item }) => item)
+  )
+  const byId = new Map(rows.map((row) => [row.id, row]))
+  return hits
+    .filter(({ item }) => byId.has(item))
+    .map(({ item, score }) => ({ ...byId.get(item), score }))
 }
 
-// Cosine similarity
-function cosineSimilarity(a, b) {
-  const dot = a.reduce((sum, val, i) => sum + val * b[i], 0)
-  const normA = Math.sqrt(a.reduce((sum, val) => sum + val * val, 0))
-  const normB = Math.sqrt(b.reduce((sum, val) => sum + val * val, 0))
-  return dot / (normA * normB)
+/**
+ * Compactage immédiat (expirés + plafond par source)
+ */
+async function compactMemoryStore() {
+  const store = await getMemoryStore()
+  return store.compact()
 }
 
-module.exports = { buildMemoryStore, queryMemoryStore }
+module.exports = { buildMemoryStore, queryMemoryStore, compactMemoryStore }
@@ -0,0 +1,270 @@
+/**
+ * Pipeline de réindexation en masse des embeddings
+ *
+ * ✅ Plusieurs documents par appel embeddings (lots bornés en nombre et en tokens)
+ * ✅ Appels concurrents bornés + limitation de débit (seaux à jetons requêtes/min et tokens/min)
+ * ✅ Reprise sur erreur 429/5xx/réseau avec backoff exponentiel (Retry-After respecté)
+ * ✅ Point de reprise par table (embedding_reindex_checkpoints) : un redémarrage reprend où il s'est
+ *    arrêté ; supprimé en fin de table pour que le passage suivant reprenne les documents en échec
+ * ✅ Écritures groupées en transactions (db/documentEmbeddings.js)
+ *
+ * Le module ne dépend ni d'OpenAI ni du format des textes : ai/semanticSearch.js
+ * fournit embedBatch / buildText. Test hors ligne : scripts/fake-embeddings-server.js.
+ */
+
+const {
+  upsertDocumentEmbeddings,
+  readReindexCheckpoint,
+  writeReindexCheckpoint,
+  clearReindexCheckpoint,
+} = require('../db/documentEmbeddings');
+
+const DEFAULTS = {
+  pageSize: 500,
+  batchSize: 64,
+  maxBatchTokens: 100000,
+  concurrency: 4,
+  rpm: 3000,
+  tpm: 1000000,
+  retries: 5,
+  baseDelayMs: 500,
+  maxDelayMs: 30000,
+};
+
+const RETRYABLE_STATUS = new Set([408, 409, 429, 500, 502, 503, 504]);
+
+function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+/**
+ * Estimation grossière du nombre de tokens (≈ 4 caractères par token).
+ */
+function estimateTokens(text) {
+  return Math.ceil((text || '').length / 4);
+}
+
+/**
+ * Seau à jetons : `capacity` jetons, rechargé de `perMinute` jetons par minute.
+ */
+class TokenBucket {
+  constructor(perMinute) {
+    this.capacity = perMinute;
+    this.tokens = perMinute;
+    this.refillPerMs = perMinute / 60000;
+    this.updatedAt = Date.now();
+    this.queue = Promise.resolve();
+  }
+
+  _refill() {
+    const now = Date.now();
+    this.tokens = Math.min(this.capacity, this.tokens + (now - this.updatedAt) * this.refillPerMs);
+    this.updatedAt = now;
+  }
+
+  /**
+   * Attend que `n` jetons soient disponibles puis les consomme (ordre FIFO).
+   */
+  take(n = 1) {
+    const wanted = Math.min(n, this.capacity);
+    const turn = this.queue.then(async () => {
+      this._refill();
+      while (this.tokens < wanted) {
+        await sleep(Math.ceil((wanted - this.tokens) / this.refillPerMs));
+        this._refill();
+      }
+      this.tokens -= wanted;
+    });
+    this.queue = turn.catch(() => {});
+    return turn;
+  }
+}
+
+function isRetryable(err) {
+  if (!err) return false;
+  if (err.status === undefined) return true; // erreur réseau / timeout
+  return RETRYABLE_STATUS.has(err.status);
+}
+
+function retryAfterMs(err) {
+  const headers = err && err.headers;
+  const value = headers && (typeof headers.get === 'function' ? headers.get('retry-after') : headers['retry-after']);
+  const seconds = parseFloat(value);
+  return Number.isFinite(seconds) ? seconds * 1000 : null;
+}
+
+/**
+ * Exécute `fn` avec reprise exponentielle (jitter) sur les erreurs transitoires.
+ */
+async function withRetry(fn, { retries = DEFAULTS.retries, baseDelayMs = DEFAULTS.baseDelayMs, maxDelayMs = DEFAULTS.maxDelayMs, onRetry } = {}) {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await fn(attempt);
+    } catch (err) {
+      if (attempt >= retries || !isRetryable(err)) throw err;
+      const backoff = Math.min(maxDelayMs, baseDelayMs * 2 ** attempt) * (0.5 + Math.random() / 2);
+      const delay = Math.min(maxDelayMs, retryAfterMs(err) ?? backoff);
+      if (onRetry) onRetry(err, attempt + 1, delay);
+      await sleep(delay);
+    }
+  }
+}
+
+/**
+ * Découpe des documents (triés par id) en lots bornés en nombre et en tokens.
+ * @param {Array<{id: number, text: string}>} docs
+ */
+function planBatches(docs, { batchSize = DEFAULTS.batchSize, maxBatchTokens = DEFAULTS.maxBatchTokens } = {}) {
+  const batches = [];
+  let current = [];
+  let tokens = 0;
+  for (const doc of docs) {
+    const cost = estimateTokens(doc.text);
+    if (current.length && (current.length >= batchSize || tokens + cost > maxBatchTokens)) {
+      batches.push({ docs: current, tokens });
+      current = [];
+      tokens = 0;
+    }
+    current.push(doc);
+    tokens += cost;
+  }
+  if (current.length) batches.push({ docs: current, tokens });
+  return batches;
+}
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+/**
+ * Réindexe les documents sans embedding pour `model`, table par table.
+ *
+ * @param {Object} db
+ * @param {Object} options
+ * @param {string} options.model
+ * @param {Array<{source: string, columns: string[]}>} options.sources - tables et colonnes lues
+ * @param {(source: string, row: Object) => string|null} options.buildText
+ * @param {(texts: string[]) => Promise<number[][]>} options.embedBatch
+ * @param {(written: Array) => Promise<void>} [options.onWritten] - ex. mise à jour de la matrice
+ * @param {string} [options.job] - nom du point de reprise
+ * @param {boolean} [options.reset] - repartir du début
+ * @returns {Promise<{indexed: number, skipped: number, failed: number}>}
+ */
+async function runReindexPipeline(db, options) {
+  const opts = { ...DEFAULTS, job: 'default', ...options };
+  const { model, sources, buildText, embedBatch, onWritten, job } = opts;
+  const requests = new TokenBucket(opts.rpm);
+  const tokenBudget = new TokenBucket(opts.tpm);
+  const totals = { indexed: 0, skipped: 0, failed: 0 };
+
+  for (const { source, columns } of sources) {
+    if (opts.reset) await clearReindexCheckpoint(db, job, source);
+    const checkpoint = await readReindexCheckpoint(db, job, source);
+    let cursor = checkpoint ? checkpoint.last_id : 0;
+    const stats = { indexed: 0, skipped: 0, failed: 0 };
+    // Compteurs cumulés sur les redémarrages (stockés avec le point de reprise)
+    const previous = checkpoint || { indexed: 0, failed: 0 };
+    if (checkpoint) console.log(`↩️  ${source}: reprise après id ${cursor} (${previous.indexed} déjà indexés)`);
+
+    // Lots en vol, dans l'ordre des id : le point de reprise avance sur le préfixe terminé
+    const inFlight = [];
+    let committed = cursor;
+
+    const advance = async () => {
+      let last = committed;
+      while (inFlight.length && inFlight[0].done) last = inFlight.shift().lastId;
+      if (last === committed) return;
+      committed = last;
+      await writeReindexCheckpoint(db, job, source, committed, {
+        indexed: previous.indexed + stats.indexed,
+        failed: previous.failed + stats.failed,
+      });
+    };
+
+    const runBatch = async (batch) => {
+      await Promise.all([requests.take(1), tokenBudget.take(batch.tokens)]);
+      try {
+        const vectors = await withRetry(() => embedBatch(batch.docs.map((d) => d.text)), {
+          retries: opts.retries,
+          baseDelayMs: opts.baseDelayMs,
+          maxDelayMs: opts.maxDelayMs,
+          onRetry: (err, attempt, delay) =>
+            console.warn(`⏳ ${source}: lot ${batch.docs[0].id}-${batch.lastId} réessai ${attempt} dans ${Math.round(delay)} ms (${err.status || err.message})`),
+        });
+        const written = await upsertDocumentEmbeddings(
+          db,
+          batch.docs.map((d, i) => ({ source, docId: d.id, model, vector: vectors[i] })),
+        );
+        stats.indexed += written.length;
+        stats.failed += batch.docs.length - written.length;
+        if (onWritten) await onWritten(written);
+      } catch (err) {
+        stats.failed += batch.docs.length;
+        console.error(`❌ ${source}: lot ${batch.docs[0].id}-${batch.lastId} abandonné:`, err.message);
+      }
+    };
+
+    for (;;) {
+      const rows = await dbAll(
+        db,
+        `SELECT id, ${columns.join(', ')} FROM ${source} t
+         WHERE id > ?
+           AND NOT EXISTS (SELECT 1 FROM document_embeddings e WHERE e.source = ? AND e.doc_id = t.id AND e.model = ?)
+         ORDER BY id
+         LIMIT ?`,
+        [cursor, source, model, opts.pageSize],
+      );
+      if (!rows.length) break;
+      cursor = rows[rows.length - 1].id;
+
+      const docs = [];
+      for (const row of rows) {
+        const text = buildText(source, row);
+        if (text) docs.push({ id: row.id, text });
+        else stats.skipped++;
+      }
+
+      // Page sans texte exploitable : entrée vide pour faire avancer le point de reprise
+      const batches = planBatches(docs, opts);
+      batches.forEach((b) => { b.lastId = b.docs[b.docs.length - 1].id; });
+      if (batches.length) batches[batches.length - 1].lastId = cursor;
+      else inFlight.push({ lastId: cursor, done: true });
+
+      for (const batch of batches) {
+        while (inFlight.filter((e) => !e.done).length >= opts.concurrency) {
+          await Promise.race(inFlight.filter((e) => !e.done).map((e) => e.promise));
+        }
+        const entry = { lastId: batch.lastId, done: false };
+        entry.promise = runBatch(batch).then(() => {
+          entry.done = true;
+          return advance();
+        });
+        inFlight.push(entry);
+      }
+      await advance();
+    }
+
+    await Promise.all(inFlight.map((e) => e.promise).filter(Boolean));
+    await clearReindexCheckpoint(db, job, source);
+    console.log(`📚 ${source}: ${stats.indexed} indexés, ${stats.skipped} ignorés (texte trop court), ${stats.failed} en échec`);
+    totals.indexed += stats.indexed;
+    totals.skipped += stats.skipped;
+    totals.failed += stats.failed;
+  }
+
+  return totals;
+}
+
+module.exports = {
+  DEFAULTS,
+  TokenBucket,
+  estimateTokens,
+  planBatches,
+  withRetry,
+  runReindexPipeline,
+};
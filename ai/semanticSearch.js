@@ -3,9 +3,13 @@
  * Permet de rechercher des documents par similarité de sens
  */
 
+const fs = require('fs');
 const { OpenAI } = require('openai');
-const sqlite3 = require('sqlite3').verbose();
-const path = require('path');
+const { EmbeddingMatrix } = require('./embeddingMatrix');
+const { ExactIndex, IvfIndex } = require('./vectorIndex');
+const { loadDocumentEmbeddings, upsertDocumentEmbeddings } = require('../db/documentEmbeddings');
+const { runReindexPipeline } = require('./reindexPipeline');
+const { cachedEmbeddings, cachedQueryEmbedding } = require('./embeddingCache');
 
 const openai = new OpenAI({ apiKey: process.env.OPENAI_API_KEY });
 
@@ -34,6 +38,25 @@ async function generateEmbedding(text) {
   }
 }
 
+/**
+ * Génère les embeddings de plusieurs textes en un seul appel (réindexation en masse).
+ * Pas de reprise automatique du client : ai/reindexPipeline.js gère backoff et débit.
+ * @returns {Promise<number[][]>} dans l'ordre des textes
+ */
+async function generateEmbeddings(texts) {
+  const response = await openai.embeddings.create(
+    {
+      model: EMBEDDING_MODEL,
+      input: texts.map((text) => text.substring(0, 8000)),
+    },
+    { maxRetries: 0 },
+  );
+
+  const vectors = new Array(texts.length);
+  for (const item of response.data) vectors[item.index] = item.embedding;
+  return vectors;
+}
+
 /**
  * Calcule similarité cosine entre deux vecteurs
  */
@@ -62,6 +85,28 @@ function cosineSimilarity(vecA, vecB) {
   return dotProduct / (normA * normB);
 }
 
+// Colonnes lues pour construire le texte indexé (métadonnées puis texte extrait)
+const EMBEDDING_TEXT_COLUMNS = {
+  incoming_mails: ['subject', 'sender', 'ref_code', 'statut_global', 'type_courrier', 'extracted_text'],
+  courriers_sortants: ['objet', 'destinataire', 'reference_unique', 'statut', 'extracted_text'],
+};
+
+/**
+ * Texte à indexer à partir d'une ligne (null si trop court)
+ */
+function buildEmbeddingTextFromRow(table, row, baseText = '') {
+  const columns = EMBEDDING_TEXT_COLUMNS[table] || EMBEDDING_TEXT_COLUMNS.incoming_mails;
+  const parts = columns.map((column) => (column === 'extracted_text' ? baseText || row.extracted_text : row[column]));
+
+  const combined = parts
+    .map(part => (part || '').toString().trim())
+    .filter(Boolean)
+    .join('\n')
+    .trim();
+
+  return combined.length < 10 ? null : combined;
+}
+
 /**
  * Construit le texte à indexer en ajoutant les métadonnées utiles (objet, expéditeur...)
  */
@@ -69,168 +114,370 @@ async function buildEmbeddingText(db, table, documentId, baseText = '') {
   const normalizedTable = table === 'courriers_sortants' ? 'courriers_sortants' : 'incoming_mails';
 
   const row = await new Promise((resolve, reject) => {
-    let sql;
-    if (normalizedTable === 'incoming_mails') {
-      sql = `SELECT subject, sender, ref_code, statut_global, type_courrier, extracted_text FROM incoming_mails WHERE id = ?`;
-    } else {
-      sql = `SELECT objet, destinataire, reference_unique, statut, created_at, extracted_text FROM courriers_sortants WHERE id = ?`;
-    }
-
+    const sql = `SELECT ${EMBEDDING_TEXT_COLUMNS[normalizedTable].join(', ')} FROM ${normalizedTable} WHERE id = ?`;
     db.get(sql, [documentId], (err, result) => {
       if (err) reject(err);
       else resolve(result || {});
     });
   });
 
-  const parts = [];
+  const combined = buildEmbeddingTextFromRow(normalizedTable, row, baseText);
+  if (!combined) {
+    console.log(`Document ${documentId} (${normalizedTable}) trop court pour indexation`);
+  }
+  return combined;
+}
 
-  if (normalizedTable === 'incoming_mails') {
-    parts.push(row.subject, row.sender, row.ref_code, row.statut_global, row.type_courrier);
-  } else {
-    parts.push(row.objet, row.destinataire, row.reference_unique, row.statut);
+// ---------------------------------------------------------------------------
+// Matrice d'embeddings en mémoire (chargée une fois par connexion, mise à jour
+// incrémentalement par indexDocument)
+// ---------------------------------------------------------------------------
+
+const matricesByDb = new WeakMap();
+
+function embeddingKey(table, id) {
+  return `${table}:${id}`;
+}
+
+function parseEmbeddingKey(key) {
+  const sep = key.lastIndexOf(':');
+  return { table: key.slice(0, sep), id: Number(key.slice(sep + 1)) };
+}
+
+async function loadEmbeddingMatrix(db) {
+  const rows = await loadDocumentEmbeddings(db, EMBEDDING_MODEL);
+  const matrix = new EmbeddingMatrix(EMBEDDING_DIMENSIONS, rows.length || 1024);
+  for (const row of rows) {
+    matrix.upsert(embeddingKey(row.source, row.doc_id), row.vector);
   }
+  console.log(`🧮 Matrice d'embeddings chargée: ${matrix.size} documents (${(matrix.byteLength() / 1048576).toFixed(1)} Mo)`);
+  return matrix;
+}
 
-  parts.push(baseText || row.extracted_text);
+/**
+ * Matrice d'embeddings de la base (chargée au premier appel).
+ * @returns {Promise<EmbeddingMatrix>}
+ */
+function getEmbeddingMatrix(db) {
+  if (!matricesByDb.has(db)) {
+    const pending = loadEmbeddingMatrix(db).catch((err) => {
+      matricesByDb.delete(db);
+      throw err;
+    });
+    matricesByDb.set(db, pending);
+  }
+  return matricesByDb.get(db);
+}
 
-  const combined = parts
-    .map(part => (part || '').toString().trim())
-    .filter(Boolean)
-    .join('\n')
-    .trim();
+// ---------------------------------------------------------------------------
+// Index de plus proches voisins (ai/vectorIndex.js)
+// VECTOR_INDEX=auto : index IVF si le fichier <db>.ivf existe (construit par
+// scripts/build-vector-index.js), sinon parcours exact. VECTOR_INDEX=exact : toujours exact.
+// ---------------------------------------------------------------------------
 
-  if (!combined || combined.length < 10) {
-    console.log(`Document ${documentId} (${normalizedTable}) trop court pour indexation`);
-    return null;
+const VECTOR_INDEX_MODE = (process.env.VECTOR_INDEX || 'auto').toLowerCase();
+const VECTOR_INDEX_NPROBE = parseInt(process.env.VECTOR_INDEX_NPROBE, 10) || undefined;
+const VECTOR_INDEX_RECHECK_MS = 60 * 1000;
+const VECTOR_INDEX_SAVE_DELAY_MS = 30 * 1000;
+// Sous ce nombre de documents filtrés, le parcours exact de ces seuls documents est plus rapide que l'IVF
+const EXACT_CANDIDATES_MAX = 5000;
+
+const indexStates = new WeakMap();
+
+/**
+ * Fichier de l'index IVF : VECTOR_INDEX_PATH ou <fichier SQLite>.ivf
+ */
+function vectorIndexPath(db) {
+  if (process.env.VECTOR_INDEX_PATH) return process.env.VECTOR_INDEX_PATH;
+  const file = db.filename || process.env.SQLITE_DB_PATH;
+  return file && file !== ':memory:' ? `${file}.ivf` : null;
+}
+
+function scheduleIndexSave(state) {
+  if (state.index.kind !== 'ivf' || state.saveTimer) return;
+  state.saveTimer = setTimeout(async () => {
+    state.saveTimer = null;
+    if (!state.index.dirty) return;
+    try {
+      await state.index.save(state.file, { model: EMBEDDING_MODEL });
+      state.mtimeMs = (await fs.promises.stat(state.file)).mtimeMs;
+    } catch (err) {
+      console.warn('⚠️  Sauvegarde index IVF échouée:', err.message);
+    }
+  }, VECTOR_INDEX_SAVE_DELAY_MS);
+  state.saveTimer.unref();
+}
+
+/**
+ * Index courant de la matrice : IVF persisté si disponible (rechargé quand le
+ * fichier change), parcours exact sinon.
+ */
+async function getVectorIndex(db, matrix) {
+  let state = indexStates.get(db);
+  if (!state) {
+    state = { index: new ExactIndex(matrix), file: vectorIndexPath(db), mtimeMs: 0, checkedAt: 0, saveTimer: null };
+    indexStates.set(db, state);
   }
+  if (VECTOR_INDEX_MODE === 'exact' || !state.file) return state.index;
+  if (Date.now() - state.checkedAt < VECTOR_INDEX_RECHECK_MS) return state.index;
+  state.checkedAt = Date.now();
 
-  return combined;
+  try {
+    const { mtimeMs } = await fs.promises.stat(state.file);
+    if (mtimeMs !== state.mtimeMs) {
+      const index = await IvfIndex.load(matrix, state.file, { nprobe: VECTOR_INDEX_NPROBE });
+      const { added, removed } = index.reconcile();
+      state.index = index;
+      state.mtimeMs = mtimeMs;
+      console.log(`🧭 Index IVF chargé: ${index.nlist} listes, nprobe=${index.nprobe} (+${added} / -${removed} depuis la sauvegarde)`);
+      if (index.dirty) scheduleIndexSave(state);
+    }
+  } catch (err) {
+    if (err.code !== 'ENOENT') console.warn('⚠️  Index IVF illisible, parcours exact:', err.message);
+  }
+  return state.index;
 }
 
 /**
- * Recherche sémantique dans les courriers
- * @param {string} query - Question en langage naturel
- * @param {Object} db - Instance SQLite
- * @param {Object} options - Options de recherche
+ * Met à jour la matrice (et l'index) s'ils sont déjà chargés (sinon la base sera lue au premier appel).
  */
-async function semanticSearch(query, db, options = {}) {
-  const {
-    limit = 10,
-    threshold = 0.7, // Similarité minimale
-    tables,
-    status,
-    type,
-    startDate,
-    endDate
-  } = options;
+async function updateLoadedMatrix(db, entries) {
+  if (!matricesByDb.has(db)) return;
+  const matrix = await matricesByDb.get(db).catch(() => null);
+  if (!matrix) return;
+  const state = indexStates.get(db);
+  for (const { source, docId, vector } of entries) {
+    const key = embeddingKey(source, docId);
+    if (matrix.upsert(key, vector) && state) state.index.add(key);
+  }
+  if (state) scheduleIndexSave(state);
+}
 
-  // Sélectionner les tables en fonction du type demandé
-  let targetTables = ['incoming_mails', 'courriers_sortants'];
-  if (type === 'entrant') {
-    targetTables = ['incoming_mails'];
-  } else if (type === 'sortant') {
-    targetTables = ['courriers_sortants'];
-  } else if (type === 'interne') {
-    targetTables = ['incoming_mails'];
+/**
+ * Retire des clés de la matrice et de l'index (documents supprimés).
+ */
+function forgetKeys(db, matrix, keys) {
+  const state = indexStates.get(db);
+  for (const key of keys) {
+    if (!matrix.remove(key)) continue;
+    if (state) state.index.remove(key);
   }
+  if (state) scheduleIndexSave(state);
+}
+
+/**
+ * À appeler après la suppression d'un courrier (la ligne document_embeddings
+ * est supprimée par trigger ; ceci met à jour la mémoire).
+ */
+async function forgetDocument(db, table, documentId) {
+  if (!matricesByDb.has(db)) return;
+  const matrix = await matricesByDb.get(db).catch(() => null);
+  if (matrix) forgetKeys(db, matrix, [embeddingKey(table, documentId)]);
+}
 
+/**
+ * Top-k : parcours exact des seuls documents filtrés s'ils sont peu nombreux,
+ * sinon index IVF (ou parcours exact complet en mode exact).
+ */
+async function searchVectors(db, matrix, query, k, { threshold, filter, admissible = null, exact = false }) {
+  if (admissible && admissible.size <= EXACT_CANDIDATES_MAX) {
+    return matrix.topKAmong(query, k, admissible, { threshold });
+  }
+  if (exact) return matrix.topK(query, k, { threshold, filter });
+  const index = await getVectorIndex(db, matrix);
+  return index.search(query, k, { threshold, filter });
+}
+
+/**
+ * Colonnes et filtres SQL d'une table pour la recherche sémantique
+ */
+function buildTableQuery(table, { status, type, startDate, endDate } = {}) {
+  const conditions = [];
+  const params = [];
+  let selectClause;
+
+  if (table === 'incoming_mails') {
+    selectClause = `SELECT id, subject, sender, extracted_text, ref_code, statut_global as status, date_reception as date, type_courrier FROM ${table}`;
+
+    if (status && status !== 'all') {
+      conditions.push('statut_global = ?');
+      params.push(status);
+    }
+    if (type === 'interne') {
+      conditions.push('type_courrier = ?');
+      params.push('Interne');
+    }
+    if (startDate) {
+      conditions.push('date(date_reception) >= date(?)');
+      params.push(startDate);
+    }
+    if (endDate) {
+      conditions.push('date(date_reception) <= date(?)');
+      params.push(endDate);
+    }
+  } else if (table === 'courriers_sortants') {
+    selectClause = `SELECT id, objet as subject, destinataire as sender, extracted_text, reference_unique, statut as status, created_at as date FROM ${table}`;
+
+    if (status && status !== 'all') {
+      conditions.push('statut = ?');
+      params.push(status);
+    }
+    if (startDate) {
+      conditions.push('date(created_at) >= date(?)');
+      params.push(startDate);
+    }
+    if (endDate) {
+      conditions.push('date(created_at) <= date(?)');
+      params.push(endDate);
+    }
+  } else {
+    return null; // Table non supportée
+  }
+
+  return { selectClause, conditions, params };
+}
+
+function dbAllAsync(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) reject(err);
+      else resolve(rows || []);
+    });
+  });
+}
+
+/**
+ * Clés admissibles après filtres SQL (null = tous les documents des tables ciblées)
+ */
+async function resolveAdmissibleKeys(db, targetTables, options) {
+  const queries = targetTables
+    .map((table) => ({ table, query: buildTableQuery(table, options) }))
+    .filter(({ query }) => query);
+
+  if (queries.every(({ query }) => !query.conditions.length)) return null;
+
+  const keys = new Set();
+  for (const { table, query } of queries) {
+    const where = query.conditions.length ? `WHERE ${query.conditions.join(' AND ')}` : '';
+    const rows = await dbAllAsync(db, `SELECT id FROM ${table} ${where}`, query.params);
+    for (const row of rows) keys.add(embeddingKey(table, row.id));
+  }
+  return keys;
+}
+
+/**
+ * Charge les lignes des documents retenus (une requête par table).
+ * Les clés dont le document a disparu sont retirées de la matrice.
+ * @returns {Promise<Map<string, Object>>}
+ */
+async function fetchDocumentsByKey(db, matrix, hits) {
+  const idsByTable = new Map();
+  for (const { key } of hits) {
+    const { table, id } = parseEmbeddingKey(key);
+    if (!idsByTable.has(table)) idsByTable.set(table, []);
+    idsByTable.get(table).push(id);
+  }
+
+  const rowsByKey = new Map();
+  for (const [table, ids] of idsByTable) {
+    const query = buildTableQuery(table);
+    if (!query) continue;
+    const rows = await dbAllAsync(
+      db,
+      `${query.selectClause} WHERE id IN (${ids.map(() => '?').join(', ')})`,
+      ids,
+    );
+    for (const row of rows) rowsByKey.set(embeddingKey(table, row.id), row);
+  }
+
+  forgetKeys(db, matrix, hits.map(({ key }) => key).filter((key) => !rowsByKey.has(key)));
+  return rowsByKey;
+}
+
+/**
+ * Tables ciblées selon le type demandé (ou la liste explicite `tables`)
+ */
+function resolveTargetTables({ type, tables } = {}) {
   if (Array.isArray(tables) && tables.length > 0) {
-    targetTables = tables;
+    return tables;
+  }
+  if (type === 'entrant' || type === 'interne') {
+    return ['incoming_mails'];
   }
+  if (type === 'sortant') {
+    return ['courriers_sortants'];
+  }
+  return ['incoming_mails', 'courriers_sortants'];
+}
 
+/**
+ * Documents les plus proches d'une requête : clés et scores, sans lecture des lignes.
+ * Les filtres SQL (statut, type, dates) restreignent les candidats avant le calcul des scores.
+ * @returns {Promise<Array<{key: string, table: string, id: number, score: number}>>}
+ */
+async function semanticHits(query, db, options = {}) {
+  const {
+    limit = 10,
+    threshold = 0.7, // Similarité minimale
+  } = options;
+  const targetTables = resolveTargetTables(options);
+
+  // 1. Embedding de la requête (cache ; normalisé : cosine = produit scalaire)
+  const [queryVector, matrix] = await Promise.all([
+    cachedQueryEmbedding(db, EMBEDDING_MODEL, query, generateEmbedding),
+    getEmbeddingMatrix(db),
+  ]);
+  if (!queryVector) return [];
+
+  // 2. Filtres SQL (statut, type, dates) → ensemble de clés admissibles
+  const admissible = await resolveAdmissibleKeys(db, targetTables, options);
+  const wantedTables = new Set(targetTables);
+  const filter = admissible
+    ? (key) => admissible.has(key)
+    : (key) => wantedTables.has(parseEmbeddingKey(key).table);
+
+  // 3. Top-k par produit scalaire (index IVF ou parcours exact)
+  const hits = await searchVectors(db, matrix, queryVector, limit, {
+    threshold,
+    filter,
+    admissible,
+    exact: Boolean(options.exact),
+  });
+  return hits.map(({ key, score }) => ({ key, ...parseEmbeddingKey(key), score }));
+}
+
+/**
+ * Recherche sémantique dans les courriers
+ * @param {string} query - Question en langage naturel
+ * @param {Object} db - Instance SQLite
+ * @param {Object} options - Options de recherche
+ */
+async function semanticSearch(query, db, options = {}) {
   try {
-    // 1. Générer embedding de la requête
     console.log('🔍 Recherche sémantique:', query);
-    const queryEmbedding = await generateEmbedding(query);
+    const [hits, matrix] = await Promise.all([semanticHits(query, db, options), getEmbeddingMatrix(db)]);
+    const rowsByKey = await fetchDocumentsByKey(db, matrix, hits);
 
-    // 2. Récupérer tous les documents avec embeddings
     const results = [];
-
-    for (const table of targetTables) {
-      // Adapter les colonnes selon la table
-      let selectClause;
-      let conditions = ['embedding IS NOT NULL'];
-      const params = [];
-
-      if (table === 'incoming_mails') {
-        selectClause = `SELECT id, subject, sender, extracted_text, embedding, ref_code, statut_global as status, date_reception as date, type_courrier FROM ${table}`;
-
-        if (status) {
-          conditions.push('statut_global = ?');
-          params.push(status);
-        }
-        if (type === 'interne') {
-          conditions.push('type_courrier = ?');
-          params.push('Interne');
-        }
-        if (startDate) {
-          conditions.push('date(date_reception) >= date(?)');
-          params.push(startDate);
-        }
-        if (endDate) {
-          conditions.push('date(date_reception) <= date(?)');
-          params.push(endDate);
-        }
-      } else if (table === 'courriers_sortants') {
-        selectClause = `SELECT id, objet as subject, destinataire as sender, extracted_text, embedding, reference_unique, statut as status, created_at as date FROM ${table}`;
-
-        if (status) {
-          conditions.push('statut = ?');
-          params.push(status);
-        }
-        if (startDate) {
-          conditions.push('date(created_at) >= date(?)');
-          params.push(startDate);
-        }
-        if (endDate) {
-          conditions.push('date(created_at) <= date(?)');
-          params.push(endDate);
-        }
-      } else {
-        continue; // Table non supportée
-      }
-
-      const rows = await new Promise((resolve, reject) => {
-        db.all(
-          `${selectClause} WHERE ${conditions.join(' AND ')}`,
-          params,
-          (err, rows) => {
-            if (err) reject(err);
-            else resolve(rows || []);
-          }
-        );
+    for (const { key, score } of hits) {
+      const row = rowsByKey.get(key);
+      if (!row) continue;
+      const { table } = parseEmbeddingKey(key);
+      results.push({
+        id: row.id,
+        reference: row.reference_unique || row.ref_code,
+        subject: row.subject,
+        sender: row.sender,
+        excerpt: (row.extracted_text || '').substring(0, 200),
+        similarity: score,
+        source: table,
+        type: table === 'incoming_mails' ? (row.type_courrier === 'Interne' ? 'interne' : 'entrant') : 'sortant',
+        status: row.status,
+        date: row.date
       });
-
-      // 3. Calculer similarité pour chaque document
-      for (const row of rows) {
-        try {
-          const docEmbedding = JSON.parse(row.embedding);
-          const similarity = cosineSimilarity(queryEmbedding, docEmbedding);
-
-          if (similarity >= threshold) {
-            results.push({
-              id: row.id,
-              reference: row.reference_unique || row.ref_code,
-              subject: row.subject,
-              sender: row.sender,
-              excerpt: (row.extracted_text || '').substring(0, 200),
-              similarity: similarity,
-              source: table,
-              type: table === 'incoming_mails' ? (row.type_courrier === 'Interne' ? 'interne' : 'entrant') : 'sortant',
-              status: row.status,
-              date: row.date
-            });
-          }
-        } catch (parseErr) {
-          // Embedding invalide, ignorer
-          continue;
-        }
-      }
     }
 
-    // 4. Trier par similarité décroissante
-    results.sort((a, b) => b.similarity - a.similarity);
-
-    return results.slice(0, limit);
+    return results;
 
   } catch (error) {
     console.error('Erreur recherche sémantique:', error.message);
@@ -239,7 +486,7 @@ async function semanticSearch(query, db, options = {}) {
 }
 
 /**
- * Indexe un document (génère et stocke son embedding)
+ * Indexe un document (génère et stocke son embedding ; texte inchangé = cache, pas d'appel API)
  */
 async function indexDocument(db, table, documentId, text) {
 
@@ -247,19 +494,13 @@ async function indexDocument(db, table, documentId, text) {
   if (!combinedText) return null;
 
   try {
-    const embedding = await generateEmbedding(combinedText);
-    const embeddingJson = JSON.stringify(embedding);
-
-    await new Promise((resolve, reject) => {
-      db.run(
-        `UPDATE ${table} SET embedding = ? WHERE id = ?`,
-        [embeddingJson, documentId],
-        (err) => {
-          if (err) reject(err);
-          else resolve();
-        }
-      );
-    });
+    const [embedding] = await cachedEmbeddings(db, EMBEDDING_MODEL, [combinedText], generateEmbeddings);
+    if (!embedding) return null;
+
+    const written = await upsertDocumentEmbeddings(db, [
+      { source: table, docId: documentId, model: EMBEDDING_MODEL, vector: embedding }
+    ]);
+    await updateLoadedMatrix(db, written);
 
     console.log(`✅ Document ${documentId} (${table}) indexé`);
     return embedding;
@@ -271,44 +512,31 @@ async function indexDocument(db, table, documentId, text) {
 }
 
 /**
- * Réindexe tous les documents sans embedding
+ * Réindexe tous les documents sans embedding : lots de textes par appel,
+ * appels concurrents sous limite de débit, reprise après interruption
+ * (voir ai/reindexPipeline.js ; réglages REINDEX_* ou `options`).
  */
-async function reindexAllDocuments(db) {
-  const tables = [
-    { name: 'incoming_mails', textField: 'extracted_text' },
-    { name: 'courriers_sortants', textField: 'extracted_text' }
-  ];
-
-  let totalIndexed = 0;
-
-  for (const { name, textField } of tables) {
-    const rows = await new Promise((resolve, reject) => {
-      db.all(
-        `SELECT id, ${textField} FROM ${name} WHERE embedding IS NULL`,
-        (err, rows) => {
-          if (err) reject(err);
-          else resolve(rows || []);
-        }
-      );
-    });
-
-    console.log(`📚 ${name}: ${rows.length} documents à indexer`);
-
-    for (const row of rows) {
-      const embedding = await indexDocument(db, name, row.id, row[textField]);
-      if (embedding) {
-        totalIndexed++;
-      }
-      
-      // Pause pour éviter rate limits
-      if (totalIndexed % 5 === 0) {
-        await new Promise(resolve => setTimeout(resolve, 1000));
-      }
-    }
-  }
+async function reindexAllDocuments(db, options = {}) {
+  const settings = {
+    batchSize: parseInt(process.env.REINDEX_BATCH_SIZE, 10) || undefined,
+    concurrency: parseInt(process.env.REINDEX_CONCURRENCY, 10) || undefined,
+    rpm: parseInt(process.env.REINDEX_RPM, 10) || undefined,
+    tpm: parseInt(process.env.REINDEX_TPM, 10) || undefined,
+  };
+  Object.keys(settings).forEach((key) => settings[key] === undefined && delete settings[key]);
+
+  const totals = await runReindexPipeline(db, {
+    ...settings,
+    ...options,
+    model: EMBEDDING_MODEL,
+    sources: Object.entries(EMBEDDING_TEXT_COLUMNS).map(([source, columns]) => ({ source, columns })),
+    buildText: (table, row) => buildEmbeddingTextFromRow(table, row),
+    embedBatch: (texts) => cachedEmbeddings(db, EMBEDDING_MODEL, texts, generateEmbeddings),
+    onWritten: (written) => updateLoadedMatrix(db, written),
+  });
 
-  console.log(`✅ Indexation terminée: ${totalIndexed} documents`);
-  return totalIndexed;
+  console.log(`✅ Indexation terminée: ${totals.indexed} documents (${totals.failed} en échec)`);
+  return totals.indexed;
 }
 
 /**
@@ -316,75 +544,35 @@ async function reindexAllDocuments(db) {
  */
 async function findSimilarDocuments(db, table, documentId, limit = 5) {
   try {
-    // Récupérer l'embedding du document source (adapter selon la table)
-    let sourceColumn = table === 'incoming_mails' ? 'subject' : 'objet';
-    const sourceDoc = await new Promise((resolve, reject) => {
-      db.get(
-        `SELECT embedding, ${sourceColumn} as subject FROM ${table} WHERE id = ?`,
-        [documentId],
-        (err, row) => {
-          if (err) reject(err);
-          else resolve(row);
-        }
-      );
-    });
+    const matrix = await getEmbeddingMatrix(db);
+    const sourceKey = embeddingKey(table, documentId);
+    const sourceVector = matrix.get(sourceKey);
 
-    if (!sourceDoc || !sourceDoc.embedding) {
+    if (!sourceVector) {
       return [];
     }
 
-    const sourceEmbedding = JSON.parse(sourceDoc.embedding);
+    // Chercher documents similaires dans toutes les tables (seuil plus bas pour similarité)
+    const hits = await searchVectors(db, matrix, Float32Array.from(sourceVector), limit, {
+      threshold: 0.6,
+      filter: (key) => key !== sourceKey,
+    });
+    const rowsByKey = await fetchDocumentsByKey(db, matrix, hits);
 
-    // Chercher documents similaires dans toutes les tables
-    const tables = ['incoming_mails', 'courriers_sortants'];
     const results = [];
-
-    for (const tbl of tables) {
-      // Adapter les colonnes selon la table
-      let selectClause;
-      if (tbl === 'incoming_mails') {
-        selectClause = `SELECT id, subject, sender, reference_unique, embedding FROM ${tbl}`;
-      } else if (tbl === 'courriers_sortants') {
-        selectClause = `SELECT id, objet as subject, destinataire as sender, reference_unique, embedding FROM ${tbl}`;
-      } else {
-        continue;
-      }
-      
-      const rows = await new Promise((resolve, reject) => {
-        db.all(
-          `${selectClause}
-           WHERE embedding IS NOT NULL AND NOT (id = ? AND '${tbl}' = '${table}')`,
-          [documentId],
-          (err, rows) => {
-            if (err) reject(err);
-            else resolve(rows || []);
-          }
-        );
+    for (const { key, score } of hits) {
+      const row = rowsByKey.get(key);
+      if (!row) continue;
+      results.push({
+        id: row.id,
+        reference: row.reference_unique || row.ref_code,
+        subject: row.subject,
+        sender: row.sender,
+        similarity: score,
+        source: parseEmbeddingKey(key).table
       });
-
-      for (const row of rows) {
-        try {
-          const docEmbedding = JSON.parse(row.embedding);
-          const similarity = cosineSimilarity(sourceEmbedding, docEmbedding);
-
-          if (similarity > 0.6) { // Seuil plus bas pour similarité
-            results.push({
-              id: row.id,
-              reference: row.reference_unique,
-              subject: row.subject,
-              sender: row.sender,
-              similarity: similarity,
-              source: tbl
-            });
-          }
-        } catch (e) {
-          continue;
-        }
-      }
     }
-
-    results.sort((a, b) => b.similarity - a.similarity);
-    return results.slice(0, limit);
+    return results;
 
   } catch (error) {
     console.error('Erreur recherche documents similaires:', error.message);
@@ -394,9 +582,18 @@ async function findSimilarDocuments(db, table, documentId, limit = 5) {
 
 module.exports = {
   generateEmbedding,
+  generateEmbeddings,
   semanticSearch,
+  semanticHits,
+  resolveTargetTables,
+  buildTableQuery,
   indexDocument,
   reindexAllDocuments,
   findSimilarDocuments,
-  cosineSimilarity
+  getEmbeddingMatrix,
+  forgetDocument,
+  vectorIndexPath,
+  cosineSimilarity,
+  EMBEDDING_MODEL,
+  EMBEDDING_DIMENSIONS
 };
@@ -0,0 +1,290 @@
+/**
+ * Index de plus proches voisins pour la matrice d'embeddings (ai/embeddingMatrix.js)
+ *
+ * Deux implémentations interchangeables (même interface add / remove / search) :
+ *   - ExactIndex : parcours complet de la matrice (référence, repli)
+ *   - IvfIndex   : index IVF-flat approximatif. Les vecteurs sont répartis entre
+ *                  `nlist` centroïdes (k-means sphérique). Une requête ne parcourt
+ *                  que les `nprobe` listes les plus proches.
+ *
+ * ✅ Ajout / retrait incrémental (réindexation, suppression de courrier)
+ * ✅ Persistance sur disque à côté de la base (<db>.ivf) : pas de ré-entraînement au démarrage
+ * ✅ Pur JavaScript : aucune dépendance native
+ */
+
+const fs = require('fs');
+const { TopK } = require('./embeddingMatrix');
+
+const IVF_MAGIC = 'IVF1';
+
+// Générateur pseudo-aléatoire déterministe (mulberry32)
+function seeded(seed) {
+  let a = seed;
+  return () => {
+    a = (a + 0x6d2b79f5) | 0;
+    let t = Math.imul(a ^ (a >>> 15), 1 | a);
+    t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t;
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+function normalizeInPlace(vector) {
+  let norm = 0;
+  for (let i = 0; i < vector.length; i++) norm += vector[i] * vector[i];
+  norm = Math.sqrt(norm);
+  if (norm === 0) return false;
+  for (let i = 0; i < vector.length; i++) vector[i] /= norm;
+  return true;
+}
+
+/**
+ * nlist par défaut : ~√N listes (≥ 1)
+ */
+function defaultNlist(size) {
+  return Math.max(1, Math.round(Math.sqrt(size)));
+}
+
+class ExactIndex {
+  constructor(matrix) {
+    this.kind = 'exact';
+    this.matrix = matrix;
+  }
+
+  add() {}
+
+  remove() {}
+
+  search(query, k, options = {}) {
+    return this.matrix.topK(query, k, options);
+  }
+}
+
+class IvfIndex {
+  /**
+   * @param {import('./embeddingMatrix').EmbeddingMatrix} matrix
+   * @param {Float32Array} centroids - nlist × dim, normalisés
+   * @param {Object} [options]
+   * @param {number} [options.nprobe] - listes parcourues par requête
+   */
+  constructor(matrix, centroids, { nprobe = 8 } = {}) {
+    this.kind = 'ivf';
+    this.matrix = matrix;
+    this.dim = matrix.dim;
+    this.centroids = centroids;
+    this.nlist = centroids.length / matrix.dim;
+    this.nprobe = nprobe;
+    this.lists = Array.from({ length: this.nlist }, () => new Set());
+    this.listOf = new Map();
+    this.dirty = false;
+  }
+
+  /**
+   * Entraîne les centroïdes (k-means sphérique sur un échantillon) puis
+   * répartit toutes les lignes de la matrice.
+   */
+  static train(matrix, { nlist = defaultNlist(matrix.size), nprobe, iterations = 10, sampleSize, seed = 42 } = {}) {
+    const { dim } = matrix;
+    const rnd = seeded(seed);
+    const count = Math.min(nlist, matrix.size);
+    if (!count) throw new Error('Matrice vide : index IVF impossible');
+
+    // Échantillon d'entraînement (~40 points par liste suffisent)
+    const sample = [];
+    const wanted = Math.min(matrix.size, sampleSize || count * 40);
+    const step = matrix.size / wanted;
+    for (let i = 0; i < wanted; i++) sample.push(Math.floor(i * step));
+
+    const centroids = new Float32Array(count * dim);
+    for (let c = 0; c < count; c++) {
+      const slot = sample[Math.floor(rnd() * sample.length)];
+      centroids.set(matrix.data.subarray(slot * dim, (slot + 1) * dim), c * dim);
+    }
+
+    const index = new IvfIndex(matrix, centroids, { nprobe });
+    const assignment = new Int32Array(sample.length);
+    for (let iter = 0; iter < iterations; iter++) {
+      for (let i = 0; i < sample.length; i++) {
+        assignment[i] = index.nearestCentroids(matrix.data.subarray(sample[i] * dim, (sample[i] + 1) * dim), 1)[0];
+      }
+
+      const sums = new Float32Array(count * dim);
+      const sizes = new Int32Array(count);
+      for (let i = 0; i < sample.length; i++) {
+        const c = assignment[i];
+        const base = sample[i] * dim;
+        sizes[c]++;
+        for (let d = 0; d < dim; d++) sums[c * dim + d] += matrix.data[base + d];
+      }
+      for (let c = 0; c < count; c++) {
+        const centroid = sums.subarray(c * dim, (c + 1) * dim);
+        if (!sizes[c] || !normalizeInPlace(centroid)) {
+          // Liste vide : réensemencée sur un point de l'échantillon
+          const slot = sample[Math.floor(rnd() * sample.length)];
+          centroid.set(matrix.data.subarray(slot * dim, (slot + 1) * dim));
+        }
+      }
+      index.centroids = sums;
+    }
+
+    for (let slot = 0; slot < matrix.size; slot++) index.add(matrix.keys[slot]);
+    return index;
+  }
+
+  /**
+   * Indices des `n` centroïdes les plus proches d'un vecteur.
+   */
+  nearestCentroids(vector, n) {
+    const { dim, centroids, nlist } = this;
+    const heap = new TopK(Math.min(n, nlist));
+    for (let c = 0; c < nlist; c++) {
+      const base = c * dim;
+      let s0 = 0;
+      let s1 = 0;
+      let s2 = 0;
+      let s3 = 0;
+      let i = 0;
+      for (; i + 3 < dim; i += 4) {
+        s0 += vector[i] * centroids[base + i];
+        s1 += vector[i + 1] * centroids[base + i + 1];
+        s2 += vector[i + 2] * centroids[base + i + 2];
+        s3 += vector[i + 3] * centroids[base + i + 3];
+      }
+      for (; i < dim; i++) s0 += vector[i] * centroids[base + i];
+      const score = s0 + s1 + s2 + s3;
+      if (score > heap.floor()) heap.push(score, c);
+    }
+    return heap.sorted().map(({ item }) => item);
+  }
+
+  /**
+   * Range (ou déplace) une clé de la matrice dans la liste de son centroïde.
+   */
+  add(key) {
+    const vector = this.matrix.get(key);
+    if (!vector) return;
+    const list = this.nearestCentroids(vector, 1)[0];
+    const previous = this.listOf.get(key);
+    if (previous === list) return;
+    if (previous !== undefined) this.lists[previous].delete(key);
+    this.lists[list].add(key);
+    this.listOf.set(key, list);
+    this.dirty = true;
+  }
+
+  remove(key) {
+    const list = this.listOf.get(key);
+    if (list === undefined) return;
+    this.lists[list].delete(key);
+    this.listOf.delete(key);
+    this.dirty = true;
+  }
+
+  /**
+   * Top-k approximatif : seules les `nprobe` listes les plus proches sont parcourues.
+   */
+  search(query, k, { nprobe = this.nprobe, ...options } = {}) {
+    const probes = this.nearestCentroids(query, nprobe);
+    const lists = this.lists;
+    function* candidates() {
+      for (const p of probes) yield* lists[p];
+    }
+    return this.matrix.topKAmong(query, k, candidates(), options);
+  }
+
+  /**
+   * Aligne l'index sur la matrice (clés ajoutées/supprimées depuis la sauvegarde).
+   * @returns {{added: number, removed: number}}
+   */
+  reconcile() {
+    let removed = 0;
+    for (const key of [...this.listOf.keys()]) {
+      if (!this.matrix.has(key)) {
+        this.remove(key);
+        removed++;
+      }
+    }
+    let added = 0;
+    for (let slot = 0; slot < this.matrix.size; slot++) {
+      const key = this.matrix.keys[slot];
+      if (!this.listOf.has(key)) {
+        this.add(key);
+        added++;
+      }
+    }
+    return { added, removed };
+  }
+
+  /**
+   * Sérialisation : 'IVF1' | longueur en-tête (uint32 LE) | en-tête JSON | centroïdes float32
+   */
+  toBuffer(meta = {}) {
+    const header = Buffer.from(JSON.stringify({
+      ...meta,
+      dim: this.dim,
+      nlist: this.nlist,
+      nprobe: this.nprobe,
+      lists: this.lists.map((list) => [...list]),
+    }));
+    const size = Buffer.alloc(4);
+    size.writeUInt32LE(header.length);
+    const centroids = Buffer.from(this.centroids.buffer, this.centroids.byteOffset, this.centroids.byteLength);
+    return Buffer.concat([Buffer.from(IVF_MAGIC), size, header, centroids]);
+  }
+
+  static fromBuffer(matrix, buffer, { nprobe } = {}) {
+    if (buffer.subarray(0, 4).toString() !== IVF_MAGIC) throw new Error('Fichier IVF invalide');
+    const headerLength = buffer.readUInt32LE(4);
+    const header = JSON.parse(buffer.subarray(8, 8 + headerLength).toString());
+    if (header.dim !== matrix.dim) throw new Error(`Dimension IVF ${header.dim} ≠ ${matrix.dim}`);
+
+    const centroids = new Float32Array(header.nlist * header.dim);
+    Buffer.from(centroids.buffer).set(buffer.subarray(8 + headerLength));
+    const index = new IvfIndex(matrix, centroids, { nprobe: nprobe || header.nprobe });
+    header.lists.forEach((keys, list) => {
+      for (const key of keys) {
+        index.lists[list].add(key);
+        index.listOf.set(key, list);
+      }
+    });
+    index.meta = header;
+    return index;
+  }
+
+  /**
+   * Écriture atomique (fichier temporaire puis rename).
+   */
+  async save(file, meta = {}) {
+    const tmp = `${file}.tmp`;
+    await fs.promises.writeFile(tmp, this.toBuffer(meta));
+    await fs.promises.rename(tmp, file);
+    this.dirty = false;
+  }
+
+  static async load(matrix, file, options = {}) {
+    const buffer = await fs.promises.readFile(file);
+    return IvfIndex.fromBuffer(matrix, buffer, options);
+  }
+}
+
+/**
+ * recall@k d'un index par rapport au parcours exact.
+ * @param {Float32Array[]} queries
+ * @returns {number} entre 0 et 1
+ */
+function measureRecall(index, exact, queries, k = 10, options = {}) {
+  let found = 0;
+  let expected = 0;
+  for (const query of queries) {
+    const truth = new Set(exact.search(query, k).map((h) => h.key));
+    for (const hit of index.search(query, k, options)) if (truth.has(hit.key)) found++;
+    expected += truth.size;
+  }
+  return expected ? found / expected : 1;
+}
+
+module.exports = {
+  ExactIndex,
+  IvfIndex,
+  defaultNlist,
+  measureRecall,
+};
@@ -1,15 +1,23 @@
 // 🔒 Configuration MinIO (Stockage WORM - Write Once Read Many)
+const crypto = require('crypto');
+const fs = require('fs');
+const { pipeline } = require('stream');
 const Minio = require('minio');
 
 const MINIO_ENABLED = String(process.env.MINIO_ENABLED || '').toLowerCase() === 'true'
 
+// Taille des parties d'un upload multipart : mémoire tampon maximale par upload en flux
+// (sans elle, un flux de taille inconnue est découpé en parties de plusieurs centaines de Mo)
+const MINIO_PART_SIZE = Math.max(5, parseInt(process.env.MINIO_PART_SIZE_MB || '16', 10)) * 1024 * 1024;
+
 // Configuration du client MinIO
 const minioClient = new Minio.Client({
   endPoint: process.env.MINIO_ENDPOINT || 'localhost',
   port: parseInt(process.env.MINIO_PORT) || 9000,
   useSSL: process.env.MINIO_USE_SSL === 'true',
   accessKey: process.env.MINIO_ACCESS_KEY || 'minioadmin',
-  secretKey: process.env.MINIO_SECRET_KEY || 'minioadmin'
+  secretKey: process.env.MINIO_SECRET_KEY || 'minioadmin',
+  partSize: MINIO_PART_SIZE
 });
 
 // Nom du bucket principal (avec politique WORM)
@@ -77,7 +85,51 @@ async function initializeMinIO() {
 }
 
 /**
- * 🔒 Upload un fichier vers MinIO avec calcul de hash
+ * 🔒 Upload d'un flux vers MinIO (parties de MINIO_PART_SIZE, mémoire bornée)
+ *
+ * Les métadonnées connues seulement en fin de flux (sha256, tag GCM) sont posées ensuite par
+ * copie côté serveur (mise à jour de métadonnées seule pour MinIO). Vers le bucket WORM, le flux
+ * transite par un objet temporaire du bucket principal : l'archive n'a qu'une version, complète.
+ *
+ * @param {import('stream').Readable} stream - Données à stocker
+ * @param {string} objectName - Nom de l'objet dans MinIO
+ * @param {string} bucketName - Bucket cible (par défaut: BUCKET_NAME)
+ * @param {object} metadata - Métadonnées connues au départ
+ * @param {() => object} [finalMetadata] - Métadonnées calculées pendant le flux
+ * @returns {Promise<{etag: string, versionId: string, bucketName: string, objectName: string}>}
+ */
+async function uploadStreamToMinIO(stream, objectName, bucketName = BUCKET_NAME, metadata = {}, finalMetadata = null) {
+  const staged = Boolean(finalMetadata) && bucketName !== BUCKET_NAME;
+  const uploadBucket = staged ? BUCKET_NAME : bucketName;
+  const uploadName = staged ? `.staging/${crypto.randomUUID()}` : objectName;
+
+  const putResult = await minioClient.putObject(uploadBucket, uploadName, stream, undefined, metadata);
+  if (!finalMetadata) {
+    return { etag: putResult.etag, versionId: putResult.versionId || null, bucketName, objectName };
+  }
+
+  try {
+    const copyResult = await minioClient.copyObject(
+      new Minio.CopySourceOptions({ Bucket: uploadBucket, Object: uploadName }),
+      new Minio.CopyDestinationOptions({
+        Bucket: bucketName,
+        Object: objectName,
+        MetadataDirective: 'REPLACE',
+        UserMetadata: { ...metadata, ...finalMetadata() }
+      })
+    );
+    return { etag: copyResult.Etag, versionId: copyResult.VersionId || null, bucketName, objectName };
+  } catch (error) {
+    // Objet sans hash : inutilisable pour verifyIntegrity, on ne le garde pas
+    if (!staged) await minioClient.removeObject(uploadBucket, uploadName).catch(() => {});
+    throw error;
+  } finally {
+    if (staged) await minioClient.removeObject(uploadBucket, uploadName).catch(() => {});
+  }
+}
+
+/**
+ * 🔒 Upload un fichier vers MinIO avec calcul de hash (un seul passage sur le fichier)
  * @param {string} filePath - Chemin local du fichier
  * @param {string} objectName - Nom de l'objet dans MinIO
  * @param {string} bucketName - Bucket cible (par défaut: BUCKET_NAME)
@@ -85,34 +137,30 @@ async function initializeMinIO() {
  * @returns {Promise<{etag: string, versionId: string}>}
  */
 async function uploadToMinIO(filePath, objectName, bucketName = BUCKET_NAME, metadata = {}) {
-  const crypto = require('crypto');
-  const fs = require('fs');
-
-  // Calculer le hash SHA-256 avant upload
-  const fileHash = await new Promise((resolve, reject) => {
-    const hash = crypto.createHash('sha256');
-    const stream = fs.createReadStream(filePath);
-    stream.on('data', chunk => hash.update(chunk));
-    stream.on('end', () => resolve(hash.digest('hex')));
-    stream.on('error', reject);
-  });
+  const { createHashStream } = require('../utils/uploadPipeline');
+
+  // Hash calculé pendant l'envoi
+  const hashStream = createHashStream();
+  const body = pipeline(fs.createReadStream(filePath), hashStream, () => {});
 
   // Enrichir les métadonnées
   const enrichedMetadata = {
     ...metadata,
-    'x-amz-meta-sha256': fileHash,
     'x-amz-meta-upload-date': new Date().toISOString(),
     'x-amz-meta-original-path': filePath
   };
 
   // Upload vers MinIO
-  const result = await minioClient.fPutObject(bucketName, objectName, filePath, enrichedMetadata);
+  const result = await uploadStreamToMinIO(body, objectName, bucketName, enrichedMetadata, () => ({
+    'x-amz-meta-sha256': hashStream.digest()
+  }));
+  const fileHash = hashStream.digest();
   
   console.log(`✅ Fichier uploadé vers MinIO: ${bucketName}/${objectName} (hash: ${fileHash.substring(0, 16)}...)`);
   
   return {
     etag: result.etag,
-    versionId: result.versionId || null,
+    versionId: result.versionId,
     fileHash,
     bucketName,
     objectName
@@ -186,6 +234,7 @@ module.exports = {
   WORM_BUCKET,
   initializeMinIO,
   uploadToMinIO,
+  uploadStreamToMinIO,
   archiveToWORM,
   getPresignedUrl,
   verifyIntegrity,
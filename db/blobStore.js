@@ -0,0 +1,385 @@
+/**
+ * db/blobStore.js
+ * Stockage adressé par contenu des fichiers uploadés (table blobs)
+ *
+ * ✅ Un fichier = un blob uploads/blobs/<aa>/<sha256><ext>, quel que soit le nombre d'uploads
+ * ✅ ref_count tenu par triggers sur les colonnes de chemin connues (courriers, annexes,
+ *    archives, archives temporaires, pièces jointes…) : aucune route n'a à le gérer
+ * ✅ Recomptage complet avant chaque collecte : une table non suivie ne peut pas perdre un fichier
+ * ✅ Rapport des octets économisés (uploads dédupliqués, références partagées)
+ */
+
+const fsPromises = require('fs/promises');
+const path = require('path');
+
+const BLOB_DIR = 'blobs';
+const BLOB_GC_GRACE_HOURS = parseInt(process.env.BLOB_GC_GRACE_HOURS || '24', 10);
+
+// Colonnes qui stockent le chemin d'un fichier uploadé (triggers de comptage)
+const BLOB_OWNER_COLUMNS = [
+  { table: 'incoming_mails', column: 'file_path' },
+  { table: 'annexes', column: 'file_path' },
+  { table: 'archives', column: 'file_path' },
+  { table: 'archive_annexes', column: 'file_path' },
+  { table: 'temp_archives', column: 'file_path' },
+  { table: 'files', column: 'path' },
+  { table: 'courriers_sortants', column: 'original_file_path' },
+  { table: 'courriers_sortants', column: 'scanned_receipt_path' },
+  { table: 'correspondances_externes', column: 'piece_jointe' },
+  { table: 'correspondances_internes', column: 'piece_jointe' },
+  { table: 'planifications', column: 'piece_jointe' },
+  { table: 'appels', column: 'piece_jointe' },
+  { table: 'contrats', column: 'piece_jointe' },
+  { table: 'rapports', column: 'piece_jointe' },
+];
+
+// Colonnes examinées par le recomptage complet (toutes tables)
+const PATH_LIKE_COLUMN = /path|file|piece|jointe|scan|annex|pdf|url|document/i;
+const BLOB_PATH_PATTERN = /uploads[\\/]blobs[\\/][0-9a-f]{2}[\\/]([0-9a-f]{64})/g;
+
+function dbGet(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.get(sql, params, (err, row) => {
+      if (err) return reject(err);
+      resolve(row);
+    });
+  });
+}
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+function dbRun(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.run(sql, params, function onRun(err) {
+      if (err) return reject(err);
+      resolve(this);
+    });
+  });
+}
+
+function dbExec(db, sql) {
+  return new Promise((resolve, reject) => {
+    db.exec(sql, (err) => {
+      if (err) return reject(err);
+      resolve();
+    });
+  });
+}
+
+/**
+ * Chemin relatif (à uploads/) d'un blob.
+ */
+function blobRelativePath(sha256, ext = '') {
+  return `${BLOB_DIR}/${sha256.slice(0, 2)}/${sha256}${ext}`;
+}
+
+// sha256 d'un chemin .../uploads/blobs/<aa>/<sha256>... (NULL sinon), en SQL
+function sqlBlobSha(expr) {
+  const p = `replace(${expr}, char(92), '/')`;
+  return `CASE WHEN instr(${p}, 'uploads/${BLOB_DIR}/') > 0 THEN substr(${p}, instr(${p}, 'uploads/${BLOB_DIR}/') + 17, 64) END`;
+}
+
+function buildOwnerTriggers({ table, column }) {
+  const base = `trg_blobref_${table}_${column}`;
+  const inc = (ref) => `UPDATE blobs SET ref_count = ref_count + 1 WHERE sha256 = ${sqlBlobSha(ref)};`;
+  const dec = (ref) => `UPDATE blobs SET ref_count = max(ref_count - 1, 0) WHERE sha256 = ${sqlBlobSha(ref)};`;
+  return [
+    {
+      name: `${base}_ins`,
+      sql: `CREATE TRIGGER ${base}_ins AFTER INSERT ON ${table}
+WHEN ${sqlBlobSha(`NEW.${column}`)} IS NOT NULL
+BEGIN
+  ${inc(`NEW.${column}`)}
+END`,
+    },
+    {
+      name: `${base}_upd`,
+      sql: `CREATE TRIGGER ${base}_upd AFTER UPDATE OF ${column} ON ${table}
+WHEN OLD.${column} IS NOT NEW.${column}
+BEGIN
+  ${dec(`OLD.${column}`)}
+  ${inc(`NEW.${column}`)}
+END`,
+    },
+    {
+      name: `${base}_del`,
+      sql: `CREATE TRIGGER ${base}_del AFTER DELETE ON ${table}
+WHEN ${sqlBlobSha(`OLD.${column}`)} IS NOT NULL
+BEGIN
+  ${dec(`OLD.${column}`)}
+END`,
+    },
+  ];
+}
+
+function listColumns(db, table) {
+  return dbAll(db, `PRAGMA table_info("${table}")`);
+}
+
+/**
+ * Crée la table blobs et les triggers de comptage des colonnes présentes.
+ * Les triggers ne sont recréés que si leur définition a changé (tables apparues depuis).
+ * @returns {Promise<string[]>} colonnes suivies (table.colonne)
+ */
+async function ensureBlobStore(db) {
+  await dbExec(db, `
+    CREATE TABLE IF NOT EXISTS blobs (
+      sha256 TEXT PRIMARY KEY,
+      rel_path TEXT NOT NULL,
+      size INTEGER NOT NULL,
+      mime_type TEXT,
+      ref_count INTEGER NOT NULL DEFAULT 0,
+      upload_count INTEGER NOT NULL DEFAULT 0,
+      created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+      last_uploaded_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_blobs_gc ON blobs(ref_count, last_uploaded_at);
+  `);
+
+  const tables = new Set(
+    (await dbAll(db, "SELECT name FROM sqlite_master WHERE type = 'table'")).map((r) => r.name),
+  );
+  const tracked = [];
+  for (const owner of BLOB_OWNER_COLUMNS) {
+    if (!tables.has(owner.table)) continue;
+    const columns = await listColumns(db, owner.table);
+    if (columns.some((c) => c.name === owner.column)) tracked.push(owner);
+  }
+  const wanted = tracked.flatMap(buildOwnerTriggers);
+
+  const existing = await dbAll(
+    db,
+    "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_blobref_%'",
+  );
+  const existingSql = new Map(existing.map((t) => [t.name, t.sql]));
+  const upToDate =
+    existing.length === wanted.length && wanted.every((t) => existingSql.get(t.name) === t.sql);
+
+  if (!upToDate) {
+    const statements = [
+      ...existing.map((t) => `DROP TRIGGER IF EXISTS ${t.name};`),
+      ...wanted.map((t) => `${t.sql};`),
+    ];
+    try {
+      await dbExec(db, `BEGIN IMMEDIATE;\n${statements.join('\n')}\nCOMMIT;`);
+    } catch (err) {
+      await dbExec(db, 'ROLLBACK;').catch(() => {});
+      throw err;
+    }
+    // Triggers posés après coup : compteurs remis d'aplomb
+    await recountBlobRefs(db);
+    console.log(`✅ Triggers de références des blobs installés (${tracked.length} colonne(s))`);
+  }
+  return tracked.map((o) => `${o.table}.${o.column}`);
+}
+
+async function getBlob(db, sha256) {
+  return dbGet(db, 'SELECT * FROM blobs WHERE sha256 = ?', [sha256]);
+}
+
+/**
+ * Enregistre un upload du blob (création ou doublon), avant toute vérification du fichier :
+ * last_uploaded_at protège le blob de la collecte jusqu'à ce que la route enregistre sa ligne.
+ * @returns {Promise<Object>} ligne du blob (rel_path d'origine si le contenu était connu)
+ */
+async function registerBlobUpload(db, { sha256, relPath, size, mimeType = null }) {
+  await dbRun(
+    db,
+    `INSERT INTO blobs (sha256, rel_path, size, mime_type, ref_count, upload_count)
+     VALUES (?, ?, ?, ?, 0, 1)
+     ON CONFLICT(sha256) DO UPDATE SET
+       upload_count = upload_count + 1,
+       last_uploaded_at = CURRENT_TIMESTAMP`,
+    [sha256, relPath, size, mimeType],
+  );
+  return getBlob(db, sha256);
+}
+
+/**
+ * Supprime le fichier d'un blob dont la ligne vient d'être effacée, sauf si un upload du même
+ * contenu l'a recréée entre-temps. Le fichier est d'abord écarté (renommage atomique) puis la
+ * ligne re-vérifiée : un upload enregistré avant la re-vérification retrouve son fichier, un
+ * upload enregistré après ne le trouve plus et dépose le sien (storeBlob enregistre la ligne
+ * avant de regarder le fichier). Même contenu, donc même fichier dans les deux cas.
+ * @returns {Promise<boolean>} vrai si le fichier a été supprimé
+ */
+async function discardBlobFile(db, uploadsDir, blob) {
+  const absPath = path.join(uploadsDir, blob.rel_path);
+  const trashPath = path.join(uploadsDir, BLOB_DIR, 'tmp', `${blob.sha256}.gc-${process.pid}`);
+  try {
+    await fsPromises.mkdir(path.dirname(trashPath), { recursive: true });
+    await fsPromises.rename(absPath, trashPath);
+  } catch (err) {
+    if (err.code !== 'ENOENT') console.warn(`⚠️  Blob ${blob.sha256.slice(0, 12)} non supprimé:`, err.message);
+    return err.code === 'ENOENT';
+  }
+
+  const current = await getBlob(db, blob.sha256).catch(() => null);
+  if (current && current.rel_path === blob.rel_path) {
+    // Ré-uploadé pendant la collecte : le fichier reste en place
+    await fsPromises.rename(trashPath, absPath);
+    return false;
+  }
+  await fsPromises.unlink(trashPath).catch(() => {});
+  return true;
+}
+
+/**
+ * Recompte les références de chaque blob dans toutes les colonnes de type chemin
+ * (y compris les tables sans trigger et les listes JSON de chemins).
+ * @returns {Promise<{columns: number, references: number, corrected: number}>}
+ */
+async function recountBlobRefs(db) {
+  const counts = new Map();
+  let columnsScanned = 0;
+  let references = 0;
+
+  const tables = await dbAll(
+    db,
+    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' AND name <> 'blobs'",
+  );
+  for (const { name: table } of tables) {
+    const columns = (await listColumns(db, table).catch(() => []))
+      .filter((c) => PATH_LIKE_COLUMN.test(c.name) && (!c.type || /char|text|clob/i.test(c.type)));
+    for (const { name: column } of columns) {
+      columnsScanned += 1;
+      const rows = await dbAll(
+        db,
+        `SELECT "${column}" AS value FROM "${table}" WHERE instr("${column}", '${BLOB_DIR}') > 0`,
+      );
+      for (const { value } of rows) {
+        for (const match of String(value).matchAll(BLOB_PATH_PATTERN)) {
+          counts.set(match[1], (counts.get(match[1]) || 0) + 1);
+          references += 1;
+        }
+      }
+    }
+  }
+
+  const blobs = await dbAll(db, 'SELECT sha256, ref_count FROM blobs');
+  const updates = blobs.filter((b) => (counts.get(b.sha256) || 0) !== b.ref_count);
+  if (updates.length) {
+    // Un seul exec : la transaction ne s'entrelace pas avec les requêtes des routes
+    // (sha256 hexadécimal et entiers : valeurs sûres à inliner)
+    const statements = updates
+      .filter((b) => /^[0-9a-f]{64}$/.test(b.sha256))
+      .map((b) => `UPDATE blobs SET ref_count = ${Number(counts.get(b.sha256) || 0)} WHERE sha256 = '${b.sha256}';`);
+    try {
+      await dbExec(db, `BEGIN IMMEDIATE;\n${statements.join('\n')}\nCOMMIT;`);
+    } catch (err) {
+      await dbExec(db, 'ROLLBACK;').catch(() => {});
+      throw err;
+    }
+  }
+  return { columns: columnsScanned, references, corrected: updates.length };
+}
+
+/**
+ * Supprime les blobs sans référence depuis plus de graceHours (après recomptage).
+ * @returns {Promise<{deleted: number, freedBytes: number, corrected: number}>}
+ */
+async function collectBlobGarbage(db, { uploadsDir, graceHours = BLOB_GC_GRACE_HOURS, dryRun = false } = {}) {
+  const { corrected } = await recountBlobRefs(db);
+  const cutoff = `-${Math.max(0, graceHours)} hours`;
+  const candidates = await dbAll(
+    db,
+    `SELECT sha256, rel_path, size FROM blobs
+     WHERE ref_count = 0 AND last_uploaded_at < datetime('now', ?)`,
+    [cutoff],
+  );
+
+  let deleted = 0;
+  let freedBytes = 0;
+  for (const blob of candidates) {
+    if (dryRun) {
+      deleted += 1;
+      freedBytes += blob.size;
+      continue;
+    }
+    // Re-vérifié au moment de la suppression : un upload ou une référence a pu arriver entre-temps
+    const result = await dbRun(
+      db,
+      `DELETE FROM blobs WHERE sha256 = ? AND ref_count = 0 AND last_uploaded_at < datetime('now', ?)`,
+      [blob.sha256, cutoff],
+    );
+    if (!result.changes) continue;
+    if (!(await discardBlobFile(db, uploadsDir, blob))) continue;
+    deleted += 1;
+    freedBytes += blob.size;
+  }
+
+  // Fichiers temporaires d'uploads interrompus
+  const tmpDir = path.join(uploadsDir, BLOB_DIR, 'tmp');
+  const entries = await fsPromises.readdir(tmpDir).catch(() => []);
+  const tmpCutoff = Date.now() - Math.max(1, graceHours) * 3600 * 1000;
+  for (const entry of entries) {
+    const file = path.join(tmpDir, entry);
+    const stat = await fsPromises.stat(file).catch(() => null);
+    if (stat && stat.mtimeMs < tmpCutoff && !dryRun) await fsPromises.unlink(file).catch(() => {});
+  }
+
+  return { deleted, freedBytes, corrected };
+}
+
+/**
+ * Volume stocké vs volume logique, et octets économisés par la déduplication.
+ */
+async function getBlobStoreReport(db, { top = 10 } = {}) {
+  const totals = await dbGet(db, `
+    SELECT
+      COUNT(*) AS blobs,
+      COALESCE(SUM(size), 0) AS stored_bytes,
+      COALESCE(SUM(upload_count), 0) AS uploads,
+      COALESCE(SUM(size * upload_count), 0) AS uploaded_bytes,
+      COALESCE(SUM(ref_count), 0) AS references_count,
+      COALESCE(SUM(size * ref_count), 0) AS referenced_bytes,
+      COALESCE(SUM(CASE WHEN ref_count > 0 THEN size ELSE 0 END), 0) AS live_bytes,
+      COALESCE(SUM(CASE WHEN ref_count = 0 THEN 1 ELSE 0 END), 0) AS orphan_blobs,
+      COALESCE(SUM(CASE WHEN ref_count = 0 THEN size ELSE 0 END), 0) AS orphan_bytes
+    FROM blobs
+  `);
+  const topDuplicates = await dbAll(
+    db,
+    `SELECT sha256, rel_path, size, upload_count, ref_count, size * (upload_count - 1) AS saved_bytes
+     FROM blobs WHERE upload_count > 1
+     ORDER BY saved_bytes DESC LIMIT ?`,
+    [top],
+  );
+
+  const savedByUploads = totals.uploaded_bytes - totals.stored_bytes;
+  const savedByReferences = Math.max(0, totals.referenced_bytes - totals.live_bytes);
+  return {
+    blobs: totals.blobs,
+    storedBytes: totals.stored_bytes,
+    uploads: totals.uploads,
+    uploadedBytes: totals.uploaded_bytes,
+    savedBytes: savedByUploads,
+    savedRatio: totals.uploaded_bytes ? savedByUploads / totals.uploaded_bytes : 0,
+    references: totals.references_count,
+    referencedBytes: totals.referenced_bytes,
+    savedByReferencesBytes: savedByReferences,
+    orphanBlobs: totals.orphan_blobs,
+    orphanBytes: totals.orphan_bytes,
+    topDuplicates,
+  };
+}
+
+module.exports = {
+  BLOB_DIR,
+  BLOB_OWNER_COLUMNS,
+  BLOB_GC_GRACE_HOURS,
+  blobRelativePath,
+  ensureBlobStore,
+  getBlob,
+  registerBlobUpload,
+  recountBlobRefs,
+  collectBlobGarbage,
+  getBlobStoreReport,
+};
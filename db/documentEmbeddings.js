@@ -0,0 +1,224 @@
+/**
+ * db/documentEmbeddings.js
+ * Stockage binaire des embeddings de documents (table document_embeddings)
+ *
+ * ✅ Vecteurs float32 normalisés en BLOB (dim × 4 octets) au lieu de JSON texte
+ * ✅ Table dédiée : le chargement ne lit pas les lignes (et le texte OCR) des courriers
+ * ✅ Suppression en cascade par triggers quand un courrier est supprimé
+ * ✅ Migration des anciennes colonnes `embedding` (JSON) d'incoming_mails / courriers_sortants
+ * ✅ Points de reprise de la réindexation en masse (table embedding_reindex_checkpoints)
+ */
+
+const { normalizeVector, vectorToBlob } = require('../ai/embeddingMatrix');
+
+const EMBEDDING_SOURCES = ['incoming_mails', 'courriers_sortants'];
+
+// Modèle des embeddings JSON hérités (ai/semanticSearch.js)
+const LEGACY_EMBEDDING_MODEL = 'text-embedding-3-small';
+
+// Lignes par lot d'écriture (un db.exec par lot)
+const WRITE_BATCH_SIZE = 200;
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+function dbExec(db, sql) {
+  return new Promise((resolve, reject) => {
+    db.exec(sql, (err) => {
+      if (err) return reject(err);
+      resolve();
+    });
+  });
+}
+
+function quoteLiteral(value) {
+  return `'${String(value).replace(/'/g, "''")}'`;
+}
+
+async function execTransaction(db, statements) {
+  try {
+    await dbExec(db, `BEGIN IMMEDIATE;\n${statements.join('\n')}\nCOMMIT;`);
+  } catch (err) {
+    await dbExec(db, 'ROLLBACK;').catch(() => {});
+    throw err;
+  }
+}
+
+/**
+ * Écrit des embeddings par lots transactionnels.
+ * Les vecteurs sont normalisés ici ; les BLOB sont insérés en littéraux X'..'
+ * pour passer chaque lot en un seul db.exec (transaction non entrelacée).
+ *
+ * @param {Array<{source: string, docId: number, model: string, vector: number[]|Float32Array}>} entries
+ * @returns {Promise<Array<{source: string, docId: number, vector: Float32Array}>>} vecteurs normalisés écrits
+ */
+async function upsertDocumentEmbeddings(db, entries) {
+  const written = [];
+  for (let start = 0; start < entries.length; start += WRITE_BATCH_SIZE) {
+    const statements = [];
+    const batch = [];
+    for (const { source, docId, model, vector } of entries.slice(start, start + WRITE_BATCH_SIZE)) {
+      const normalized = normalizeVector(vector);
+      if (!normalized || !EMBEDDING_SOURCES.includes(source)) continue;
+      statements.push(
+        `INSERT INTO document_embeddings (source, doc_id, model, dim, vector, updated_at)
+         VALUES (${quoteLiteral(source)}, ${Number(docId)}, ${quoteLiteral(model)}, ${normalized.length},
+                 X'${vectorToBlob(normalized).toString('hex')}', CURRENT_TIMESTAMP)
+         ON CONFLICT (source, doc_id) DO UPDATE SET
+           model = excluded.model, dim = excluded.dim, vector = excluded.vector, updated_at = excluded.updated_at;`,
+      );
+      batch.push({ source, docId: Number(docId), vector: normalized });
+    }
+    if (!statements.length) continue;
+    await execTransaction(db, statements);
+    written.push(...batch);
+  }
+  return written;
+}
+
+/**
+ * Supprime l'embedding d'un document.
+ */
+async function deleteDocumentEmbedding(db, source, docId) {
+  await dbExec(
+    db,
+    `DELETE FROM document_embeddings WHERE source = ${quoteLiteral(source)} AND doc_id = ${Number(docId)};`,
+  );
+}
+
+/**
+ * Charge tous les embeddings d'un modèle.
+ * @returns {Promise<Array<{source: string, doc_id: number, vector: Buffer}>>}
+ */
+function loadDocumentEmbeddings(db, model) {
+  return dbAll(db, 'SELECT source, doc_id, vector FROM document_embeddings WHERE model = ?', [model]);
+}
+
+/**
+ * Point de reprise d'une réindexation (dernier id traité d'une table).
+ * @returns {Promise<{last_id: number, indexed: number, failed: number}|null>}
+ */
+async function readReindexCheckpoint(db, job, source) {
+  const rows = await dbAll(
+    db,
+    'SELECT last_id, indexed, failed FROM embedding_reindex_checkpoints WHERE job = ? AND source = ?',
+    [job, source],
+  );
+  return rows[0] || null;
+}
+
+async function writeReindexCheckpoint(db, job, source, lastId, { indexed = 0, failed = 0 } = {}) {
+  await dbExec(
+    db,
+    `INSERT INTO embedding_reindex_checkpoints (job, source, last_id, indexed, failed, updated_at)
+     VALUES (${quoteLiteral(job)}, ${quoteLiteral(source)}, ${Number(lastId)}, ${Number(indexed)}, ${Number(failed)}, CURRENT_TIMESTAMP)
+     ON CONFLICT (job, source) DO UPDATE SET
+       last_id = excluded.last_id, indexed = excluded.indexed, failed = excluded.failed, updated_at = excluded.updated_at;`,
+  );
+}
+
+/**
+ * Supprime le point de reprise (table terminée : le prochain passage repart de 0
+ * et reprend les documents en échec).
+ */
+async function clearReindexCheckpoint(db, job, source) {
+  await dbExec(
+    db,
+    `DELETE FROM embedding_reindex_checkpoints WHERE job = ${quoteLiteral(job)} AND source = ${quoteLiteral(source)};`,
+  );
+}
+
+/**
+ * Convertit les embeddings JSON hérités (colonne `embedding`) en BLOB normalisés,
+ * puis vide la colonne d'origine (le JSON pèse ~30 Ko par courrier).
+ */
+async function migrateLegacyEmbeddings(db, model = LEGACY_EMBEDDING_MODEL) {
+  let migrated = 0;
+  for (const source of EMBEDDING_SOURCES) {
+    const info = await dbAll(db, `PRAGMA table_info(${source})`);
+    if (!info.some((c) => c.name === 'embedding')) continue;
+
+    for (;;) {
+      const rows = await dbAll(
+        db,
+        `SELECT id, embedding FROM ${source} WHERE embedding IS NOT NULL AND typeof(embedding) = 'text' LIMIT ?`,
+        [WRITE_BATCH_SIZE],
+      );
+      if (!rows.length) break;
+
+      const entries = [];
+      for (const row of rows) {
+        try {
+          entries.push({ source, docId: row.id, model, vector: JSON.parse(row.embedding) });
+        } catch (_) {
+          // JSON invalide : la colonne est vidée, le document sera réindexé
+        }
+      }
+      await upsertDocumentEmbeddings(db, entries);
+      await dbExec(db, `UPDATE ${source} SET embedding = NULL WHERE id IN (${rows.map((r) => Number(r.id)).join(', ')});`);
+      migrated += entries.length;
+    }
+  }
+  if (migrated) console.log(`✅ ${migrated} embedding(s) JSON convertis en BLOB float32`);
+  return migrated;
+}
+
+/**
+ * Crée la table document_embeddings, ses triggers de suppression et migre
+ * les embeddings JSON existants.
+ */
+async function ensureDocumentEmbeddings(db, model = LEGACY_EMBEDDING_MODEL) {
+  const statements = [
+    `CREATE TABLE IF NOT EXISTS document_embeddings (
+      source TEXT NOT NULL,
+      doc_id INTEGER NOT NULL,
+      model TEXT NOT NULL,
+      dim INTEGER NOT NULL,
+      vector BLOB NOT NULL,
+      updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (source, doc_id)
+    );`,
+    `CREATE TABLE IF NOT EXISTS embedding_reindex_checkpoints (
+      job TEXT NOT NULL,
+      source TEXT NOT NULL,
+      last_id INTEGER NOT NULL DEFAULT 0,
+      indexed INTEGER NOT NULL DEFAULT 0,
+      failed INTEGER NOT NULL DEFAULT 0,
+      updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (job, source)
+    );`,
+  ];
+
+  for (const source of EMBEDDING_SOURCES) {
+    const info = await dbAll(db, `PRAGMA table_info(${source})`);
+    if (!info.length) continue;
+    statements.push(
+      `CREATE TRIGGER IF NOT EXISTS trg_embeddings_${source}_delete AFTER DELETE ON ${source}
+       BEGIN
+         DELETE FROM document_embeddings WHERE source = ${quoteLiteral(source)} AND doc_id = OLD.id;
+       END;`,
+    );
+  }
+
+  await execTransaction(db, statements);
+  await migrateLegacyEmbeddings(db, model);
+  console.log('✅ Table document_embeddings prête');
+}
+
+module.exports = {
+  EMBEDDING_SOURCES,
+  ensureDocumentEmbeddings,
+  upsertDocumentEmbeddings,
+  deleteDocumentEmbedding,
+  loadDocumentEmbeddings,
+  migrateLegacyEmbeddings,
+  readReindexCheckpoint,
+  writeReindexCheckpoint,
+  clearReindexCheckpoint,
+};
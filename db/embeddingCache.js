@@ -0,0 +1,173 @@
+/**
+ * db/embeddingCache.js
+ * Cache persistant des embeddings par contenu (table embedding_cache)
+ *
+ * ✅ Clé = sha256(modèle + texte) : un texte déjà vectorisé n'est jamais renvoyé à l'API
+ * ✅ Partagé par la recherche sémantique, le magasin vectoriel mémoire et l'assistant
+ * ✅ Taille bornée : les entrées les moins récemment utilisées sont évincées
+ */
+
+const crypto = require('crypto');
+const { normalizeVector, vectorToBlob, blobToVector } = require('../ai/embeddingMatrix');
+
+// Nombre maximal d'entrées (~6 Ko par vecteur de dimension 1536)
+const EMBEDDING_CACHE_MAX_ENTRIES = parseInt(process.env.EMBEDDING_CACHE_MAX_ENTRIES, 10) || 50000;
+// Éviction jusqu'à 90 % de la limite (amortit le DELETE)
+const EVICTION_TARGET_RATIO = 0.9;
+// Taille contrôlée toutes les N écritures
+const EVICTION_CHECK_EVERY = 500;
+const LOOKUP_BATCH_SIZE = 500;
+
+const statesByDb = new WeakMap();
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+function dbExec(db, sql) {
+  return new Promise((resolve, reject) => {
+    db.exec(sql, (err) => {
+      if (err) return reject(err);
+      resolve();
+    });
+  });
+}
+
+function quoteLiteral(value) {
+  return `'${String(value).replace(/'/g, "''")}'`;
+}
+
+async function execTransaction(db, statements) {
+  try {
+    await dbExec(db, `BEGIN IMMEDIATE;\n${statements.join('\n')}\nCOMMIT;`);
+  } catch (err) {
+    await dbExec(db, 'ROLLBACK;').catch(() => {});
+    throw err;
+  }
+}
+
+/**
+ * Clé de cache d'un texte pour un modèle
+ */
+function embeddingCacheKey(model, text) {
+  return crypto.createHash('sha256').update(model).update('\0').update(text).digest('hex');
+}
+
+/**
+ * Crée la table embedding_cache (idempotent, une fois par connexion).
+ */
+function ensureEmbeddingCache(db) {
+  let state = statesByDb.get(db);
+  if (!state) {
+    state = { ready: null, writes: 0 };
+    statesByDb.set(db, state);
+  }
+  if (!state.ready) {
+    state.ready = execTransaction(db, [
+      `CREATE TABLE IF NOT EXISTS embedding_cache (
+        hash TEXT PRIMARY KEY,
+        model TEXT NOT NULL,
+        dim INTEGER NOT NULL,
+        vector BLOB NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_used_at DATETIME DEFAULT CURRENT_TIMESTAMP
+      ) WITHOUT ROWID;`,
+      'CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used_at);',
+    ]).catch((err) => {
+      state.ready = null;
+      throw err;
+    });
+  }
+  return state.ready;
+}
+
+/**
+ * Vecteurs en cache pour une liste de textes.
+ * @returns {Promise<Array<Float32Array|null>>} dans l'ordre des textes (null = absent)
+ */
+async function getCachedEmbeddings(db, model, texts) {
+  await ensureEmbeddingCache(db);
+  const hashes = texts.map((text) => embeddingCacheKey(model, text));
+  const found = new Map();
+
+  for (let start = 0; start < hashes.length; start += LOOKUP_BATCH_SIZE) {
+    const chunk = [...new Set(hashes.slice(start, start + LOOKUP_BATCH_SIZE))];
+    const rows = await dbAll(
+      db,
+      `SELECT hash, vector FROM embedding_cache WHERE hash IN (${chunk.map(() => '?').join(', ')})`,
+      chunk,
+    );
+    for (const row of rows) found.set(row.hash, blobToVector(row.vector));
+  }
+
+  if (found.size) {
+    // Date d'utilisation rafraîchie en arrière-plan (ordre d'éviction)
+    dbExec(
+      db,
+      `UPDATE embedding_cache SET last_used_at = CURRENT_TIMESTAMP
+       WHERE hash IN (${[...found.keys()].map(quoteLiteral).join(', ')});`,
+    ).catch((err) => console.warn('⚠️  Cache embeddings (last_used_at):', err.message));
+  }
+
+  return hashes.map((hash) => found.get(hash) || null);
+}
+
+/**
+ * Enregistre des vecteurs (normalisés ici) pour des textes.
+ */
+async function putCachedEmbeddings(db, model, texts, vectors) {
+  await ensureEmbeddingCache(db);
+  const statements = [];
+  texts.forEach((text, i) => {
+    const normalized = normalizeVector(vectors[i]);
+    if (!normalized) return;
+    statements.push(
+      `INSERT OR REPLACE INTO embedding_cache (hash, model, dim, vector, created_at, last_used_at)
+       VALUES (${quoteLiteral(embeddingCacheKey(model, text))}, ${quoteLiteral(model)}, ${normalized.length},
+               X'${vectorToBlob(normalized).toString('hex')}', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP);`,
+    );
+  });
+  if (!statements.length) return;
+  await execTransaction(db, statements);
+
+  const state = statesByDb.get(db);
+  const before = state.writes;
+  state.writes += statements.length;
+  if (Math.floor(before / EVICTION_CHECK_EVERY) !== Math.floor(state.writes / EVICTION_CHECK_EVERY)) {
+    await evictEmbeddingCache(db).catch((err) => console.warn('⚠️  Éviction cache embeddings:', err.message));
+  }
+}
+
+/**
+ * Ramène le cache sous sa limite (entrées les moins récemment utilisées d'abord).
+ * @returns {Promise<number>} entrées supprimées
+ */
+async function evictEmbeddingCache(db, maxEntries = EMBEDDING_CACHE_MAX_ENTRIES) {
+  await ensureEmbeddingCache(db);
+  const [{ count }] = await dbAll(db, 'SELECT COUNT(*) AS count FROM embedding_cache');
+  if (count <= maxEntries) return 0;
+
+  const excess = count - Math.floor(maxEntries * EVICTION_TARGET_RATIO);
+  await dbExec(
+    db,
+    `DELETE FROM embedding_cache WHERE hash IN (
+       SELECT hash FROM embedding_cache ORDER BY last_used_at LIMIT ${Number(excess)}
+     );`,
+  );
+  console.log(`🧹 Cache embeddings: ${excess} entrée(s) évincée(s) (limite ${maxEntries})`);
+  return excess;
+}
+
+module.exports = {
+  EMBEDDING_CACHE_MAX_ENTRIES,
+  embeddingCacheKey,
+  ensureEmbeddingCache,
+  getCachedEmbeddings,
+  putCachedEmbeddings,
+  evictEmbeddingCache,
+};
@@ -0,0 +1,63 @@
+/**
+ * db/incomingMailsIndexes.js
+ * Index de la liste des courriers entrants (GET /api/mails/incoming)
+ *
+ * ✅ Un index (filtre, date_reception) par filtre de la liste : la page la plus récente
+ *    est lue dans l'ordre de l'index, sans tri ni parcours de la table
+ * ✅ id (rowid) est implicitement en fin d'index : la pagination par curseur
+ *    (date_reception, id) s'appuie dessus
+ * ✅ Index d'expression pour le filtre implicite UPPER(TRIM(assigned_service)) des rôles service
+ */
+
+const LIST_INDEXES = [
+  { name: 'idx_incoming_mails_date_reception', columns: ['date_reception'], on: 'date_reception' },
+  { name: 'idx_incoming_mails_status_date', columns: ['statut_global', 'date_reception'], on: 'statut_global, date_reception' },
+  { name: 'idx_incoming_mails_service_date', columns: ['assigned_service', 'date_reception'], on: 'assigned_service, date_reception' },
+  { name: 'idx_incoming_mails_service_norm_date', columns: ['assigned_service', 'date_reception'], on: 'UPPER(TRIM(assigned_service)), date_reception' },
+  { name: 'idx_incoming_mails_assigned_to_date', columns: ['assigned_to', 'date_reception'], on: 'assigned_to, date_reception' },
+];
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+function dbExec(db, sql) {
+  return new Promise((resolve, reject) => {
+    db.exec(sql, (err) => {
+      if (err) return reject(err);
+      resolve();
+    });
+  });
+}
+
+/**
+ * Crée les index de liste manquants (colonnes absentes du schéma ignorées) ;
+ * statistiques du planificateur rafraîchies quand un index est ajouté.
+ */
+async function ensureIncomingMailsListIndexes(db) {
+  const info = await dbAll(db, 'PRAGMA table_info(incoming_mails)');
+  const columns = new Set(info.map((c) => c.name));
+  const existing = new Set(
+    (await dbAll(db, "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'incoming_mails'")).map((r) => r.name),
+  );
+  const missing = LIST_INDEXES.filter(
+    (index) => !existing.has(index.name) && index.columns.every((c) => columns.has(c)),
+  );
+  if (!missing.length) return;
+
+  await dbExec(
+    db,
+    `${missing.map((index) => `CREATE INDEX IF NOT EXISTS ${index.name} ON incoming_mails(${index.on});`).join('\n')}
+     ANALYZE incoming_mails;`,
+  );
+  console.log(`✅ Index liste courriers entrants créés: ${missing.map((index) => index.name).join(', ')}`);
+}
+
+module.exports = {
+  ensureIncomingMailsListIndexes,
+};
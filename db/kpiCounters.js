@@ -0,0 +1,242 @@
+/**
+ * db/kpiCounters.js
+ * Matérialisation incrémentale des compteurs KPI (table kpi_counters)
+ *
+ * ✅ Compteurs maintenus par triggers INSERT/UPDATE/DELETE
+ * ✅ Lecture en O(1) pour stats.service.js et l'agent Flask (flask_app.py)
+ * ✅ Reconstruction complète (rebuildKpiCounters) en cas de dérive
+ *
+ * Schéma : une ligne par (source, dimension, bucket, is_null)
+ *   - dimension 'total'    : bucket '' → nombre de lignes de la table
+ *   - dimension '<colonne>': bucket = valeur de la colonne → nombre de lignes
+ *   - dimension '_tracked' : bucket = nom de colonne suivie (marqueur, count = 0)
+ *
+ * is_null distingue une valeur NULL d'une chaîne vide ('' dans bucket).
+ */
+
+// Colonnes ventilées par table (seules celles présentes dans le schéma sont suivies)
+const KPI_SOURCES = {
+  incoming_mails: ['status', 'statut_global', 'assigned_service'],
+  courriers_sortants: ['statut'],
+  archives: [],
+  notifications: ['lu'],
+};
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+function dbExec(db, sql) {
+  return new Promise((resolve, reject) => {
+    db.exec(sql, (err) => {
+      if (err) return reject(err);
+      resolve();
+    });
+  });
+}
+
+function quoteLiteral(value) {
+  return `'${String(value).replace(/'/g, "''")}'`;
+}
+
+function bump(source, dimension, bucketExpr, nullExpr, delta) {
+  return `
+    INSERT INTO kpi_counters (source, dimension, bucket, is_null, count)
+    VALUES (${quoteLiteral(source)}, ${quoteLiteral(dimension)}, ${bucketExpr}, ${nullExpr}, ${delta})
+    ON CONFLICT (source, dimension, bucket, is_null) DO UPDATE SET count = count + (${delta});`;
+}
+
+function bumpColumn(source, column, row, delta) {
+  return bump(source, column, `COALESCE(${row}.${column}, '')`, `(${row}.${column} IS NULL)`, delta);
+}
+
+/**
+ * Génère les triggers d'une table pour les colonnes suivies.
+ * @returns {Array<{name: string, sql: string}>}
+ */
+function buildTriggers(source, columns) {
+  const triggers = [
+    {
+      name: `trg_kpi_${source}_insert`,
+      sql: `CREATE TRIGGER trg_kpi_${source}_insert AFTER INSERT ON ${source}
+BEGIN${bump(source, 'total', "''", '0', 1)}${columns.map((c) => bumpColumn(source, c, 'NEW', 1)).join('')}
+END`,
+    },
+    {
+      name: `trg_kpi_${source}_delete`,
+      sql: `CREATE TRIGGER trg_kpi_${source}_delete AFTER DELETE ON ${source}
+BEGIN${bump(source, 'total', "''", '0', -1)}${columns.map((c) => bumpColumn(source, c, 'OLD', -1)).join('')}
+END`,
+    },
+  ];
+
+  for (const column of columns) {
+    triggers.push({
+      name: `trg_kpi_${source}_update_${column}`,
+      sql: `CREATE TRIGGER trg_kpi_${source}_update_${column} AFTER UPDATE OF ${column} ON ${source}
+WHEN OLD.${column} IS NOT NEW.${column}
+BEGIN${bumpColumn(source, column, 'OLD', -1)}${bumpColumn(source, column, 'NEW', 1)}
+END`,
+    });
+  }
+
+  return triggers;
+}
+
+function rebuildSql(source, columns) {
+  const parts = [
+    `DELETE FROM kpi_counters WHERE source = ${quoteLiteral(source)};`,
+    `INSERT INTO kpi_counters (source, dimension, bucket, is_null, count)
+     SELECT ${quoteLiteral(source)}, 'total', '', 0, COUNT(*) FROM ${source};`,
+  ];
+  for (const column of columns) {
+    parts.push(
+      `INSERT INTO kpi_counters (source, dimension, bucket, is_null, count)
+       VALUES (${quoteLiteral(source)}, '_tracked', ${quoteLiteral(column)}, 0, 0);`,
+      `INSERT INTO kpi_counters (source, dimension, bucket, is_null, count)
+       SELECT ${quoteLiteral(source)}, ${quoteLiteral(column)}, COALESCE(${column}, ''), (${column} IS NULL), COUNT(*)
+       FROM ${source}
+       GROUP BY 3, 4;`,
+    );
+  }
+  return parts.join('\n');
+}
+
+/**
+ * Colonnes réellement suivies par table (tables absentes ignorées).
+ * @returns {Promise<Object<string, string[]>>}
+ */
+async function resolveTrackedColumns(db) {
+  const tracked = {};
+  for (const [source, wanted] of Object.entries(KPI_SOURCES)) {
+    const info = await dbAll(db, `PRAGMA table_info(${source})`);
+    if (!info.length) continue;
+    const names = new Set(info.map((c) => c.name));
+    tracked[source] = wanted.filter((c) => names.has(c));
+  }
+  return tracked;
+}
+
+/**
+ * Reconstruit kpi_counters à partir des tables sources (réparation de dérive).
+ * Exécuté dans une seule transaction : les lectures concurrentes voient
+ * soit l'ancien état, soit le nouveau.
+ */
+async function rebuildKpiCounters(db, tracked = null) {
+  const columnsBySource = tracked || (await resolveTrackedColumns(db));
+  const body = Object.entries(columnsBySource)
+    .map(([source, columns]) => rebuildSql(source, columns))
+    .join('\n');
+
+  try {
+    await dbExec(db, `BEGIN IMMEDIATE;\n${body}\nCOMMIT;`);
+  } catch (err) {
+    await dbExec(db, 'ROLLBACK;').catch(() => {});
+    throw err;
+  }
+  console.log(`✅ kpi_counters reconstruit (${Object.keys(columnsBySource).join(', ')})`);
+}
+
+/**
+ * Crée la table kpi_counters et ses triggers.
+ * Les triggers ne sont recréés (et les compteurs reconstruits) que si leur
+ * définition a changé, par exemple après l'ajout d'une colonne suivie.
+ */
+async function ensureKpiCounters(db) {
+  await dbExec(db, `
+    CREATE TABLE IF NOT EXISTS kpi_counters (
+      source TEXT NOT NULL,
+      dimension TEXT NOT NULL,
+      bucket NOT NULL,
+      is_null INTEGER NOT NULL DEFAULT 0,
+      count INTEGER NOT NULL DEFAULT 0,
+      PRIMARY KEY (source, dimension, bucket, is_null)
+    ) WITHOUT ROWID;
+  `);
+
+  const tracked = await resolveTrackedColumns(db);
+  const wanted = Object.entries(tracked).flatMap(([source, columns]) => buildTriggers(source, columns));
+
+  const existing = await dbAll(
+    db,
+    "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_kpi_%'",
+  );
+  const existingSql = new Map(existing.map((t) => [t.name, t.sql]));
+
+  const upToDate =
+    existing.length === wanted.length &&
+    wanted.every((t) => existingSql.get(t.name) === t.sql);
+
+  if (upToDate) {
+    console.log('✅ Triggers kpi_counters à jour');
+    return tracked;
+  }
+
+  const statements = [
+    ...existing.map((t) => `DROP TRIGGER IF EXISTS ${t.name};`),
+    ...wanted.map((t) => `${t.sql};`),
+    ...Object.entries(tracked).map(([source, columns]) => rebuildSql(source, columns)),
+  ];
+
+  try {
+    await dbExec(db, `BEGIN IMMEDIATE;\n${statements.join('\n')}\nCOMMIT;`);
+  } catch (err) {
+    await dbExec(db, 'ROLLBACK;').catch(() => {});
+    throw err;
+  }
+  console.log(`✅ Triggers kpi_counters installés (${wanted.length}) et compteurs reconstruits`);
+  return tracked;
+}
+
+/**
+ * Lit les compteurs d'une table.
+ * @returns {Promise<null|{total: number, dimensions: Object<string, Array<{value: any, count: number}>>}>}
+ *          null si la table n'est pas matérialisée.
+ */
+async function getKpiCounters(db, source) {
+  const rows = await dbAll(
+    db,
+    'SELECT dimension, bucket, is_null, count FROM kpi_counters WHERE source = ?',
+    [source],
+  );
+  const totalRow = rows.find((r) => r.dimension === 'total');
+  if (!totalRow) return null;
+
+  const dimensions = {};
+  for (const r of rows) {
+    if (r.dimension === '_tracked') dimensions[r.bucket] = dimensions[r.bucket] || [];
+  }
+  for (const r of rows) {
+    if (r.dimension === 'total' || r.dimension === '_tracked' || r.count <= 0) continue;
+    if (!dimensions[r.dimension]) continue;
+    dimensions[r.dimension].push({ value: r.is_null ? null : r.bucket, count: Number(r.count) });
+  }
+
+  return { total: Number(totalRow.count), dimensions };
+}
+
+/**
+ * Somme des compteurs d'une dimension pour un ensemble de valeurs.
+ * Retourne null si la dimension n'est pas suivie.
+ */
+function sumBuckets(counters, dimension, values) {
+  const buckets = counters?.dimensions?.[dimension];
+  if (!buckets) return null;
+  const wanted = new Set(values);
+  return buckets.reduce((acc, b) => (wanted.has(b.value) ? acc + b.count : acc), 0);
+}
+
+module.exports = {
+  KPI_SOURCES,
+  buildTriggers,
+  rebuildSql,
+  ensureKpiCounters,
+  rebuildKpiCounters,
+  getKpiCounters,
+  sumBuckets,
+};
@@ -0,0 +1,155 @@
+/**
+ * db/kpiDailyRollup.js
+ * Agrégats journaliers des courriers entrants (table kpi_daily_rollup)
+ *
+ * ✅ Une ligne par (jour, service) : arrivées, traités, en retard
+ * ✅ Mise à jour incrémentale : seuls les derniers jours sont recalculés
+ * ✅ Séries jour/semaine/mois servies par l'agent Flask sans scanner incoming_mails
+ *
+ * - arrivals  : courriers reçus ce jour-là (date_reception)
+ * - processed : courriers dont le traitement s'est terminé ce jour-là (treatment_completed_at)
+ * - late      : courriers ouverts dont l'échéance (response_due) était dépassée à la
+ *               date du calcul. Ce chiffre n'est pas reconstructible a posteriori :
+ *               il est figé chaque nuit pour le jour écoulé. Statuts clos : même liste
+ *               (config/mail_statuses.json), sans tenir compte de la casse, que le KPI
+ *               "late" de l'agent Flask.
+ */
+
+const { closed: CLOSED_STATUSES } = require('../config/mail_statuses.json');
+
+// UPPER() de SQLite ne convertit que l'ASCII ("Traité" → "TRAITé") : chaque statut
+// est comparé sous ses deux formes possibles
+function sqliteUpper(value) {
+  return String(value).replace(/[a-z]/g, (c) => c.toUpperCase());
+}
+
+const CLOSED_STATUSES_UPPER = [
+  ...new Set(CLOSED_STATUSES.flatMap((s) => [sqliteUpper(s), sqliteUpper(s.toLowerCase())])),
+];
+
+// Jours recalculés à chaque passage (corrections tardives de dates/statuts)
+const DEFAULT_LOOKBACK_DAYS = 7;
+
+function dbGet(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.get(sql, params, (err, row) => {
+      if (err) return reject(err);
+      resolve(row);
+    });
+  });
+}
+
+function dbExec(db, sql) {
+  return new Promise((resolve, reject) => {
+    db.exec(sql, (err) => {
+      if (err) return reject(err);
+      resolve();
+    });
+  });
+}
+
+function quoteLiteral(value) {
+  return `'${String(value).replace(/'/g, "''")}'`;
+}
+
+/**
+ * Crée la table de rollup et les index utilisés par le calcul incrémental.
+ */
+async function ensureKpiDailyRollup(db) {
+  await dbExec(db, `
+    CREATE TABLE IF NOT EXISTS kpi_daily_rollup (
+      day TEXT NOT NULL,
+      service TEXT NOT NULL DEFAULT '',
+      arrivals INTEGER NOT NULL DEFAULT 0,
+      processed INTEGER NOT NULL DEFAULT 0,
+      late INTEGER NOT NULL DEFAULT 0,
+      updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (day, service)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_incoming_mails_date_reception ON incoming_mails(date_reception);
+    CREATE INDEX IF NOT EXISTS idx_incoming_mails_treatment_completed_at ON incoming_mails(treatment_completed_at);
+  `);
+}
+
+/**
+ * Recalcule kpi_daily_rollup à partir de `fromDay` (inclus) jusqu'à aujourd'hui.
+ * Sans `fromDay`, reprend au dernier jour agrégé moins `lookbackDays` ;
+ * table vide → reconstruction complète.
+ *
+ * @returns {Promise<{fromDay: string|null, today: string}>}
+ */
+async function refreshKpiDailyRollup(db, { fromDay = null, lookbackDays = DEFAULT_LOOKBACK_DAYS } = {}) {
+  let start = fromDay;
+  if (!start) {
+    const row = await dbGet(
+      db,
+      `SELECT date(MAX(day), ?) AS start FROM kpi_daily_rollup`,
+      [`-${Math.max(0, lookbackDays)} day`],
+    );
+    start = row?.start || null;
+  }
+
+  const todayRow = await dbGet(db, `SELECT date('now', 'localtime') AS today`);
+  const today = todayRow.today;
+  const closed = CLOSED_STATUSES_UPPER.map(quoteLiteral).join(', ');
+
+  // Bornes issues de date() SQLite (AAAA-MM-JJ) : insérées littéralement pour
+  // passer tout le lot en un seul db.exec (transaction non entrelacée).
+  const from = start ? quoteLiteral(start) : null;
+  const fromFilter = (column) => (from ? `AND ${column} >= ${from}` : '');
+  const dayFilter = from ? `day >= ${from} AND` : '';
+  const t = quoteLiteral(today);
+
+  const sql = `
+    BEGIN IMMEDIATE;
+
+    -- Remise à zéro des jours recalculés ; "late" (non reconstructible) est conservé
+    UPDATE kpi_daily_rollup SET arrivals = 0, processed = 0
+    WHERE ${dayFilter} day < ${t};
+
+    INSERT INTO kpi_daily_rollup (day, service, arrivals)
+    SELECT date(date_reception), COALESCE(TRIM(assigned_service), ''), COUNT(*)
+    FROM incoming_mails
+    WHERE date_reception IS NOT NULL ${fromFilter('date_reception')}
+      AND date(date_reception) < ${t}
+    GROUP BY 1, 2
+    ON CONFLICT (day, service) DO UPDATE SET arrivals = excluded.arrivals, updated_at = CURRENT_TIMESTAMP;
+
+    INSERT INTO kpi_daily_rollup (day, service, processed)
+    SELECT date(treatment_completed_at), COALESCE(TRIM(assigned_service), ''), COUNT(*)
+    FROM incoming_mails
+    WHERE treatment_completed_at IS NOT NULL ${fromFilter('treatment_completed_at')}
+      AND date(treatment_completed_at) < ${t}
+    GROUP BY 1, 2
+    ON CONFLICT (day, service) DO UPDATE SET processed = excluded.processed, updated_at = CURRENT_TIMESTAMP;
+
+    -- Retards figés pour la veille (dernier jour complet)
+    INSERT INTO kpi_daily_rollup (day, service, late)
+    SELECT date(${t}, '-1 day'), COALESCE(TRIM(assigned_service), ''), COUNT(*)
+    FROM incoming_mails
+    WHERE response_due IS NOT NULL
+      AND date(response_due) < date(${t}, '-1 day')
+      AND UPPER(COALESCE(statut_global, status, '')) NOT IN (${closed})
+    GROUP BY 2
+    ON CONFLICT (day, service) DO UPDATE SET late = excluded.late, updated_at = CURRENT_TIMESTAMP;
+
+    DELETE FROM kpi_daily_rollup WHERE arrivals = 0 AND processed = 0 AND late = 0;
+
+    COMMIT;
+  `;
+
+  try {
+    await dbExec(db, sql);
+  } catch (err) {
+    await dbExec(db, 'ROLLBACK;').catch(() => {});
+    throw err;
+  }
+
+  return { fromDay: start, today };
+}
+
+module.exports = {
+  ensureKpiDailyRollup,
+  refreshKpiDailyRollup,
+  DEFAULT_LOOKBACK_DAYS,
+};
@@ -26,6 +26,15 @@ const ensureServicesTable = require('./ensureServices');
 const ensureRolesTable = require('./ensureRoles');
 const ensureRolePermissionsTable = require('./ensureRolePermissions');
 const { ensureMailSharesTables } = require('./ensureMailShares');
+const { ensureKpiCounters } = require('./kpiCounters');
+const { ensureKpiDailyRollup } = require('./kpiDailyRollup');
+const { ensureSearchIndex } = require('./searchIndex');
+const { ensureDocumentEmbeddings } = require('./documentEmbeddings');
+const { ensureEmbeddingCache, evictEmbeddingCache } = require('./embeddingCache');
+const { ensureIncomingMailsListIndexes } = require('./incomingMailsIndexes');
+const { ensureSearchCacheGenerations } = require('./searchCacheGenerations');
+const { ensurePdfTextCache, evictPdfTextCache } = require('./pdfTextCache');
+const { ensureBlobStore } = require('./blobStore');
 const runMigrations = require('./runMigrations');
 
 /**
@@ -182,6 +191,16 @@ function runAuthSchemaMigrations(db) {
         { name: 'ip', ddl: 'ip TEXT' },
         { name: 'meta', ddl: 'meta TEXT' }
       ], { backfillStatus: false })
+        .then(() => {
+          // Rotation (replaced_by) et session des refresh tokens (claim sid des tokens d'accès)
+          return ensureColumns(db, 'refresh_tokens', [
+            { name: 'replaced_by', ddl: 'replaced_by TEXT' },
+            { name: 'session_id', ddl: 'session_id TEXT' }
+          ], { backfillStatus: false });
+        })
+        .then(() => new Promise((resolveIndex) => {
+          db.run(`CREATE INDEX IF NOT EXISTS idx_refresh_tokens_session ON refresh_tokens(session_id)`, () => resolveIndex());
+        }))
         .then(() => {
           // Ajouter la colonne full_name à la table users
           return ensureColumns(db, 'users', [
@@ -622,6 +641,55 @@ async function runAllMigrations(db) {
       console.warn('⚠️  Migration colonnes services ignorée:', err.message);
     });
 
+    // 10. Compteurs KPI matérialisés (triggers) — après tous les ALTER TABLE
+    await ensureKpiCounters(db).catch((err) => {
+      console.warn('⚠️  Matérialisation kpi_counters ignorée:', err.message);
+    });
+
+    // 11. Rollup journalier des KPI (alimenté par jobs/schedulers.js)
+    await ensureKpiDailyRollup(db).catch((err) => {
+      console.warn('⚠️  Table kpi_daily_rollup ignorée:', err.message);
+    });
+
+    // 12. Index plein texte FTS5 des courriers (services/search.service.js)
+    await ensureSearchIndex(db).catch((err) => {
+      console.warn('⚠️  Index plein texte ignoré (recherche LIKE conservée):', err.message);
+    });
+
+    // 13. Embeddings binaires (float32) pour la recherche sémantique (ai/semanticSearch.js)
+    await ensureDocumentEmbeddings(db).catch((err) => {
+      console.warn('⚠️  Table document_embeddings ignorée:', err.message);
+    });
+
+    // 14. Cache d'embeddings par contenu (ai/embeddingCache.js), ramené sous sa limite
+    await ensureEmbeddingCache(db)
+      .then(() => evictEmbeddingCache(db))
+      .catch((err) => {
+        console.warn('⚠️  Table embedding_cache ignorée:', err.message);
+      });
+
+    // 15. Index (filtre, date_reception) de la liste paginée des courriers entrants
+    await ensureIncomingMailsListIndexes(db).catch((err) => {
+      console.warn('⚠️  Index liste courriers entrants ignorés:', err.message);
+    });
+
+    // 16. Générations des tables recherchées (invalidation de services/searchCache.service.js)
+    await ensureSearchCacheGenerations(db).catch((err) => {
+      console.warn('⚠️  Générations du cache de recherche ignorées (cache désactivé):', err.message);
+    });
+
+    // 17. Cache du texte extrait des PDF (utils/pdf.js), ramené sous sa limite
+    await ensurePdfTextCache(db)
+      .then(() => evictPdfTextCache(db))
+      .catch((err) => {
+        console.warn('⚠️  Table pdf_text_cache ignorée:', err.message);
+      });
+
+    // 18. Stockage dédupliqué des uploads (utils/blobStorage.js) et triggers de références
+    await ensureBlobStore(db).catch((err) => {
+      console.warn('⚠️  Table blobs ignorée (collecte des fichiers désactivée):', err.message);
+    });
+
     console.log('✅ Toutes les migrations exécutées avec succès');
   } catch (error) {
     console.error('❌ Erreur lors des migrations:', error.message);
@@ -0,0 +1,128 @@
+/**
+ * db/pdfTextCache.js
+ * Cache persistant du texte extrait des PDF (table pdf_text_cache)
+ *
+ * ✅ Clé = sha256 du fichier : un PDF déjà lu (ré-upload, nouvelle analyse) n'est jamais re-parsé
+ * ✅ Texte conservé page par page (rejoué page à page par utils/pdf.js)
+ * ✅ Taille bornée : les entrées les moins récemment utilisées sont évincées
+ */
+
+const PDF_TEXT_CACHE_MAX_ENTRIES = parseInt(process.env.PDF_TEXT_CACHE_MAX_ENTRIES, 10) || 20000;
+const EVICTION_TARGET_RATIO = 0.9;
+const EVICTION_CHECK_EVERY = 200;
+
+const statesByDb = new WeakMap();
+
+function dbGet(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.get(sql, params, (err, row) => {
+      if (err) return reject(err);
+      resolve(row);
+    });
+  });
+}
+
+function dbRun(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.run(sql, params, function onRun(err) {
+      if (err) return reject(err);
+      resolve(this);
+    });
+  });
+}
+
+function dbExec(db, sql) {
+  return new Promise((resolve, reject) => {
+    db.exec(sql, (err) => {
+      if (err) return reject(err);
+      resolve();
+    });
+  });
+}
+
+/**
+ * Crée la table pdf_text_cache (idempotent, une fois par connexion).
+ */
+function ensurePdfTextCache(db) {
+  let state = statesByDb.get(db);
+  if (!state) {
+    state = { ready: null, writes: 0 };
+    statesByDb.set(db, state);
+  }
+  if (!state.ready) {
+    // Table rowid (et non WITHOUT ROWID) : lignes volumineuses
+    state.ready = dbExec(db, `
+      CREATE TABLE IF NOT EXISTS pdf_text_cache (
+        sha256 TEXT PRIMARY KEY,
+        page_count INTEGER NOT NULL,
+        pages TEXT NOT NULL,
+        extract_ms INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        last_used_at DATETIME DEFAULT CURRENT_TIMESTAMP
+      );
+      CREATE INDEX IF NOT EXISTS idx_pdf_text_cache_last_used ON pdf_text_cache(last_used_at);
+    `).catch((err) => {
+      state.ready = null;
+      throw err;
+    });
+  }
+  return state.ready;
+}
+
+/**
+ * Texte en cache d'un PDF.
+ * @returns {Promise<null|{pages: string[], extractMs: number|null}>}
+ */
+async function getPdfTextCache(db, sha256) {
+  await ensurePdfTextCache(db);
+  const row = await dbGet(db, 'SELECT pages, extract_ms FROM pdf_text_cache WHERE sha256 = ?', [sha256]);
+  if (!row) return null;
+  dbRun(db, 'UPDATE pdf_text_cache SET last_used_at = CURRENT_TIMESTAMP WHERE sha256 = ?', [sha256])
+    .catch((err) => console.warn('⚠️  Cache texte PDF (last_used_at):', err.message));
+  return { pages: JSON.parse(row.pages), extractMs: row.extract_ms };
+}
+
+async function putPdfTextCache(db, sha256, pages, extractMs = null) {
+  await ensurePdfTextCache(db);
+  await dbRun(
+    db,
+    `INSERT OR REPLACE INTO pdf_text_cache (sha256, page_count, pages, extract_ms, created_at, last_used_at)
+     VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)`,
+    [sha256, pages.length, JSON.stringify(pages), extractMs === null ? null : Math.round(extractMs)],
+  );
+
+  const state = statesByDb.get(db);
+  state.writes += 1;
+  if (state.writes % EVICTION_CHECK_EVERY === 0) {
+    await evictPdfTextCache(db).catch((err) => console.warn('⚠️  Éviction cache texte PDF:', err.message));
+  }
+}
+
+/**
+ * Ramène le cache sous sa limite (entrées les moins récemment utilisées d'abord).
+ * @returns {Promise<number>} entrées supprimées
+ */
+async function evictPdfTextCache(db, maxEntries = PDF_TEXT_CACHE_MAX_ENTRIES) {
+  await ensurePdfTextCache(db);
+  const { count } = await dbGet(db, 'SELECT COUNT(*) AS count FROM pdf_text_cache');
+  if (count <= maxEntries) return 0;
+
+  const excess = count - Math.floor(maxEntries * EVICTION_TARGET_RATIO);
+  await dbRun(
+    db,
+    `DELETE FROM pdf_text_cache WHERE sha256 IN (
+       SELECT sha256 FROM pdf_text_cache ORDER BY last_used_at LIMIT ?
+     )`,
+    [excess],
+  );
+  console.log(`🧹 Cache texte PDF: ${excess} entrée(s) évincée(s) (limite ${maxEntries})`);
+  return excess;
+}
+
+module.exports = {
+  PDF_TEXT_CACHE_MAX_ENTRIES,
+  ensurePdfTextCache,
+  getPdfTextCache,
+  putPdfTextCache,
+  evictPdfTextCache,
+};
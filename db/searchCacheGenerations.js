@@ -0,0 +1,104 @@
+/**
+ * db/searchCacheGenerations.js
+ * Compteurs de génération des tables recherchées (invalidation du cache de recherche)
+ *
+ * ✅ Une ligne par table source, incrémentée par triggers INSERT/UPDATE/DELETE :
+ *    toute écriture (routes, scripts, agent Flask) invalide les résultats en cache
+ * ✅ Lecture groupée des générations en une requête (clé primaire, WITHOUT ROWID)
+ */
+
+// Tables lues par les recherches (services/search.service.js, recherche hybride)
+const SEARCH_CACHE_SOURCES = ['incoming_mails', 'archives', 'courriers_sortants', 'outgoing_mails', 'document_embeddings'];
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+function dbExec(db, sql) {
+  return new Promise((resolve, reject) => {
+    db.exec(sql, (err) => {
+      if (err) return reject(err);
+      resolve();
+    });
+  });
+}
+
+function buildGenerationTriggers(source) {
+  return ['INSERT', 'UPDATE', 'DELETE'].map((event) => ({
+    name: `trg_searchgen_${source}_${event.toLowerCase()}`,
+    sql: `CREATE TRIGGER trg_searchgen_${source}_${event.toLowerCase()} AFTER ${event} ON ${source}
+BEGIN
+  UPDATE search_cache_generations SET generation = generation + 1 WHERE source = '${source}';
+END`,
+  }));
+}
+
+/**
+ * Crée la table des générations et les triggers des tables présentes.
+ * Les triggers ne sont recréés que si leur définition a changé.
+ * @returns {Promise<string[]>} tables suivies
+ */
+async function ensureSearchCacheGenerations(db) {
+  await dbExec(db, `
+    CREATE TABLE IF NOT EXISTS search_cache_generations (
+      source TEXT PRIMARY KEY,
+      generation INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+  `);
+
+  const present = (
+    await dbAll(
+      db,
+      `SELECT name FROM sqlite_master WHERE type = 'table' AND name IN (${SEARCH_CACHE_SOURCES.map(() => '?').join(', ')})`,
+      SEARCH_CACHE_SOURCES,
+    )
+  ).map((r) => r.name);
+  const wanted = present.flatMap(buildGenerationTriggers);
+
+  const existing = await dbAll(
+    db,
+    "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_searchgen_%'",
+  );
+  const existingSql = new Map(existing.map((t) => [t.name, t.sql]));
+  const upToDate =
+    existing.length === wanted.length && wanted.every((t) => existingSql.get(t.name) === t.sql);
+
+  const statements = [
+    ...present.map((source) => `INSERT OR IGNORE INTO search_cache_generations (source, generation) VALUES ('${source}', 0);`),
+  ];
+  if (!upToDate) {
+    statements.push(
+      ...existing.map((t) => `DROP TRIGGER IF EXISTS ${t.name};`),
+      ...wanted.map((t) => `${t.sql};`),
+    );
+  }
+
+  try {
+    await dbExec(db, `BEGIN IMMEDIATE;\n${statements.join('\n')}\nCOMMIT;`);
+  } catch (err) {
+    await dbExec(db, 'ROLLBACK;').catch(() => {});
+    throw err;
+  }
+  if (!upToDate) console.log(`✅ Triggers de génération du cache de recherche installés (${present.join(', ')})`);
+  return present;
+}
+
+/**
+ * Générations courantes, par table.
+ * @returns {Promise<Object<string, number>>}
+ */
+async function getSearchCacheGenerations(db) {
+  const rows = await dbAll(db, 'SELECT source, generation FROM search_cache_generations');
+  return Object.fromEntries(rows.map((r) => [r.source, Number(r.generation)]));
+}
+
+module.exports = {
+  SEARCH_CACHE_SOURCES,
+  ensureSearchCacheGenerations,
+  getSearchCacheGenerations,
+};
@@ -0,0 +1,240 @@
+/**
+ * db/searchIndex.js
+ * Index plein texte FTS5 des courriers (incoming_mails, archives, courriers_sortants, outgoing_mails)
+ *
+ * ✅ Une table FTS5 "external content" par table source (<source>_fts) : le texte
+ *    n'est pas dupliqué, seul l'index inversé est stocké
+ * ✅ Synchronisation par triggers INSERT/UPDATE/DELETE
+ * ✅ Tokenizer unicode61 sans diacritiques : "échéance" = "echeance", insensible à la casse
+ * ✅ Reconstruction complète (rebuildSearchIndex) pour le backfill initial ou après import brut
+ *
+ * Le tokenizer porter de SQLite est un stemmer anglais : il n'est pas utilisé
+ * (il dégrade les mots français). La recherche par préfixe ("factur*") couvre
+ * les variantes singulier/pluriel usuelles.
+ */
+
+// Colonnes indexées par table (seules celles présentes dans le schéma sont retenues)
+const SEARCH_SOURCES = {
+  incoming_mails: ['ref_code', 'subject', 'sender', 'recipient', 'extracted_text'],
+  archives: ['reference', 'description', 'category', 'sender', 'extracted_text'],
+  courriers_sortants: ['reference_unique', 'objet', 'destinataire', 'extracted_text'],
+  outgoing_mails: ['subject', 'recipient', 'content'],
+};
+
+// Poids bm25 par colonne (référence et objet priment sur le texte OCR)
+const COLUMN_WEIGHTS = {
+  ref_code: 5,
+  reference: 5,
+  reference_unique: 5,
+  subject: 3,
+  objet: 3,
+  description: 3,
+  sender: 2,
+  recipient: 2,
+  destinataire: 2,
+  category: 1,
+  extracted_text: 1,
+  content: 1,
+};
+
+const TOKENIZER = "unicode61 remove_diacritics 2";
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+function dbExec(db, sql) {
+  return new Promise((resolve, reject) => {
+    db.exec(sql, (err) => {
+      if (err) return reject(err);
+      resolve();
+    });
+  });
+}
+
+function ftsTable(source) {
+  return `${source}_fts`;
+}
+
+function columnWeights(columns) {
+  return columns.map((c) => COLUMN_WEIGHTS[c] || 1);
+}
+
+/**
+ * Génère la table FTS5 et ses triggers de synchronisation.
+ * @returns {Array<{type: string, name: string, sql: string}>}
+ */
+function buildSearchObjects(source, columns) {
+  const fts = ftsTable(source);
+  const cols = columns.join(', ');
+  const values = (row) => columns.map((c) => `${row}.${c}`).join(', ');
+
+  return [
+    {
+      type: 'table',
+      name: fts,
+      sql: `CREATE VIRTUAL TABLE ${fts} USING fts5(${cols}, content='${source}', content_rowid='id', tokenize="${TOKENIZER}")`,
+    },
+    {
+      type: 'trigger',
+      name: `trg_fts_${source}_insert`,
+      sql: `CREATE TRIGGER trg_fts_${source}_insert AFTER INSERT ON ${source}
+BEGIN
+  INSERT INTO ${fts} (rowid, ${cols}) VALUES (NEW.id, ${values('NEW')});
+END`,
+    },
+    {
+      type: 'trigger',
+      name: `trg_fts_${source}_delete`,
+      sql: `CREATE TRIGGER trg_fts_${source}_delete AFTER DELETE ON ${source}
+BEGIN
+  INSERT INTO ${fts} (${fts}, rowid, ${cols}) VALUES ('delete', OLD.id, ${values('OLD')});
+END`,
+    },
+    {
+      type: 'trigger',
+      name: `trg_fts_${source}_update`,
+      sql: `CREATE TRIGGER trg_fts_${source}_update AFTER UPDATE OF ${cols} ON ${source}
+BEGIN
+  INSERT INTO ${fts} (${fts}, rowid, ${cols}) VALUES ('delete', OLD.id, ${values('OLD')});
+  INSERT INTO ${fts} (rowid, ${cols}) VALUES (NEW.id, ${values('NEW')});
+END`,
+    },
+  ];
+}
+
+function rebuildSql(source) {
+  const fts = ftsTable(source);
+  return `INSERT INTO ${fts} (${fts}) VALUES ('rebuild');`;
+}
+
+/**
+ * Colonnes réellement indexées par table (tables absentes ou sans colonne id ignorées).
+ * @returns {Promise<Object<string, string[]>>}
+ */
+async function resolveSearchColumns(db) {
+  const indexed = {};
+  for (const [source, wanted] of Object.entries(SEARCH_SOURCES)) {
+    const info = await dbAll(db, `PRAGMA table_info(${source})`);
+    if (!info.length) continue;
+    const names = new Set(info.map((c) => c.name));
+    const columns = wanted.filter((c) => names.has(c));
+    if (!names.has('id') || !columns.length) continue;
+    indexed[source] = columns;
+  }
+  return indexed;
+}
+
+/**
+ * Recalcule l'index à partir des tables sources (backfill), puis le compacte.
+ */
+async function rebuildSearchIndex(db, indexed = null) {
+  const columnsBySource = indexed || (await resolveSearchColumns(db));
+  const sources = Object.keys(columnsBySource);
+  const body = sources
+    .map((source) => `${rebuildSql(source)}\nINSERT INTO ${ftsTable(source)} (${ftsTable(source)}) VALUES ('optimize');`)
+    .join('\n');
+
+  try {
+    await dbExec(db, `BEGIN IMMEDIATE;\n${body}\nCOMMIT;`);
+  } catch (err) {
+    await dbExec(db, 'ROLLBACK;').catch(() => {});
+    throw err;
+  }
+  console.log(`✅ Index plein texte reconstruit (${sources.join(', ')})`);
+}
+
+/**
+ * Crée les tables FTS5 et leurs triggers.
+ * Tables et triggers ne sont recréés (et l'index reconstruit) que si leur
+ * définition a changé, par exemple après l'ajout d'une colonne indexée.
+ */
+async function ensureSearchIndex(db) {
+  const indexed = await resolveSearchColumns(db);
+  const wanted = Object.entries(indexed).flatMap(([source, columns]) => buildSearchObjects(source, columns));
+
+  const existing = await dbAll(
+    db,
+    `SELECT type, name, sql FROM sqlite_master
+     WHERE (type = 'trigger' AND name LIKE 'trg_fts_%')
+        OR (type = 'table' AND name LIKE '%_fts' AND sql LIKE 'CREATE VIRTUAL TABLE%')`,
+  );
+  const existingSql = new Map(existing.map((o) => [o.name, o.sql]));
+
+  const upToDate =
+    existing.length === wanted.length &&
+    wanted.every((o) => existingSql.get(o.name) === o.sql);
+
+  if (upToDate) {
+    console.log('✅ Index plein texte à jour');
+    return indexed;
+  }
+
+  const statements = [
+    ...existing.filter((o) => o.type === 'trigger').map((o) => `DROP TRIGGER IF EXISTS ${o.name};`),
+    ...existing.filter((o) => o.type === 'table').map((o) => `DROP TABLE IF EXISTS ${o.name};`),
+    ...wanted.map((o) => `${o.sql};`),
+    ...Object.keys(indexed).map((source) => rebuildSql(source)),
+  ];
+
+  try {
+    await dbExec(db, `BEGIN IMMEDIATE;\n${statements.join('\n')}\nCOMMIT;`);
+  } catch (err) {
+    await dbExec(db, 'ROLLBACK;').catch(() => {});
+    throw err;
+  }
+  console.log(`✅ Index plein texte installé (${Object.keys(indexed).join(', ')}) et alimenté`);
+  return indexed;
+}
+
+/**
+ * Tables FTS présentes, avec leurs colonnes (ordre de déclaration).
+ * @returns {Promise<Object<string, string[]>>}
+ */
+async function getSearchIndexes(db) {
+  const rows = await dbAll(
+    db,
+    "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%_fts' AND sql LIKE 'CREATE VIRTUAL TABLE%'",
+  );
+  const present = new Set(rows.map((r) => r.name));
+  const indexes = {};
+  for (const source of Object.keys(SEARCH_SOURCES)) {
+    const fts = ftsTable(source);
+    if (!present.has(fts)) continue;
+    const info = await dbAll(db, `PRAGMA table_info(${fts})`);
+    indexes[source] = info.map((c) => c.name);
+  }
+  return indexes;
+}
+
+/**
+ * Convertit une saisie utilisateur en requête FTS5 sûre.
+ * Chaque mot devient une phrase préfixée ("ce 2024 015"*), les mots sont combinés en ET.
+ * Retourne null si la saisie ne contient aucun terme indexable.
+ */
+function toFtsQuery(input, maxTerms = 16) {
+  const words = String(input || '')
+    .split(/\s+/)
+    .map((word) => (word.match(/[\p{L}\p{N}]+/gu) || []).join(' '))
+    .filter(Boolean)
+    .slice(0, maxTerms);
+  if (!words.length) return null;
+  return words.map((w) => `"${w}"*`).join(' ');
+}
+
+module.exports = {
+  SEARCH_SOURCES,
+  COLUMN_WEIGHTS,
+  ftsTable,
+  columnWeights,
+  buildSearchObjects,
+  ensureSearchIndex,
+  rebuildSearchIndex,
+  getSearchIndexes,
+  toFtsQuery,
+};
@@ -1,11 +1,25 @@
 # backend/flask_app.py
 
+import contextvars
+import json
+import logging
 import os
+import queue
+import re
 import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
 from datetime import date
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -22,7 +36,8 @@ except Exception as e:
 load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent
-DB_PATH = BASE_DIR / "databasepnda.db"
+# Même variable que le backend Node (db/index.js) pour pointer sur la même base
+DB_PATH = Path(os.getenv("SQLITE_DB_PATH") or BASE_DIR / "databasepnda.db")
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
@@ -39,20 +54,541 @@ else:
 app = Flask(__name__)
 CORS(app)  # Vue -> Node -> Flask, CORS ok
 
+# -------------------------------------------------------------------
+# 1b. Traces par requête, logs structurés et métriques Prometheus
+# -------------------------------------------------------------------
+SLOW_REQUEST_MS = float(os.getenv("FLASK_SLOW_REQUEST_MS", "500"))
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Une ligne JSON par événement (champs additionnels via extra={"fields": {...}})."""
+
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        payload.update(getattr(record, "fields", {}) or {})
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+logger = logging.getLogger("flask_agent")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(JsonLogFormatter())
+    logger.addHandler(_handler)
+    logger.setLevel(os.getenv("FLASK_LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+
+class _Metric:
+    """Base minimale d'une métrique Prometheus à labels (thread-safe, par processus)."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    @staticmethod
+    def _escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+    def _labels(self, values, extra=()):
+        pairs = list(zip(self.label_names, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{self._escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    @staticmethod
+    def merge(acc: dict, snapshot):
+        for labels, value in snapshot:
+            key = tuple(labels)
+            acc[key] = acc.get(key, 0.0) + value
+        return acc
+
+    def render(self, values=None):
+        lines = super().render()
+        if values is None:
+            values = self.merge({}, self.snapshot())
+        for labels, value in values.items():
+            lines.append(f"{self.name}{self._labels(labels)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets=(0.1, 0.5, 1, 2, 5, 10)):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(counts), total, count]
+                    for labels, (counts, total, count) in self._values.items()]
+
+    def merge(self, acc: dict, snapshot):
+        for labels, counts, total, count in snapshot:
+            if len(counts) != len(self.buckets):
+                continue  # buckets modifiés entre deux versions : valeurs incomparables
+            entry = acc.setdefault(tuple(labels), [[0] * len(self.buckets), 0.0, 0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += total
+            entry[2] += count
+        return acc
+
+    def render(self, values=None):
+        lines = super().render()
+        if values is None:
+            values = self.merge({}, self.snapshot())
+        for labels, (counts, total, count) in values.items():
+            for bound, c in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{self._labels(labels, [('le', bound)])} {c}")
+            lines.append(f"{self.name}_bucket{self._labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {total}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {count}")
+        return lines
+
+
+METRICS = []
+
+# Mêmes noms/labels que monitoring/metrics.js côté Node
+http_requests_total = Counter(
+    "http_requests_total", "Total des requêtes HTTP", ["method", "path", "status"]
+)
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP en secondes",
+    ["method", "path", "status"], buckets=[0.1, 0.5, 1, 2, 5, 10],
+)
+dashboard_stage_duration_seconds = Histogram(
+    "dashboard_stage_duration_seconds", "Durée des étapes de l'agent IA (snapshot, classification, ai_comment, config) en secondes",
+    ["stage"], buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2, 5],
+)
+sqlite_query_duration_seconds = Histogram(
+    "sqlite_query_duration_seconds", "Durée d'exécution des requêtes SQLite de l'agent IA en secondes",
+    ["operation"], buckets=[0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1],
+)
+
+
+class RequestTrace:
+    """Spans (durée cumulée par étape) et requêtes SQL d'une requête HTTP."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.queries = []
+
+    def add_span(self, stage: str, seconds: float):
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    def summary(self) -> dict:
+        slowest = sorted(self.queries, key=lambda q: q["ms"], reverse=True)[:5]
+        return {
+            "request_id": self.request_id,
+            "spans_ms": {k: round(v * 1000, 2) for k, v in self.spans.items()},
+            "sql": {
+                "count": len(self.queries),
+                "total_ms": round(sum(q["ms"] for q in self.queries), 2),
+                "slowest": [{**q, "ms": round(q["ms"], 2)} for q in slowest],
+            },
+        }
+
+
+_current_trace = contextvars.ContextVar("flask_agent_trace", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """Chronomètre une étape : histogramme Prometheus + trace de la requête courante."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        dashboard_stage_duration_seconds.observe(stage, value=elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(stage, elapsed)
+
+
+def _record_query(sql: str, seconds: float):
+    operation = (sql.lstrip().split(None, 1) or ["?"])[0].upper()
+    sqlite_query_duration_seconds.observe(operation, value=seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.queries.append({"op": operation, "sql": " ".join(sql.split())[:160], "ms": seconds * 1000})
+        return trace.queries[-1]
+    return None
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Curseur chronométré. execute() couvre le premier pas SQLite (pour un
+    agrégat ou un GROUP BY, tout le parcours) ; le temps des fetch* est
+    ajouté à la requête dans la trace.
+    """
+
+    _last = None
+
+    def execute(self, sql, parameters=()):
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._last = _record_query(sql, time.perf_counter() - t0)
+
+    def _timed_fetch(self, method, *args):
+        t0 = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._last is not None:
+                self._last["ms"] += (time.perf_counter() - t0) * 1000
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+
+# Identifiant client repris tel quel seulement s'il est sûr (en-têtes de réponse, logs JSON)
+REQUEST_ID_RE = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+
+@app.before_request
+def _start_trace():
+    # Propagé par le proxy Node (middlewares/requestLogger.js) ; sinon généré ici
+    request_id = request.headers.get("X-Request-ID", "")
+    if not REQUEST_ID_RE.fullmatch(request_id):
+        request_id = uuid.uuid4().hex
+    trace = RequestTrace(request_id)
+    g.trace = trace
+    g.trace_token = _current_trace.set(trace)
+
+
+@app.after_request
+def _finish_trace(response):
+    trace = getattr(g, "trace", None)
+    if trace is None:
+        return response
+    elapsed = time.perf_counter() - trace.started
+    path = request.url_rule.rule if request.url_rule is not None else "unknown"
+    status = str(response.status_code)
+    http_requests_total.inc(request.method, path, status)
+    http_request_duration_seconds.observe(request.method, path, status, value=elapsed)
+    if metrics_store is not None:
+        metrics_store.ensure_started()
+    response.headers["X-Request-ID"] = trace.request_id
+
+    if path != "/metrics":
+        duration_ms = round(elapsed * 1000, 2)
+        fields = {"method": request.method, "path": path, "status": response.status_code,
+                  "duration_ms": duration_ms, **trace.summary()}
+        level = logging.WARNING if duration_ms >= SLOW_REQUEST_MS else logging.INFO
+        logger.log(level, "HTTP", extra={"fields": fields})
+    return response
+
+
+@app.teardown_request
+def _reset_trace(exc=None):
+    token = getattr(g, "trace_token", None)
+    if token is not None:
+        _current_trace.reset(token)
+        g.trace_token = None
+
+
+METRICS_DIR = os.getenv("FLASK_METRICS_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR")
+METRICS_FLUSH_SEC = float(os.getenv("FLASK_METRICS_FLUSH_SEC", "1"))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+
+
+class MultiprocessMetrics:
+    """
+    Agrégation des métriques entre workers gunicorn par fichiers partagés.
+
+    Chaque worker écrit ses valeurs dans <dir>/<pid>.json (au plus toutes les
+    METRICS_FLUSH_SEC, depuis un thread de fond) ; /metrics, quel que soit le
+    worker qui répond, additionne tous les fichiers. Les fichiers des workers
+    terminés (recyclage max_requests) sont conservés pour que les compteurs ne
+    reculent jamais ; les jauges (taille des caches) ne comptent que les vivants.
+    """
+
+    def __init__(self, directory: str, interval: float = METRICS_FLUSH_SEC):
+        self.directory = Path(directory)
+        self.interval = max(0.1, interval)
+        self._pid = None
+        self._wake = threading.Event()
+
+    def _path(self, pid: int) -> Path:
+        return self.directory / f"{pid}.json"
+
+    def flush(self):
+        payload = {
+            "metrics": {metric.name: metric.snapshot() for metric in METRICS},
+            "caches": cache_stats(),
+        }
+        self.directory.mkdir(parents=True, exist_ok=True)
+        target = self._path(os.getpid())
+        tmp = target.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload))
+        os.replace(tmp, target)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning("⚠️  Écriture des métriques impossible: %s", e)
+
+    def ensure_started(self):
+        # Un thread par processus : celui du maître ne survit pas au fork()
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            threading.Thread(target=self._loop, name="metrics-flush", daemon=True).start()
+
+    def collect(self):
+        """Valeurs additionnées de tous les workers : ({métrique: valeurs}, {cache: stats})."""
+        self.flush()
+        merged = {metric.name: {} for metric in METRICS}
+        by_name = {metric.name: metric for metric in METRICS}
+        caches = {}
+        for path in self.directory.glob("*.json"):
+            try:
+                payload = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue  # fichier en cours de remplacement ou corrompu
+            for name, snapshot in payload.get("metrics", {}).items():
+                if name in by_name:
+                    by_name[name].merge(merged[name], snapshot)
+            alive = path.stem.isdigit() and _pid_alive(int(path.stem))
+            for cache_name, values in payload.get("caches", {}).items():
+                acc = caches.setdefault(cache_name, {k: 0 for k in values})
+                for key, value in values.items():
+                    if key == "size" and not alive:
+                        continue
+                    acc[key] = acc.get(key, 0) + value
+        return merged, caches
+
+
+metrics_store = MultiprocessMetrics(METRICS_DIR) if METRICS_DIR else None
+
+
+def render_metrics() -> str:
+    """
+    Exposition Prometheus (format texte 0.0.4). Avec FLASK_METRICS_DIR (posé par
+    gunicorn.conf.py), valeurs additionnées de tous les workers ; sinon, du processus.
+    """
+    lines = []
+    if metrics_store is not None:
+        merged, stats = metrics_store.collect()
+        for metric in METRICS:
+            lines.extend(metric.render(merged[metric.name]))
+    else:
+        for metric in METRICS:
+            lines.extend(metric.render())
+        stats = cache_stats()
+    for key, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"),
+                      ("expirations", "counter"), ("size", "gauge")):
+        name = f"dashboard_cache_{key}_total" if kind == "counter" else f"dashboard_cache_{key}"
+        lines.append(f"# HELP {name} Cache de l'agent IA : {key}")
+        lines.append(f"# TYPE {name} {kind}")
+        for cache_name, values in stats.items():
+            lines.append(f'{name}{{cache="{cache_name}"}} {values[key]}')
+    return "\n".join(lines) + "\n"
+
+
 # -------------------------------------------------------------------
 # 2. Helpers SQLite
 # -------------------------------------------------------------------
+SQLITE_POOL_SIZE = int(os.getenv("FLASK_SQLITE_POOL_SIZE", "4"))
+SQLITE_MMAP_SIZE = int(os.getenv("FLASK_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KIB = int(os.getenv("FLASK_SQLITE_CACHE_KIB", str(64 * 1024)))
+
+
+def _sqlite_readonly() -> bool:
+    return os.getenv("FLASK_SQLITE_READONLY", "true").lower() in ("1", "true", "yes")
+
+
 def get_connection():
     """Ouvre une connexion SQLite vers backend/databasepnda.db."""
-    readonly = os.getenv("FLASK_SQLITE_READONLY", "true").lower() in ("1", "true", "yes")
-    if readonly:
-        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+    if _sqlite_readonly():
+        conn = sqlite3.connect(
+            f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False, factory=TimedConnection
+        )
     else:
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False, factory=TimedConnection)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+class ConnectionPool:
+    """
+    Pool de connexions SQLite par processus.
+
+    Les connexions sont ouvertes à la demande (au plus `size`), réglées une
+    seule fois (mmap_size, cache_size, query_only) puis réutilisées entre
+    les requêtes /dashboard-ai au lieu d'être rouvertes à chaque appel.
+    """
+
+    def __init__(self, size: int = SQLITE_POOL_SIZE):
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._pid = os.getpid()
+
+    def _open(self):
+        conn = get_connection()
+        try:
+            conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            # cache_size négatif = taille en KiB (et non en pages)
+            conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KIB}")
+            if _sqlite_readonly():
+                conn.execute("PRAGMA query_only = ON")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️  PRAGMA pool SQLite ignoré: {e}")
+        return conn
+
+    def _reset_after_fork(self):
+        # Une connexion SQLite ne doit jamais traverser un fork()
+        self._idle = queue.LifoQueue(maxsize=self.size)
+        self._opened = 0
+        self._pid = os.getpid()
+
+    def acquire(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset_after_fork()
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        # Pool saturé : on attend qu'une connexion se libère
+        return self._idle.get()
+
+    def release(self, conn):
+        if self._pid != os.getpid():
+            return
+        try:
+            # Termine une éventuelle transaction de lecture implicite
+            conn.rollback()
+            self._idle.put_nowait(conn)
+        except Exception:
+            with self._lock:
+                self._opened -= 1
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError:
+            broken = True
+            raise
+        finally:
+            if broken:
+                # Connexion potentiellement inutilisable : on la remplace
+                with self._lock:
+                    self._opened -= 1
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            else:
+                self.release(conn)
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                self._opened -= 1
+
+
+db_pool = ConnectionPool()
+
+
 def get_table_columns(conn, table_name: str):
     """Retourne la liste des colonnes pour une table."""
     try:
@@ -63,6 +599,76 @@ def get_table_columns(conn, table_name: str):
         return []
 
 
+def detect_column(columns, candidates):
+    """Retrouve la première colonne existante parmi une liste de candidats."""
+    for c in candidates:
+        if c in columns:
+            return c
+    return None
+
+
+STATUS_COLUMN_CANDIDATES = ["status", "statut", "etat"]
+SERVICE_COLUMN_CANDIDATES = ["service", "service_id", "id_service", "idService"]
+DUE_COLUMN_CANDIDATES = ["due_date", "date_limite", "date_echeance", "deadline"]
+
+
+class SchemaCache:
+    """
+    Cache des colonnes par table, invalidé uniquement quand le schéma change.
+
+    SQLite incrémente `PRAGMA schema_version` à chaque ALTER/CREATE/DROP :
+    tant qu'il ne bouge pas, PRAGMA table_info et la détection des colonnes
+    status/service/échéance ne sont pas rejoués.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._columns = {}
+        self._incoming = None
+
+    def _sync(self, conn):
+        try:
+            version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        except sqlite3.Error:
+            version = None
+        if version is None or version != self._version:
+            self._columns = {}
+            self._incoming = None
+            self._version = version
+
+    def columns(self, conn, table_name: str):
+        with self._lock:
+            self._sync(conn)
+            cols = self._columns.get(table_name)
+            if cols is None:
+                cols = get_table_columns(conn, table_name)
+                if self._version is not None:
+                    self._columns[table_name] = cols
+            return cols
+
+    def incoming_columns(self, conn) -> dict:
+        """Colonnes status/service/due détectées sur incoming_mails."""
+        cols = self.columns(conn, "incoming_mails")
+        with self._lock:
+            if self._incoming is None:
+                self._incoming = {
+                    "status": detect_column(cols, STATUS_COLUMN_CANDIDATES),
+                    "service": detect_column(cols, SERVICE_COLUMN_CANDIDATES),
+                    "due": detect_column(cols, DUE_COLUMN_CANDIDATES),
+                }
+            return dict(self._incoming)
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+            self._columns = {}
+            self._incoming = None
+
+
+schema_cache = SchemaCache()
+
+
 def safe_count(conn, table_name: str) -> int:
     """COUNT(*) sur une table, avec gestion d'erreur."""
     try:
@@ -71,28 +677,160 @@ def safe_count(conn, table_name: str) -> int:
         row = cur.fetchone()
         return row["c"] if row else 0
     except Exception as e:
-        print(f"⚠️  Erreur COUNT sur {table_name}: {e}")
+        logger.warning(f"⚠️  Erreur COUNT sur {table_name}: {e}")
         return 0
 
 
-def get_basic_counters(conn):
-    """Totaux globaux (entrants, sortants, archives, notifications)."""
+UNPROCESSED_VALUES = [
+    "NON_TRAITE", "NON TRAITE", "NON_TRAITÉ", "NON TRAITÉ",
+    "EN_ATTENTE", "EN ATTENTE", "A_TRAITER", "A TRAITER",
+    "PENDING", "TO_DO", "TODO", "TO_PROCESS",
+]
+
+# Statuts clos (un courrier clos n'est jamais en retard) : liste partagée avec
+# le rollup journalier Node (db/kpiDailyRollup.js)
+DONE_VALUES = json.loads((BASE_DIR / "config" / "mail_statuses.json").read_text(encoding="utf-8"))["closed"]
+
+_ASCII_UPPER = str.maketrans("abcdefghijklmnopqrstuvwxyz", "ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+
+def sqlite_upper(value: str) -> str:
+    """UPPER() de SQLite : seules les lettres ASCII sont converties ("traité" → "TRAITé")."""
+    return value.translate(_ASCII_UPPER)
+
+
+def sqlite_upper_variants(values) -> list:
+    """
+    Valeurs à comparer à UPPER(colonne) pour une égalité insensible à la casse,
+    accents compris : "Traité" devient "TRAITé" côté SQLite, pas "TRAITÉ".
+    """
+    return sorted({sqlite_upper(v) for v in values} | {sqlite_upper(v.lower()) for v in values})
+
+
+def _sqlite_sort_key(value):
+    """Reproduit l'ordre de tri SQLite (NULL < nombres < texte < blob)."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, bytes(value))
+
+
+def aggregate_incoming(conn):
+    """
+    Agrège incoming_mails en un seul parcours de table.
+
+    Une unique requête GROUP BY (statut, service) calcule le total, les
+    non traités et les retards via SUM(CASE ...) ; les répartitions par
+    statut et par service sont ensuite repliées en Python sur ces groupes
+    (quelques dizaines de lignes au plus).
+
+    Retourne (total, kpis) où kpis a la même forme que compute_incoming_kpis().
+    """
+    detected = schema_cache.incoming_columns(conn)
+    status_col = detected["status"]
+    service_col = detected["service"]
+    due_col = detected["due"]
+
+    kpis = {
+        "by_status": [],
+        "unprocessed": 0,
+        "late": 0,
+        "by_service": [],
+    }
+
+    status_expr = status_col or "NULL"
+    service_expr = service_col or "NULL"
+    params = []
+
+    if status_col:
+        placeholders = ",".join("?" for _ in UNPROCESSED_VALUES)
+        unprocessed_expr = (
+            f"CASE WHEN {status_col} IS NULL "
+            f"OR UPPER({status_col}) IN ({placeholders}) THEN 1 ELSE 0 END"
+        )
+        params.extend(sqlite_upper(v) for v in UNPROCESSED_VALUES)
+    else:
+        unprocessed_expr = "0"
+
+    if due_col:
+        params.append(date.today().isoformat())
+        if status_col:
+            done = sqlite_upper_variants(DONE_VALUES)
+            placeholders = ",".join("?" for _ in done)
+            late_expr = (
+                f"CASE WHEN {due_col} < ? AND ({status_col} IS NULL "
+                f"OR UPPER({status_col}) NOT IN ({placeholders})) THEN 1 ELSE 0 END"
+            )
+            params.extend(done)
+        else:
+            late_expr = f"CASE WHEN {due_col} < ? THEN 1 ELSE 0 END"
+    else:
+        late_expr = "0"
+
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT {status_expr} AS status,
+                   {service_expr} AS service,
+                   COUNT(*) AS c,
+                   SUM({unprocessed_expr}) AS unprocessed,
+                   SUM({late_expr}) AS late
+            FROM incoming_mails
+            GROUP BY 1, 2
+            """,
+            params,
+        )
+        groups = cur.fetchall()
+    except Exception as e:
+        logger.warning("⚠️  Erreur agrégat incoming_mails: %s", e)
+        return 0, kpis
+
+    total = 0
+    by_status = {}
+    by_service = {}
+    for row in groups:
+        count = row["c"] or 0
+        total += count
+        kpis["unprocessed"] += row["unprocessed"] or 0
+        kpis["late"] += row["late"] or 0
+        by_status[row["status"]] = by_status.get(row["status"], 0) + count
+        by_service[row["service"]] = by_service.get(row["service"], 0) + count
+
+    if status_col:
+        kpis["by_status"] = [
+            {"status": key, "count": by_status[key]}
+            for key in sorted(by_status, key=_sqlite_sort_key)
+        ]
+    if service_col:
+        kpis["by_service"] = [
+            {"service": key, "count": by_service[key]}
+            for key in sorted(by_service, key=_sqlite_sort_key)
+        ]
+
+    return total, kpis
+
+
+def get_basic_counters(conn, incoming_total=None):
+    """
+    Totaux globaux (entrants, sortants, archives, notifications).
+
+    `incoming_total` peut être fourni par aggregate_incoming() pour éviter
+    un second parcours de incoming_mails.
+    """
     return {
-        "incoming_total": safe_count(conn, "incoming_mails"),
+        "incoming_total": (
+            safe_count(conn, "incoming_mails") if incoming_total is None else incoming_total
+        ),
         "outgoing_total": safe_count(conn, "courriers_sortants"),
         "archives_total": safe_count(conn, "archives"),
         "notifications_total": safe_count(conn, "notifications"),
     }
 
 
-def detect_column(columns, candidates):
-    """Retrouve la première colonne existante parmi une liste de candidats."""
-    for c in candidates:
-        if c in columns:
-            return c
-    return None
-
-
 def compute_incoming_kpis(conn):
     """
     Calcule des KPIs sur incoming_mails :
@@ -101,139 +839,473 @@ def compute_incoming_kpis(conn):
       - en retard (si date d'échéance dispo)
       - par service
     """
-    cur = conn.cursor()
-    cols = get_table_columns(conn, "incoming_mails")
-
-    result = {
-        "by_status": [],
-        "unprocessed": 0,
-        "late": 0,
-        "by_service": [],
-    }
+    return aggregate_incoming(conn)[1]
 
-    status_col = detect_column(cols, ["status", "statut", "etat"])
-    service_col = detect_column(cols, ["service", "service_id", "id_service", "idService"])
-    due_col = detect_column(cols, ["due_date", "date_limite", "date_echeance", "deadline"])
 
-    # --- Répartition par statut ---
+def count_late_incoming(conn, status_col, due_col) -> int:
+    """Courriers dont l'échéance est dépassée et qui ne sont pas clos."""
+    params = [date.today().isoformat()]
+    where = f"{due_col} < ?"
     if status_col:
-        try:
-            cur.execute(
-                f"SELECT {status_col} AS status, COUNT(*) AS c "
-                f"FROM incoming_mails GROUP BY {status_col}"
-            )
-            result["by_status"] = [
-                {"status": row["status"], "count": row["c"]}
-                for row in cur.fetchall()
-            ]
-        except Exception as e:
-            print("⚠️  Erreur by_status incoming_mails:", e)
+        done = sqlite_upper_variants(DONE_VALUES)
+        placeholders = ",".join("?" for _ in done)
+        where += f" AND ({status_col} IS NULL OR UPPER({status_col}) NOT IN ({placeholders}))"
+        params.extend(done)
+    try:
+        row = conn.execute(f"SELECT COUNT(*) AS c FROM incoming_mails WHERE {where}", params).fetchone()
+        return row["c"] if row else 0
+    except Exception as e:
+        logger.warning("⚠️  Erreur late incoming_mails: %s", e)
+        return 0
+
+
+KPI_COUNTER_SOURCES = {
+    "incoming_mails": "incoming_total",
+    "courriers_sortants": "outgoing_total",
+    "archives": "archives_total",
+    "notifications": "notifications_total",
+}
 
-        # --- Courriers non traités ---
-        unprocessed_values = [
-            "NON_TRAITE", "NON TRAITE", "NON_TRAITÉ", "NON TRAITÉ",
-            "EN_ATTENTE", "EN ATTENTE", "A_TRAITER", "A TRAITER",
-            "PENDING", "TO_DO", "TODO", "TO_PROCESS",
+
+def read_kpi_counters(conn):
+    """
+    Lit la table kpi_counters maintenue par triggers (db/kpiCounters.js côté Node).
+
+    Retourne {source: {"total": int, "dimensions": {colonne: {valeur: count}}}}
+    ou None si la matérialisation n'existe pas dans cette base.
+    """
+    if not schema_cache.columns(conn, "kpi_counters"):
+        return None
+    try:
+        rows = conn.execute(
+            "SELECT source, dimension, bucket, is_null, count FROM kpi_counters"
+        ).fetchall()
+    except sqlite3.Error as e:
+        logger.warning("⚠️  Lecture kpi_counters impossible: %s", e)
+        return None
+
+    counters = {}
+    for row in rows:
+        entry = counters.setdefault(row["source"], {"total": None, "dimensions": {}})
+        if row["dimension"] == "total":
+            entry["total"] = row["count"]
+        elif row["dimension"] == "_tracked":
+            entry["dimensions"].setdefault(row["bucket"], {})
+    for row in rows:
+        if row["dimension"] in ("total", "_tracked") or row["count"] <= 0:
+            continue
+        dims = counters[row["source"]]["dimensions"]
+        if row["dimension"] in dims:
+            value = None if row["is_null"] else row["bucket"]
+            dims[row["dimension"]][value] = row["count"]
+    return {src: entry for src, entry in counters.items() if entry["total"] is not None}
+
+
+def materialized_snapshot(conn):
+    """
+    Snapshot lu depuis kpi_counters (O(nombre de statuts/services)).
+
+    Retourne None si une dimension nécessaire n'est pas matérialisée ;
+    build_snapshot() retombe alors sur l'agrégat en un parcours.
+    """
+    counters = read_kpi_counters(conn)
+    if not counters or "incoming_mails" not in counters:
+        return None
+
+    detected = schema_cache.incoming_columns(conn)
+    status_col = detected["status"]
+    service_col = detected["service"]
+    due_col = detected["due"]
+    incoming = counters["incoming_mails"]
+    dims = incoming["dimensions"]
+    if (status_col and status_col not in dims) or (service_col and service_col not in dims):
+        return None
+
+    kpis = {"by_status": [], "unprocessed": 0, "late": 0, "by_service": []}
+    if status_col:
+        statuses = dims[status_col]
+        kpis["by_status"] = [
+            {"status": key, "count": statuses[key]}
+            for key in sorted(statuses, key=_sqlite_sort_key)
+        ]
+        # Même repli de casse que UPPER() dans aggregate_incoming() : les deux chemins concordent
+        unprocessed = {sqlite_upper(v) for v in UNPROCESSED_VALUES}
+        kpis["unprocessed"] = sum(
+            count for key, count in statuses.items()
+            if key is None or (isinstance(key, str) and sqlite_upper(key) in unprocessed)
+        )
+    if service_col:
+        services = dims[service_col]
+        kpis["by_service"] = [
+            {"service": key, "count": services[key]}
+            for key in sorted(services, key=_sqlite_sort_key)
         ]
-        placeholders = ",".join("?" for _ in unprocessed_values)
-        try:
-            cur.execute(
-                f"""
-                SELECT COUNT(*) AS c
-                FROM incoming_mails
-                WHERE {status_col} IS NULL
-                   OR UPPER({status_col}) IN ({placeholders})
-                """,
-                [v.upper() for v in unprocessed_values],
-            )
-            row = cur.fetchone()
-            result["unprocessed"] = row["c"] if row else 0
-        except Exception as e:
-            print("⚠️  Erreur unprocessed incoming_mails:", e)
 
-    # --- Courriers en retard (besoin d'une date d'échéance) ---
+    # Le retard dépend de la date du jour : il ne peut pas être maintenu par
+    # trigger et reste calculé à la demande quand une colonne d'échéance existe.
     if due_col:
+        kpis["late"] = count_late_incoming(conn, status_col, due_col)
+
+    totals = {}
+    for source, key in KPI_COUNTER_SOURCES.items():
+        entry = counters.get(source)
+        totals[key] = entry["total"] if entry else safe_count(conn, source)
+
+    return {"totals": totals, "incoming_kpis": kpis}
+
+
+SNAPSHOT_SERIES_DAYS = int(os.getenv("FLASK_SNAPSHOT_SERIES_DAYS", "30"))
+
+
+def build_snapshot(conn) -> dict:
+    """
+    Snapshot complet du dashboard.
+
+    Lit kpi_counters si la matérialisation est disponible, sinon une requête
+    d'agrégat par table.
+    """
+    snapshot = None
+    if os.getenv("FLASK_KPI_COUNTERS", "true").lower() in ("1", "true", "yes"):
+        snapshot = materialized_snapshot(conn)
+
+    if snapshot is None:
+        incoming_total, incoming_kpis = aggregate_incoming(conn)
+        snapshot = {
+            "totals": get_basic_counters(conn, incoming_total=incoming_total),
+            "incoming_kpis": incoming_kpis,
+        }
+
+    series = read_kpi_series(conn, "day", SNAPSHOT_SERIES_DAYS)
+    if series is not None:
+        snapshot["series"] = series
+    return snapshot
+
+SERIES_PERIODS = {
+    "day": lambda d: d.isoformat(),
+    "week": lambda d: f"{d.isocalendar()[0]}-W{d.isocalendar()[1]:02d}",
+    "month": lambda d: d.strftime("%Y-%m"),
+}
+
+
+def read_kpi_series(conn, period: str = "day", days: int = 30, service=None):
+    """
+    Séries arrivées / traités / en retard depuis kpi_daily_rollup
+    (alimentée chaque nuit par jobs/schedulers.js, cf. db/kpiDailyRollup.js).
+
+    Coût proportionnel à days × services, indépendant de la taille
+    d'incoming_mails. Pour une semaine ou un mois, arrivées et traités sont
+    sommés ; "late" étant un stock, on garde la valeur du dernier jour connu.
+    Retourne None si la table de rollup n'existe pas.
+    """
+    if period not in SERIES_PERIODS or not schema_cache.columns(conn, "kpi_daily_rollup"):
+        return None
+
+    sql = (
+        "SELECT day, service, arrivals, processed, late FROM kpi_daily_rollup "
+        "WHERE day >= date('now', 'localtime', ?)"
+    )
+    params = [f"-{max(1, int(days))} day"]
+    if service is not None:
+        sql += " AND service = ?"
+        params.append(service)
+    try:
+        rows = conn.execute(sql + " ORDER BY day", params).fetchall()
+    except sqlite3.Error as e:
+        logger.warning("⚠️  Lecture kpi_daily_rollup impossible: %s", e)
+        return None
+
+    to_bucket = SERIES_PERIODS[period]
+    totals = OrderedDict()
+    per_service = {}
+    for row in rows:
         try:
-            today_str = date.today().isoformat()
-            if status_col:
-                done_values = [
-                    "TRAITE", "TRAITÉ", "TERMINE", "TERMINÉ",
-                    "CLOS", "CLOSE", "DONE", "PROCESSED",
-                ]
-                placeholders = ",".join("?" for _ in done_values)
-                cur.execute(
-                    f"""
-                    SELECT COUNT(*) AS c
-                    FROM incoming_mails
-                    WHERE {due_col} < ?
-                      AND (
-                        {status_col} IS NULL
-                        OR UPPER({status_col}) NOT IN ({placeholders})
-                      )
-                    """,
-                    [today_str, *[v.upper() for v in done_values]],
-                )
-            else:
-                cur.execute(
-                    f"SELECT COUNT(*) AS c FROM incoming_mails WHERE {due_col} < ?",
-                    [today_str],
-                )
-            row = cur.fetchone()
-            result["late"] = row["c"] if row else 0
-        except Exception as e:
-            print("⚠️  Erreur late incoming_mails:", e)
+            bucket = to_bucket(date.fromisoformat(row["day"]))
+        except (TypeError, ValueError):
+            continue
+        for target in (
+            totals.setdefault(bucket, {"arrivals": 0, "processed": 0, "late": {}}),
+            per_service.setdefault(row["service"] or "Non renseigné", OrderedDict()).setdefault(
+                bucket, {"arrivals": 0, "processed": 0, "late": {}}
+            ),
+        ):
+            target["arrivals"] += row["arrivals"]
+            target["processed"] += row["processed"]
+            # Dernier jour du bucket, par service
+            target["late"][row["service"]] = (row["day"], row["late"])
+
+    def _late(values):
+        if not values:
+            return 0
+        last_day = max(day for day, _ in values.values())
+        return sum(late for day, late in values.values() if day == last_day)
+
+    labels = list(totals)
+    return {
+        "period": period,
+        "days": max(1, int(days)),
+        "labels": labels,
+        "arrivals": [totals[b]["arrivals"] for b in labels],
+        "processed": [totals[b]["processed"] for b in labels],
+        "late": [_late(totals[b]["late"]) for b in labels],
+        "by_service": {
+            svc: {
+                "labels": list(buckets),
+                "arrivals": [v["arrivals"] for v in buckets.values()],
+                "processed": [v["processed"] for v in buckets.values()],
+                "late": [_late(v["late"]) for v in buckets.values()],
+            }
+            for svc, buckets in per_service.items()
+        },
+    }
 
-    # --- Répartition par service ---
-    if service_col:
+
+# -------------------------------------------------------------------
+# 2b. Cache des snapshots et commentaires (TTL + version des données)
+# -------------------------------------------------------------------
+DASHBOARD_CACHE_SIZE = int(os.getenv("FLASK_DASHBOARD_CACHE_SIZE", "256"))
+DASHBOARD_CACHE_TTL = float(os.getenv("FLASK_DASHBOARD_CACHE_TTL", "30"))
+
+
+class TTLCache:
+    """
+    Cache LRU borné avec expiration.
+
+    Les clés incluent la version des données (voir DataVersionTracker) : une
+    écriture dans la base change la clé, les anciennes entrées ne sont plus
+    jamais lues et sortent par LRU/TTL.
+    """
+
+    def __init__(self, name: str, maxsize: int = DASHBOARD_CACHE_SIZE, ttl: float = DASHBOARD_CACHE_TTL):
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        found, value = self.get(key)
+        if found:
+            return value
+        value = compute()
+        self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class DataVersionTracker:
+    """
+    Version courante des données de la base.
+
+    `PRAGMA data_version` change quand une AUTRE connexion (le backend Node)
+    a commité ; sa valeur est propre à chaque connexion du pool, on la suit
+    donc par connexion et on incrémente une génération globale au moindre
+    changement. Le mtime du fichier DB et du WAL couvre le premier usage
+    d'une connexion.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._seen = {}
+        self._generation = 0
+
+    def _file_stamp(self):
+        stamp = []
+        for suffix in ("", "-wal"):
+            try:
+                st = os.stat(f"{self.db_path}{suffix}")
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def current(self, conn):
         try:
-            cur.execute(
-                f"""
-                SELECT {service_col} AS service, COUNT(*) AS c
-                FROM incoming_mails
-                GROUP BY {service_col}
-                """
-            )
-            result["by_service"] = [
-                {"service": row["service"], "count": row["c"]}
-                for row in cur.fetchall()
-            ]
-        except Exception as e:
-            print("⚠️  Erreur by_service incoming_mails:", e)
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error:
+            data_version = None
+        with self._lock:
+            previous = self._seen.get(id(conn))
+            if previous is not None and previous != data_version:
+                self._generation += 1
+            self._seen[id(conn)] = data_version
+            return (self._generation, self._file_stamp())
+
+
+snapshot_cache = TTLCache("snapshot")
+comment_cache = TTLCache("ai_comment")
+data_version_tracker = DataVersionTracker(DB_PATH)
 
-    return result
+
+def comment_cache_key(mode: str, query: str, version):
+    """
+    Clé du cache des commentaires : (mode, version des données).
+
+    Le mode "default" cite la requête dans son commentaire, elle fait donc
+    partie de la clé dans ce cas.
+    """
+    if mode == "default":
+        return (mode, " ".join((query or "").lower().split()), version)
+    return (mode, version)
+
+
+def shared_comment_key(cache_key) -> str:
+    """
+    Clé de dédoublonnage des jobs entre workers gunicorn.
+
+    La génération de DataVersionTracker est propre à chaque processus (et
+    PRAGMA data_version à chaque connexion) : seule l'empreinte du fichier
+    de base et du WAL (mtime, taille) est commune à tous les workers.
+    """
+    *head, (_generation, file_stamp) = cache_key
+    return json.dumps([*head, file_stamp], default=str)
+
+
+def cache_stats() -> dict:
+    return {
+        "snapshot": snapshot_cache.stats(),
+        "ai_comment": comment_cache.stats(),
+    }
 
 # -------------------------------------------------------------------
 # 3. Classification des requêtes (intention de l'agent)
 # -------------------------------------------------------------------
-def classify_query(query: str) -> str:
+# Mots-clés par mode, dans l'ordre de priorité historique : classify_query()
+# renvoie la première intention détectée dans cet ordre (comme l'ancienne
+# cascade de `if`), "retard par service" reste donc late_mails. Les poids
+# (> 1 pour les formulations sans ambiguïté) ne servent qu'au classement de
+# classify_query_intents(). Les accents sont ignorés :
+# "échéance dépassée" == "echeance depassee".
+INTENT_KEYWORDS = [
+    ("urgent_focus", {
+        # Vue urgences = retards + non traités : prioritaire sur tout le reste
+        "urgent": 2.0, "urgence": 2.0, "prioritaire": 2.0, "haute priorite": 3.0,
+    }),
+    ("late_mails", {
+        "retard": 1.0, "en retard": 2.0, "deadline depassee": 2.0, "echeance depassee": 2.0,
+    }),
+    ("unprocessed_mails", {
+        "non traite": 2.0, "non traites": 2.0, "pas traite": 2.0, "pas traites": 2.0,
+    }),
+    ("per_service", {
+        "par service": 2.0, "par departement": 2.0, "par unite": 2.0, "par direction": 2.0,
+        "services": 1.0, "departements": 1.0,
+    }),
+    ("workflow_kpis", {
+        "kpi": 1.0, "performance": 1.0, "workflow": 1.0, "indicateur": 1.0, "indicateurs": 1.0,
+    }),
+    ("archives_focus", {
+        "archive": 1.0, "archives": 1.0, "archivage": 1.0,
+    }),
+]
+
+INTENT_PRIORITY = {mode: rank for rank, (mode, _) in enumerate(INTENT_KEYWORDS)}
+
+
+def normalize_query(query: str) -> str:
+    """Minuscules, accents retirés, espaces normalisés."""
     q = (query or "").lower()
+    if not q.isascii():
+        # NFKD sépare lettre et accent ; les caractères non ASCII restants
+        # ne peuvent de toute façon pas faire partie d'un mot-clé
+        q = unicodedata.normalize("NFKD", q).encode("ascii", "ignore").decode("ascii")
+    return " ".join(q.split())
+
 
-    # Urgences
-    if any(k in q for k in ["urgent", "urgence", "prioritaire", "haute priorité", "haute priorite"]):
-        return "urgent_focus"
+def _compile_intent_matcher():
+    """
+    Construit une seule regex d'alternance pour tous les mots-clés (une passe
+    sur la requête, comme un automate multi-motifs). Les motifs les plus
+    longs passent en premier : "en retard" est reconnu avant "retard".
+    Pas de bornes de mots : même sémantique de sous-chaîne que l'ancien
+    `k in q` ("archive" reconnaît "archives").
+    """
+    table = {}
+    for mode, keywords in INTENT_KEYWORDS:
+        for keyword, weight in keywords.items():
+            table.setdefault(normalize_query(keyword), []).append((mode, weight))
+    patterns = sorted(table, key=len, reverse=True)
+    regex = re.compile("|".join(re.escape(p) for p in patterns))
+    return regex, table
 
-    # Courriers en retard
-    if any(k in q for k in ["retard", "en retard", "deadline dépassée", "deadline depassee", "échéance dépassée", "echeance depassee"]):
-        return "late_mails"
 
-    # Courriers non traités
-    if any(k in q for k in ["non traité", "non traites", "non traités", "pas traité", "pas traites", "non traite"]):
-        return "unprocessed_mails"
+_INTENT_REGEX, _INTENT_TABLE = _compile_intent_matcher()
 
-    # Répartition par service / département
-    if any(k in q for k in ["par service", "par département", "par departement", "par unité", "par unite", "par direction", "services", "départements", "departements"]):
-        return "per_service"
 
-    # Performance workflow / KPIs
-    if any(k in q for k in ["kpi", "performance", "workflow", "indicateur", "indicateurs"]):
-        return "workflow_kpis"
+@lru_cache(maxsize=4096)
+def _score_intents(normalized: str):
+    scores = {}
+    for keyword in set(_INTENT_REGEX.findall(normalized)):
+        for mode, weight in _INTENT_TABLE[keyword]:
+            scores[mode] = scores.get(mode, 0.0) + weight
+    return tuple(sorted(scores.items(), key=lambda item: (-item[1], INTENT_PRIORITY[item[0]])))
 
-    # Archives
-    if any(k in q for k in ["archive", "archives", "archivage"]):
-        return "archives_focus"
 
-    # Par défaut
-    return "default"
+def classify_query_intents(query: str):
+    """
+    Intentions détectées, triées par score décroissant puis par priorité.
+
+    Retourne [(mode, score), ...] ; liste vide si aucune intention
+    (classify_query() renvoie alors "default"). Un même mot-clé répété ne
+    compte qu'une fois. Les requêtes des dashboards se répètent beaucoup :
+    le score est mémorisé par requête normalisée.
+    """
+    return list(_score_intents(normalize_query(query)))
+
+
+@lru_cache(maxsize=4096)
+def _first_intent(normalized: str) -> str:
+    modes = [mode for mode, _ in _score_intents(normalized)]
+    return min(modes, key=INTENT_PRIORITY.__getitem__) if modes else "default"
+
+
+def classify_query(query: str) -> str:
+    """Mode de l'agent : intention détectée la plus prioritaire (pas la mieux notée)."""
+    return _first_intent(normalize_query(query))
 
 # -------------------------------------------------------------------
 # 4. Commentaire IA (rule-based + éventuellement OpenAI)
@@ -327,9 +1399,187 @@ def build_ai_comment_with_openai(mode: str, snapshot: dict, query: str) -> str:
         txt = resp.output[0].content[0].text
         return txt
     except Exception as e:
-        print("⚠️ Erreur appel OpenAI, fallback commentaire simple:", e)
+        logger.warning("⚠️ Erreur appel OpenAI, fallback commentaire simple: %s", e)
         return build_rule_based_comment(mode, snapshot, query)
 
+# -------------------------------------------------------------------
+# 4b. Commentaires IA asynchrones (réponse immédiate rule-based + polling)
+# -------------------------------------------------------------------
+AI_COMMENT_ASYNC = os.getenv("FLASK_AI_COMMENT_ASYNC", "false").lower() in ("1", "true", "yes")
+AI_COMMENT_WORKERS = int(os.getenv("FLASK_AI_COMMENT_WORKERS", "4"))
+AI_COMMENT_JOBS_MAX = int(os.getenv("FLASK_AI_COMMENT_JOBS_MAX", "1024"))
+# Jobs partagés entre workers gunicorn (la base principale est ouverte en lecture seule)
+AI_COMMENT_JOBS_DB = Path(os.getenv("FLASK_AI_COMMENT_JOBS_DB") or DB_PATH.with_name("ai_comment_jobs.db"))
+# Au-delà, un job encore "pending" est considéré perdu (worker tué ou recyclé)
+AI_COMMENT_JOB_TIMEOUT = int(os.getenv("FLASK_AI_COMMENT_JOB_TIMEOUT", "120"))
+
+
+def parse_flag(value, default: bool) -> bool:
+    """Booléen de corps JSON ou d'env : true/1/yes (la chaîne "false" vaut False)."""
+    if value is None:
+        return default
+    return str(value).lower() in ("1", "true", "yes")
+
+
+class CommentJobs:
+    """
+    Génère les commentaires OpenAI hors du thread de requête.
+
+    /dashboard-ai répond tout de suite avec le commentaire rule-based et un
+    `ai_comment_id` ; le commentaire enrichi est ensuite récupéré via
+    GET /dashboard-ai/comments/<id>. Les demandes identiques en cours
+    (même clé de cache) partagent le même job, donc un seul appel OpenAI.
+    """
+
+    def __init__(self, workers: int = AI_COMMENT_WORKERS, max_jobs: int = AI_COMMENT_JOBS_MAX,
+                 db_path: Path = AI_COMMENT_JOBS_DB, timeout: int = AI_COMMENT_JOB_TIMEOUT):
+        self.workers = max(1, workers)
+        self.max_jobs = max(1, max_jobs)
+        self.db_path = db_path
+        self.timeout = max(1, timeout)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self._pid = os.getpid()
+
+    def _pool(self):
+        # Les threads ne survivent pas à un fork() : pool recréé par processus
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ai-comment")
+            self._pid = os.getpid()
+        return self._executor
+
+    @contextmanager
+    def _store(self):
+        """
+        Connexion au fichier des jobs, partagé par tous les workers : le polling
+        GET /dashboard-ai/comments/<id> répond pareil quel que soit le worker.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            if not self._schema_ready:
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS ai_comment_jobs ("
+                    " id TEXT PRIMARY KEY, cache_key TEXT NOT NULL, status TEXT NOT NULL,"
+                    " mode TEXT, ai_comment TEXT, created_at REAL NOT NULL, completed_at REAL)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_ai_comment_jobs_key "
+                    "ON ai_comment_jobs(cache_key, status)"
+                )
+                self._schema_ready = True
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, cache_key, mode: str, snapshot: dict, query: str, fallback: str) -> str:
+        with self._lock:
+            executor = self._pool()
+        key = shared_comment_key(cache_key)
+        now = time.time()
+        with self._store() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Demande identique déjà en cours (dans ce worker ou un autre) : même job
+                row = conn.execute(
+                    "SELECT id FROM ai_comment_jobs WHERE cache_key = ? AND status = 'pending' "
+                    "AND created_at > ? ORDER BY created_at DESC LIMIT 1",
+                    (key, now - self.timeout),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("COMMIT")
+                    return row["id"]
+
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO ai_comment_jobs (id, cache_key, status, mode, ai_comment, created_at) "
+                    "VALUES (?, ?, 'pending', ?, ?, ?)",
+                    (job_id, key, mode, fallback, now),
+                )
+                conn.execute(
+                    "DELETE FROM ai_comment_jobs WHERE id IN ("
+                    " SELECT id FROM ai_comment_jobs ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_jobs,),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        executor.submit(self._run, job_id, cache_key, mode, snapshot, query)
+        return job_id
+
+    def _run(self, job_id, cache_key, mode, snapshot, query):
+        status = "ready"
+        try:
+            comment = build_ai_comment_with_openai(mode, snapshot, query)
+            comment_cache.set(cache_key, comment)
+        except Exception as e:
+            logger.warning("⚠️ Erreur commentaire IA asynchrone: %s", e)
+            comment = build_rule_based_comment(mode, snapshot, query)
+            status = "error"
+        try:
+            with self._store() as conn:
+                conn.execute(
+                    "UPDATE ai_comment_jobs SET status = ?, ai_comment = ?, completed_at = ? WHERE id = ?",
+                    (status, comment, time.time(), job_id),
+                )
+        except sqlite3.Error as e:
+            logger.warning("⚠️ Job commentaire IA %s non enregistré: %s", job_id, e)
+
+    def get(self, job_id: str):
+        with self._store() as conn:
+            row = conn.execute(
+                "SELECT id, status, mode, ai_comment, created_at, completed_at "
+                "FROM ai_comment_jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = {k: row[k] for k in row.keys() if row[k] is not None}
+        # Worker arrêté avant la fin : le commentaire rule-based reste la réponse
+        if job["status"] == "pending" and job["created_at"] < time.time() - self.timeout:
+            job["status"] = "error"
+        return job
+
+    def generate_many(self, requests_by_key: dict, snapshot: dict) -> dict:
+        """
+        Génère en parallèle les commentaires OpenAI manquants et attend le résultat.
+
+        requests_by_key : {clé de cache: (mode, query)} ; retourne {clé: commentaire}.
+        Les commentaires déjà en cache ne déclenchent aucun appel.
+        """
+        comments, futures = {}, {}
+        with self._lock:
+            executor = self._pool()
+        for key, (mode, query) in requests_by_key.items():
+            found, comment = comment_cache.get(key)
+            if found:
+                comments[key] = comment
+            else:
+                futures[key] = executor.submit(build_ai_comment_with_openai, mode, snapshot, query)
+        for key, future in futures.items():
+            mode, query = requests_by_key[key]
+            try:
+                comments[key] = future.result()
+                comment_cache.set(key, comments[key])
+            except Exception as e:
+                logger.warning("⚠️ Erreur commentaire IA (batch): %s", e)
+                comments[key] = build_rule_based_comment(mode, snapshot, query)
+        return comments
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+comment_jobs = CommentJobs()
+
+
 # -------------------------------------------------------------------
 # 5. Construction de la config de dashboard selon le mode
 # -------------------------------------------------------------------
@@ -465,18 +1715,41 @@ def build_config_for_mode(mode: str, snapshot: dict, query: str, ai_comment: str
 
     elif mode == "workflow_kpis":
         title = "Performance & KPIs du Workflow"
+        by_status = incoming_kpis.get("by_status", [])
         widgets.append({
             "id": "incoming-by-status-chart",
             "type": "chart",
             "title": "Répartition des courriers entrants par statut",
             "dataSource": "incoming_by_status",
             "chartType": "bar",  # 👈 important : on évite "area" pour ne pas casser Chart.js
+            "labels": [row.get("status") or "Non renseigné" for row in by_status],
+            "datasets": [{"label": "Courriers", "data": [row.get("count", 0) for row in by_status]}],
             "size": {"sm": 12, "md": 8, "lg": 8, "xl": 8, "xxl": 8},
             "navigationTarget": {
                 "routeName": "Indexation",
                 "query": {"fromDashboard": "workflow_kpis"},
             },
         })
+        series = snapshot.get("series")
+        if series and series.get("labels"):
+            widgets.append({
+                "id": "incoming-trend-chart",
+                "type": "chart",
+                "title": f"Tendance sur {series.get('days')} jours",
+                "dataSource": "incoming_daily_series",
+                "chartType": "line",
+                "labels": series["labels"],
+                "datasets": [
+                    {"label": "Arrivées", "data": series["arrivals"]},
+                    {"label": "Traités", "data": series["processed"]},
+                    {"label": "En retard", "data": series["late"]},
+                ],
+                "size": {"sm": 12, "md": 12, "lg": 12, "xl": 12, "xxl": 12},
+                "navigationTarget": {
+                    "routeName": "Indexation",
+                    "query": {"fromDashboard": "workflow_trend"},
+                },
+            })
 
     elif mode == "archives_focus":
         title = "Vue Archives"
@@ -494,45 +1767,226 @@ def build_config_for_mode(mode: str, snapshot: dict, query: str, ai_comment: str
 # -------------------------------------------------------------------
 # 6. Endpoint principal : /dashboard-ai
 # -------------------------------------------------------------------
+def take_snapshot():
+    """Snapshot de la base et version des données associée (avec cache)."""
+    with span("snapshot"), db_pool.connection() as conn:
+        version = data_version_tracker.current(conn)
+        snapshot = snapshot_cache.get_or_compute(("snapshot", version), lambda: build_snapshot(conn))
+    return snapshot, version
+
+
+def build_dashboard_response(query: str, mode: str, snapshot: dict, ai_comment: str,
+                             ai_comment_id=None, ai_comment_status: str = "ready") -> dict:
+    with span("config"):
+        config = build_config_for_mode(mode, snapshot, query, ai_comment)
+    return {
+        "config": config,
+        "mode": mode,
+        "snapshot": snapshot,  # utile si un jour tu veux afficher les détails dans Vue
+        "source": "flask-agent",
+        "query": query,
+        "intents": [{"mode": m, "score": score} for m, score in classify_query_intents(query)],
+        "ai_comment_id": ai_comment_id,
+        "ai_comment_status": ai_comment_status,
+    }
+
+
 @app.route("/dashboard-ai", methods=["POST"])
 def dashboard_ai():
     data = request.get_json(force=True) or {}
     query = data.get("query", "")
 
-    print(f"[Flask] Reçu query depuis Node : {query}")
+    logger.info("[Flask] Reçu query depuis Node", extra={"fields": {"query": query}})
 
-    # 1) Récupérer un snapshot de la base
-    with get_connection() as conn:
-        snapshot = {
-            "totals": get_basic_counters(conn),
-            "incoming_kpis": compute_incoming_kpis(conn),
-        }
+    # 1) Récupérer un snapshot de la base (mis en cache tant que les données ne bougent pas)
+    snapshot, version = take_snapshot()
 
     # 2) Déterminer l'intention (mode)
-    mode = classify_query(query)
+    with span("classification"):
+        mode = classify_query(query)
 
-    # 3) Générer le commentaire IA
-    if openai_client is not None:
-        ai_comment = build_ai_comment_with_openai(mode, snapshot, query)
-    else:
-        ai_comment = build_rule_based_comment(mode, snapshot, query)
+    # 3) Générer le commentaire IA (un appel OpenAI par mode et version des données)
+    key = comment_cache_key(mode, query, version)
+    use_async = parse_flag(data.get("async_comment"), AI_COMMENT_ASYNC) and openai_client is not None
+    ai_comment_id = None
+    ai_comment_status = "ready"
+
+    with span("ai_comment"):
+        if use_async:
+            found, ai_comment = comment_cache.get(key)
+            if not found:
+                # Réponse immédiate ; le commentaire OpenAI arrive via le polling
+                ai_comment = build_rule_based_comment(mode, snapshot, query)
+                ai_comment_id = comment_jobs.submit(key, mode, snapshot, query, ai_comment)
+                ai_comment_status = "pending"
+        else:
+            def _comment():
+                if openai_client is not None:
+                    return build_ai_comment_with_openai(mode, snapshot, query)
+                return build_rule_based_comment(mode, snapshot, query)
+
+            ai_comment = comment_cache.get_or_compute(key, _comment)
+
+    # 4) Construire la config du dashboard et 5) la retourner au backend Node
+    return jsonify(build_dashboard_response(query, mode, snapshot, ai_comment, ai_comment_id, ai_comment_status))
+
+
+DASHBOARD_BATCH_MAX = int(os.getenv("FLASK_DASHBOARD_BATCH_MAX", "32"))
+
+
+@app.route("/dashboard-ai/batch", methods=["POST"])
+def dashboard_ai_batch():
+    """
+    Résout plusieurs requêtes de dashboard sur UN seul snapshot.
+
+    Corps : {"queries": ["courriers en retard", "par service", ...], "async_comment": bool}
+    Réponse : {"snapshot": ..., "results": [<même forme que /dashboard-ai>, ...]}
 
-    # 4) Construire la config du dashboard
-    config = build_config_for_mode(mode, snapshot, query, ai_comment)
+    Coût comparé à N appels /dashboard-ai :
+      - SQL : 1 snapshot au lieu de N (N fois moins de lectures à cache froid) ;
+      - OpenAI : un appel par mode distinct (dédupliqués), lancés en parallèle,
+        donc latence ≈ max(appels) au lieu de la somme des N appels séquentiels ;
+      - HTTP : 1 aller-retour Vue → Node → Flask au lieu de N.
+    Le snapshot n'est renvoyé qu'une fois, au niveau racine.
+    """
+    data = request.get_json(force=True) or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "queries doit être une liste non vide"}), 400
+    if len(queries) > DASHBOARD_BATCH_MAX:
+        return jsonify({"error": f"Au plus {DASHBOARD_BATCH_MAX} requêtes par batch"}), 400
+    queries = [q if isinstance(q, str) else str(q or "") for q in queries]
+
+    logger.info("[Flask] Batch reçu depuis Node", extra={"fields": {"queries": len(queries)}})
+
+    snapshot, version = take_snapshot()
+    with span("classification"):
+        modes = [classify_query(q) for q in queries]
+    keys = [comment_cache_key(mode, q, version) for mode, q in zip(modes, queries)]
+    use_async = parse_flag(data.get("async_comment"), AI_COMMENT_ASYNC) and openai_client is not None
+
+    comments, ids, statuses = {}, {}, {}
+    with span("ai_comment"):
+        if openai_client is None:
+            for key, mode, q in zip(keys, modes, queries):
+                if key not in comments:
+                    comments[key] = comment_cache.get_or_compute(
+                        key, lambda m=mode, qq=q: build_rule_based_comment(m, snapshot, qq)
+                    )
+        elif use_async:
+            for key, mode, q in zip(keys, modes, queries):
+                if key in comments:
+                    continue
+                found, comment = comment_cache.get(key)
+                if found:
+                    comments[key] = comment
+                else:
+                    comments[key] = build_rule_based_comment(mode, snapshot, q)
+                    ids[key] = comment_jobs.submit(key, mode, snapshot, q, comments[key])
+                    statuses[key] = "pending"
+        else:
+            wanted = {}
+            for key, mode, q in zip(keys, modes, queries):
+                wanted.setdefault(key, (mode, q))
+            comments = comment_jobs.generate_many(wanted, snapshot)
+
+    results = []
+    for key, mode, q in zip(keys, modes, queries):
+        item = build_dashboard_response(
+            q, mode, snapshot, comments[key], ids.get(key), statuses.get(key, "ready")
+        )
+        item.pop("snapshot")
+        results.append(item)
 
-    # 5) Retourner au backend Node
     return jsonify({
-        "config": config,
-        "mode": mode,
-        "snapshot": snapshot,  # utile si un jour tu veux afficher les détails dans Vue
+        "snapshot": snapshot,
+        "results": results,
         "source": "flask-agent",
-        "query": query,
     })
 
 
+@app.route("/dashboard-ai/comments/<comment_id>", methods=["GET"])
+def dashboard_ai_comment(comment_id):
+    """Polling du commentaire IA enrichi (status: pending | ready | error)."""
+    job = comment_jobs.get(comment_id)
+    if job is None:
+        return jsonify({"error": "Commentaire introuvable ou expiré", "id": comment_id}), 404
+    return jsonify(job)
+
+
+@app.route("/dashboard-ai/series", methods=["GET"])
+def dashboard_ai_series():
+    """
+    Séries KPI pour les widgets de tendance.
+
+    Paramètres : period=day|week|month (défaut day), days (défaut 30, max 731),
+    service (optionnel, valeur d'assigned_service).
+    """
+    period = request.args.get("period", "day")
+    if period not in SERIES_PERIODS:
+        return jsonify({"error": "period doit valoir day, week ou month"}), 400
+    try:
+        days = min(731, max(1, int(request.args.get("days", "30"))))
+    except ValueError:
+        return jsonify({"error": "days doit être un entier"}), 400
+
+    with db_pool.connection() as conn:
+        series = read_kpi_series(conn, period, days, request.args.get("service"))
+    if series is None:
+        return jsonify({"error": "kpi_daily_rollup indisponible (rollup nocturne pas encore exécuté)"}), 503
+    return jsonify(series)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Métriques Prometheus de l'agent IA (mêmes conventions que /metrics côté Node)."""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.route("/dashboard-ai/cache-stats", methods=["GET"])
+def dashboard_ai_cache_stats():
+    """Compteurs hit/miss des caches, pour dimensionner FLASK_DASHBOARD_CACHE_*."""
+    return jsonify(cache_stats())
+
+
+# -------------------------------------------------------------------
+# 7. Préchargement et arrêt (serveur WSGI, cf. wsgi.py / gunicorn.conf.py)
+# -------------------------------------------------------------------
+def warmup():
+    """
+    Prépare l'état partagé avant le fork des workers (preload_app) :
+    client OpenAI (déjà créé à l'import), cache de schéma et vérification de
+    la base. Les connexions ouvertes ici sont refermées : une connexion
+    SQLite ne doit pas être héritée par un processus fils.
+    """
+    try:
+        with db_pool.connection() as conn:
+            schema_cache.incoming_columns(conn)
+            schema_cache.columns(conn, "kpi_counters")
+        logger.info(f"✅ Agent IA préchargé (DB_PATH = {DB_PATH})")
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️  Préchargement SQLite impossible: {e}")
+    finally:
+        db_pool.close_all()
+
+
+def shutdown(wait: bool = True):
+    """Arrêt propre : termine les commentaires IA en cours puis ferme le pool."""
+    comment_jobs.shutdown(wait=wait)
+    db_pool.close_all()
+    if metrics_store is not None:
+        try:
+            metrics_store.flush()  # dernières valeurs du worker avant sa sortie
+        except OSError as e:
+            logger.warning("⚠️  Écriture des métriques impossible: %s", e)
+
+
 if __name__ == "__main__":
-    print("🚀 Flask IA Agent démarré sur http://127.0.0.1:5000")
+    # Serveur de développement uniquement ; en production : gunicorn -c gunicorn.conf.py wsgi:app
+    host = os.getenv("FLASK_HOST", "127.0.0.1")
+    port = int(os.getenv("FLASK_PORT", "5000"))
+    print(f"🚀 Flask IA Agent démarré sur http://{host}:{port}")
     print("   DB_PATH =", DB_PATH)
     if openai_client is None:
         print("   ⚠️ OpenAI désactivé (pas de clé ou pas de SDK)")
-    app.run(host="127.0.0.1", port=5000, debug=True)
+    app.run(host=host, port=port, debug=os.getenv("FLASK_DEBUG", "true").lower() in ("1", "true", "yes"))
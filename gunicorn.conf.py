@@ -0,0 +1,52 @@
+# backend/gunicorn.conf.py
+#
+# Configuration gunicorn de l'agent IA Flask (voir wsgi.py).
+# Toutes les valeurs sont surchargeables par variables d'environnement.
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = f"{os.getenv('FLASK_HOST', '127.0.0.1')}:{os.getenv('FLASK_PORT', '5000')}"
+
+# Workers processus × threads : SQLite en lecture seule + WAL supporte bien
+# plusieurs lecteurs ; les threads couvrent l'attente réseau (OpenAI).
+# Les jobs de commentaires IA sont dans FLASK_AI_COMMENT_JOBS_DB, partagé par
+# les workers : le polling peut tomber sur n'importe lequel.
+workers = int(os.getenv("FLASK_WORKERS", str(min(4, multiprocessing.cpu_count()))))
+threads = int(os.getenv("FLASK_THREADS", "4"))
+worker_class = "gthread" if threads > 1 else "sync"
+
+# Construit l'état partagé une seule fois avant le fork (wsgi.warmup)
+preload_app = True
+
+# Métriques additionnées entre workers (flask_app.MultiprocessMetrics) : posé
+# avant le chargement de l'app, vidé à chaque démarrage du maître
+os.environ.setdefault(
+    "FLASK_METRICS_DIR",
+    os.path.join(tempfile.gettempdir(), f"flask-agent-metrics-{os.getenv('FLASK_PORT', '5000')}"),
+)
+
+# Arrêt gracieux : les requêtes en cours ont graceful_timeout pour se terminer
+timeout = int(os.getenv("FLASK_WORKER_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("FLASK_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+# Recyclage périodique des workers (fuites mémoire éventuelles des SDK)
+max_requests = int(os.getenv("FLASK_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("FLASK_MAX_REQUESTS_JITTER", "500"))
+
+accesslog = os.getenv("FLASK_ACCESS_LOG", "-")
+loglevel = os.getenv("FLASK_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    shutil.rmtree(os.environ["FLASK_METRICS_DIR"], ignore_errors=True)
+
+
+def worker_exit(server, worker):
+    # Termine les commentaires IA en cours et ferme les connexions SQLite du worker
+    from flask_app import shutdown
+
+    shutdown(wait=True)
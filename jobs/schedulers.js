@@ -9,6 +9,9 @@
  */
 
 const moment = require('moment');
+const path = require('path');
+const { refreshKpiDailyRollup } = require('../db/kpiDailyRollup');
+const { collectBlobGarbage } = require('../db/blobStore');
 
 // Protection contre double démarrage
 let schedulersStarted = false;
@@ -407,6 +410,55 @@ function startRefreshTokenCleanup(cleanupExpiredRefreshTokens, logger) {
   console.log('✅ Refresh Token Cleanup démarré (toutes les 6h)');
 }
 
+/**
+ * Rollup journalier des KPI (kpi_daily_rollup)
+ * Au démarrage (rattrapage) puis chaque nuit à 02:00
+ */
+function startKpiDailyRollupScheduler(db) {
+  const run = () => {
+    refreshKpiDailyRollup(db)
+      .then(({ fromDay, today }) => {
+        console.log(`✅ kpi_daily_rollup mis à jour (${fromDay || 'complet'} → ${today})`);
+      })
+      .catch((err) => console.error('❌ kpi_daily_rollup refresh failed:', err.message));
+  };
+
+  setTimeout(run, 10000); // Après 10 secondes
+
+  const nextRun = moment().startOf('day').add(2, 'hours');
+  if (nextRun.isBefore(moment())) nextRun.add(1, 'day');
+  setTimeout(() => {
+    run();
+    setInterval(run, 24 * 60 * 60 * 1000); // Puis toutes les 24 heures
+  }, nextRun.diff(moment()));
+
+  console.log('✅ KPI Daily Rollup démarré (chaque nuit à 02:00)');
+}
+
+/**
+ * Collecte des blobs d'upload sans référence (uploads/blobs/)
+ * Chaque nuit à 03:00, après le délai de grâce BLOB_GC_GRACE_HOURS
+ */
+function startBlobGcScheduler(db) {
+  const uploadsDir = path.join(__dirname, '..', 'uploads');
+  const run = () => {
+    collectBlobGarbage(db, { uploadsDir })
+      .then(({ deleted, freedBytes, corrected }) => {
+        console.log(`✅ Collecte des blobs: ${deleted} supprimé(s), ${(freedBytes / 1024 / 1024).toFixed(1)} Mo libérés, ${corrected} compteur(s) corrigé(s)`);
+      })
+      .catch((err) => console.error('❌ Blob GC failed:', err.message));
+  };
+
+  const nextRun = moment().startOf('day').add(3, 'hours');
+  if (nextRun.isBefore(moment())) nextRun.add(1, 'day');
+  setTimeout(() => {
+    run();
+    setInterval(run, 24 * 60 * 60 * 1000); // Puis toutes les 24 heures
+  }, nextRun.diff(moment()));
+
+  console.log('✅ Blob GC démarré (chaque nuit à 03:00)');
+}
+
 /**
  * Point d'entrée unique : démarre TOUS les schedulers
  * À appeler UNE SEULE FOIS au démarrage
@@ -452,6 +504,12 @@ function startAllSchedulers(db, helpers) {
     // 4. Purge refresh tokens (toutes les 6 heures)
     startRefreshTokenCleanup(cleanupExpiredRefreshTokens, logger);
 
+    // 5. Rollup journalier des KPI (chaque nuit)
+    startKpiDailyRollupScheduler(db);
+
+    // 6. Collecte des fichiers uploadés sans référence (chaque nuit)
+    startBlobGcScheduler(db);
+
     console.log('✅ Tous les schedulers démarrés avec succès');
   } catch (e) {
     console.error('❌ Erreur démarrage schedulers:', e?.message || e);
@@ -462,5 +520,7 @@ module.exports = {
   startAllSchedulers,
   detectBruteforce,
   checkOverdueMails,
-  startSmartAlertsScheduler
+  startSmartAlertsScheduler,
+  startKpiDailyRollupScheduler,
+  startBlobGcScheduler
 };
@@ -1,4 +1,7 @@
+const crypto = require('crypto')
 const jwt = require('jsonwebtoken')
+const { LruCache } = require('../utils/lruCache')
+const metrics = require('../monitoring/metrics')
 
 const secretsRaw = process.env.JWT_SECRET_KEYS || process.env.JWT_SECRET_KEY || ''
 const SECRET_KEYS = secretsRaw
@@ -10,7 +13,96 @@ if (!SECRET_KEYS.length) {
   throw new Error('Missing required env var: JWT_SECRET_KEY')
 }
 
-module.exports = function authenticateToken(req, res, next) {
+// kid = empreinte du secret (jamais le secret lui-même) : posé à la signature (keyIdFor),
+// il désigne directement la clé à utiliser au lieu d'essayer chaque clé en rotation
+function keyIdFor(secret) {
+  return crypto.createHash('sha256').update(String(secret)).digest('hex').slice(0, 16)
+}
+
+const KEYS_BY_ID = new Map(SECRET_KEYS.map((secret) => [keyIdFor(secret), secret]))
+
+// Tokens déjà vérifiés (clé : sha256 du token), jamais conservés au-delà de exp
+const VERIFIED_CACHE_TTL_MS = parseInt(process.env.JWT_VERIFY_CACHE_TTL_SEC || '300', 10) * 1000
+const verifiedTokens = new LruCache({
+  max: parseInt(process.env.JWT_VERIFY_CACHE_MAX || '10000', 10),
+  ttlMs: VERIFIED_CACHE_TTL_MS,
+})
+
+// Sessions déconnectées : la déconnexion révoque le refresh token d'une session, et avec lui
+// les tokens d'accès de cette session seule (claim sid), en cache ou encore valides ; les autres
+// appareils de l'utilisateur ne sont pas touchés.
+// sid → ms ; au-delà de la durée de vie maximale d'un token d'accès (24 h), plus rien à refuser
+const REVOCATION_RETENTION_MS = 24 * 3600 * 1000
+const revokedSessions = new Map()
+
+function recordRevocation(sessionId, revokedAt) {
+  revokedSessions.set(String(sessionId), revokedAt)
+  const cutoff = Date.now() - REVOCATION_RETENTION_MS
+  for (const [sid, at] of revokedSessions) {
+    if (at < cutoff) revokedSessions.delete(sid)
+  }
+}
+
+function isRevoked(user) {
+  return Boolean(user && user.sid) && revokedSessions.has(String(user.sid))
+}
+
+// Déconnexion connue en base (autre processus, redémarrage) : refresh token de la session révoqué
+// sans remplaçant (la rotation pose replaced_by). Consultée à chaque vérification complète,
+// donc au plus tard après JWT_VERIFY_CACHE_TTL_SEC pour un token déjà en cache ailleurs.
+function loadRevocation(sessionId) {
+  return new Promise((resolve) => {
+    if (!sessionId || revokedSessions.has(String(sessionId))) return resolve()
+    let db
+    try {
+      db = require('../db/index')
+    } catch (err) {
+      return resolve()
+    }
+    db.get(
+      `SELECT revoked_at FROM refresh_tokens
+       WHERE session_id = ? AND revoked_at IS NOT NULL AND replaced_by IS NULL
+       LIMIT 1`,
+      [sessionId],
+      (err, row) => {
+        // Base indisponible : seules les révocations connues de ce processus s'appliquent
+        if (err || !row || !row.revoked_at) return resolve()
+        const revokedAt = Date.parse(`${String(row.revoked_at).replace(' ', 'T')}Z`)
+        recordRevocation(sessionId, Number.isFinite(revokedAt) ? revokedAt : Date.now())
+        resolve()
+      },
+    )
+  })
+}
+
+function verifyToken(token) {
+  const decoded = jwt.decode(token, { complete: true })
+  const kid = decoded && decoded.header && decoded.header.kid
+  if (kid && KEYS_BY_ID.has(kid)) {
+    return jwt.verify(token, KEYS_BY_ID.get(kid))
+  }
+  // Tokens émis sans kid (ou par une clé retirée) : essai de chaque clé
+  let lastErr = null
+  for (const secret of SECRET_KEYS) {
+    try {
+      return jwt.verify(token, secret)
+    } catch (err) {
+      lastErr = err
+    }
+  }
+  throw lastErr
+}
+
+// Normalisation: compat anciens tokens
+function normalizeUser(user) {
+  if (user && typeof user === 'object') {
+    if (user.id == null && user.userId != null) user.id = user.userId
+    if (user.role_id == null && user.roleId != null) user.role_id = user.roleId
+  }
+  return user
+}
+
+function authenticateToken(req, res, next) {
   const authHeader = req.headers['authorization']
   const token = authHeader && authHeader.split(' ')[1]
 
@@ -18,23 +110,68 @@ module.exports = function authenticateToken(req, res, next) {
     return res.status(401).json({ error: "Token d'authentification manquant." })
   }
 
-  const tryVerify = (idx) => {
-    if (idx >= SECRET_KEYS.length) {
-      return res.status(401).json({ error: "Token invalide ou expiré." })
+  const start = metrics.startTimer()
+  const tokenHash = crypto.createHash('sha256').update(token).digest('hex')
+  const cached = verifiedTokens.get(tokenHash)
+  if (cached && isRevoked(cached.user)) {
+    verifiedTokens.delete(tokenHash)
+    metrics.recordJwtVerification('rejected', metrics.endTimer(start))
+    return res.status(401).json({ error: "Token révoqué." })
+  }
+  if (cached && (!cached.expiresAt || cached.expiresAt > Date.now())) {
+    // Copie : une route qui modifie req.user ne doit pas altérer le cache
+    req.user = { ...cached.user }
+    metrics.recordJwtVerification('cache_hit', metrics.endTimer(start))
+    return next()
+  }
+
+  let user
+  try {
+    user = normalizeUser(verifyToken(token))
+  } catch (err) {
+    metrics.recordJwtVerification('rejected', metrics.endTimer(start))
+    return res.status(401).json({ error: "Token invalide ou expiré." })
+  }
+  if (!user || typeof user !== 'object' || user.id == null) {
+    metrics.recordJwtVerification('verified', metrics.endTimer(start))
+    req.user = user
+    return next()
+  }
+
+  return loadRevocation(user.sid).then(() => {
+    if (isRevoked(user)) {
+      metrics.recordJwtVerification('rejected', metrics.endTimer(start))
+      return res.status(401).json({ error: "Token révoqué." })
     }
-    jwt.verify(token, SECRET_KEYS[idx], (err, user) => {
-      if (err) return tryVerify(idx + 1)
+    metrics.recordJwtVerification('verified', metrics.endTimer(start))
 
-      // Normalisation: compat anciens tokens
-      if (user && typeof user === 'object') {
-        if (user.id == null && user.userId != null) user.id = user.userId
-        if (user.role_id == null && user.roleId != null) user.role_id = user.roleId
-      }
+    const expiresAt = user.exp ? user.exp * 1000 : 0
+    const ttlMs = expiresAt ? Math.min(VERIFIED_CACHE_TTL_MS, expiresAt - Date.now()) : VERIFIED_CACHE_TTL_MS
+    if (ttlMs > 0) verifiedTokens.set(tokenHash, { user: { ...user }, sessionId: user.sid || null, expiresAt }, ttlMs)
 
-      req.user = user
-      return next()
-    })
-  }
+    req.user = user
+    return next()
+  })
+}
 
-  tryVerify(0)
+/**
+ * Révoque les tokens d'accès d'une session (déconnexion, refresh token révoqué) :
+ * ils sont refusés et retirés du cache de vérification.
+ */
+function revokeSessionTokens(sessionId, revokedAt = Date.now()) {
+  if (!sessionId) return 0
+  recordRevocation(sessionId, revokedAt)
+  let removed = 0
+  for (const [key, entry] of verifiedTokens.entries) {
+    if (entry.value.sessionId != null && String(entry.value.sessionId) === String(sessionId)) {
+      verifiedTokens.delete(key)
+      removed += 1
+    }
+  }
+  return removed
 }
+
+module.exports = authenticateToken
+module.exports.keyIdFor = keyIdFor
+module.exports.revokeSessionTokens = revokeSessionTokens
+module.exports.clearVerifiedTokens = () => verifiedTokens.clear()
@@ -1,8 +1,18 @@
+const crypto = require('crypto');
 const logger = require('../utils/logger');
 
+// Identifiant client repris tel quel seulement s'il est sûr (en-têtes de réponse, logs JSON)
+const REQUEST_ID_PATTERN = /^[A-Za-z0-9._-]{1,128}$/;
+
 module.exports = function requestLogger(req, res, next) {
   const startedAt = Date.now();
-  const reqId = req.headers['x-request-id'] || undefined;
+  // Identifiant repris par les appels à l'agent Flask (corrélation des logs)
+  const incomingId = req.headers['x-request-id'];
+  const reqId = typeof incomingId === 'string' && REQUEST_ID_PATTERN.test(incomingId)
+    ? incomingId
+    : crypto.randomUUID();
+  req.id = reqId;
+  res.setHeader('X-Request-ID', reqId);
 
   res.on('finish', () => {
     const durationMs = Date.now() - startedAt;
@@ -1,8 +1,8 @@
-const Tesseract = require('tesseract.js');
+const { recognizeFile } = require('./ocrPool');
 
+// OCR via le pool de workers (modèles déjà chargés, hors boucle d'événements)
 async function extractTextFromImage(filePath) {
-  const result = await Tesseract.recognize(filePath, 'eng');
-  return result.data.text;
+  return recognizeFile(filePath);
 }
 
 module.exports = { extractTextFromImage };
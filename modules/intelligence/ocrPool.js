@@ -0,0 +1,276 @@
+/**
+ * modules/intelligence/ocrPool.js
+ * Pool de workers OCR (tesseract.js) et file de travaux
+ *
+ * ✅ Workers créés une fois (modèles chargés au démarrage), réutilisés par tous les travaux :
+ *    plus de chargement de modèle par fichier ni par page
+ * ✅ Reconnaissance hors boucle d'événements (worker_threads de tesseract.js)
+ * ✅ PDF scannés : pages rasterisées puis reconnues en parallèle sur les workers libres
+ * ✅ File bornée (OCR_QUEUE_MAX) : au-delà, refus immédiat (503) plutôt qu'une attente sans fin
+ * ✅ Suivi des travaux (statut, pages traitées, texte) conservé OCR_JOB_TTL_MINUTES
+ */
+
+const crypto = require('crypto');
+const os = require('os');
+const path = require('path');
+const fsPromises = require('fs/promises');
+const Tesseract = require('tesseract.js');
+
+const OCR_WORKERS = Math.max(1, parseInt(process.env.OCR_WORKERS || String(Math.min(Math.max(os.cpus().length - 1, 1), 4)), 10));
+const OCR_QUEUE_MAX = parseInt(process.env.OCR_QUEUE_MAX || '100', 10);
+const OCR_LANGS = process.env.OCR_LANGS || 'fra+eng+osd';
+const OCR_JOB_TTL_MS = parseInt(process.env.OCR_JOB_TTL_MINUTES || '60', 10) * 60 * 1000;
+// Modèles *.traineddata (fra.traineddata à la racine du dépôt)
+const OCR_CACHE_PATH = process.env.OCR_CACHE_PATH || path.resolve(__dirname, '..', '..');
+const OCR_TEMP_DIR = path.resolve(__dirname, '..', '..', 'uploads', 'temp-ocr');
+
+// Couche texte jugée exploitable au-delà de ce nombre de caractères
+const MIN_TEXT_LAYER_CHARS = 50;
+
+const IMAGE_EXTENSIONS = new Set(['.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.webp', '.gif']);
+
+let schedulerPromise = null;
+let poolReady = false;
+const jobs = new Map();
+const pending = [];
+let running = 0;
+
+/**
+ * Démarre (une seule fois) le pool : OCR_WORKERS workers, modèles chargés.
+ * @returns {Promise<Tesseract.Scheduler>}
+ */
+function startOcrPool() {
+  if (!schedulerPromise) {
+    schedulerPromise = (async () => {
+      const startedAt = Date.now();
+      const scheduler = Tesseract.createScheduler();
+      const workers = await Promise.all(
+        Array.from({ length: OCR_WORKERS }, async () => {
+          const worker = await Tesseract.createWorker(OCR_LANGS, 1, { cachePath: OCR_CACHE_PATH });
+          await worker.setParameters({ tessedit_pageseg_mode: '1' });
+          return worker;
+        }),
+      );
+      workers.forEach((worker) => scheduler.addWorker(worker));
+      poolReady = true;
+      console.log(`🧠 Pool OCR prêt: ${OCR_WORKERS} worker(s) ${OCR_LANGS} en ${Date.now() - startedAt} ms`);
+      return scheduler;
+    })().catch((err) => {
+      schedulerPromise = null;
+      throw err;
+    });
+  }
+  return schedulerPromise;
+}
+
+async function stopOcrPool() {
+  if (!schedulerPromise) return;
+  const scheduler = await schedulerPromise.catch(() => null);
+  schedulerPromise = null;
+  poolReady = false;
+  if (scheduler) await scheduler.terminate();
+}
+
+function isOcrCandidate(filePath, mimetype = '') {
+  const ext = path.extname(filePath || '').toLowerCase();
+  return ext === '.pdf' || IMAGE_EXTENSIONS.has(ext) || String(mimetype).startsWith('image/');
+}
+
+function jobTempDir(jobId) {
+  return path.join(OCR_TEMP_DIR, jobId);
+}
+
+/**
+ * Pages d'un PDF en images PNG (une par page), dans un dossier propre au travail
+ * (uploads/temp-ocr/<jobId>/, supprimé en fin de travail).
+ * @returns {Promise<string[]>}
+ */
+async function rasterizePdf(pdfPath, jobId) {
+  const { fromPath } = require('pdf2pic');
+  const savePath = jobTempDir(jobId);
+  await fsPromises.mkdir(savePath, { recursive: true });
+  const convert = fromPath(pdfPath, {
+    density: 200,
+    saveFilename: 'page',
+    savePath,
+    format: 'png',
+    width: 2000,
+    height: 2000,
+  });
+  const pages = await convert.bulk(-1, { responseType: 'image' });
+  return pages
+    .filter((page) => page && page.path)
+    .sort((a, b) => a.page - b.page)
+    .map((page) => page.path);
+}
+
+async function runJob(job) {
+  job.status = 'running';
+  job.startedAt = new Date().toISOString();
+  let rasterized = false;
+  try {
+    const isPdf = path.extname(job.filePath).toLowerCase() === '.pdf';
+    // PDF avec couche texte : pas d'OCR
+    if (isPdf && job.textLayer) {
+      const text = await job.textLayer(job.filePath).catch(() => '');
+      if (text && text.trim().length >= MIN_TEXT_LAYER_CHARS) {
+        job.source = 'text-layer';
+        job.text = text.trim();
+        job.status = 'done';
+        return job.text;
+      }
+    }
+
+    const scheduler = await startOcrPool();
+    job.source = 'ocr';
+    rasterized = isPdf;
+    const images = isPdf ? await rasterizePdf(job.filePath, job.id) : [job.filePath];
+    job.pagesTotal = images.length;
+
+    // Pages réparties sur les workers libres, texte réassemblé dans l'ordre
+    const texts = await Promise.all(
+      images.map(async (image) => {
+        const { data } = await scheduler.addJob('recognize', image);
+        job.pagesDone += 1;
+        return (data.text || '').trim();
+      }),
+    );
+
+    job.text = isPdf
+      ? texts.map((text, i) => (text ? `\n--- PAGE ${i + 1} ---\n${text}` : '')).join('').trim()
+      : texts[0] || '';
+    job.status = 'done';
+    return job.text;
+  } catch (err) {
+    job.status = 'failed';
+    job.error = err.message;
+    throw err;
+  } finally {
+    job.finishedAt = new Date().toISOString();
+    job.durationMs = Date.now() - Date.parse(job.startedAt);
+    // Dossier entier : y compris les pages d'une rasterisation interrompue
+    if (rasterized) {
+      await fsPromises.rm(jobTempDir(job.id), { recursive: true, force: true }).catch(() => {});
+    }
+  }
+}
+
+function drain() {
+  while (running < OCR_WORKERS && pending.length) {
+    const { job, resolve, reject } = pending.shift();
+    running += 1;
+    runJob(job)
+      .then(resolve, reject)
+      .finally(() => {
+        running -= 1;
+        drain();
+      });
+  }
+}
+
+function sweepJobs() {
+  const cutoff = Date.now() - OCR_JOB_TTL_MS;
+  for (const [id, job] of jobs) {
+    if (job.finishedAt && Date.parse(job.finishedAt) < cutoff) jobs.delete(id);
+  }
+}
+
+function publicJob(job, { withText = true } = {}) {
+  const view = {
+    id: job.id,
+    status: job.status,
+    source: job.source,
+    file: path.basename(job.filePath),
+    pagesTotal: job.pagesTotal,
+    pagesDone: job.pagesDone,
+    queuePosition: job.status === 'queued' ? pending.findIndex((p) => p.job === job) + 1 : null,
+    createdAt: job.createdAt,
+    startedAt: job.startedAt,
+    finishedAt: job.finishedAt,
+    durationMs: job.durationMs,
+    error: job.error,
+    meta: job.meta,
+  };
+  if (withText && job.status === 'done') view.text = job.text;
+  return view;
+}
+
+/**
+ * Met un fichier (image ou PDF scanné) en file d'OCR.
+ * @param {Object} params
+ * @param {string} params.filePath
+ * @param {Object} [params.meta] - informations libres (table, id du courrier…)
+ * @param {(filePath: string) => Promise<string>} [params.textLayer] - extraction de la couche
+ *        texte d'un PDF, essayée avant l'OCR
+ * @returns {{id: string, promise: Promise<string>}} promise : texte reconnu
+ * @throws {Error} status 503 si la file est pleine
+ */
+function submitOcrJob({ filePath, meta = null, textLayer = null }) {
+  sweepJobs();
+  if (pending.length >= OCR_QUEUE_MAX) {
+    const err = new Error(`File OCR saturée (${OCR_QUEUE_MAX} travaux en attente)`);
+    err.status = 503;
+    throw err;
+  }
+
+  const job = {
+    id: crypto.randomUUID(),
+    filePath: path.resolve(filePath),
+    meta,
+    textLayer,
+    source: null,
+    status: 'queued',
+    pagesTotal: null,
+    pagesDone: 0,
+    text: null,
+    error: null,
+    createdAt: new Date().toISOString(),
+    startedAt: null,
+    finishedAt: null,
+    durationMs: null,
+  };
+  jobs.set(job.id, job);
+
+  const promise = new Promise((resolve, reject) => {
+    pending.push({ job, resolve, reject });
+  });
+  // Erreur consultable via getOcrJob : pas de rejet non géré si personne n'attend
+  promise.catch(() => {});
+  drain();
+  return { id: job.id, promise };
+}
+
+/**
+ * OCR d'un fichier en attendant le résultat (même file que les travaux en arrière-plan).
+ * @returns {Promise<string>}
+ */
+function recognizeFile(filePath) {
+  return submitOcrJob({ filePath }).promise;
+}
+
+function getOcrJob(id, options) {
+  sweepJobs();
+  const job = jobs.get(id);
+  return job ? publicJob(job, options) : null;
+}
+
+function getOcrPoolStats() {
+  return {
+    workers: OCR_WORKERS,
+    ready: poolReady,
+    running,
+    queued: pending.length,
+    queueMax: OCR_QUEUE_MAX,
+    trackedJobs: jobs.size,
+  };
+}
+
+module.exports = {
+  startOcrPool,
+  stopOcrPool,
+  isOcrCandidate,
+  submitOcrJob,
+  recognizeFile,
+  getOcrJob,
+  getOcrPoolStats,
+};
@@ -73,6 +73,27 @@ const securityEventsTotal = new promClient.Counter({
   registers: [register]
 });
 
+const embeddingCacheLookupsTotal = new promClient.Counter({
+  name: 'embedding_cache_lookups_total',
+  help: 'Recherches dans le cache d\'embeddings',
+  labelNames: ['layer', 'result'], // 'memory', 'sqlite' / 'hit', 'miss'
+  registers: [register]
+});
+
+const searchCacheLookupsTotal = new promClient.Counter({
+  name: 'search_cache_lookups_total',
+  help: 'Recherches dans le cache de résultats de recherche',
+  labelNames: ['kind', 'result'], // 'search', 'hybrid', 'memory'… / 'hit', 'miss'
+  registers: [register]
+});
+
+const pdfTextCacheLookupsTotal = new promClient.Counter({
+  name: 'pdf_text_cache_lookups_total',
+  help: 'Recherches dans le cache de texte PDF (par sha256)',
+  labelNames: ['result'], // 'hit', 'miss'
+  registers: [register]
+});
+
 // 📉 Jauges (Gauges) - Valeurs qui peuvent monter/descendre
 
 const activeUsers = new promClient.Gauge({
@@ -93,6 +114,32 @@ const uploadQueueSize = new promClient.Gauge({
   registers: [register]
 });
 
+const embeddingCacheHitRatio = new promClient.Gauge({
+  name: 'embedding_cache_hit_ratio',
+  help: 'Taux de succès du cache d\'embeddings depuis le démarrage',
+  labelNames: ['layer'], // 'memory', 'sqlite'
+  registers: [register]
+});
+
+const searchCacheHitRatio = new promClient.Gauge({
+  name: 'search_cache_hit_ratio',
+  help: 'Taux de succès du cache de résultats de recherche depuis le démarrage',
+  labelNames: ['kind'],
+  registers: [register]
+});
+
+const searchCacheEntries = new promClient.Gauge({
+  name: 'search_cache_entries',
+  help: 'Entrées du cache de résultats de recherche',
+  registers: [register]
+});
+
+const searchCacheBytes = new promClient.Gauge({
+  name: 'search_cache_bytes',
+  help: 'Taille estimée du cache de résultats de recherche (octets)',
+  registers: [register]
+});
+
 // ⏱️ Histogrammes (Histograms) - Distribution des valeurs
 
 const httpRequestDuration = new promClient.Histogram({
@@ -135,6 +182,21 @@ const fileSizeBytes = new promClient.Histogram({
   registers: [register]
 });
 
+const pdfPageExtractionDuration = new promClient.Histogram({
+  name: 'pdf_page_extraction_seconds',
+  help: 'Durée d\'extraction du texte d\'une page PDF (worker) en secondes',
+  buckets: [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+  registers: [register]
+});
+
+const jwtVerificationDuration = new promClient.Histogram({
+  name: 'jwt_verification_seconds',
+  help: 'Coût de l\'authentification JWT par requête en secondes',
+  labelNames: ['result'], // 'cache_hit', 'verified', 'rejected'
+  buckets: [0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01],
+  registers: [register]
+});
+
 // 📊 Résumés (Summaries) - Quantiles de distribution
 
 const apiResponseTime = new promClient.Summary({
@@ -240,6 +302,44 @@ function recordFileSize(type, sizeBytes) {
   fileSizeBytes.labels(type).observe(sizeBytes);
 }
 
+const embeddingCacheTotals = {};
+
+function recordEmbeddingCacheLookup(layer, hits, misses) {
+  if (hits) embeddingCacheLookupsTotal.labels(layer, 'hit').inc(hits);
+  if (misses) embeddingCacheLookupsTotal.labels(layer, 'miss').inc(misses);
+  const totals = embeddingCacheTotals[layer] || (embeddingCacheTotals[layer] = { hits: 0, lookups: 0 });
+  totals.hits += hits;
+  totals.lookups += hits + misses;
+  if (totals.lookups) embeddingCacheHitRatio.labels(layer).set(totals.hits / totals.lookups);
+}
+
+const searchCacheTotals = {};
+
+function recordSearchCacheLookup(kind, hit) {
+  searchCacheLookupsTotal.labels(kind, hit ? 'hit' : 'miss').inc();
+  const totals = searchCacheTotals[kind] || (searchCacheTotals[kind] = { hits: 0, lookups: 0 });
+  if (hit) totals.hits += 1;
+  totals.lookups += 1;
+  searchCacheHitRatio.labels(kind).set(totals.hits / totals.lookups);
+}
+
+function setSearchCacheSize(entries, bytes) {
+  searchCacheEntries.set(entries);
+  searchCacheBytes.set(bytes);
+}
+
+function recordPdfPageExtraction(seconds) {
+  pdfPageExtractionDuration.observe(seconds);
+}
+
+function recordPdfTextCacheLookup(hit) {
+  pdfTextCacheLookupsTotal.labels(hit ? 'hit' : 'miss').inc();
+}
+
+function recordJwtVerification(result, seconds) {
+  jwtVerificationDuration.labels(result).observe(seconds);
+}
+
 function setActiveUsers(count) {
   activeUsers.set(count);
 }
@@ -270,6 +370,12 @@ module.exports = {
   recordMinioOperation,
   recordSecurityEvent,
   recordFileSize,
+  recordEmbeddingCacheLookup,
+  recordSearchCacheLookup,
+  setSearchCacheSize,
+  recordPdfPageExtraction,
+  recordPdfTextCacheLookup,
+  recordJwtVerification,
   setActiveUsers,
   setUploadQueueSize,
   
@@ -48,7 +48,8 @@ module.exports = function aiQueryRoutes({
     }
 
     try {
-      const vectorContext = await queryMemoryStore(question);
+      const memories = await queryMemoryStore(question);
+      const vectorContext = memories.map((memory) => memory.content).join('\n---\n');
       const pdfContent = await getAllPDFContent();
 
       const prompt = `
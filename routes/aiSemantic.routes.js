@@ -137,6 +137,7 @@ module.exports = function aiSemanticRoutes({
         type,
         startDate,
         endDate,
+        exact: req.query.mode === 'exact',
       });
 
       return res.json({
@@ -5,9 +5,11 @@ const {
   getArchivesPublic,
   getArchivesAll,
   listArchives,
+  archivesExportQuery,
   getArchiveCounts,
   getArchiveAnnexes,
 } = require('../services/archives.service');
+const { resolveExportFormat, wantsGzip, streamQuery } = require('../utils/streamExport');
 
 module.exports = function archivesRoutes({
   authenticateToken,
@@ -112,6 +114,31 @@ module.exports = function archivesRoutes({
     }
   });
 
+  // Export du registre des archives en flux (NDJSON ou CSV, gzip optionnel), mémoire constante
+  router.get('/archives/export', authenticateToken, archivesListValidator, validate, async (req, res, next) => {
+    const format = resolveExportFormat(req);
+    if (!format) {
+      return res.status(400).json({ error: 'Format invalide (ndjson ou csv).' });
+    }
+    const { service, category, type, status, year } = req.query;
+    const { sql, params } = archivesExportQuery({ service, category, type, status, year });
+    const startedAt = Date.now();
+
+    try {
+      const { rows, aborted } = await streamQuery(db, res, {
+        sql,
+        params,
+        format,
+        gzip: wantsGzip(req),
+        filename: `registre-archives${year ? `-${year}` : ''}`,
+      });
+      console.log(`📤 Export archives (${format}): ${rows} lignes en ${Date.now() - startedAt} ms${aborted ? ' (interrompu)' : ''}`);
+    } catch (err) {
+      console.error('❌ Erreur export archives:', err.message);
+      if (!res.headersSent) return next(err);
+    }
+  });
+
   router.get('/archives/search', authenticateToken, (req, res) => {
     const { q } = req.query;
     const sql = `
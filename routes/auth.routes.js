@@ -3,6 +3,8 @@ const jwt = require('jsonwebtoken');
 const rateLimit = require('express-rate-limit');
 
 const validate = require('../middlewares/validate');
+// kid dans l'en-tête : authenticateToken vérifie avec la bonne clé sans essayer les autres
+const { keyIdFor } = require('../middlewares/authenticateToken');
 const { loginValidator, registerValidator, refreshValidator } = require('../validators/auth.validators');
 const {
   createUserAsAdmin,
@@ -57,12 +59,6 @@ module.exports = function authRoutes({
     try {
       const user = await loginUser({ db, email, username, password });
 
-      const token = jwt.sign(
-        { id: user.id, username: user.username, role_id: user.role_id },
-        jwtSecret,
-        { expiresIn: '1h' },
-      );
-
       const refresh = await issueRefreshToken({
         db,
         userId: user.id,
@@ -71,6 +67,12 @@ module.exports = function authRoutes({
         userAgent: req.headers['user-agent'],
       });
 
+      const token = jwt.sign(
+        { id: user.id, username: user.username, role_id: user.role_id, sid: refresh.session_id },
+        jwtSecret,
+        { expiresIn: '1h', keyid: keyIdFor(jwtSecret) },
+      );
+
       const frontendRole = getFrontendRole(user.role_id);
       const permissions = getPermissions(user.role_id);
       const uiConfig = getUIConfig(user.role_id);
@@ -113,9 +115,9 @@ module.exports = function authRoutes({
       });
 
       const token = jwt.sign(
-        { id: user.id, username: user.username, role_id: user.role_id },
+        { id: user.id, username: user.username, role_id: user.role_id, sid: rotated.refresh.session_id },
         jwtSecret,
-        { expiresIn: '1h' },
+        { expiresIn: '1h', keyid: keyIdFor(jwtSecret) },
       );
 
       return res.json({
@@ -131,7 +133,11 @@ module.exports = function authRoutes({
   router.post('/logout', refreshLimiter, refreshValidator, validate, async (req, res, next) => {
     const { refresh_token } = req.body || {};
     try {
-      await revokeRefreshToken({ db, refreshToken: refresh_token });
+      const revoked = await revokeRefreshToken({ db, refreshToken: refresh_token });
+      // Tokens d'accès de cette session seule : refusés et retirés du cache
+      if (revoked && revoked.session_id && typeof authenticateToken.revokeSessionTokens === 'function') {
+        authenticateToken.revokeSessionTokens(revoked.session_id);
+      }
       return res.json({ success: true });
     } catch (e) {
       return next(e);
@@ -3,8 +3,14 @@ const express = require('express');
 module.exports = function dashboardAiRoutes({ authenticateToken, axios }) {
   const router = express.Router();
 
+  // Propage l'identifiant de requête (middlewares/requestLogger.js) à l'agent Flask
+  const traceHeaders = (req) => {
+    const id = req.id || req.headers['x-request-id'];
+    return id ? { 'X-Request-ID': id } : {};
+  };
+
   router.post('/dashboard/ai', authenticateToken, async (req, res) => {
-    const { query, filters = {} } = req.body || {};
+    const { query, filters = {}, async_comment } = req.body || {};
 
     const user = req.user || {};
 
@@ -22,8 +28,11 @@ module.exports = function dashboardAiRoutes({ authenticateToken, axios }) {
         userContext,
         filters,
       };
+      if (async_comment !== undefined) payload.async_comment = Boolean(async_comment);
 
-      const response = await axios.post('http://127.0.0.1:5000/dashboard-ai', payload);
+      const response = await axios.post('http://127.0.0.1:5000/dashboard-ai', payload, {
+        headers: traceHeaders(req),
+      });
 
       if (!response.data) {
         return res.status(500).json({ error: 'Réponse IA invalide' });
@@ -36,5 +45,69 @@ module.exports = function dashboardAiRoutes({ authenticateToken, axios }) {
     }
   });
 
+  // Plusieurs groupes de widgets en un appel : un seul snapshot côté Flask
+  router.post('/dashboard/ai/batch', authenticateToken, async (req, res) => {
+    const { queries, filters = {}, async_comment } = req.body || {};
+
+    if (!Array.isArray(queries) || queries.length === 0) {
+      return res.status(400).json({ error: 'queries doit être une liste non vide' });
+    }
+
+    const user = req.user || {};
+
+    const userContext = {
+      id: user.id || user.user_id || null,
+      email: user.email || null,
+      role: user.role || user.profil || 'Utilisateur',
+      service: user.service || user.service_name || null,
+      fullName: user.fullName || user.nom_complet || user.username || 'Utilisateur',
+    };
+
+    try {
+      const payload = { queries, userContext, filters };
+      if (async_comment !== undefined) payload.async_comment = Boolean(async_comment);
+
+      const response = await axios.post('http://127.0.0.1:5000/dashboard-ai/batch', payload, {
+        headers: traceHeaders(req),
+        validateStatus: (status) => status < 500,
+      });
+
+      res.status(response.status).json(response.data);
+    } catch (err) {
+      console.error('Erreur IA /api/dashboard/ai/batch:', err.message);
+      res.status(500).json({ error: err.message });
+    }
+  });
+
+  // Séries KPI (jour/semaine/mois) lues depuis kpi_daily_rollup
+  router.get('/dashboard/ai/series', authenticateToken, async (req, res) => {
+    try {
+      const { period, days, service } = req.query || {};
+      const response = await axios.get('http://127.0.0.1:5000/dashboard-ai/series', {
+        params: { period, days, service },
+        headers: traceHeaders(req),
+        validateStatus: (status) => status < 600,
+      });
+      res.status(response.status).json(response.data);
+    } catch (err) {
+      console.error('Erreur IA /api/dashboard/ai/series:', err.message);
+      res.status(500).json({ error: err.message });
+    }
+  });
+
+  // Polling du commentaire IA enrichi quand /dashboard/ai a répondu en mode asynchrone
+  router.get('/dashboard/ai/comments/:id', authenticateToken, async (req, res) => {
+    try {
+      const response = await axios.get(
+        `http://127.0.0.1:5000/dashboard-ai/comments/${encodeURIComponent(req.params.id)}`,
+        { headers: traceHeaders(req), validateStatus: (status) => status < 500 },
+      );
+      res.status(response.status).json(response.data);
+    } catch (err) {
+      console.error('Erreur IA /api/dashboard/ai/comments:', err.message);
+      res.status(500).json({ error: err.message });
+    }
+  });
+
   return router;
 };
@@ -6,7 +6,7 @@ module.exports = function extractPdfRoutes({
   openai,
   path,
   fsPromises,
-  PDFParse,
+  extractTextFromPDF,
   extractTextWithOCR,
   calculateFileHash,
   baseDir,
@@ -34,11 +34,7 @@ module.exports = function extractPdfRoutes({
     };
 
     try {
-      const buffer = await fsPromises.readFile(filePath);
-
-      const parser = new PDFParse({ data: buffer });
-      const pdfData = await parser.getText();
-      let rawText = (pdfData.text || '').trim();
+      let rawText = await extractTextFromPDF(filePath);
 
       if (!rawText) {
         console.log('⚙️ Aucun texte natif trouvé, lancement OCR...');
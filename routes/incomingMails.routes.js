@@ -1,6 +1,19 @@
 const express = require('express');
 const fs = require('fs');
 const path = require('path');
+const { searchMails, MAX_SEARCH_LIMIT } = require('../services/search.service');
+const {
+  MAX_PAGE_SIZE,
+  parseListFields,
+  decodeCursor,
+  listIncomingMails,
+  countIncomingMails,
+  incomingMailsExportQuery,
+} = require('../services/incomingMailsList.service');
+const { resolveExportFormat, wantsGzip, streamQuery } = require('../utils/streamExport');
+const { MAIL_SEARCH_SOURCES, searchScope, cachedSearch } = require('../services/searchCache.service');
+const { isOcrCandidate, submitOcrJob } = require('../modules/intelligence/ocrPool');
+const { extractTextFromPDF } = require('../utils/pdf');
 
 module.exports = function createIncomingMailsRoutes({
   db,
@@ -311,8 +324,33 @@ module.exports = function createIncomingMailsRoutes({
         type: body.type_courrier,
       };
 
-      analyzeDocumentAsync(db, 'incoming_mails', mailId, extractedText, metadata)
-        .catch((err) => console.error('❌ Erreur analyse IA:', err));
+      // Scan sans texte fourni : OCR en arrière-plan (pool de workers), l'acquisition répond tout de suite
+      let ocrJobId = null;
+      if (!extractedText.trim() && mainFilePath && isOcrCandidate(mainFilePath, req.files[0].mimetype)) {
+        try {
+          const job = submitOcrJob({
+            filePath: mainFilePath,
+            meta: { table: 'incoming_mails', id: mailId, userId: req.user?.id || null },
+            textLayer: extractTextFromPDF,
+          });
+          ocrJobId = job.id;
+          job.promise
+            .then(async (text) => {
+              if (!text || !text.trim()) return;
+              await dbRun(
+                "UPDATE incoming_mails SET extracted_text = ? WHERE id = ? AND (extracted_text IS NULL OR extracted_text = '')",
+                [text, mailId],
+              );
+              await analyzeDocumentAsync(db, 'incoming_mails', mailId, text, metadata);
+            })
+            .catch((err) => console.error(`❌ OCR acquisition courrier ${mailId}:`, err.message));
+        } catch (err) {
+          console.warn(`⚠️ OCR non planifié pour le courrier ${mailId}:`, err.message);
+        }
+      } else {
+        analyzeDocumentAsync(db, 'incoming_mails', mailId, extractedText, metadata)
+          .catch((err) => console.error('❌ Erreur analyse IA:', err));
+      }
 
       notifyMailStatusChange(mailId, 'Acquis', null, {})
         .catch((err) => console.error('❌ Erreur notification acquisition:', err));
@@ -325,6 +363,7 @@ module.exports = function createIncomingMailsRoutes({
         numero_acquisition: numeroAcquisition,
         reference,
         annexesCount,
+        ocr_job_id: ocrJobId,
       });
     } catch (error) {
       console.error('❌ Erreur POST /api/mails/incoming:', error.message);
@@ -332,157 +371,19 @@ module.exports = function createIncomingMailsRoutes({
     }
   });
 
-  // Route de récupération de tous les courriers (GET)
-  router.get('/mails/incoming', authenticateToken, (req, res) => {
-    console.log('🔍 Route /api/mails/incoming appelée');
-    console.log('🔍 Query params:', req.query);
-
+  /**
+   * Filtres de la liste des courriers entrants (statut, service, assignation)
+   * et restrictions de lecture liées au rôle, communs à la liste et à l'export.
+   * @returns {{conditions: string[], params: Array, statuses: string[]|null}|{error: {status: number, message: string}}}
+   */
+  function incomingListFilters(req) {
     const statusFilter = req.query.status || req.query.statut_global;
-    const searchTerm = req.query.search;
     const assignedServiceFilter = req.query.assigned_service || req.query.service;
     const assignedToQuery = req.query.assigned_to;
 
     const isPrivilegedRead = req.user && (req.user.role_id === 1 || req.user.role_id === 2 || req.user.role_id === 7);
     const expectedSvc = getExpectedServiceForRole(req.user?.role_id);
 
-    if (searchTerm) {
-      console.log(`🔍 Recherche demandée: "${searchTerm}"`);
-      const searchPattern = `%${searchTerm}%`;
-      const sql = `
-        SELECT 
-          id, ref_code, subject, sender, recipient, 
-          mail_date, 
-          date_reception AS arrival_date,  
-          statut_global AS status, 
-          file_path, 
-          summary,
-          id_type_document, 
-          is_mission_doc, 
-          mission_reference, 
-          date_retour_mission,
-          classeur,
-          'incoming' as source
-        FROM incoming_mails
-        WHERE ref_code LIKE ? OR subject LIKE ? OR sender LIKE ? OR recipient LIKE ? OR extracted_text LIKE ?
-
-        UNION ALL
-
-        SELECT 
-          incoming_mail_id as id,
-          reference as ref_code,
-          description as subject,
-          sender as sender,
-          '' as recipient,
-          date as mail_date,
-          date as arrival_date,
-          status as status,
-          file_path,
-          summary as summary,
-          NULL as id_type_document,
-          0 as is_mission_doc,
-          '' as mission_reference,
-          NULL as date_retour_mission,
-          classeur,
-          'archived' as source
-        FROM archives
-        WHERE (reference LIKE ? OR description LIKE ? OR category LIKE ?)
-          AND incoming_mail_id IS NOT NULL
-
-        UNION ALL
-
-        SELECT
-          id,
-          COALESCE(reference_unique, 'CS-' || id) as ref_code,
-          objet as subject,
-          '' as sender,
-          destinataire as recipient,
-          COALESCE(date_edition, substr(created_at, 1, 10)) as mail_date,
-          COALESCE(date_edition, substr(created_at, 1, 10)) as arrival_date,
-          statut as status,
-          COALESCE(original_file_path, preview_pdf, '') as file_path,
-          COALESCE(extracted_text, '') as summary,
-          NULL as id_type_document,
-          0 as is_mission_doc,
-          '' as mission_reference,
-          NULL as date_retour_mission,
-          '' as classeur,
-          'outgoing' as source
-        FROM courriers_sortants
-        WHERE objet LIKE ? OR destinataire LIKE ? OR extracted_text LIKE ?
-
-        UNION ALL
-
-        SELECT 
-          id,
-          'OUT-' || id as ref_code,
-          subject,
-          '' as sender,
-          recipient,
-          mail_date as mail_date,
-          mail_date as arrival_date,
-          status,
-          file_path,
-          content as summary,
-          NULL as id_type_document,
-          0 as is_mission_doc,
-          '' as mission_reference,
-          NULL as date_retour_mission,
-          '' as classeur,
-          'outgoing_legacy' as source
-        FROM outgoing_mails
-        WHERE subject LIKE ? OR recipient LIKE ? OR content LIKE ?
-
-        ORDER BY arrival_date DESC
-        LIMIT 50
-      `;
-
-      const params = [
-        searchPattern, searchPattern, searchPattern, searchPattern, searchPattern,
-        searchPattern, searchPattern, searchPattern,
-        searchPattern, searchPattern, searchPattern,
-        searchPattern, searchPattern, searchPattern,
-      ];
-
-      console.log('🔍 Exécution SQL avec paramètres:', params);
-
-      db.all(sql, params, (err, rows) => {
-        if (err) {
-          console.error('❌ Erreur SQL recherche:', err.message);
-          console.error('❌ Code erreur:', err.code);
-          console.error('❌ Errno:', err.errno);
-          return res.status(500).json({ error: 'Erreur serveur lors de la recherche.' });
-        }
-        console.log(`✅ Recherche "${searchTerm}": ${rows.length} résultats trouvés.`);
-        return res.json(rows);
-      });
-      return;
-    }
-
-    let sql = `
-      SELECT 
-        id, ref_code, subject, sender, recipient, 
-        mail_date, 
-        date_reception AS arrival_date,  
-        statut_global AS status, 
-        file_path, 
-        summary,
-        comment,
-        assigned_service,
-        assigned_to,
-        id_type_document, 
-        is_mission_doc, 
-        mission_reference, 
-        date_retour_mission,
-        classeur,
-        qr_code_path,
-        ar_pdf_path,
-        response_required,
-        response_due,
-        response_outgoing_id,
-        response_created_at
-      FROM incoming_mails
-    `;
-
     const params = [];
     const conditions = [];
 
@@ -496,7 +397,7 @@ module.exports = function createIncomingMailsRoutes({
     if (assignedServiceFilter) {
       const requestedService = String(assignedServiceFilter).trim().toUpperCase();
       if (!requestedService) {
-        return res.status(400).json({ error: 'assigned_service invalide.' });
+        return { error: { status: 400, message: 'assigned_service invalide.' } };
       }
 
       if (!isPrivilegedRead) {
@@ -511,7 +412,7 @@ module.exports = function createIncomingMailsRoutes({
         };
         const allowed = allowedByRole[roleId] || [];
         if (!allowed.includes(requestedService)) {
-          return res.status(403).json({ error: 'Accès interdit: filtre service non autorisé.' });
+          return { error: { status: 403, message: 'Accès interdit: filtre service non autorisé.' } };
         }
       }
 
@@ -546,31 +447,137 @@ module.exports = function createIncomingMailsRoutes({
       const wanted = String(assignedToQuery).trim();
       const targetUsername = wanted.toLowerCase() === 'me' ? (req.user?.username || '') : wanted;
       if (!targetUsername) {
-        return res.status(400).json({ error: 'assigned_to invalide.' });
+        return { error: { status: 400, message: 'assigned_to invalide.' } };
       }
       const effective = isPrivilegedReadLocal ? targetUsername : (req.user?.username || '');
       if (!effective) {
-        return res.status(400).json({ error: 'assigned_to invalide.' });
+        return { error: { status: 400, message: 'assigned_to invalide.' } };
       }
       conditions.push('assigned_to = ?');
       params.push(effective);
     }
 
-    if (conditions.length > 0) {
-      sql += ` WHERE ${conditions.join(' AND ')}`;
+    return {
+      conditions,
+      params,
+      statuses: statusFilter ? statusFilter.split(',').map((s) => s.trim()) : null,
+    };
+  }
+
+  // Route de récupération de tous les courriers (GET)
+  router.get('/mails/incoming', authenticateToken, (req, res) => {
+    console.log('🔍 Route /api/mails/incoming appelée');
+    console.log('🔍 Query params:', req.query);
+
+    const searchTerm = req.query.search;
+
+    if (searchTerm) {
+      console.log(`🔍 Recherche demandée: "${searchTerm}"`);
+      const limit = Math.min(parseInt(req.query.limit, 10) || 50, MAX_SEARCH_LIMIT);
+      const page = Math.max(parseInt(req.query.page, 10) || 1, 1);
+
+      cachedSearch({
+        db,
+        kind: 'incoming',
+        scope: searchScope(req.user),
+        term: searchTerm,
+        options: { limit, offset: (page - 1) * limit },
+        sources: MAIL_SEARCH_SOURCES,
+        compute: (term) => searchMails({ db, term, limit, offset: (page - 1) * limit }),
+      })
+        .then(({ rows, total, engine }) => {
+          console.log(`✅ Recherche "${searchTerm}" (${engine}): ${rows.length} résultats trouvés.`);
+          if (total !== null) res.set('X-Total-Count', String(total));
+          return res.json(rows);
+        })
+        .catch((err) => {
+          console.error('❌ Erreur SQL recherche:', err.message);
+          console.error('❌ Code erreur:', err.code);
+          console.error('❌ Errno:', err.errno);
+          return res.status(500).json({ error: 'Erreur serveur lors de la recherche.' });
+        });
+      return;
     }
 
-    sql += ' ORDER BY date_reception DESC';
+    const { fields, unknown } = parseListFields(req.query.fields);
+    if (unknown.length) {
+      return res.status(400).json({ error: `Champs inconnus: ${unknown.join(', ')}` });
+    }
+    const cursor = req.query.cursor ? decodeCursor(req.query.cursor) : null;
+    if (req.query.cursor && !cursor) {
+      return res.status(400).json({ error: 'Curseur invalide.' });
+    }
+    // Pagination par curseur si demandée (limit ou cursor) ; sinon liste complète (clients historiques)
+    const paginated = req.query.limit !== undefined || Boolean(cursor);
+    const limit = paginated ? Math.min(parseInt(req.query.limit, 10) || 50, MAX_PAGE_SIZE) : null;
 
-    db.all(sql, params, (err, rows) => {
-      if (err) {
+    const filters = incomingListFilters(req);
+    if (filters.error) {
+      return res.status(filters.error.status).json({ error: filters.error.message });
+    }
+    const { conditions, params, statuses } = filters;
+    const statusOnly = conditions.length === (statuses ? 1 : 0);
+
+    Promise.all([
+      listIncomingMails(db, { conditions, params, fields, limit, cursor }),
+      // Total calculé sur la première page seulement
+      paginated && !cursor ? countIncomingMails(db, { conditions, params, statuses, statusOnly }) : null,
+    ])
+      .then(([{ rows, nextCursor }, count]) => {
+        if (paginated) {
+          if (nextCursor) res.set('X-Next-Cursor', nextCursor);
+          if (count) {
+            res.set('X-Total-Count', String(count.total));
+            if (count.estimated) res.set('X-Total-Count-Estimated', 'true');
+          }
+        }
+        console.log(`📦 Données renvoyées à Vue: ${rows.length} lignes.`);
+        return res.json(rows);
+      })
+      .catch((err) => {
         console.error('Erreur SQL lors de la récupération des courriers entrants :', err.message);
         return res.status(500).json({ error: 'Erreur serveur lors du chargement des courriers.' });
-      }
+      });
+  });
 
-      console.log(`📦 Données renvoyées à Vue: ${rows.length} lignes.`);
-      return res.json(rows);
-    });
+  // Export du registre des courriers entrants en flux (NDJSON ou CSV, gzip optionnel).
+  // Mêmes filtres et restrictions de rôle que la liste ; période : year ou startDate/endDate.
+  router.get('/mails/incoming/export', authenticateToken, async (req, res) => {
+    const format = resolveExportFormat(req);
+    if (!format) {
+      return res.status(400).json({ error: 'Format invalide (ndjson ou csv).' });
+    }
+    const { fields, unknown } = parseListFields(req.query.fields);
+    if (unknown.length) {
+      return res.status(400).json({ error: `Champs inconnus: ${unknown.join(', ')}` });
+    }
+    const { year, startDate, endDate } = req.query;
+    const isDate = (value) => /^\d{4}-\d{2}-\d{2}$/.test(String(value));
+    if ((year && !/^\d{4}$/.test(String(year))) || (startDate && !isDate(startDate)) || (endDate && !isDate(endDate))) {
+      return res.status(400).json({ error: 'Période invalide (year=AAAA, startDate/endDate=AAAA-MM-JJ).' });
+    }
+    const filters = incomingListFilters(req);
+    if (filters.error) {
+      return res.status(filters.error.status).json({ error: filters.error.message });
+    }
+
+    const { sql, params } = incomingMailsExportQuery({ ...filters, fields, year, startDate, endDate });
+    const startedAt = Date.now();
+    try {
+      const { rows, aborted } = await streamQuery(db, res, {
+        sql,
+        params,
+        format,
+        gzip: wantsGzip(req),
+        filename: `registre-courriers-entrants${year ? `-${year}` : ''}`,
+      });
+      console.log(`📤 Export courriers entrants (${format}): ${rows} lignes en ${Date.now() - startedAt} ms${aborted ? ' (interrompu)' : ''}`);
+    } catch (err) {
+      console.error('❌ Erreur export courriers entrants:', err.message);
+      if (!res.headersSent) {
+        return res.status(500).json({ error: "Erreur serveur lors de l'export des courriers." });
+      }
+    }
   });
 
   router.put('/mails/incoming/:id/complete-treatment', authenticateToken, async (req, res) => {
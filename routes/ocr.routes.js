@@ -0,0 +1,52 @@
+const express = require('express');
+const { submitOcrJob, getOcrJob, getOcrPoolStats } = require('../modules/intelligence/ocrPool');
+const { extractTextFromPDF } = require('../utils/pdf');
+const { releaseUploadedFile } = require('../utils/blobStorage');
+
+module.exports = function ocrRoutes({ authenticateToken, upload }) {
+  const router = express.Router();
+
+  // Dépôt d'un fichier à reconnaître : réponse immédiate (202) avec l'identifiant du travail
+  router.post('/ocr/jobs', authenticateToken, upload.single('file'), (req, res) => {
+    if (!req.file) {
+      return res.status(400).json({ error: 'Aucun fichier fourni.' });
+    }
+    try {
+      const filePath = req.file.path;
+      const { id, promise } = submitOcrJob({
+        filePath,
+        meta: { originalName: req.file.originalname, userId: req.user?.id || null },
+        textLayer: extractTextFromPDF,
+      });
+      // Fichier déposé pour ce seul travail : libéré dès la fin (le texte reste dans le suivi)
+      promise
+        .catch(() => {})
+        .then(() => releaseUploadedFile(filePath, (err) => {
+          if (err && err.code !== 'ENOENT') console.warn('⚠️ Suppression upload OCR:', err.message);
+        }));
+      return res.status(202).location(`/api/ocr/jobs/${id}`).json(getOcrJob(id));
+    } catch (err) {
+      console.error('❌ Erreur mise en file OCR:', err.message);
+      releaseUploadedFile(req.file.path);
+      return res.status(err.status || 500).json({ error: err.message });
+    }
+  });
+
+  router.get('/ocr/jobs/:id', authenticateToken, (req, res) => {
+    const job = getOcrJob(req.params.id, { withText: req.query.text !== '0' });
+    // Texte reconnu réservé à l'auteur du dépôt (ou lecture privilégiée) : 404 plutôt que 403,
+    // l'existence d'un identifiant de travail n'est pas révélée
+    const isPrivilegedRead = req.user && (req.user.role_id === 1 || req.user.role_id === 2 || req.user.role_id === 7);
+    const ownerId = job && job.meta ? job.meta.userId : null;
+    if (!job || (!isPrivilegedRead && (ownerId == null || String(ownerId) !== String(req.user?.id)))) {
+      return res.status(404).json({ error: 'Travail OCR introuvable ou expiré.' });
+    }
+    return res.json(job);
+  });
+
+  router.get('/ocr/status', authenticateToken, (req, res) => {
+    res.json(getOcrPoolStats());
+  });
+
+  return router;
+};
@@ -1,4 +1,36 @@
 const express = require('express');
+const { MAIL_SEARCH_SELECTS, MAX_SEARCH_LIMIT, searchMails } = require('../services/search.service');
+const { hybridSearch } = require('../services/hybridSearch.service');
+const {
+  MAIL_SEARCH_SOURCES,
+  HYBRID_SEARCH_SOURCES,
+  searchScope,
+  cachedSearch,
+} = require('../services/searchCache.service');
+
+// Archives : la catégorie tient lieu de statut dans les résultats de recherche
+const SEARCH_SELECTS = {
+  ...MAIL_SEARCH_SELECTS,
+  archives: {
+    ...MAIL_SEARCH_SELECTS.archives,
+    select: `m.incoming_mail_id as id,
+      m.reference as ref_code,
+      m.description as subject,
+      '' as sender,
+      '' as recipient,
+      m.date as mail_date,
+      m.date as arrival_date,
+      m.category as status,
+      m.file_path,
+      '' as summary,
+      NULL as id_type_document,
+      0 as is_mission_doc,
+      '' as mission_reference,
+      NULL as date_retour_mission,
+      m.classeur,
+      'archived' as source`,
+  },
+};
 
 module.exports = function searchRoutes({ authenticateToken, db }) {
   const router = express.Router();
@@ -13,119 +45,15 @@ module.exports = function searchRoutes({ authenticateToken, db }) {
     }
 
     console.log(`🔍 Recherche IA demandée: "${searchTerm}"`);
-    const searchPattern = `%${searchTerm}%`;
-
-    const sql = `
-        SELECT
-            id, ref_code, subject, sender, recipient,
-            mail_date,
-            date_reception AS arrival_date,
-            statut_global AS status,
-            file_path,
-            summary,
-            id_type_document,
-            is_mission_doc,
-            mission_reference,
-            date_retour_mission,
-            classeur,
-            'incoming' as source
-        FROM incoming_mails
-        WHERE ref_code LIKE ? OR subject LIKE ? OR sender LIKE ? OR recipient LIKE ? OR extracted_text LIKE ?
-
-        UNION ALL
-
-        SELECT
-            incoming_mail_id as id,
-            reference as ref_code,
-            description as subject,
-            '' as sender,
-            '' as recipient,
-            date as mail_date,
-            date as arrival_date,
-            category as status,
-            file_path,
-            '' as summary,
-            NULL as id_type_document,
-            0 as is_mission_doc,
-            '' as mission_reference,
-            NULL as date_retour_mission,
-            classeur,
-            'archived' as source
-        FROM archives
-        WHERE (reference LIKE ? OR description LIKE ? OR category LIKE ?)
-        AND incoming_mail_id IS NOT NULL
-
-        UNION ALL
-
-        SELECT
-          id,
-          COALESCE(reference_unique, 'CS-' || id) as ref_code,
-          objet as subject,
-          '' as sender,
-          destinataire as recipient,
-          COALESCE(date_edition, substr(created_at, 1, 10)) as mail_date,
-          COALESCE(date_edition, substr(created_at, 1, 10)) as arrival_date,
-          statut as status,
-          COALESCE(original_file_path, preview_pdf, '') as file_path,
-          COALESCE(extracted_text, '') as summary,
-          NULL as id_type_document,
-          0 as is_mission_doc,
-          '' as mission_reference,
-          NULL as date_retour_mission,
-          '' as classeur,
-          'outgoing' as source
-        FROM courriers_sortants
-        WHERE objet LIKE ? OR destinataire LIKE ? OR extracted_text LIKE ?
-
-        UNION ALL
-
-        SELECT
-          id,
-          'OUT-' || id as ref_code,
-          subject,
-          '' as sender,
-          recipient,
-          mail_date as mail_date,
-          mail_date as arrival_date,
-          status,
-          file_path,
-          content as summary,
-          NULL as id_type_document,
-          0 as is_mission_doc,
-          '' as mission_reference,
-          NULL as date_retour_mission,
-          '' as classeur,
-          'outgoing_legacy' as source
-        FROM outgoing_mails
-        WHERE subject LIKE ? OR recipient LIKE ? OR content LIKE ?
-
-        ORDER BY arrival_date DESC
-        LIMIT 20
-    `;
-
-    const params = [
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-    ];
-
-    db.all(sql, params, async (err, searchResults) => {
-      if (err) {
-        console.error('❌ Erreur SQL recherche IA:', err.message);
-        return res.status(500).json({ error: 'Erreur serveur lors de la recherche IA.' });
-      }
-
+    cachedSearch({
+      db,
+      kind: 'search',
+      scope: searchScope(req.user),
+      term: searchTerm,
+      options: { limit: 20, offset: 0 },
+      sources: MAIL_SEARCH_SOURCES,
+      compute: (term) => searchMails({ db, term, limit: 20, selects: SEARCH_SELECTS }),
+    }).then(async ({ rows: searchResults }) => {
       console.log(`✅ Recherche IA "${searchTerm}": ${searchResults.length} résultats trouvés.`);
 
       if (searchResults.length === 0) {
@@ -202,6 +130,9 @@ Réponds de manière naturelle et conversationnelle, comme si tu discutais avec
           },
         });
       }
+    }).catch((err) => {
+      console.error('❌ Erreur SQL recherche IA:', err.message);
+      return res.status(500).json({ error: 'Erreur serveur lors de la recherche IA.' });
     });
   });
 
@@ -211,121 +142,78 @@ Réponds de manière naturelle et conversationnelle, comme si tu discutais avec
     if (!searchTerm) {
       return res.status(400).json({ error: 'Paramètre search (ou q) requis' });
     }
-    const searchPattern = `%${searchTerm}%`;
-
-    const sql = `
-    SELECT
-      id, ref_code, subject, sender, recipient,
-      mail_date,
-      date_reception AS arrival_date,
-      statut_global AS status,
-      file_path,
-      summary,
-      id_type_document,
-      is_mission_doc,
-      mission_reference,
-      date_retour_mission,
-      classeur,
-      'incoming' as source
-    FROM incoming_mails
-    WHERE ref_code LIKE ? OR subject LIKE ? OR sender LIKE ? OR recipient LIKE ? OR extracted_text LIKE ?
-
-    UNION ALL
-
-    SELECT
-      incoming_mail_id as id,
-      reference as ref_code,
-      description as subject,
-      '' as sender,
-      '' as recipient,
-      date as mail_date,
-      date as arrival_date,
-      category as status,
-      file_path,
-      '' as summary,
-      NULL as id_type_document,
-      0 as is_mission_doc,
-      '' as mission_reference,
-      NULL as date_retour_mission,
-      classeur,
-      'archived' as source
-    FROM archives
-    WHERE (reference LIKE ? OR description LIKE ? OR category LIKE ?)
-    AND incoming_mail_id IS NOT NULL
-
-    UNION ALL
-
-    SELECT
-      id,
-      COALESCE(reference_unique, 'CS-' || id) as ref_code,
-      objet as subject,
-      '' as sender,
-      destinataire as recipient,
-      date_edition as mail_date,
-      date_edition as arrival_date,
-      statut as status,
-      COALESCE(original_file_path, preview_pdf, '') as file_path,
-      COALESCE(extracted_text, '') as summary,
-      NULL as id_type_document,
-      0 as is_mission_doc,
-      '' as mission_reference,
-      NULL as date_retour_mission,
-      '' as classeur,
-      'outgoing' as source
-    FROM courriers_sortants
-    WHERE objet LIKE ? OR destinataire LIKE ? OR extracted_text LIKE ?
-
-    UNION ALL
-
-    SELECT
-      id,
-      'OUT-' || id as ref_code,
-      subject,
-      '' as sender,
-      recipient,
-      mail_date as mail_date,
-      mail_date as arrival_date,
-      status,
-      file_path,
-      content as summary,
-      NULL as id_type_document,
-      0 as is_mission_doc,
-      '' as mission_reference,
-      NULL as date_retour_mission,
-      '' as classeur,
-      'outgoing_legacy' as source
-    FROM outgoing_mails
-    WHERE subject LIKE ? OR recipient LIKE ? OR content LIKE ?
-
-    ORDER BY arrival_date DESC
-    LIMIT 50
-  `;
-
-    const params = [
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-      searchPattern,
-    ];
-
-    db.all(sql, params, (err, rows) => {
-      if (err) {
+    const limit = Math.min(parseInt(req.query.limit, 10) || 50, MAX_SEARCH_LIMIT);
+    const page = Math.max(parseInt(req.query.page, 10) || 1, 1);
+
+    cachedSearch({
+      db,
+      kind: 'search',
+      scope: searchScope(req.user),
+      term: searchTerm,
+      options: { limit, offset: (page - 1) * limit },
+      sources: MAIL_SEARCH_SOURCES,
+      compute: (term) => searchMails({ db, term, limit, offset: (page - 1) * limit, selects: SEARCH_SELECTS }),
+    })
+      .then(({ rows, total, engine }) => {
+        console.log(`✅ Recherche générale "${searchTerm}" (${engine}): ${rows.length} résultats trouvés.`);
+        if (total !== null) res.set('X-Total-Count', String(total));
+        return res.json(rows || []);
+      })
+      .catch((err) => {
         console.error('❌ Erreur SQL recherche générale:', err.message);
         return res.status(500).json({ error: 'Erreur serveur lors de la recherche générale.' });
+      });
+  });
+
+  // Recherche hybride (plein texte + sémantique, fusion RRF) : remplace les deux appels séparés.
+  // Accept: application/x-ndjson → une ligne d'en-tête puis un résultat par ligne.
+  router.get('/search/hybrid', authenticateToken, async (req, res) => {
+    const searchTerm = req.query.q || req.query.search;
+    if (!searchTerm || !searchTerm.trim()) {
+      return res.status(400).json({ error: 'Paramètre q (ou search) requis' });
+    }
+    const limit = Math.min(parseInt(req.query.limit, 10) || 20, MAX_SEARCH_LIMIT);
+    const page = Math.max(parseInt(req.query.page, 10) || 1, 1);
+    const weight = (value) => (Number.isFinite(parseFloat(value)) ? Math.max(parseFloat(value), 0) : undefined);
+
+    const params = {
+      filters: {
+        status: req.query.status,
+        type: req.query.type,
+        startDate: req.query.startDate,
+        endDate: req.query.endDate,
+        tables: req.query.tables ? String(req.query.tables).split(',').filter(Boolean) : undefined,
+      },
+      limit,
+      offset: (page - 1) * limit,
+      weights: { lexical: weight(req.query.lexicalWeight), semantic: weight(req.query.semanticWeight) },
+      threshold: weight(req.query.threshold),
+    };
+
+    try {
+      const { results, hasMore, engines } = await cachedSearch({
+        db,
+        kind: 'hybrid',
+        scope: searchScope(req.user),
+        term: searchTerm,
+        options: params,
+        sources: HYBRID_SEARCH_SOURCES,
+        compute: (term) => hybridSearch({ db, term, ...params }),
+      });
+      console.log(`✅ Recherche hybride "${searchTerm}" (${engines.lexical || '-'} + ${engines.semantic || '-'}): ${results.length} résultats.`);
+
+      const meta = { query: searchTerm, page, limit, hasMore, nextPage: hasMore ? page + 1 : null, engines };
+      if (req.accepts(['json', 'application/x-ndjson']) === 'application/x-ndjson') {
+        res.type('application/x-ndjson');
+        res.write(`${JSON.stringify({ meta })}\n`);
+        for (const result of results) res.write(`${JSON.stringify(result)}\n`);
+        return res.end();
       }
-      console.log(`✅ Recherche générale "${searchTerm}": ${rows.length} résultats trouvés.`);
-      return res.json(rows || []);
-    });
+      return res.json({ ...meta, resultsCount: results.length, results });
+    } catch (err) {
+      console.error('❌ Erreur recherche hybride:', err.message);
+      return res.status(500).json({ error: 'Erreur serveur lors de la recherche hybride.' });
+    }
   });
 
   return router;
@@ -1,4 +1,5 @@
 const express = require('express');
+const { searchScope, cachedSearch } = require('../services/searchCache.service');
 
 module.exports = function searchMemoryRoutes({ authenticateToken, validate, searchMemoryValidator, queryMemoryStore }) {
   const router = express.Router();
@@ -6,7 +7,14 @@ module.exports = function searchMemoryRoutes({ authenticateToken, validate, sear
   router.get('/search-memory', authenticateToken, searchMemoryValidator, validate, async (req, res, next) => {
     try {
       const query = req.query.q;
-      const results = await queryMemoryStore(query);
+      const results = await cachedSearch({
+        db: null,
+        kind: 'memory',
+        scope: searchScope(req.user),
+        term: query,
+        sources: ['memory_vectors'],
+        compute: (term) => queryMemoryStore(term),
+      });
       res.json({ results });
     } catch (err) {
       next(err);
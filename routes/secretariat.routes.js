@@ -17,6 +17,7 @@ const {
   updateSecretariatDocument,
   deleteSecretariatDocument,
 } = require('../services/secretariat.service');
+const { isBlobPath, releaseUploadedFile } = require('../utils/blobStorage');
 
 module.exports = function secretariatRoutes({
   authenticateToken,
@@ -29,8 +30,6 @@ module.exports = function secretariatRoutes({
   baseDir,
   sqlite3,
   dbPath,
-  pdfParse,
-  PDFParse,
   extractTextWithOCR,
   analyzeDocumentAsync,
   analyzeDocument,
@@ -40,7 +39,6 @@ module.exports = function secretariatRoutes({
   const fsLib = fs || require('fs');
   const pathLib = path || require('path');
   const sqlite3Lib = sqlite3 || require('sqlite3').verbose();
-  const pdfParser = pdfParse || PDFParse;
   const rootDir = baseDir || process.cwd();
 
   router.post('/secretariat/upload', authenticateToken, upload.single('file'), (req, res) => {
@@ -324,11 +322,10 @@ module.exports = function secretariatRoutes({
 
       let extractedText = '';
       try {
-        if (!pdfParser) {
-          throw new Error('PDF parser indisponible');
+        extractedText = await extractTextFromPDF(filePath);
+        if (!extractedText) {
+          throw new Error('Aucun texte natif');
         }
-        const data = await pdfParser(fsLib.readFileSync(filePath));
-        extractedText = data.text;
       } catch (extractErr) {
         console.warn('Erreur extraction PDF, tentative OCR:', extractErr.message);
         try {
@@ -712,7 +709,8 @@ module.exports = function secretariatRoutes({
           return res.status(404).json({ error: 'Archive non trouvée' });
         }
 
-        if (row.file_path && fsLib.existsSync(row.file_path)) {
+        // Blob partagé : la ligne supprimée décrémente son compteur, la collecte fera le reste
+        if (row.file_path && !isBlobPath(row.file_path) && fsLib.existsSync(row.file_path)) {
           try {
             fsLib.unlinkSync(row.file_path);
           } catch (fileErr) {
@@ -823,11 +821,10 @@ module.exports = function secretariatRoutes({
 
         let extractedText = '';
         try {
-          if (!pdfParser) {
-            throw new Error('PDF parser indisponible');
+          extractedText = await extractTextFromPDF(filePath);
+          if (!extractedText) {
+            throw new Error('Aucun texte natif');
           }
-          const data = await pdfParser(fsLib.readFileSync(filePath));
-          extractedText = data.text.trim();
         } catch (err) {
           console.warn(`Erreur extraction PDF ${originalName}: ${err.message}. Tentative OCR.`);
           try {
@@ -878,7 +875,7 @@ module.exports = function secretariatRoutes({
       console.error('Erreur globale analyse archives:', err);
       res.status(500).json({ error: "Erreur serveur lors de l'analyse" });
     } finally {
-      req.files.forEach(file => fsLib.unlink(file.path, err => err && console.warn(`Erreur cleanup ${file.originalname}: ${err}`)));
+      req.files.forEach(file => releaseUploadedFile(file.path, err => err && console.warn(`Erreur cleanup ${file.originalname}: ${err}`)));
     }
   });
 
@@ -1,15 +1,23 @@
 const express = require('express');
+const {
+  createLocalBackend,
+  createMinioBackend,
+  storeStream,
+  receiveMultipartFile,
+  localUploadFilename,
+} = require('../utils/uploadPipeline');
+const { getBlobStoreReport } = require('../db/blobStore');
 
 module.exports = function storageRoutes({
   authenticateToken,
   authorizeRoles,
-  upload,
   minioConfig,
   fs,
   fsPromises,
   path,
   crypto,
   baseDir,
+  db,
   resolveAlertsByType,
   upsertAlertByType,
 }) {
@@ -20,56 +28,73 @@ module.exports = function storageRoutes({
   const cryptoLib = crypto || require('crypto');
   const basePath = baseDir || process.cwd();
 
+  // Upload en flux : multipart → sha256 → chiffrement optionnel → backend, sans fichier
+  // intermédiaire. Les champs (ref_code, mail_id) doivent précéder le fichier dans le formulaire.
+  const streamUpload = (req, backend, { bucket, objectName, encrypt = false, metadata = null }) =>
+    receiveMultipartFile(req, {
+      onFile: ({ stream, filename, fields }) =>
+        storeStream(stream, {
+          backend,
+          bucket,
+          objectName: objectName(filename, fields),
+          encrypt,
+          metadata: metadata ? metadata(fields) : {},
+        }),
+    });
+
   if (minioConfig) {
-    router.post('/storage/upload', authenticateToken, upload.single('file'), async (req, res) => {
+    const storageBackend = createMinioBackend(minioConfig);
+
+    router.post('/storage/upload', authenticateToken, async (req, res) => {
       try {
-        if (!req.file) {
+        const { file: result } = await streamUpload(req, storageBackend, {
+          bucket: minioConfig.BUCKET_NAME,
+          objectName: (filename) => `${Date.now()}-${filename}`,
+        });
+        if (!result) {
           return res.status(400).json({ error: 'Aucun fichier fourni' });
         }
 
-        const filePath = req.file.path;
-        const objectName = `${Date.now()}-${req.file.originalname}`;
-
-        const result = await minioConfig.uploadToMinIO(filePath, objectName);
-
         res.json({
           message: 'Fichier uploadé vers MinIO avec succès',
-          objectName,
-          bucket: result.bucketName,
+          objectName: result.objectName,
+          bucket: result.bucket,
           hash: result.fileHash,
           etag: result.etag,
         });
       } catch (error) {
         console.error('Erreur upload MinIO:', error);
-        res.status(500).json({ error: 'Erreur upload MinIO', details: error.message });
+        res.status(error.status || 500).json({ error: 'Erreur upload MinIO', details: error.message });
       }
     });
 
-    router.post('/storage/archive', authenticateToken, authorizeRoles(['admin', 'archiviste']), upload.single('file'), async (req, res) => {
+    router.post('/storage/archive', authenticateToken, authorizeRoles(['admin', 'archiviste']), async (req, res) => {
       try {
-        if (!req.file) {
+        const { file: result } = await streamUpload(req, storageBackend, {
+          bucket: minioConfig.WORM_BUCKET,
+          objectName: (filename) => `archive-${Date.now()}-${filename}`,
+          metadata: (fields) => ({
+            'x-amz-meta-archived-by': req.user.username || req.user.email,
+            'x-amz-meta-mail-id': fields.mail_id || 'unknown',
+            'x-amz-meta-worm': 'true',
+            'x-amz-meta-archived-at': new Date().toISOString(),
+          }),
+        });
+        if (!result) {
           return res.status(400).json({ error: 'Aucun fichier fourni' });
         }
 
-        const filePath = req.file.path;
-        const objectName = `archive-${Date.now()}-${req.file.originalname}`;
-
-        const result = await minioConfig.archiveToWORM(filePath, objectName, {
-          'x-amz-meta-archived-by': req.user.username || req.user.email,
-          'x-amz-meta-mail-id': req.body.mail_id || 'unknown',
-        });
-
         res.json({
           message: 'Document archivé en mode WORM (immuable)',
-          objectName,
-          bucket: result.bucketName,
+          objectName: result.objectName,
+          bucket: result.bucket,
           hash: result.fileHash,
           etag: result.etag,
           warning: 'Ce fichier ne peut plus être modifié ni supprimé',
         });
       } catch (error) {
         console.error('Erreur archivage WORM:', error);
-        res.status(500).json({ error: 'Erreur archivage WORM', details: error.message });
+        res.status(error.status || 500).json({ error: 'Erreur archivage WORM', details: error.message });
       }
     });
 
@@ -201,66 +226,52 @@ module.exports = function storageRoutes({
       }
     });
 
-    router.post('/storage/upload-encrypted', authenticateToken, upload.single('file'), async (req, res) => {
+    router.post('/storage/upload-encrypted', authenticateToken, async (req, res) => {
       try {
-        const { encryptFile } = require('../security/encryption');
-        if (!req.file) return res.status(400).json({ error: 'Aucun fichier fourni' });
-        const filePath = req.file.path;
-        const encryptedPath = filePath + '.enc';
-        const meta = await encryptFile(filePath, encryptedPath);
-        const objectName = `enc-${Date.now()}-${req.file.originalname}`;
-        const uploadResult = await minioConfig.uploadToMinIO(encryptedPath, objectName, minioConfig.BUCKET_NAME, {
-          'x-amz-meta-encrypted': 'true',
-          'x-amz-meta-algo': meta.algo,
-          'x-amz-meta-salt': meta.salt,
-          'x-amz-meta-iv': meta.iv,
-          'x-amz-meta-tag': meta.tag,
-          'x-amz-meta-original-hash': meta.originalHash,
-          'x-amz-meta-encrypted-hash': meta.encryptedHash,
+        const { file: result } = await streamUpload(req, storageBackend, {
+          bucket: minioConfig.BUCKET_NAME,
+          objectName: (filename) => `enc-${Date.now()}-${filename}`,
+          encrypt: true,
         });
+        if (!result) return res.status(400).json({ error: 'Aucun fichier fourni' });
         res.json({
           message: 'Fichier chiffré et uploadé',
-          objectName,
-          bucket: uploadResult.bucketName,
-          originalHash: meta.originalHash,
-          encryptedHash: meta.encryptedHash,
-          etag: uploadResult.etag,
+          objectName: result.objectName,
+          bucket: result.bucket,
+          originalHash: result.originalHash,
+          encryptedHash: result.encryptedHash,
+          etag: result.etag,
         });
       } catch (e) {
         console.error('Erreur upload chiffré:', e);
-        res.status(500).json({ error: 'Erreur upload chiffré', details: e.message });
+        res.status(e.status || 500).json({ error: 'Erreur upload chiffré', details: e.message });
       }
     });
 
-    router.post('/storage/archive-encrypted', authenticateToken, authorizeRoles(['admin', 'archiviste']), upload.single('file'), async (req, res) => {
+    router.post('/storage/archive-encrypted', authenticateToken, authorizeRoles(['admin', 'archiviste']), async (req, res) => {
       try {
-        const { encryptFile } = require('../security/encryption');
-        if (!req.file) return res.status(400).json({ error: 'Aucun fichier fourni' });
-        const filePath = req.file.path;
-        const encryptedPath = filePath + '.enc';
-        const meta = await encryptFile(filePath, encryptedPath);
-        const objectName = `archive-enc-${Date.now()}-${req.file.originalname}`;
-        const uploadResult = await minioConfig.archiveToWORM(encryptedPath, objectName, {
-          'x-amz-meta-encrypted': 'true',
-          'x-amz-meta-algo': meta.algo,
-          'x-amz-meta-salt': meta.salt,
-          'x-amz-meta-iv': meta.iv,
-          'x-amz-meta-tag': meta.tag,
-          'x-amz-meta-original-hash': meta.originalHash,
-          'x-amz-meta-encrypted-hash': meta.encryptedHash,
+        const { file: result } = await streamUpload(req, storageBackend, {
+          bucket: minioConfig.WORM_BUCKET,
+          objectName: (filename) => `archive-enc-${Date.now()}-${filename}`,
+          encrypt: true,
+          metadata: () => ({
+            'x-amz-meta-worm': 'true',
+            'x-amz-meta-archived-at': new Date().toISOString(),
+          }),
         });
+        if (!result) return res.status(400).json({ error: 'Aucun fichier fourni' });
         res.json({
           message: 'Document archivé chiffré (WORM)',
-          objectName,
-          bucket: uploadResult.bucketName,
-          originalHash: meta.originalHash,
-          encryptedHash: meta.encryptedHash,
-          etag: uploadResult.etag,
+          objectName: result.objectName,
+          bucket: result.bucket,
+          originalHash: result.originalHash,
+          encryptedHash: result.encryptedHash,
+          etag: result.etag,
           warning: 'Immuable et chiffré',
         });
       } catch (e) {
         console.error('Erreur archivage chiffré:', e);
-        res.status(500).json({ error: 'Erreur archivage chiffré', details: e.message });
+        res.status(e.status || 500).json({ error: 'Erreur archivage chiffré', details: e.message });
       }
     });
 
@@ -358,6 +369,7 @@ module.exports = function storageRoutes({
       });
   } else {
     const uploadsRoot = pathLib.resolve(basePath, 'uploads');
+    const storageBackend = createLocalBackend(uploadsRoot);
 
     const ensureUploadsDir = async () => {
       try {
@@ -392,53 +404,47 @@ module.exports = function storageRoutes({
       return { candidate, rel };
     };
 
-    router.post('/storage/upload', authenticateToken, upload.single('file'), async (req, res) => {
+    router.post('/storage/upload', authenticateToken, async (req, res) => {
       try {
-        await ensureUploadsDir();
-        if (!req.file) return res.status(400).json({ error: 'Aucun fichier fourni' });
-
-        const fileHash = await sha256File(req.file.path);
-        const objectName = `/uploads/${req.file.filename}`;
+        const { file: result } = await streamUpload(req, storageBackend, {
+          objectName: localUploadFilename,
+        });
+        if (!result) return res.status(400).json({ error: 'Aucun fichier fourni' });
 
         res.json({
           message: 'Fichier uploadé (mode local)',
-          objectName,
+          objectName: `/uploads/${result.objectName}`,
           bucket: 'local',
-          hash: fileHash,
+          hash: result.fileHash,
           etag: null,
           mode: 'local',
         });
       } catch (e) {
         console.error('Erreur upload local:', e);
-        res.status(500).json({ error: 'Erreur upload local', details: e.message });
+        res.status(e.status || 500).json({ error: 'Erreur upload local', details: e.message });
       }
     });
 
-    router.post('/storage/archive', authenticateToken, authorizeRoles(['admin', 'archiviste']), upload.single('file'), async (req, res) => {
+    router.post('/storage/archive', authenticateToken, authorizeRoles(['admin', 'archiviste']), async (req, res) => {
       try {
-        await ensureUploadsDir();
-        if (!req.file) return res.status(400).json({ error: 'Aucun fichier fourni' });
-
-        const archivesDir = pathLib.resolve(uploadsRoot, 'archives');
-        await fsPromisesLib.mkdir(archivesDir, { recursive: true });
-        const destAbs = pathLib.resolve(archivesDir, req.file.filename);
-        await fsPromisesLib.rename(req.file.path, destAbs);
-
-        const fileHash = await sha256File(destAbs);
-        const objectName = `/uploads/archives/${req.file.filename}`;
+        const { file: result } = await streamUpload(req, storageBackend, {
+          bucket: storageBackend.wormBucket,
+          objectName: localUploadFilename,
+        });
+        if (!result) return res.status(400).json({ error: 'Aucun fichier fourni' });
 
         res.json({
           message: 'Document archivé (mode local)',
-          objectName,
+          objectName: `/uploads/archives/${result.objectName}`,
           bucket: 'local',
-          hash: fileHash,
+          hash: result.fileHash,
           etag: null,
           mode: 'local',
           warning: 'Mode local: pas de WORM (immutabilité) garantie',
         });
       } catch (e) {
         console.error('Erreur archivage local:', e);
-        res.status(500).json({ error: 'Erreur archivage local', details: e.message });
+        res.status(e.status || 500).json({ error: 'Erreur archivage local', details: e.message });
       }
     });
 
@@ -512,5 +518,16 @@ module.exports = function storageRoutes({
     router.post('/storage/decrypt', authenticateToken, minioRequired('decrypt'));
   }
 
+  // Déduplication des uploads (uploads/blobs/) : volume stocké vs volume reçu
+  router.get('/storage/blobs/report', authenticateToken, authorizeRoles(['admin']), async (req, res) => {
+    if (!db) return res.status(501).json({ error: 'Base de données non fournie' });
+    try {
+      const top = Math.min(parseInt(req.query.top, 10) || 10, 100);
+      res.json(await getBlobStoreReport(db, { top }));
+    } catch (e) {
+      res.status(500).json({ error: 'Erreur rapport blobs', details: e.message });
+    }
+  });
+
   return router;
 };
@@ -0,0 +1,143 @@
+/**
+ * Benchmark de la recherche courriers : LIKE '%terme%' (ancien) vs index FTS5.
+ *
+ * Usage : node scripts/bench-search.js [--rows 100000,1000000] [--runs 20] [--dir /tmp]
+ *
+ * Une base jetable par taille est générée dans --dir (réutilisée si elle existe
+ * déjà avec le bon nombre de lignes) : incoming_mails avec ~150 mots de texte OCR
+ * par courrier, tables archives/courriers_sortants/outgoing_mails vides.
+ */
+const os = require('os');
+const path = require('path');
+const sqlite3 = require('sqlite3');
+const { ensureSearchIndex } = require('../db/searchIndex');
+const { MAIL_SEARCH_SELECTS, buildLikeSearchSql, searchMails } = require('../services/search.service');
+
+const WORDS = (
+  'courrier facture échéance ministère service direction réponse demande dossier ' +
+  'budget réunion marché contrat paiement relance convocation rapport mission ' +
+  'personnel congé recrutement formation équipement fourniture logistique audit ' +
+  'décision arrêté note circulaire projet partenaire subvention avenant délai'
+).split(' ');
+const SENDERS = ['Ministère des Finances', 'DAF', 'DRH', 'Préfecture', 'Trésor public', 'Cabinet'];
+const QUERIES = ['facture', 'échéance budget', 'CE/2024/0042', 'préfecture relance', 'subvention avenant délai'];
+
+function arg(name, fallback) {
+  const i = process.argv.indexOf(`--${name}`);
+  return i > 0 ? process.argv[i + 1] : fallback;
+}
+
+const run = (db, sql, params = []) =>
+  new Promise((resolve, reject) => db.run(sql, params, (err) => (err ? reject(err) : resolve())));
+const get = (db, sql, params = []) =>
+  new Promise((resolve, reject) => db.get(sql, params, (err, row) => (err ? reject(err) : resolve(row))));
+const all = (db, sql, params = []) =>
+  new Promise((resolve, reject) => db.all(sql, params, (err, rows) => (err ? reject(err) : resolve(rows))));
+
+function randomText(rnd, n) {
+  const out = [];
+  for (let i = 0; i < n; i += 1) out.push(WORDS[Math.floor(rnd() * WORDS.length)]);
+  return out.join(' ');
+}
+
+// Générateur pseudo-aléatoire déterministe (mulberry32)
+function seeded(seed) {
+  let a = seed;
+  return () => {
+    a = (a + 0x6d2b79f5) | 0;
+    let t = Math.imul(a ^ (a >>> 15), 1 | a);
+    t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t;
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+async function seed(db, rows) {
+  await run(db, 'PRAGMA journal_mode = WAL');
+  await run(db, 'PRAGMA synchronous = OFF');
+  const existing = await get(db, 'SELECT COUNT(*) AS c FROM incoming_mails').catch(() => null);
+  if (existing && existing.c === rows) return;
+
+  console.log(`⏳ Génération de ${rows} courriers ...`);
+  for (const table of ['incoming_mails', 'archives', 'courriers_sortants', 'outgoing_mails']) {
+    await run(db, `DROP TABLE IF EXISTS ${table}`);
+  }
+  await run(db, `CREATE TABLE incoming_mails (id INTEGER PRIMARY KEY, ref_code TEXT, subject TEXT, sender TEXT,
+    recipient TEXT, extracted_text TEXT, mail_date TEXT, date_reception TEXT, statut_global TEXT, file_path TEXT,
+    summary TEXT, id_type_document INTEGER, is_mission_doc INTEGER, mission_reference TEXT,
+    date_retour_mission TEXT, classeur TEXT)`);
+  await run(db, `CREATE TABLE archives (id INTEGER PRIMARY KEY, reference TEXT, description TEXT, category TEXT,
+    sender TEXT, extracted_text TEXT, incoming_mail_id INTEGER, date TEXT, status TEXT, file_path TEXT,
+    summary TEXT, classeur TEXT)`);
+  await run(db, `CREATE TABLE courriers_sortants (id INTEGER PRIMARY KEY, reference_unique TEXT, objet TEXT,
+    destinataire TEXT, extracted_text TEXT, date_edition TEXT, created_at TEXT, statut TEXT,
+    original_file_path TEXT, preview_pdf TEXT)`);
+  await run(db, `CREATE TABLE outgoing_mails (id INTEGER PRIMARY KEY, subject TEXT, recipient TEXT, content TEXT,
+    mail_date TEXT, status TEXT, file_path TEXT)`);
+
+  const rnd = seeded(42);
+  await run(db, 'BEGIN');
+  const stmt = db.prepare(`INSERT INTO incoming_mails (ref_code, subject, sender, recipient, extracted_text, date_reception)
+    VALUES (?, ?, ?, ?, ?, ?)`);
+  for (let i = 0; i < rows; i += 1) {
+    const day = String(1 + Math.floor(rnd() * 28)).padStart(2, '0');
+    stmt.run(
+      `CE/2024/${String(i).padStart(4, '0')}`,
+      randomText(rnd, 6),
+      SENDERS[Math.floor(rnd() * SENDERS.length)],
+      SENDERS[Math.floor(rnd() * SENDERS.length)],
+      randomText(rnd, 150),
+      `2024-01-${day}`,
+    );
+  }
+  await new Promise((resolve, reject) => stmt.finalize((err) => (err ? reject(err) : resolve())));
+  await run(db, 'COMMIT');
+}
+
+async function time(fn, runs) {
+  const timings = [];
+  let result;
+  for (let i = 0; i < runs; i += 1) {
+    const t0 = process.hrtime.bigint();
+    result = await fn();
+    timings.push(Number(process.hrtime.bigint() - t0) / 1e6);
+  }
+  timings.sort((a, b) => a - b);
+  return { result, p50: timings[Math.floor(timings.length / 2)], max: timings[timings.length - 1] };
+}
+
+async function bench(rows, runs, dir) {
+  const file = path.join(dir, `bench_search_${rows}.db`);
+  const db = new sqlite3.Database(file);
+  await seed(db, rows);
+
+  const t0 = Date.now();
+  await ensureSearchIndex(db);
+  const indexMs = Date.now() - t0;
+
+  const { sql } = buildLikeSearchSql(MAIL_SEARCH_SELECTS);
+  const likeParamCount = Object.values(MAIL_SEARCH_SELECTS).reduce((n, s) => n + s.like.length, 0);
+
+  console.log(`\n📊 ${rows} courriers — index FTS5 prêt en ${indexMs} ms, ${runs} exécutions par requête`);
+  console.log(`${'requête'.padEnd(26)}${'LIKE p50'.padStart(12)}${'FTS5 p50'.padStart(12)}${'FTS5 max'.padStart(12)}${'total'.padStart(10)}`);
+  for (const q of QUERIES) {
+    const like = await time(() => all(db, sql, [...Array(likeParamCount).fill(`%${q}%`), 50, 0]), Math.min(runs, 3));
+    const fts = await time(() => searchMails({ db, term: q, limit: 50 }), runs);
+    console.log(
+      `${q.padEnd(26)}${like.p50.toFixed(1).padStart(12)}${fts.p50.toFixed(1).padStart(12)}` +
+      `${fts.max.toFixed(1).padStart(12)}${String(fts.result.total).padStart(10)}`,
+    );
+  }
+  await new Promise((resolve) => db.close(resolve));
+}
+
+(async () => {
+  const sizes = String(arg('rows', '100000,1000000')).split(',').map((n) => parseInt(n, 10));
+  const runs = parseInt(arg('runs', '20'), 10);
+  const dir = arg('dir', os.tmpdir());
+  try {
+    for (const rows of sizes) await bench(rows, runs, dir);
+  } catch (err) {
+    console.error('❌ Benchmark recherche échoué:', err.message);
+    process.exit(1);
+  }
+})();
@@ -0,0 +1,132 @@
+/**
+ * Benchmark de la recherche sémantique : embeddings JSON + cosine scalaire (ancien)
+ * vs matrice Float32Array contiguë + top-k par tas (ai/embeddingMatrix.js).
+ *
+ * Usage : node scripts/bench-semantic-search.js [--docs 50000] [--dim 1536] [--queries 20] [--k 10]
+ *
+ * Aucun appel OpenAI ni base : les vecteurs sont aléatoires (graine fixe).
+ * Le chargement simule la lecture SQLite (chaînes JSON vs BLOB float32).
+ */
+const { EmbeddingMatrix, normalizeVector, vectorToBlob } = require('../ai/embeddingMatrix');
+
+function arg(name, fallback) {
+  const i = process.argv.indexOf(`--${name}`);
+  return i > 0 ? parseInt(process.argv[i + 1], 10) : fallback;
+}
+
+// Générateur pseudo-aléatoire déterministe (mulberry32)
+function seeded(seed) {
+  let a = seed;
+  return () => {
+    a = (a + 0x6d2b79f5) | 0;
+    let t = Math.imul(a ^ (a >>> 15), 1 | a);
+    t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t;
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+function randomVector(rnd, dim) {
+  const v = new Array(dim);
+  for (let i = 0; i < dim; i++) v[i] = rnd() * 2 - 1;
+  return v;
+}
+
+function ms(t0) {
+  return Number(process.hrtime.bigint() - t0) / 1e6;
+}
+
+function median(values) {
+  const sorted = [...values].sort((a, b) => a - b);
+  return sorted[Math.floor(sorted.length / 2)];
+}
+
+// Reproduction de l'ancien cosineSimilarity (ai/semanticSearch.js)
+function cosineSimilarity(vecA, vecB) {
+  let dotProduct = 0;
+  let normA = 0;
+  let normB = 0;
+  for (let i = 0; i < vecA.length; i++) {
+    dotProduct += vecA[i] * vecB[i];
+    normA += vecA[i] * vecA[i];
+    normB += vecB[i] * vecB[i];
+  }
+  return dotProduct / (Math.sqrt(normA) * Math.sqrt(normB));
+}
+
+function legacySearch(rows, query, k) {
+  const results = [];
+  for (const row of rows) {
+    const similarity = cosineSimilarity(query, JSON.parse(row.embedding.toString()));
+    results.push({ key: row.key, similarity });
+  }
+  results.sort((a, b) => b.similarity - a.similarity);
+  return results.slice(0, k);
+}
+
+function main() {
+  const docs = arg('docs', 50000);
+  const dim = arg('dim', 1536);
+  const queries = arg('queries', 20);
+  const k = arg('k', 10);
+  const rnd = seeded(42);
+
+  console.log(`⏳ Génération de ${docs} vecteurs de dimension ${dim} ...`);
+  const queryVectors = [];
+  for (let i = 0; i < queries; i++) queryVectors.push(randomVector(rnd, dim));
+
+  // Lignes telles que lues en base par chaque variante (texte JSON hors tas V8, comme un TEXT SQLite)
+  const jsonRows = [];
+  const blobRows = [];
+  for (let i = 0; i < docs; i++) {
+    const v = randomVector(rnd, dim);
+    jsonRows.push({ key: `incoming_mails:${i}`, embedding: Buffer.from(JSON.stringify(v)) });
+    blobRows.push({ key: `incoming_mails:${i}`, vector: vectorToBlob(normalizeVector(v)) });
+  }
+
+  // Ancien chemin : JSON.parse + cosine à chaque requête
+  const legacyTimes = [];
+  const legacyResults = [];
+  for (const q of queryVectors) {
+    const t0 = process.hrtime.bigint();
+    legacyResults.push(legacySearch(jsonRows, q, k));
+    legacyTimes.push(ms(t0));
+  }
+  const jsonBytes = jsonRows.reduce((n, r) => n + r.embedding.length, 0);
+
+  // Nouveau chemin : chargement unique puis produit scalaire + tas
+  const t0 = process.hrtime.bigint();
+  const matrix = new EmbeddingMatrix(dim, blobRows.length);
+  for (const row of blobRows) matrix.upsert(row.key, row.vector);
+  const loadMs = ms(t0);
+
+  const matrixTimes = [];
+  let mismatches = 0;
+  queryVectors.forEach((q, qi) => {
+    const t1 = process.hrtime.bigint();
+    const hits = matrix.topK(normalizeVector(q), k);
+    matrixTimes.push(ms(t1));
+    const expected = legacyResults[qi].map((r) => r.key).join(',');
+    if (hits.map((h) => h.key).join(',') !== expected) mismatches++;
+  });
+
+  // Mise à jour incrémentale (indexDocument)
+  const t2 = process.hrtime.bigint();
+  for (let i = 0; i < 1000; i++) matrix.upsert(`incoming_mails:${i}`, normalizeVector(randomVector(rnd, dim)));
+  const upsertUs = ms(t2); // 1000 upserts : ms total = µs par upsert
+
+  console.log(`\n📊 ${docs} documents × ${dim} dimensions, top-${k}, ${queries} requêtes`);
+  console.log(`${'variante'.padEnd(22)}${'p50 (ms)'.padStart(12)}${'max (ms)'.padStart(12)}${'données (Mo)'.padStart(16)}`);
+  console.log(
+    `${'JSON + cosine'.padEnd(22)}${median(legacyTimes).toFixed(1).padStart(12)}` +
+    `${Math.max(...legacyTimes).toFixed(1).padStart(12)}${(jsonBytes / 1048576).toFixed(1).padStart(16)}`,
+  );
+  console.log(
+    `${'Float32 + top-k'.padEnd(22)}${median(matrixTimes).toFixed(1).padStart(12)}` +
+    `${Math.max(...matrixTimes).toFixed(1).padStart(12)}${(matrix.byteLength() / 1048576).toFixed(1).padStart(16)}`,
+  );
+  console.log(`Chargement matrice (BLOB → Float32Array) : ${loadMs.toFixed(0)} ms ; upsert : ${upsertUs.toFixed(1)} µs`);
+  console.log(mismatches ? `❌ ${mismatches} requête(s) au top-${k} différent` : `✅ Top-${k} identiques`);
+  if (mismatches) process.exit(1);
+}
+
+main();
@@ -0,0 +1,224 @@
+/**
+ * Benchmark de l'upload chiffré : ancien chemin (multer sur disque, passe de hash,
+ * chiffrement en mémoire, ré-lecture pour l'envoi) vs flux unique de utils/uploadPipeline.js.
+ *
+ * Usage : node scripts/bench-upload-pipeline.js [--mb 500] [--dir /tmp] [--no-http]
+ *
+ * Le backend est le système de fichiers local (--dir) : les écarts mesurés sont ceux des
+ * passes disque et de la mémoire, pas du réseau. Chaque scénario tourne dans un processus
+ * séparé (pic RSS non pollué par le précédent). Le scénario HTTP (multipart réel via busboy)
+ * est ignoré si busboy n'est pas installé.
+ */
+const crypto = require('crypto');
+const fs = require('fs');
+const fsPromises = require('fs/promises');
+const http = require('http');
+const os = require('os');
+const path = require('path');
+const { execFileSync } = require('child_process');
+const { pipeline } = require('stream/promises');
+
+function arg(name, fallback) {
+  const i = process.argv.indexOf(`--${name}`);
+  return i > 0 ? process.argv[i + 1] : fallback;
+}
+
+if (!process.env.ENCRYPTION_MASTER_KEY) {
+  process.env.ENCRYPTION_MASTER_KEY = crypto.randomBytes(32).toString('base64');
+}
+
+const SIZE_MB = parseInt(arg('mb', '500'), 10);
+const WORK_DIR = path.resolve(arg('dir', os.tmpdir()), 'bench-upload-pipeline');
+const SOURCE = path.join(WORK_DIR, `source-${SIZE_MB}mb.bin`);
+
+async function ensureSource() {
+  const expected = SIZE_MB * 1024 * 1024;
+  const stat = await fsPromises.stat(SOURCE).catch(() => null);
+  if (stat && stat.size === expected) return;
+  console.log(`⏳ Génération d'un fichier de ${SIZE_MB} Mo ...`);
+  await fsPromises.mkdir(WORK_DIR, { recursive: true });
+  const block = crypto.randomBytes(1024 * 1024);
+  const out = fs.createWriteStream(SOURCE);
+  for (let i = 0; i < SIZE_MB; i += 1) {
+    block.writeUInt32LE(i, 0);
+    if (!out.write(block)) await new Promise((resolve) => out.once('drain', resolve));
+  }
+  await new Promise((resolve, reject) => out.end((err) => (err ? reject(err) : resolve())));
+}
+
+function sha256File(filePath) {
+  return new Promise((resolve, reject) => {
+    const hash = crypto.createHash('sha256');
+    fs.createReadStream(filePath)
+      .on('error', reject)
+      .on('data', (chunk) => hash.update(chunk))
+      .on('end', () => resolve(hash.digest('hex')));
+  });
+}
+
+// ── Scénarios (exécutés dans un processus fils) ─────────────────────────────
+
+const scenarios = {
+  // Chemin d'origine de /storage/upload-encrypted : multer → encryptFile (readFileSync,
+  // chiffrement du buffer, writeFileSync, hash) → uploadToMinIO (passe de hash puis fPutObject)
+  async legacy(dest) {
+    const landing = path.join(dest, 'multer-landing.bin');
+    await pipeline(fs.createReadStream(SOURCE), fs.createWriteStream(landing));
+
+    const salt = crypto.randomBytes(16);
+    const iv = crypto.randomBytes(12);
+    const key = crypto.pbkdf2Sync(Buffer.from(process.env.ENCRYPTION_MASTER_KEY, 'base64'), salt, 150000, 32, 'sha512');
+    const data = fs.readFileSync(landing);
+    const originalHash = crypto.createHash('sha256').update(data).digest('hex');
+    const cipher = crypto.createCipheriv('aes-256-gcm', key, iv);
+    const encrypted = Buffer.concat([cipher.update(data), cipher.final()]);
+    fs.writeFileSync(`${landing}.enc`, encrypted);
+    crypto.createHash('sha256').update(encrypted).digest('hex');
+
+    await sha256File(`${landing}.enc`);
+    await pipeline(fs.createReadStream(`${landing}.enc`), fs.createWriteStream(path.join(dest, 'stored.enc')));
+    return { originalHash, passes: 'écriture multer, lecture, écriture .enc, 2 lectures .enc, écriture stockage' };
+  },
+
+  async stream(dest) {
+    const { createLocalBackend, storeStream } = require('../utils/uploadPipeline');
+    const result = await storeStream(fs.createReadStream(SOURCE), {
+      backend: createLocalBackend(dest),
+      objectName: 'stored.enc',
+      encrypt: true,
+    });
+    return { originalHash: result.originalHash, passes: '1 lecture, 1 écriture stockage' };
+  },
+
+  async 'stream-plain'(dest) {
+    const { createLocalBackend, storeStream } = require('../utils/uploadPipeline');
+    const result = await storeStream(fs.createReadStream(SOURCE), {
+      backend: createLocalBackend(dest),
+      objectName: 'stored.bin',
+    });
+    return { originalHash: result.originalHash, passes: '1 lecture, 1 écriture stockage' };
+  },
+
+  // Multipart réel : serveur HTTP local + receiveMultipartFile, client qui envoie le fichier en flux
+  async http(dest) {
+    const { createLocalBackend, storeStream, receiveMultipartFile } = require('../utils/uploadPipeline');
+    const backend = createLocalBackend(dest);
+    const server = http.createServer(async (req, res) => {
+      try {
+        const { file } = await receiveMultipartFile(req, {
+          maxBytes: Infinity,
+          onFile: ({ stream }) => storeStream(stream, { backend, objectName: 'stored.enc', encrypt: true }),
+        });
+        res.end(JSON.stringify({ originalHash: file.originalHash }));
+      } catch (err) {
+        res.statusCode = err.status || 500;
+        res.end(JSON.stringify({ error: err.message }));
+      }
+    });
+    await new Promise((resolve) => server.listen(0, '127.0.0.1', resolve));
+
+    const boundary = `----bench${crypto.randomBytes(8).toString('hex')}`;
+    const head = Buffer.from(
+      `--${boundary}\r\nContent-Disposition: form-data; name="ref_code"\r\n\r\nBENCH\r\n` +
+      `--${boundary}\r\nContent-Disposition: form-data; name="file"; filename="source.pdf"\r\n` +
+      'Content-Type: application/pdf\r\n\r\n',
+    );
+    const tail = Buffer.from(`\r\n--${boundary}--\r\n`);
+    const body = await new Promise((resolve, reject) => {
+      const req = http.request({
+        host: '127.0.0.1',
+        port: server.address().port,
+        method: 'POST',
+        headers: {
+          'Content-Type': `multipart/form-data; boundary=${boundary}`,
+          'Content-Length': head.length + fs.statSync(SOURCE).size + tail.length,
+        },
+      }, (res) => {
+        let text = '';
+        res.on('data', (chunk) => { text += chunk; });
+        res.on('end', () => resolve(JSON.parse(text)));
+      });
+      req.on('error', reject);
+      req.write(head);
+      const file = fs.createReadStream(SOURCE);
+      file.pipe(req, { end: false });
+      file.on('end', () => req.end(tail));
+    });
+    server.close();
+    if (body.error) throw new Error(body.error);
+    return { originalHash: body.originalHash, passes: '1 lecture client, 1 écriture stockage' };
+  },
+};
+
+async function runScenario(name) {
+  const dest = path.join(WORK_DIR, `out-${name}`);
+  await fsPromises.rm(dest, { recursive: true, force: true });
+  await fsPromises.mkdir(dest, { recursive: true });
+
+  const baseline = process.memoryUsage().rss;
+  let peak = baseline;
+  const sampler = setInterval(() => {
+    peak = Math.max(peak, process.memoryUsage().rss);
+  }, 20);
+
+  // Boucle d'événements : plus long blocage observé pendant le scénario
+  let maxLagMs = 0;
+  let last = process.hrtime.bigint();
+  const lagTimer = setInterval(() => {
+    const now = process.hrtime.bigint();
+    maxLagMs = Math.max(maxLagMs, Number(now - last) / 1e6 - 10);
+    last = now;
+  }, 10);
+
+  const startedAt = process.hrtime.bigint();
+  const result = await scenarios[name](dest);
+  const seconds = Number(process.hrtime.bigint() - startedAt) / 1e9;
+  clearInterval(sampler);
+  clearInterval(lagTimer);
+  peak = Math.max(peak, process.memoryUsage().rss);
+
+  await fsPromises.rm(dest, { recursive: true, force: true });
+  process.stdout.write(JSON.stringify({
+    name,
+    seconds,
+    peakRssMb: peak / 1024 / 1024,
+    rssDeltaMb: (peak - baseline) / 1024 / 1024,
+    maxLagMs,
+    ...result,
+  }));
+}
+
+async function main() {
+  await ensureSource();
+  const expectedHash = await sha256File(SOURCE);
+
+  let names = ['legacy', 'stream', 'stream-plain', 'http'];
+  if (process.argv.includes('--no-http')) names = names.filter((n) => n !== 'http');
+  try {
+    require.resolve('busboy');
+  } catch (_) {
+    if (names.includes('http')) console.warn('⚠️  busboy non installé : scénario HTTP ignoré');
+    names = names.filter((n) => n !== 'http');
+  }
+
+  console.log(`\n📦 Upload chiffré de ${SIZE_MB} Mo (backend fichiers local: ${WORK_DIR})\n`);
+  console.log('scénario       durée (s)   débit (Mo/s)   pic RSS (Mo)   +RSS (Mo)   blocage max (ms)   hash');
+  for (const name of names) {
+    const out = execFileSync(process.execPath, [__filename, '--scenario', name, '--mb', String(SIZE_MB), '--dir', path.dirname(WORK_DIR)], {
+      env: process.env,
+      maxBuffer: 1024 * 1024,
+    });
+    const r = JSON.parse(out.toString());
+    console.log(
+      `${r.name.padEnd(14)} ${r.seconds.toFixed(2).padStart(9)}   ${(SIZE_MB / r.seconds).toFixed(1).padStart(12)}   ` +
+      `${r.peakRssMb.toFixed(0).padStart(12)}   ${r.rssDeltaMb.toFixed(0).padStart(9)}   ${r.maxLagMs.toFixed(0).padStart(16)}   ` +
+      `${r.originalHash === expectedHash ? 'ok' : 'DIFFÉRENT'}  (${r.passes})`,
+    );
+  }
+}
+
+const scenarioName = arg('scenario', null);
+(scenarioName ? runScenario(scenarioName) : main()).catch((err) => {
+  console.error('❌', err);
+  process.exit(1);
+});
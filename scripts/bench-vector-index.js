@@ -0,0 +1,103 @@
+/**
+ * Rapport recall@k / latence de l'index IVF (ai/vectorIndex.js) face au parcours exact.
+ * Sert à choisir nlist / nprobe (VECTOR_INDEX_NLIST, VECTOR_INDEX_NPROBE).
+ *
+ * Usage : node scripts/bench-vector-index.js [--docs 50000] [--dim 1536] [--topics 300]
+ *                                            [--queries 50] [--k 10] [--nlist 0] [--nprobe 1,2,4,8,16,32]
+ *
+ * Données synthétiques regroupées en `--topics` thèmes (les embeddings réels de
+ * courriers le sont aussi) ; graine fixe. --nlist 0 = √N.
+ */
+const { EmbeddingMatrix, normalizeVector } = require('../ai/embeddingMatrix');
+const { ExactIndex, IvfIndex, defaultNlist, measureRecall } = require('../ai/vectorIndex');
+
+function arg(name, fallback) {
+  const i = process.argv.indexOf(`--${name}`);
+  return i > 0 ? process.argv[i + 1] : fallback;
+}
+
+// Générateur pseudo-aléatoire déterministe (mulberry32)
+function seeded(seed) {
+  let a = seed;
+  return () => {
+    a = (a + 0x6d2b79f5) | 0;
+    let t = Math.imul(a ^ (a >>> 15), 1 | a);
+    t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t;
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+function gaussian(rnd) {
+  return Math.sqrt(-2 * Math.log(rnd() || 1e-12)) * Math.cos(2 * Math.PI * rnd());
+}
+
+function noisy(rnd, topic, noise) {
+  const v = new Float32Array(topic.length);
+  for (let i = 0; i < v.length; i++) v[i] = topic[i] + noise * gaussian(rnd);
+  return normalizeVector(v);
+}
+
+function median(values) {
+  const sorted = [...values].sort((a, b) => a - b);
+  return sorted[Math.floor(sorted.length / 2)];
+}
+
+function timeSearch(index, queries, k, options) {
+  const timings = [];
+  for (const q of queries) {
+    const t0 = process.hrtime.bigint();
+    index.search(q, k, options);
+    timings.push(Number(process.hrtime.bigint() - t0) / 1e6);
+  }
+  return median(timings);
+}
+
+function main() {
+  const docs = parseInt(arg('docs', '50000'), 10);
+  const dim = parseInt(arg('dim', '1536'), 10);
+  const topics = parseInt(arg('topics', '300'), 10);
+  const queryCount = parseInt(arg('queries', '50'), 10);
+  const k = parseInt(arg('k', '10'), 10);
+  const nlist = parseInt(arg('nlist', '0'), 10) || defaultNlist(docs);
+  const nprobes = String(arg('nprobe', '1,2,4,8,16,32')).split(',').map((n) => parseInt(n, 10));
+  const rnd = seeded(42);
+
+  console.log(`⏳ Génération de ${docs} vecteurs (${topics} thèmes, dimension ${dim}) ...`);
+  const centers = [];
+  for (let t = 0; t < topics; t++) centers.push(noisy(rnd, new Float32Array(dim), 1));
+  const matrix = new EmbeddingMatrix(dim, docs);
+  for (let i = 0; i < docs; i++) {
+    matrix.upsert(`incoming_mails:${i}`, noisy(rnd, centers[Math.floor(rnd() * topics)], 0.04));
+  }
+  const queries = [];
+  for (let i = 0; i < queryCount; i++) queries.push(noisy(rnd, centers[Math.floor(rnd() * topics)], 0.05));
+
+  const exact = new ExactIndex(matrix);
+  const exactMs = timeSearch(exact, queries, k);
+
+  let t0 = Date.now();
+  const ivf = IvfIndex.train(matrix, { nlist });
+  const trainMs = Date.now() - t0;
+
+  t0 = Date.now();
+  const restored = IvfIndex.fromBuffer(matrix, ivf.toBuffer());
+  const loadMs = Date.now() - t0;
+  const sizes = restored.lists.map((l) => l.size);
+
+  console.log(`\n📊 ${docs} documents × ${dim}, nlist = ${nlist}, top-${k}, ${queryCount} requêtes`);
+  console.log(`Entraînement IVF : ${(trainMs / 1000).toFixed(1)} s ; rechargement : ${loadMs} ms ; ` +
+    `listes min/médiane/max : ${Math.min(...sizes)}/${median(sizes)}/${Math.max(...sizes)}`);
+  console.log(`${'index'.padEnd(16)}${`recall@${k}`.padStart(12)}${'p50 (ms)'.padStart(12)}${'accélération'.padStart(16)}`);
+  console.log(`${'exact'.padEnd(16)}${'1.000'.padStart(12)}${exactMs.toFixed(2).padStart(12)}${'1.0×'.padStart(16)}`);
+  for (const nprobe of nprobes) {
+    if (nprobe > nlist) continue;
+    const recall = measureRecall(restored, exact, queries, k, { nprobe });
+    const ms = timeSearch(restored, queries, k, { nprobe });
+    console.log(
+      `${`ivf nprobe=${nprobe}`.padEnd(16)}${recall.toFixed(3).padStart(12)}${ms.toFixed(2).padStart(12)}` +
+      `${`${(exactMs / ms).toFixed(1)}×`.padStart(16)}`,
+    );
+  }
+}
+
+main();
@@ -0,0 +1,94 @@
+"""
+Classifieur d'intentions de l'agent IA : exactitude sur le corpus étiqueté et micro-benchmark.
+
+Usage :
+    python scripts/bench_classify_query.py [--iterations 100000]
+
+Le corpus (test/data/classify_query_corpus.json, y compris des requêtes
+mêlant plusieurs intentions) est vérifié contre classify_query() ;
+l'ancienne implémentation (scans `any(k in q ...)` séquentiels), reproduite
+ici, ne doit s'en écarter que sur la normalisation (espaces, casse des
+accents). Temps par requête mesurés à
+cache froid (requête jamais vue) et sur requêtes répétées.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import flask_app  # noqa: E402
+
+CORPUS = ROOT / "test" / "data" / "classify_query_corpus.json"
+
+
+def legacy_classify_query(query: str) -> str:
+    q = (query or "").lower()
+    if any(k in q for k in ["urgent", "urgence", "prioritaire", "haute priorité", "haute priorite"]):
+        return "urgent_focus"
+    if any(k in q for k in ["retard", "en retard", "deadline dépassée", "deadline depassee", "échéance dépassée", "echeance depassee"]):
+        return "late_mails"
+    if any(k in q for k in ["non traité", "non traites", "non traités", "pas traité", "pas traites", "non traite"]):
+        return "unprocessed_mails"
+    if any(k in q for k in ["par service", "par département", "par departement", "par unité", "par unite", "par direction", "services", "départements", "departements"]):
+        return "per_service"
+    if any(k in q for k in ["kpi", "performance", "workflow", "indicateur", "indicateurs"]):
+        return "workflow_kpis"
+    if any(k in q for k in ["archive", "archives", "archivage"]):
+        return "archives_focus"
+    return "default"
+
+
+def bench(fn, queries, iterations: int) -> float:
+    t0 = time.perf_counter()
+    n = 0
+    while n < iterations:
+        for q in queries:
+            fn(q)
+        n += len(queries)
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    corpus = json.loads(CORPUS.read_text(encoding="utf-8"))
+    failures = []
+    legacy_ok = 0
+    for case in corpus:
+        got = flask_app.classify_query(case["query"])
+        legacy = legacy_classify_query(case["query"])
+        if got != case["mode"]:
+            failures.append((case["query"], case["mode"], f"{got} (legacy : {legacy})"))
+        legacy_ok += legacy == case["mode"]
+
+    queries = [case["query"] for case in corpus]
+    legacy_us = bench(legacy_classify_query, queries, args.iterations)
+    compiled_us = bench(flask_app.classify_query, queries, args.iterations)
+
+    def cold(q):
+        flask_app._score_intents.cache_clear()
+        flask_app._first_intent.cache_clear()
+        return flask_app.classify_query(q)
+
+    cold_us = bench(cold, queries, args.iterations)
+
+    print(f"\n📊 Corpus : {len(corpus)} requêtes étiquetées")
+    print(f"   exactitude compilé : {len(corpus) - len(failures)}/{len(corpus)}")
+    print(f"   exactitude legacy  : {legacy_ok}/{len(corpus)}")
+    print(f"⏱️  legacy : {legacy_us:.2f} µs/requête")
+    print(f"   compilé (cache froid) : {cold_us:.2f} µs/requête ; compilé (requêtes répétées) : {compiled_us:.2f} µs/requête")
+
+    for query, expected, got in failures:
+        print(f"❌ « {query} » : attendu {expected}, obtenu {got}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Latence de /dashboard-ai : commentaire OpenAI synchrone vs asynchrone (réponse rule-based + polling).
+
+Usage :
+    python scripts/bench_dashboard_async.py [--requests 200] [--llm-latency 0.8] [--db /tmp/bench.db]
+
+OpenAI est remplacé par un client local (StubOpenAI) qui simule la latence du
+LLM : aucun appel réseau, aucune clé nécessaire. Les caches de commentaires
+sont vidés avant chaque requête pour mesurer le pire cas (cache froid).
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import flask_app  # noqa: E402
+
+QUERIES = [
+    "courriers urgents",
+    "courriers en retard",
+    "courriers non traités",
+    "répartition par service",
+    "kpi workflow",
+    "archives",
+    "vue générale",
+]
+
+
+class StubOpenAI:
+    """Client minimal compatible avec openai_client.responses.create()."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.responses = self
+
+    def create(self, model, input, max_output_tokens=None):  # noqa: A002 - signature SDK OpenAI
+        self.calls += 1
+        time.sleep(self.latency)
+        text = f"[stub {model}] commentaire pour : {input.splitlines()[-1][:60]}"
+        return SimpleNamespace(output=[SimpleNamespace(content=[SimpleNamespace(text=text)])])
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(client, n: int, async_comment: bool):
+    timings = []
+    last = None
+    for i in range(n):
+        flask_app.comment_cache.clear()
+        t0 = time.perf_counter()
+        resp = client.post(
+            "/dashboard-ai",
+            json={"query": QUERIES[i % len(QUERIES)], "async_comment": async_comment},
+        )
+        timings.append((time.perf_counter() - t0) * 1000)
+        last = resp.get_json()
+    return timings, last
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="latence simulée du LLM (s)")
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_dashboard_kpis.db"),
+                        help="base générée par scripts/bench_dashboard_kpis.py")
+    args = parser.parse_args()
+
+    flask_app.DB_PATH = Path(args.db)
+    flask_app.data_version_tracker = flask_app.DataVersionTracker(args.db)
+    stub = StubOpenAI(args.llm_latency)
+    flask_app.openai_client = stub
+    client = flask_app.app.test_client()
+
+    sync_n = max(1, min(args.requests, 20))  # chaque requête synchrone coûte la latence du LLM
+    sync_t, _ = run(client, sync_n, async_comment=False)
+    async_t, last = run(client, args.requests, async_comment=True)
+
+    # Vérifie que le commentaire enrichi finit par être disponible via polling
+    comment_id = last.get("ai_comment_id")
+    status = None
+    deadline = time.time() + args.llm_latency * 10 + 5
+    while comment_id and time.time() < deadline:
+        status = client.get(f"/dashboard-ai/comments/{comment_id}").get_json()["status"]
+        if status != "pending":
+            break
+        time.sleep(0.05)
+    flask_app.comment_jobs.shutdown(wait=True)
+
+    print(f"\n📊 Latence /dashboard-ai (LLM simulé : {args.llm_latency * 1000:.0f} ms)")
+    print(f"{'mode':<8}{'requêtes':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+    for name, t in (("sync", sync_t), ("async", async_t)):
+        print(f"{name:<8}{len(t):>10}{percentile(t, 50):>12.1f}{percentile(t, 99):>12.1f}")
+    print(f"Appels LLM : {stub.calls} ; dernier commentaire asynchrone : {status}")
+
+
+if __name__ == "__main__":
+    main()
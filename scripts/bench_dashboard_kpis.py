@@ -0,0 +1,167 @@
+"""
+Benchmark du snapshot /dashboard-ai : ancien calcul (8 requêtes) vs agrégat en un parcours.
+
+Usage :
+    python scripts/bench_dashboard_kpis.py [--rows 1000000] [--runs 5] [--db /tmp/bench.db]
+
+La base est générée une seule fois (réutilisée si --db existe déjà avec le bon
+nombre de lignes). Pour chaque variante on affiche le nombre de requêtes SQL,
+le nombre de parcours de table (EXPLAIN QUERY PLAN « SCAN ») et la latence.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import flask_app  # noqa: E402
+
+STATUSES = ["NON_TRAITE", "EN_ATTENTE", "TRAITE", "CLOS", "PENDING", None]
+SERVICES = ["DAF", "DRH", "DG", "JURIDIQUE", "INFORMATIQUE", "LOGISTIQUE", None]
+
+
+def seed(path: str, rows: int):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    existing = 0
+    try:
+        existing = conn.execute("SELECT COUNT(*) FROM incoming_mails").fetchone()[0]
+    except sqlite3.Error:
+        pass
+    if existing == rows:
+        conn.close()
+        return
+
+    print(f"⏳ Génération de {rows} lignes dans {path} ...")
+    for table in ("incoming_mails", "courriers_sortants", "archives", "notifications"):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.execute(
+        "CREATE TABLE incoming_mails (id INTEGER PRIMARY KEY, subject TEXT, "
+        "statut TEXT, service TEXT, date_limite TEXT)"
+    )
+    conn.execute("CREATE TABLE courriers_sortants (id INTEGER PRIMARY KEY, objet TEXT)")
+    conn.execute("CREATE TABLE archives (id INTEGER PRIMARY KEY, reference TEXT)")
+    conn.execute("CREATE TABLE notifications (id INTEGER PRIMARY KEY, message TEXT)")
+
+    rnd = random.Random(42)
+    today = date.today()
+    batch = []
+    for i in range(rows):
+        due = (today + timedelta(days=rnd.randint(-60, 60))).isoformat()
+        batch.append((f"Courrier {i}", rnd.choice(STATUSES), rnd.choice(SERVICES), due))
+        if len(batch) >= 50_000:
+            conn.executemany(
+                "INSERT INTO incoming_mails (subject, statut, service, date_limite) VALUES (?, ?, ?, ?)",
+                batch,
+            )
+            batch.clear()
+    if batch:
+        conn.executemany(
+            "INSERT INTO incoming_mails (subject, statut, service, date_limite) VALUES (?, ?, ?, ?)",
+            batch,
+        )
+    conn.executemany("INSERT INTO courriers_sortants (objet) VALUES (?)", [(f"S{i}",) for i in range(rows // 10)])
+    conn.executemany("INSERT INTO archives (reference) VALUES (?)", [(f"A{i}",) for i in range(rows // 5)])
+    conn.executemany("INSERT INTO notifications (message) VALUES (?)", [(f"N{i}",) for i in range(rows // 20)])
+    conn.commit()
+    conn.close()
+
+
+def legacy_snapshot(conn):
+    """Reproduction fidèle de l'ancien calcul (4 COUNT + 4 requêtes incoming_mails)."""
+    cur = conn.cursor()
+    totals = {
+        "incoming_total": flask_app.safe_count(conn, "incoming_mails"),
+        "outgoing_total": flask_app.safe_count(conn, "courriers_sortants"),
+        "archives_total": flask_app.safe_count(conn, "archives"),
+        "notifications_total": flask_app.safe_count(conn, "notifications"),
+    }
+    kpis = {"by_status": [], "unprocessed": 0, "late": 0, "by_service": []}
+    cur.execute("SELECT statut AS status, COUNT(*) AS c FROM incoming_mails GROUP BY statut")
+    kpis["by_status"] = [{"status": r["status"], "count": r["c"]} for r in cur.fetchall()]
+    ph = ",".join("?" for _ in flask_app.UNPROCESSED_VALUES)
+    cur.execute(
+        f"SELECT COUNT(*) AS c FROM incoming_mails WHERE statut IS NULL OR UPPER(statut) IN ({ph})",
+        [v.upper() for v in flask_app.UNPROCESSED_VALUES],
+    )
+    kpis["unprocessed"] = cur.fetchone()["c"]
+    ph = ",".join("?" for _ in flask_app.DONE_VALUES)
+    cur.execute(
+        f"SELECT COUNT(*) AS c FROM incoming_mails WHERE date_limite < ? "
+        f"AND (statut IS NULL OR UPPER(statut) NOT IN ({ph}))",
+        [date.today().isoformat(), *[v.upper() for v in flask_app.DONE_VALUES]],
+    )
+    kpis["late"] = cur.fetchone()["c"]
+    cur.execute("SELECT service, COUNT(*) AS c FROM incoming_mails GROUP BY service")
+    kpis["by_service"] = [{"service": r["service"], "count": r["c"]} for r in cur.fetchall()]
+    return {"totals": totals, "incoming_kpis": kpis}
+
+
+def count_scans(conn, statements):
+    scans = 0
+    for sql in statements:
+        if not sql.lstrip().upper().startswith("SELECT"):
+            continue
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        scans += sum(1 for row in plan if " SCAN " in f" {row[-1]} ")
+    return scans
+
+
+def run(conn, fn, runs: int):
+    statements = []
+    conn.set_trace_callback(statements.append)
+    result = fn(conn)
+    conn.set_trace_callback(None)
+    # Les PRAGMA du cache de schéma ne sont pas des parcours de données
+    queries = [s for s in statements if not s.lstrip().upper().startswith("PRAGMA")]
+    scans = count_scans(conn, queries)
+
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn(conn)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return result, len(queries), scans, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_dashboard_kpis.db"))
+    args = parser.parse_args()
+
+    seed(args.db, args.rows)
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+
+    legacy, legacy_q, legacy_scans, legacy_t = run(conn, legacy_snapshot, args.runs)
+    single, single_q, single_scans, single_t = run(conn, flask_app.build_snapshot, args.runs)
+
+    if legacy != single:
+        print("❌ Les deux calculs divergent !")
+        print("   legacy :", legacy)
+        print("   single :", single)
+        sys.exit(1)
+
+    print(f"\n📊 incoming_mails = {args.rows} lignes, {args.runs} exécutions")
+    print(f"{'variante':<12}{'requêtes':>10}{'scans':>8}{'p50 (ms)':>12}{'max (ms)':>12}")
+    for name, q, sc, t in (
+        ("legacy", legacy_q, legacy_scans, legacy_t),
+        ("single-pass", single_q, single_scans, single_t),
+    ):
+        print(f"{name:<12}{q:>10}{sc:>8}{statistics.median(t):>12.1f}{max(t):>12.1f}")
+    print("✅ Snapshots identiques")
+
+
+if __name__ == "__main__":
+    main()
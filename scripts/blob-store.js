@@ -0,0 +1,53 @@
+/**
+ * Stockage dédupliqué des uploads (uploads/blobs/) : rapport et collecte manuelle.
+ * La collecte recompte d'abord les références dans toutes les colonnes de type chemin,
+ * puis supprime les blobs sans référence plus anciens que le délai de grâce.
+ *
+ * Usage : node scripts/blob-store.js report [--top 10]
+ *         node scripts/blob-store.js gc [--dry-run] [--grace-hours 24]
+ */
+const path = require('path');
+const db = require('../db/index');
+const {
+  BLOB_GC_GRACE_HOURS,
+  ensureBlobStore,
+  collectBlobGarbage,
+  getBlobStoreReport,
+} = require('../db/blobStore');
+
+function arg(name, fallback) {
+  const i = process.argv.indexOf(`--${name}`);
+  return i > 0 ? parseInt(process.argv[i + 1], 10) : fallback;
+}
+
+const mb = (bytes) => `${(bytes / 1024 / 1024).toFixed(1)} Mo`;
+
+(async () => {
+  try {
+    await ensureBlobStore(db);
+    const command = process.argv[2] || 'report';
+
+    if (command === 'gc') {
+      const dryRun = process.argv.includes('--dry-run');
+      const result = await collectBlobGarbage(db, {
+        uploadsDir: path.join(__dirname, '..', 'uploads'),
+        graceHours: arg('grace-hours', BLOB_GC_GRACE_HOURS),
+        dryRun,
+      });
+      console.log(`${dryRun ? '🔍 (simulation) ' : '🧹 '}${result.deleted} blob(s) ${dryRun ? 'à supprimer' : 'supprimé(s)'}, ${mb(result.freedBytes)}, ${result.corrected} compteur(s) corrigé(s)`);
+    } else {
+      const r = await getBlobStoreReport(db, { top: arg('top', 10) });
+      console.log(`📦 ${r.blobs} blob(s), ${mb(r.storedBytes)} stockés pour ${r.uploads} upload(s) / ${mb(r.uploadedBytes)} reçus`);
+      console.log(`♻️  Économisé par déduplication: ${mb(r.savedBytes)} (${(r.savedRatio * 100).toFixed(1)} %)`);
+      console.log(`🔗 ${r.references} référence(s) en base, ${mb(r.savedByReferencesBytes)} partagés entre lignes`);
+      console.log(`🗑️  Sans référence: ${r.orphanBlobs} blob(s), ${mb(r.orphanBytes)}`);
+      for (const d of r.topDuplicates) {
+        console.log(`   ${d.sha256.slice(0, 12)}  ${d.rel_path}  ×${d.upload_count}  ${mb(d.saved_bytes)} économisés`);
+      }
+    }
+    db.close();
+  } catch (err) {
+    console.error('❌ blob-store:', err.message);
+    process.exit(1);
+  }
+})();
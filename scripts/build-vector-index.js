@@ -0,0 +1,52 @@
+/**
+ * Construit l'index IVF des embeddings (ai/vectorIndex.js) et l'enregistre à côté
+ * de la base (<db>.ivf, ou VECTOR_INDEX_PATH). Le serveur le recharge dans la minute.
+ * Affiche le recall@10 mesuré contre le parcours exact sur un échantillon de documents.
+ *
+ * Usage : node scripts/build-vector-index.js [--nlist 0] [--nprobe 8] [--sample 50]
+ *         (--nlist 0 = √N)
+ */
+const db = require('../db/index');
+const { getEmbeddingMatrix, vectorIndexPath, EMBEDDING_MODEL } = require('../ai/semanticSearch');
+const { ExactIndex, IvfIndex, defaultNlist, measureRecall } = require('../ai/vectorIndex');
+
+function arg(name, fallback) {
+  const i = process.argv.indexOf(`--${name}`);
+  return i > 0 ? parseInt(process.argv[i + 1], 10) : fallback;
+}
+
+(async () => {
+  try {
+    const file = vectorIndexPath(db);
+    if (!file) throw new Error('Chemin de l\'index introuvable (définir VECTOR_INDEX_PATH)');
+
+    const matrix = await getEmbeddingMatrix(db);
+    if (!matrix.size) throw new Error('Aucun embedding en base (lancer la réindexation)');
+
+    const nlist = arg('nlist', 0) || defaultNlist(matrix.size);
+    const nprobe = arg('nprobe', 8);
+    const t0 = Date.now();
+    const index = IvfIndex.train(matrix, { nlist, nprobe });
+    console.log(`🧭 IVF entraîné: ${matrix.size} documents, ${index.nlist} listes en ${((Date.now() - t0) / 1000).toFixed(1)} s`);
+
+    // Requêtes = documents existants répartis sur la matrice
+    const sampleSize = Math.min(arg('sample', 50), matrix.size);
+    const queries = [];
+    for (let i = 0; i < sampleSize; i++) {
+      const slot = Math.floor((i * matrix.size) / sampleSize);
+      queries.push(Float32Array.from(matrix.get(matrix.keys[slot])));
+    }
+    const exact = new ExactIndex(matrix);
+    for (const probes of [1, 2, 4, 8, 16, 32].filter((n) => n <= index.nlist)) {
+      const recall = measureRecall(index, exact, queries, 10, { nprobe: probes });
+      console.log(`   nprobe=${String(probes).padEnd(3)} recall@10 = ${recall.toFixed(3)}${probes === nprobe ? '  ← retenu' : ''}`);
+    }
+
+    await index.save(file, { model: EMBEDDING_MODEL, builtAt: new Date().toISOString() });
+    console.log(`✅ Index IVF enregistré: ${file}`);
+    db.close();
+  } catch (err) {
+    console.error('❌ Construction index IVF échouée:', err.message);
+    process.exit(1);
+  }
+})();
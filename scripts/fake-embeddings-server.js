@@ -0,0 +1,104 @@
+/**
+ * Faux serveur d'embeddings compatible OpenAI (POST /v1/embeddings) pour tester
+ * la réindexation en masse hors ligne, sans clé ni coût.
+ *
+ * Vecteurs déterministes (hachage du texte) ; latence, erreurs 429 et 500
+ * simulées pour exercer la limitation de débit et les reprises.
+ *
+ * Usage : node scripts/fake-embeddings-server.js [--port 8089] [--dim 1536]
+ *           [--latency 150] [--rpm 0] [--fail-rate 0]
+ *         puis OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake \
+ *              node scripts/reindex-embeddings.js
+ *
+ * --rpm 0 = pas de limite ; au-delà : 429 avec en-tête Retry-After.
+ * --fail-rate 0.05 = 5 % de réponses 500.
+ */
+const http = require('http');
+const crypto = require('crypto');
+
+function arg(name, fallback) {
+  const i = process.argv.indexOf(`--${name}`);
+  return i > 0 ? process.argv[i + 1] : fallback;
+}
+
+const port = parseInt(arg('port', '8089'), 10);
+const dim = parseInt(arg('dim', '1536'), 10);
+const latency = parseInt(arg('latency', '150'), 10);
+const rpm = parseInt(arg('rpm', '0'), 10);
+const failRate = parseFloat(arg('fail-rate', '0'));
+
+const stats = { requests: 0, inputs: 0, throttled: 0, failed: 0 };
+let windowStart = Date.now();
+let windowCount = 0;
+
+// Vecteur pseudo-aléatoire déterministe dérivé du SHA-256 du texte
+function fakeEmbedding(text) {
+  const vector = new Array(dim);
+  let seed = crypto.createHash('sha256').update(text).digest().readUInt32LE(0);
+  for (let i = 0; i < dim; i++) {
+    seed = (Math.imul(seed, 1664525) + 1013904223) >>> 0;
+    vector[i] = seed / 4294967296 - 0.5;
+  }
+  return vector;
+}
+
+function send(res, status, body, headers = {}) {
+  res.writeHead(status, { 'Content-Type': 'application/json', ...headers });
+  res.end(JSON.stringify(body));
+}
+
+const server = http.createServer((req, res) => {
+  if (req.method !== 'POST' || !req.url.endsWith('/embeddings')) {
+    return send(res, 404, { error: { message: 'not found' } });
+  }
+
+  const chunks = [];
+  req.on('data', (chunk) => chunks.push(chunk));
+  req.on('end', () => {
+    stats.requests++;
+
+    if (rpm) {
+      if (Date.now() - windowStart >= 60000) {
+        windowStart = Date.now();
+        windowCount = 0;
+      }
+      if (++windowCount > rpm) {
+        stats.throttled++;
+        const retryAfter = Math.ceil((60000 - (Date.now() - windowStart)) / 1000);
+        return send(res, 429, { error: { message: 'Rate limit reached', type: 'requests' } }, { 'Retry-After': String(retryAfter) });
+      }
+    }
+
+    setTimeout(() => {
+      if (Math.random() < failRate) {
+        stats.failed++;
+        return send(res, 500, { error: { message: 'Simulated failure' } });
+      }
+
+      let body;
+      try {
+        body = JSON.parse(Buffer.concat(chunks).toString());
+      } catch (_) {
+        return send(res, 400, { error: { message: 'invalid JSON' } });
+      }
+      const inputs = Array.isArray(body.input) ? body.input : [body.input];
+      stats.inputs += inputs.length;
+
+      send(res, 200, {
+        object: 'list',
+        model: body.model,
+        data: inputs.map((text, index) => ({ object: 'embedding', index, embedding: fakeEmbedding(String(text)) })),
+        usage: { prompt_tokens: 0, total_tokens: 0 },
+      });
+    }, latency);
+  });
+});
+
+server.listen(port, '127.0.0.1', () => {
+  console.log(`🧪 Faux serveur d'embeddings sur http://127.0.0.1:${port}/v1 (dim ${dim}, latence ${latency} ms)`);
+});
+
+process.on('SIGINT', () => {
+  console.log(`\n📊 ${stats.requests} requêtes, ${stats.inputs} textes, ${stats.throttled} × 429, ${stats.failed} × 500`);
+  process.exit(0);
+});
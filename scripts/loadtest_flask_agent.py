@@ -0,0 +1,158 @@
+"""
+Test de charge de l'agent IA Flask servi par gunicorn (wsgi.py + gunicorn.conf.py).
+
+Usage :
+    python scripts/loadtest_flask_agent.py [--workers 1 4 16] [--clients 32] [--duration 15]
+                                           [--db /tmp/bench.db] [--no-cache]
+
+Pour chaque nombre de workers, un gunicorn est lancé sur un port libre, puis
+`--clients` threads envoient des POST /dashboard-ai en boucle pendant
+`--duration` secondes. OpenAI est désactivé (commentaire rule-based) pour
+mesurer l'agent lui-même. --no-cache désactive le cache de snapshots
+(TTL 0) afin de mesurer le coût SQL à chaque requête.
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+QUERIES = [
+    "courriers urgents",
+    "courriers en retard",
+    "courriers non traités",
+    "répartition par service",
+    "kpi workflow",
+    "archives",
+    "vue générale",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post(url: str, query: str):
+    body = json.dumps({"query": query}).encode("utf-8")
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        resp.read()
+        return resp.status
+
+
+def wait_ready(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            post(url, "ping")
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn ne répond pas sur {url}")
+
+
+def start_gunicorn(workers: int, port: int, args):
+    env = {
+        **os.environ,
+        "FLASK_WORKERS": str(workers),
+        "FLASK_THREADS": str(args.threads),
+        "FLASK_PORT": str(port),
+        "FLASK_ACCESS_LOG": "/dev/null",
+        "FLASK_LOG_LEVEL": "warning",
+        "OPENAI_API_KEY": "",
+        "SQLITE_DB_PATH": args.db,
+    }
+    if args.no_cache:
+        env["FLASK_DASHBOARD_CACHE_TTL"] = "0"
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def hammer(url: str, clients: int, duration: float):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client(n):
+        i = n
+        local, local_errors = [], 0
+        while time.time() < stop_at:
+            t0 = time.perf_counter()
+            try:
+                post(url, QUERIES[i % len(QUERIES)])
+                local.append((time.perf_counter() - t0) * 1000)
+            except Exception:
+                local_errors += 1
+            i += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return latencies, errors[0], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--threads", type=int, default=4, help="threads par worker (FLASK_THREADS)")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "bench_dashboard_kpis.db"),
+                        help="base générée par scripts/bench_dashboard_kpis.py")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}/dashboard-ai"
+        proc = start_gunicorn(workers, port, args)
+        try:
+            wait_ready(url)
+            latencies, errors, elapsed = hammer(url, args.clients, args.duration)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=60)
+        ordered = sorted(latencies) or [0.0]
+        results.append((
+            workers,
+            len(latencies) / elapsed,
+            statistics.median(ordered),
+            ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            errors,
+        ))
+
+    print(f"\n📊 /dashboard-ai — {args.clients} clients, {args.duration:.0f}s, "
+          f"{args.threads} threads/worker, cache {'off' if args.no_cache else 'on'}")
+    print(f"{'workers':>8}{'req/s':>10}{'p50 (ms)':>12}{'p99 (ms)':>12}{'erreurs':>10}")
+    for workers, rps, p50, p99, errors in results:
+        print(f"{workers:>8}{rps:>10.1f}{p50:>12.1f}{p99:>12.1f}{errors:>10}")
+
+
+if __name__ == "__main__":
+    main()
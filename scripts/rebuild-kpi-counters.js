@@ -0,0 +1,19 @@
+/**
+ * Reconstruit la table kpi_counters à partir des tables sources.
+ * À lancer en cas de dérive des compteurs (import SQL brut, restauration, etc.).
+ *
+ * Usage : node scripts/rebuild-kpi-counters.js
+ */
+const db = require('../db/index');
+const { ensureKpiCounters, rebuildKpiCounters } = require('../db/kpiCounters');
+
+(async () => {
+  try {
+    const tracked = await ensureKpiCounters(db);
+    await rebuildKpiCounters(db, tracked);
+    db.close();
+  } catch (err) {
+    console.error('❌ Reconstruction kpi_counters échouée:', err.message);
+    process.exit(1);
+  }
+})();
@@ -0,0 +1,19 @@
+/**
+ * Crée (si besoin) et reconstruit l'index plein texte FTS5 des courriers.
+ * À lancer pour le backfill initial ou après un import SQL brut / une restauration.
+ *
+ * Usage : node scripts/rebuild-search-index.js
+ */
+const db = require('../db/index');
+const { ensureSearchIndex, rebuildSearchIndex } = require('../db/searchIndex');
+
+(async () => {
+  try {
+    const indexed = await ensureSearchIndex(db);
+    await rebuildSearchIndex(db, indexed);
+    db.close();
+  } catch (err) {
+    console.error('❌ Reconstruction index plein texte échouée:', err.message);
+    process.exit(1);
+  }
+})();
@@ -0,0 +1,38 @@
+/**
+ * Réindexation en masse des embeddings (documents sans vecteur pour le modèle courant).
+ * Reprend automatiquement après une interruption (embedding_reindex_checkpoints).
+ *
+ * Usage : node scripts/reindex-embeddings.js [--batch 64] [--concurrency 4]
+ *                                            [--rpm 3000] [--tpm 1000000] [--reset]
+ *
+ * Hors ligne : voir scripts/fake-embeddings-server.js (OPENAI_BASE_URL).
+ */
+const db = require('../db/index');
+const { reindexAllDocuments } = require('../ai/semanticSearch');
+
+function arg(name) {
+  const i = process.argv.indexOf(`--${name}`);
+  return i > 0 ? parseInt(process.argv[i + 1], 10) : undefined;
+}
+
+(async () => {
+  try {
+    const options = {
+      batchSize: arg('batch'),
+      concurrency: arg('concurrency'),
+      rpm: arg('rpm'),
+      tpm: arg('tpm'),
+      reset: process.argv.includes('--reset'),
+    };
+    Object.keys(options).forEach((key) => options[key] === undefined && delete options[key]);
+
+    const t0 = Date.now();
+    const indexed = await reindexAllDocuments(db, options);
+    const seconds = (Date.now() - t0) / 1000;
+    console.log(`⏱️  ${indexed} documents en ${seconds.toFixed(1)} s (${(indexed / Math.max(seconds, 0.001)).toFixed(1)} docs/s)`);
+    db.close();
+  } catch (err) {
+    console.error('❌ Réindexation échouée:', err.message);
+    process.exit(1);
+  }
+})();
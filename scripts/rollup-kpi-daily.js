@@ -0,0 +1,33 @@
+/**
+ * Met à jour (ou reconstruit) la table kpi_daily_rollup.
+ * Le scheduler le fait chaque nuit ; ce script sert au rattrapage manuel / cron.
+ *
+ * Usage :
+ *   node scripts/rollup-kpi-daily.js            # incrémental (derniers jours)
+ *   node scripts/rollup-kpi-daily.js --full     # reconstruction complète
+ *   node scripts/rollup-kpi-daily.js --from 2025-01-01
+ */
+const db = require('../db/index');
+const { ensureKpiDailyRollup, refreshKpiDailyRollup } = require('../db/kpiDailyRollup');
+
+const args = process.argv.slice(2);
+const fromIndex = args.indexOf('--from');
+const fromDay = fromIndex >= 0 ? args[fromIndex + 1] : null;
+
+if (fromDay && !/^\d{4}-\d{2}-\d{2}$/.test(fromDay)) {
+  console.error('❌ --from attend une date AAAA-MM-JJ');
+  process.exit(1);
+}
+
+(async () => {
+  try {
+    await ensureKpiDailyRollup(db);
+    // --full : tous les jours sont recalculés (les retards figés sont conservés)
+    const { today } = await refreshKpiDailyRollup(db, { fromDay: args.includes('--full') ? '0000-01-01' : fromDay });
+    console.log(`✅ kpi_daily_rollup à jour jusqu'au ${today} (exclu)`);
+    db.close();
+  } catch (err) {
+    console.error('❌ Rollup KPI échoué:', err.message);
+    process.exit(1);
+  }
+})();
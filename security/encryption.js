@@ -3,6 +3,9 @@
 const crypto = require('crypto');
 const fs = require('fs');
 const path = require('path');
+const { Transform } = require('stream');
+const { pipeline } = require('stream/promises');
+const { promisify } = require('util');
 
 const MASTER_KEY_B64 = process.env.ENCRYPTION_MASTER_KEY;
 
@@ -17,8 +20,11 @@ if (MASTER_KEY_BYTES.length !== 32) {
   throw new Error('ENCRYPTION_MASTER_KEY must be base64 for exactly 32 bytes')
 }
 
+const pbkdf2 = promisify(crypto.pbkdf2);
+
+// Dérivation asynchrone : ne bloque pas la boucle d'événements
 function deriveKey(salt) {
-  return crypto.pbkdf2Sync(MASTER_KEY_BYTES, salt, 150000, 32, 'sha512');
+  return pbkdf2(MASTER_KEY_BYTES, salt, 150000, 32, 'sha512');
 }
 
 function hashFile(filePath) {
@@ -31,49 +37,91 @@ function hashFile(filePath) {
   });
 }
 
-async function encryptFile(inputPath, outputPath) {
+/**
+ * Flux de chiffrement AES-256-GCM (sel et IV neufs).
+ * Le tag d'authentification n'est disponible (getTag) qu'une fois le flux terminé.
+ */
+async function createEncryptStream() {
   const salt = crypto.randomBytes(16); // 128-bit salt
   const iv = crypto.randomBytes(12); // 96-bit IV recommandé pour GCM
-  const key = deriveKey(salt);
+  const key = await deriveKey(salt);
+  const cipher = crypto.createCipheriv('aes-256-gcm', key, iv);
+  return {
+    cipher,
+    salt: salt.toString('hex'),
+    iv: iv.toString('hex'),
+    algo: 'AES-256-GCM',
+    getTag: () => cipher.getAuthTag().toString('hex')
+  };
+}
 
-  const data = fs.readFileSync(inputPath);
-  const originalHash = crypto.createHash('sha256').update(data).digest('hex');
+/**
+ * Flux de déchiffrement : une erreur est émise en fin de flux si le tag ne correspond pas.
+ */
+async function createDecryptStream(saltHex, ivHex, tagHex) {
+  const key = await deriveKey(Buffer.from(saltHex, 'hex'));
+  const decipher = crypto.createDecipheriv('aes-256-gcm', key, Buffer.from(ivHex, 'hex'));
+  decipher.setAuthTag(Buffer.from(tagHex, 'hex'));
+  return decipher;
+}
 
-  const cipher = crypto.createCipheriv('aes-256-gcm', key, iv);
-  const encrypted = Buffer.concat([cipher.update(data), cipher.final()]);
-  const authTag = cipher.getAuthTag();
+function hashingStream(hash) {
+  return new Transform({
+    transform(chunk, encoding, callback) {
+      hash.update(chunk);
+      callback(null, chunk);
+    }
+  });
+}
+
+// Lecture, hash du clair, chiffrement, hash du chiffré et écriture en un seul passage
+async function encryptFile(inputPath, outputPath) {
+  const enc = await createEncryptStream();
+  const originalHash = crypto.createHash('sha256');
+  const encryptedHash = crypto.createHash('sha256');
 
-  fs.writeFileSync(outputPath, encrypted);
-  const encryptedHash = crypto.createHash('sha256').update(encrypted).digest('hex');
+  await pipeline(
+    fs.createReadStream(inputPath),
+    hashingStream(originalHash),
+    enc.cipher,
+    hashingStream(encryptedHash),
+    fs.createWriteStream(outputPath)
+  );
 
   return {
-    salt: salt.toString('hex'),
-    iv: iv.toString('hex'),
-    tag: authTag.toString('hex'),
-    originalHash,
-    encryptedHash,
-    algo: 'AES-256-GCM'
+    salt: enc.salt,
+    iv: enc.iv,
+    tag: enc.getTag(),
+    originalHash: originalHash.digest('hex'),
+    encryptedHash: encryptedHash.digest('hex'),
+    algo: enc.algo
   };
 }
 
 async function decryptFile(encryptedPath, outputPath, saltHex, ivHex, tagHex) {
-  const salt = Buffer.from(saltHex, 'hex');
-  const iv = Buffer.from(ivHex, 'hex');
-  const tag = Buffer.from(tagHex, 'hex');
-  const key = deriveKey(salt);
-
-  const encrypted = fs.readFileSync(encryptedPath);
-  const decipher = crypto.createDecipheriv('aes-256-gcm', key, iv);
-  decipher.setAuthTag(tag);
-  const decrypted = Buffer.concat([decipher.update(encrypted), decipher.final()]);
-  fs.writeFileSync(outputPath, decrypted);
+  const decipher = await createDecryptStream(saltHex, ivHex, tagHex);
+  const decryptedHash = crypto.createHash('sha256');
+  try {
+    await pipeline(
+      fs.createReadStream(encryptedPath),
+      decipher,
+      hashingStream(decryptedHash),
+      fs.createWriteStream(outputPath)
+    );
+  } catch (err) {
+    // Tag invalide : ne pas laisser de clair partiel sur le disque
+    await fs.promises.unlink(outputPath).catch(() => {});
+    throw err;
+  }
   return {
-    decryptedHash: crypto.createHash('sha256').update(decrypted).digest('hex')
+    decryptedHash: decryptedHash.digest('hex')
   };
 }
 
 module.exports = {
   encryptFile,
   decryptFile,
-  hashFile
+  hashFile,
+  createEncryptStream,
+  createDecryptStream
 };
@@ -38,6 +38,7 @@ const { runAllMigrations } = require('./db/migrations');
 
 // ✅ ÉTAPE 3: Import schedulers centralisés
 const { startAllSchedulers } = require('./jobs/schedulers');
+const { startOcrPool } = require('./modules/intelligence/ocrPool');
 
 // ✅ ÉTAPE 4: Import services documents (PDF, QR, OCR, IA)
 const documentsService = require('./services/documents.service');
@@ -59,16 +60,6 @@ const cors = require('cors');
 const multer = require('multer');
 const fs = require('fs');
 const fsPromises = require('fs/promises');
-let PDFParse = null;
-try {
-  ({ PDFParse } = require('pdf-parse'));
-} catch (err) {
-  console.warn(
-    '⚠️ pdf-parse indisponible: extraction PDF désactivée. Cause:',
-    err?.message || err
-  );
-  PDFParse = null;
-}
 const mammoth = require('mammoth'); // .docx extraction
 const WordExtractor = require('word-extractor'); // .doc extraction
 const { fromPath } = require('pdf2pic');
@@ -201,6 +192,11 @@ runAllMigrations(db)
     } catch (e) {
       console.error('❌ Schedulers init failed:', e?.message || e);
     }
+
+    // Pool OCR préchauffé (modèles chargés avant le premier scan)
+    if (process.env.OCR_PREWARM !== 'false') {
+      startOcrPool().catch((e) => console.warn('⚠️  Pool OCR non démarré (démarrage à la demande):', e.message));
+    }
   })
   .catch((err) => {
     logger.error('Migrations failed', { error: err.message, stack: err.stack });
@@ -381,6 +377,7 @@ const filesRoutes = require('./routes/files.routes');
 const dossiersRoutes = require('./routes/dossiers.routes');
 const agentRoutes = require('./routes/agent.routes');
 const extractPdfRoutes = require('./routes/extractPdf.routes');
+const ocrRoutes = require('./routes/ocr.routes');
 const aiQueryRoutes = require('./routes/aiQuery.routes');
 const uploadRoutes = require('./routes/upload.routes');
 const {
@@ -450,8 +447,12 @@ app.use(express.json({ limit: '10mb' })); // Limite payload JSON
 app.use(express.urlencoded({ extended: true, limit: '10mb' }));
 
 // Configuration multer pour upload de fichiers
+// (les routes /storage/* reçoivent en flux via utils/uploadPipeline.js, sans multer)
+// Fichiers dédupliqués par contenu (uploads/blobs/, utils/blobStorage.js) ; UPLOAD_DEDUP=false pour l'ancien nommage
+const { UPLOAD_ALLOWED_TYPES } = require('./utils/uploadPipeline');
+const { createBlobStorage } = require('./utils/blobStorage');
 const upload = multer({
-  storage: multer.diskStorage({
+  storage: process.env.UPLOAD_DEDUP !== 'false' ? createBlobStorage({ uploadsDir }) : multer.diskStorage({
     destination: (req, file, cb) => {
       const uploadDir = path.join(__dirname, 'uploads');
       if (!fs.existsSync(uploadDir)) {
@@ -467,15 +468,7 @@ const upload = multer({
     },
   }),
   fileFilter: (req, file, cb) => {
-    const allowedTypes = [
-      'application/msword',
-      'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-      'application/pdf',
-      'image/jpeg',
-      'image/jpg',
-      'image/png',
-    ];
-    if (allowedTypes.includes(file.mimetype)) {
+    if (UPLOAD_ALLOWED_TYPES.includes(file.mimetype)) {
       cb(null, true);
     } else {
       cb(new Error('Type de fichier non supporté. Utilisez .doc, .docx, .pdf, .jpg, .jpeg ou .png.'));
@@ -797,8 +790,6 @@ const secretariatRouter = secretariatRoutes({
   baseDir: __dirname,
   sqlite3,
   dbPath: DB_PATH,
-  pdfParse: PDFParse,
-  PDFParse,
   extractTextWithOCR,
   analyzeDocumentAsync,
   analyzeDocument,
@@ -831,13 +822,13 @@ app.use('/api', n8nRouter)
 const storageRouter = storageRoutes({
   authenticateToken,
   authorizeRoles,
-  upload,
   minioConfig,
   fs,
   fsPromises,
   path,
   crypto,
   baseDir: __dirname,
+  db,
   resolveAlertsByType,
   upsertAlertByType,
 })
@@ -937,13 +928,20 @@ const extractPdfRouter = extractPdfRoutes({
   openai,
   path,
   fsPromises,
-  PDFParse,
+  extractTextFromPDF,
   extractTextWithOCR,
   calculateFileHash,
   baseDir: __dirname,
 })
 app.use('/api', extractPdfRouter)
 
+// Travaux OCR (pool de workers, file bornée, suivi par identifiant)
+const ocrRouter = ocrRoutes({
+  authenticateToken,
+  upload,
+})
+app.use('/api', ocrRouter)
+
 const aiQueryRouter = aiQueryRoutes({
   authenticateToken,
   openai,
@@ -1803,7 +1801,7 @@ app.get('/auth/google/callback',
     const token = jwt.sign(
       { id: req.user.id, email: req.user.email },
       SECRET_KEY,
-      { expiresIn: '24h' }
+      { expiresIn: '24h', keyid: authenticateToken.keyIdFor(SECRET_KEY) }
     );
     // Rediriger vers le frontend avec le token
     res.redirect(`http://localhost:5174/#/oauth-callback?token=${token}`);
@@ -1822,7 +1820,7 @@ app.get('/auth/oauth2/callback',
     const token = jwt.sign(
       { id: req.user.id },
       SECRET_KEY,
-      { expiresIn: '24h' }
+      { expiresIn: '24h', keyid: authenticateToken.keyIdFor(SECRET_KEY) }
     );
     res.redirect(`http://localhost:5174/#/oauth-callback?token=${token}`);
   }
@@ -89,10 +89,8 @@ async function getArchivesAll({ db }) {
   );
 }
 
-async function listArchives({ db, filters }) {
-  const { service, category, type, status, limit = 100, page = 1 } = filters;
-
-  let sql = `
+// Colonnes de la liste des archives (courrier d'origine joint sous l'alias im)
+const ARCHIVES_LIST_SELECT = `
     SELECT
       a.id,
       a.reference,
@@ -124,6 +122,8 @@ async function listArchives({ db, filters }) {
     WHERE 1=1
   `;
 
+function archivesListFilters({ service, category, type, status, year }) {
+  let sql = '';
   const params = [];
 
   if (service && service !== 'ALL') {
@@ -146,6 +146,20 @@ async function listArchives({ db, filters }) {
     params.push(status);
   }
 
+  if (year) {
+    sql += ' AND a.date >= ? AND a.date < ?';
+    params.push(`${year}-01-01`, `${Number(year) + 1}-01-01`);
+  }
+
+  return { sql, params };
+}
+
+async function listArchives({ db, filters }) {
+  const { limit = 100, page = 1 } = filters;
+  const where = archivesListFilters(filters);
+  let sql = ARCHIVES_LIST_SELECT + where.sql;
+  const params = [...where.params];
+
   sql += ' ORDER BY a.date DESC, a.created_at DESC';
   const offset = (parseInt(page) - 1) * parseInt(limit);
   sql += ' LIMIT ? OFFSET ?';
@@ -153,31 +167,12 @@ async function listArchives({ db, filters }) {
 
   const rows = await dbAll(db, sql, params);
 
-  let countSql = 'SELECT COUNT(*) as total FROM archives a WHERE 1=1';
-  const countParams = [];
-
-  if (service && service !== 'ALL') {
-    countSql +=
-      ' AND EXISTS (SELECT 1 FROM incoming_mails im WHERE im.id = a.incoming_mail_id AND im.assigned_service = ?)';
-    countParams.push(service);
-  }
-
-  if (category) {
-    countSql += ' AND a.category = ?';
-    countParams.push(category);
-  }
-
-  if (type) {
-    countSql += ' AND a.type = ?';
-    countParams.push(type);
-  }
-
-  if (status) {
-    countSql += ' AND COALESCE(a.status, "Archivé") = ?';
-    countParams.push(status);
-  }
-
-  const countRow = await dbGet(db, countSql, countParams);
+  // Mêmes filtres que la liste (jointure im incluse) : liste et total ne peuvent pas diverger
+  const countSql = `SELECT COUNT(*) as total
+    FROM archives a
+    LEFT JOIN incoming_mails im ON im.id = a.incoming_mail_id
+    WHERE 1=1${where.sql}`;
+  const countRow = await dbGet(db, countSql, where.params);
   const total = countRow?.total || 0;
 
   return {
@@ -191,6 +186,19 @@ async function listArchives({ db, filters }) {
   };
 }
 
+/**
+ * Requête d'export (registre) des archives : mêmes filtres que listArchives, sans pagination.
+ * Destinée à utils/streamExport.js (lecture par curseur).
+ * @returns {{sql: string, params: Array}}
+ */
+function archivesExportQuery(filters = {}) {
+  const where = archivesListFilters(filters);
+  return {
+    sql: `${ARCHIVES_LIST_SELECT}${where.sql} ORDER BY a.date DESC, a.created_at DESC`,
+    params: where.params,
+  };
+}
+
 async function getArchiveCounts({ db }) {
   const sql = `
     SELECT 
@@ -223,6 +231,7 @@ module.exports = {
   getArchivesPublic,
   getArchivesAll,
   listArchives,
+  archivesExportQuery,
   getArchiveCounts,
   getArchiveAnnexes,
 };
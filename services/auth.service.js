@@ -158,26 +158,29 @@ async function loginUser({ db, email, username, password }) {
   return user;
 }
 
-async function issueRefreshToken({ db, userId, ttlDays = 7, ip, userAgent }) {
+// sessionId : identifiant de la session (connexion), conservé d'une rotation à l'autre et porté
+// par les tokens d'accès (claim sid) pour que la déconnexion ne révoque que cette session
+async function issueRefreshToken({ db, userId, ttlDays = 7, ip, userAgent, sessionId = null }) {
   const token = generateRefreshToken();
   const tokenHash = sha256(token);
   const expiresAt = new Date(Date.now() + ttlDays * 24 * 60 * 60 * 1000).toISOString();
+  const sid = sessionId || crypto.randomUUID();
 
   await dbRun(
     db,
-    `INSERT INTO refresh_tokens (user_id, token_hash, expires_at, ip_address, user_agent)
-     VALUES (?, ?, ?, ?, ?)` ,
-    [userId, tokenHash, expiresAt, ip || null, userAgent || null],
+    `INSERT INTO refresh_tokens (user_id, token_hash, expires_at, ip_address, user_agent, session_id)
+     VALUES (?, ?, ?, ?, ?, ?)` ,
+    [userId, tokenHash, expiresAt, ip || null, userAgent || null, sid],
   );
 
-  return { token, expires_at: expiresAt };
+  return { token, expires_at: expiresAt, session_id: sid };
 }
 
 async function rotateRefreshToken({ db, refreshToken, ip, userAgent, ttlDays = 7 }) {
   const tokenHash = sha256(refreshToken);
   const row = await dbGet(
     db,
-    `SELECT id, user_id, expires_at, revoked_at FROM refresh_tokens WHERE token_hash = ?`,
+    `SELECT id, user_id, expires_at, revoked_at, session_id FROM refresh_tokens WHERE token_hash = ?`,
     [tokenHash],
   );
 
@@ -193,7 +196,14 @@ async function rotateRefreshToken({ db, refreshToken, ip, userAgent, ttlDays = 7
     throw err;
   }
 
-  const next = await issueRefreshToken({ db, userId: row.user_id, ttlDays, ip, userAgent });
+  const next = await issueRefreshToken({
+    db,
+    userId: row.user_id,
+    ttlDays,
+    ip,
+    userAgent,
+    sessionId: row.session_id,
+  });
   await dbRun(
     db,
     `UPDATE refresh_tokens SET revoked_at = datetime('now'), replaced_by = ? WHERE id = ?`,
@@ -205,11 +215,17 @@ async function rotateRefreshToken({ db, refreshToken, ip, userAgent, ttlDays = 7
 
 async function revokeRefreshToken({ db, refreshToken }) {
   const tokenHash = sha256(refreshToken);
+  const row = await dbGet(
+    db,
+    `SELECT user_id, session_id FROM refresh_tokens WHERE token_hash = ? AND revoked_at IS NULL`,
+    [tokenHash],
+  );
   await dbRun(
     db,
     `UPDATE refresh_tokens SET revoked_at = datetime('now') WHERE token_hash = ? AND revoked_at IS NULL`,
     [tokenHash],
   );
+  return row ? { user_id: row.user_id, session_id: row.session_id || null } : null;
 }
 
 async function cleanupExpiredRefreshTokens({ db, maxRevokedAgeDays = 30 }) {
@@ -1,3 +1,6 @@
+const { forgetDocument } = require('../ai/semanticSearch');
+const { EMBEDDING_SOURCES } = require('../db/documentEmbeddings');
+
 function dbRun(db, sql, params = []) {
   return new Promise((resolve, reject) => {
     db.run(sql, params, function (err) {
@@ -9,6 +12,9 @@ function dbRun(db, sql, params = []) {
 
 async function deleteById({ db, table, id }) {
   const result = await dbRun(db, `DELETE FROM ${table} WHERE id = ?`, [id]);
+  if (result.changes && EMBEDDING_SOURCES.includes(table)) {
+    await forgetDocument(db, table, id);
+  }
   return result.changes;
 }
 
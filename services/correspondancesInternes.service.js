@@ -1,5 +1,6 @@
 const fs = require('fs');
 const path = require('path');
+const { isBlobPath } = require('../utils/blobStorage');
 
 function dbAll(db, sql, params = []) {
   return new Promise((resolve, reject) => {
@@ -124,7 +125,7 @@ async function deleteInterne({ db, id, baseDir }) {
     throw err;
   }
 
-  if (row.piece_jointe && baseDir) {
+  if (row.piece_jointe && baseDir && !isBlobPath(row.piece_jointe)) {
     const filePath = path.join(baseDir, row.piece_jointe);
     fs.unlink(filePath, (err) => {
       if (err) console.warn('Erreur lors de la suppression du fichier :', err.message);
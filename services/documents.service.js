@@ -15,19 +15,9 @@ const fs = require('fs');
 const fsPromises = require('fs/promises');
 const QRCode = require('qrcode');
 const { PDFDocument, StandardFonts } = require('pdf-lib');
-let PDFParse = null;
-try {
-  ({ PDFParse } = require('pdf-parse'));
-} catch (err) {
-  console.warn(
-    '⚠️ pdf-parse indisponible: extraction PDF désactivée. Cause:',
-    err?.message || err
-  );
-  PDFParse = null;
-}
 const mammoth = require('mammoth');
-const Tesseract = require('tesseract.js');
-const { fromPath } = require('pdf2pic');
+const { recognizeFile } = require('../modules/intelligence/ocrPool');
+const pdfText = require('../utils/pdf');
 const axios = require('axios');
 const { analyzeDocument } = require('../ai/documentAnalyzer');
 const { indexDocument } = require('../ai/semanticSearch');
@@ -199,25 +189,13 @@ async function generateARPDF(mail) {
 
 /**
  * Extrait le texte d'un fichier PDF
- * Utilise pdf-parse v2
+ * Utilise pdf-parse v2 dans le pool de workers de utils/pdf.js (cache par sha256)
  * 
  * @param {string} filePath - Chemin absolu du fichier PDF
  * @returns {Promise<string>} Texte extrait (vide si échec)
  */
 async function extractTextFromPDF(filePath) {
-  try {
-    if (!PDFParse) {
-      console.warn('⚠️ Extraction PDF ignorée (pdf-parse indisponible):', filePath);
-      return '';
-    }
-    const dataBuffer = await fsPromises.readFile(filePath);
-    const parser = new PDFParse({ data: dataBuffer });
-    const pdfData = await parser.getText();
-    return pdfData.text.trim();
-  } catch (error) {
-    console.error('❌ Erreur extraction texte PDF:', filePath, error.message);
-    return '';
-  }
+  return pdfText.extractTextFromPDF(filePath);
 }
 
 /**
@@ -315,8 +293,9 @@ async function callAISummary(text, subject) {
 
 /**
  * Extrait le texte d'un PDF via OCR (Tesseract)
- * Convertit chaque page en image puis applique OCR
- * Langues : français + anglais + détection orientation
+ * Pages converties en images puis reconnues en parallèle par le pool OCR
+ * (modules/intelligence/ocrPool.js)
+ * Langues : OCR_LANGS (français + anglais + détection orientation par défaut)
  * 
  * @param {string} pdfPath - Chemin absolu du PDF
  * @returns {Promise<string>} Texte extrait via OCR (vide si échec)
@@ -324,47 +303,14 @@ async function callAISummary(text, subject) {
 async function extractTextWithOCR(pdfPath) {
   try {
     console.log('🧠 OCR en cours sur:', pdfPath);
+    const startedAt = Date.now();
 
-    const convert = fromPath(pdfPath, {
-      density: 200,
-      saveFilename: 'page',
-      savePath: path.join(__dirname, '..', 'uploads', 'temp-ocr'),
-      format: 'png',
-      width: 2000,
-      height: 2000,
-    });
-
-    let fullText = '';
-    let page = 1;
-    let hasNext = true;
-
-    while (hasNext) {
-      const result = await convert(page, { responseType: 'image' }).catch(() => null);
-      
-      if (!result || !result.path) {
-        hasNext = false;
-        break;
-      }
-
-      const imagePath = result.path;
-      console.log(`🧠 OCR page ${page} (${imagePath})...`);
-
-      const { data: { text } } = await Tesseract.recognize(imagePath, 'fra+eng+osd', {
-        tessedit_pageseg_mode: 1,
-        logger: m => console.log(`OCR ${page}: ${Math.round(m.progress * 100)}%`)
-      });
-
-      if (text && text.trim().length > 0) {
-        fullText += `\n--- PAGE ${page} ---\n${text}`;
-      }
-
-      // Nettoyer l'image temporaire
-      await fsPromises.unlink(imagePath).catch(() => {});
-      page++;
-    }
+    const fullText = await recognizeFile(pdfPath);
 
     if (fullText.trim().length === 0) {
       console.warn("⚠️ Aucun texte OCR détecté.");
+    } else {
+      console.log(`✅ OCR terminé en ${Date.now() - startedAt} ms: ${pdfPath}`);
     }
 
     return fullText.trim();
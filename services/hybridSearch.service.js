@@ -0,0 +1,205 @@
+const { ftsTable, columnWeights, toFtsQuery } = require('../db/searchIndex');
+const { MAIL_SEARCH_SELECTS, MAX_SEARCH_LIMIT, loadSearchIndexes } = require('./search.service');
+const { semanticHits, resolveTargetTables, buildTableQuery } = require('../ai/semanticSearch');
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+// Constante k de la fusion RRF : score = Σ poids / (k + rang)
+const RRF_K = 60;
+// Candidats demandés à chaque moteur : 3 × la fin de page, bornés
+const CANDIDATE_FACTOR = 3;
+const MAX_CANDIDATES = 600;
+// Seuil sémantique bas : la fusion se charge du classement
+const HYBRID_SEMANTIC_THRESHOLD = 0.25;
+const SNIPPET_TOKENS = 12;
+
+function hitKey(table, id) {
+  return `${table}:${id}`;
+}
+
+function whereClause(base, query) {
+  return [base, ...query.conditions].filter(Boolean).join(' AND ');
+}
+
+/**
+ * Candidats lexicaux d'une table : FTS5 (bm25 + extrait) ou LIKE sans index.
+ * Les filtres (statut, type, dates) s'appliquent dans la requête, avant le classement.
+ */
+async function lexicalHitsForTable(db, table, term, filters, indexes, limit) {
+  const query = buildTableQuery(table, filters);
+  if (!query) return [];
+
+  if (indexes[table]) {
+    const match = toFtsQuery(term);
+    if (!match) return [];
+    const fts = ftsTable(table);
+    const rows = await dbAll(
+      db,
+      `SELECT m.id AS id,
+         bm25(${fts}, ${columnWeights(indexes[table]).join(', ')}) AS rank,
+         snippet(${fts}, -1, '<mark>', '</mark>', '…', ${SNIPPET_TOKENS}) AS snippet
+       FROM ${fts}
+       JOIN ${table} m ON m.id = ${fts}.rowid
+       WHERE ${whereClause(`${fts} MATCH ?`, query)}
+       ORDER BY rank ASC
+       LIMIT ?`,
+      [match, ...query.params, limit],
+    );
+    return rows.map((row) => ({ table, id: row.id, rank: row.rank, snippet: row.snippet }));
+  }
+
+  const pattern = `%${term}%`;
+  const like = MAIL_SEARCH_SELECTS[table].like;
+  const rows = await dbAll(
+    db,
+    `SELECT m.id AS id FROM ${table} m
+     WHERE ${whereClause(`(${like.map((c) => `m.${c} LIKE ?`).join(' OR ')})`, query)}
+     ORDER BY m.id DESC
+     LIMIT ?`,
+    [...like.map(() => pattern), ...query.params, limit],
+  );
+  // Sans bm25 : ordre d'arrivée (plus récent d'abord)
+  return rows.map((row, i) => ({ table, id: row.id, rank: i, snippet: null }));
+}
+
+/**
+ * Candidats lexicaux, une liste classée par table : bm25 n'est comparable qu'au sein
+ * d'une même table FTS (et LIKE n'a qu'un rang de position), chaque liste entre donc
+ * séparément dans la fusion RRF au lieu d'être triée sur des scores bruts.
+ */
+async function lexicalHits(db, term, tables, filters, limit) {
+  const indexes = await loadSearchIndexes(db);
+  const perTable = await Promise.all(
+    tables.map((table) => lexicalHitsForTable(db, table, term, filters, indexes, limit)),
+  );
+  const indexed = tables.filter((table) => indexes[table]).length;
+  return {
+    engine: indexed === tables.length ? 'fts5' : (indexed ? 'fts5+like' : 'like'),
+    lists: perTable.filter((hits) => hits.length),
+  };
+}
+
+/**
+ * Fusion RRF pondérée de listes classées.
+ * @param {Array<{name: string, weight: number, hits: Array<{table: string, id: number}>}>} lists
+ * @returns {Array<Object>} candidats triés par score décroissant
+ */
+function fuseRankings(lists, k = RRF_K) {
+  const fused = new Map();
+  for (const { name, weight, hits } of lists) {
+    hits.forEach((hit, index) => {
+      const key = hitKey(hit.table, hit.id);
+      let entry = fused.get(key);
+      if (!entry) {
+        entry = { table: hit.table, id: hit.id, score: 0, ranks: {} };
+        fused.set(key, entry);
+      }
+      entry.score += weight / (k + index + 1);
+      entry.ranks[name] = index + 1;
+      if (hit.snippet) entry.snippet = hit.snippet;
+      if (hit.score !== undefined) entry.similarity = hit.score;
+    });
+  }
+  return [...fused.values()].sort((a, b) => b.score - a.score);
+}
+
+/**
+ * Lignes (format commun des routes de recherche) des candidats d'une page.
+ * @returns {Promise<Map<string, Object>>}
+ */
+async function fetchRows(db, candidates) {
+  const idsByTable = new Map();
+  for (const { table, id } of candidates) {
+    if (!idsByTable.has(table)) idsByTable.set(table, []);
+    idsByTable.get(table).push(id);
+  }
+
+  const rowsByKey = new Map();
+  await Promise.all([...idsByTable].map(async ([table, ids]) => {
+    const rows = await dbAll(
+      db,
+      `SELECT ${MAIL_SEARCH_SELECTS[table].select} FROM ${table} m WHERE m.id IN (${ids.map(() => '?').join(', ')})`,
+      ids,
+    );
+    for (const row of rows) rowsByKey.set(hitKey(table, row.id), row);
+  }));
+  return rowsByKey;
+}
+
+/**
+ * Recherche hybride : index plein texte et index vectoriel interrogés en parallèle,
+ * avec les mêmes filtres (statut, type, dates, tables), puis fusion RRF.
+ * Si un moteur échoue (index absent, API embeddings indisponible), l'autre suffit.
+ *
+ * @param {Object} params
+ * @param {string} params.term
+ * @param {Object} [params.filters] - status, type, startDate, endDate, tables
+ * @param {number} [params.limit]
+ * @param {number} [params.offset]
+ * @param {{lexical?: number, semantic?: number}} [params.weights]
+ * @returns {Promise<{results: Object[], hasMore: boolean, engines: {lexical: string|null, semantic: string|null}}>}
+ */
+async function hybridSearch({ db, term, filters = {}, limit = 20, offset = 0, weights = {}, threshold }) {
+  const safeLimit = Math.min(Math.max(parseInt(limit, 10) || 20, 1), MAX_SEARCH_LIMIT);
+  const safeOffset = Math.max(parseInt(offset, 10) || 0, 0);
+  const depth = Math.min((safeOffset + safeLimit) * CANDIDATE_FACTOR, MAX_CANDIDATES);
+  const tables = resolveTargetTables(filters).filter((table) => MAIL_SEARCH_SELECTS[table] && buildTableQuery(table));
+  if (!tables.length) return { results: [], hasMore: false, engines: { lexical: null, semantic: null } };
+
+  const [lexical, semantic] = await Promise.all([
+    lexicalHits(db, term, tables, filters, depth).catch((err) => {
+      console.warn('⚠️  Recherche hybride: volet lexical indisponible:', err.message);
+      return null;
+    }),
+    semanticHits(term, db, {
+      ...filters,
+      tables,
+      limit: depth,
+      threshold: threshold ?? HYBRID_SEMANTIC_THRESHOLD,
+    }).catch((err) => {
+      console.warn('⚠️  Recherche hybride: volet sémantique indisponible:', err.message);
+      return null;
+    }),
+  ]);
+  if (!lexical && !semantic) throw new Error('Aucun moteur de recherche disponible');
+
+  const fused = fuseRankings([
+    ...(lexical ? lexical.lists.map((hits) => ({ name: 'lexical', weight: weights.lexical ?? 1, hits })) : []),
+    semantic && { name: 'semantic', weight: weights.semantic ?? 1, hits: semantic },
+  ].filter(Boolean));
+
+  const page = fused.slice(safeOffset, safeOffset + safeLimit);
+  const rowsByKey = await fetchRows(db, page);
+  const results = [];
+  for (const candidate of page) {
+    const row = rowsByKey.get(hitKey(candidate.table, candidate.id));
+    if (!row) continue;
+    results.push({
+      ...row,
+      score: candidate.score,
+      lexicalRank: candidate.ranks.lexical || null,
+      semanticRank: candidate.ranks.semantic || null,
+      similarity: candidate.similarity ?? null,
+      snippet: candidate.snippet || null,
+    });
+  }
+
+  return {
+    results,
+    hasMore: fused.length > safeOffset + safeLimit,
+    engines: { lexical: lexical ? lexical.engine : null, semantic: semantic ? 'vector' : null },
+  };
+}
+
+module.exports = {
+  RRF_K,
+  fuseRankings,
+  hybridSearch,
+};
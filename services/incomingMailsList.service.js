@@ -0,0 +1,210 @@
+const { getKpiCounters, sumBuckets } = require('../db/kpiCounters');
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+function dbGet(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.get(sql, params, (err, row) => {
+      if (err) return reject(err);
+      resolve(row);
+    });
+  });
+}
+
+// Champs de la liste des courriers entrants (nom exposé → expression SQL)
+const INCOMING_LIST_FIELDS = {
+  id: 'id',
+  ref_code: 'ref_code',
+  subject: 'subject',
+  sender: 'sender',
+  recipient: 'recipient',
+  mail_date: 'mail_date',
+  arrival_date: 'date_reception AS arrival_date',
+  status: 'statut_global AS status',
+  file_path: 'file_path',
+  summary: 'summary',
+  comment: 'comment',
+  assigned_service: 'assigned_service',
+  assigned_to: 'assigned_to',
+  id_type_document: 'id_type_document',
+  is_mission_doc: 'is_mission_doc',
+  mission_reference: 'mission_reference',
+  date_retour_mission: 'date_retour_mission',
+  classeur: 'classeur',
+  qr_code_path: 'qr_code_path',
+  ar_pdf_path: 'ar_pdf_path',
+  response_required: 'response_required',
+  response_due: 'response_due',
+  response_outgoing_id: 'response_outgoing_id',
+  response_created_at: 'response_created_at',
+};
+
+// Toujours renvoyés : clé du curseur (date_reception, id)
+const CURSOR_FIELDS = ['id', 'arrival_date'];
+const MAX_PAGE_SIZE = 500;
+// Au-delà, le total est borné et signalé comme estimation
+const COUNT_CAP = 10000;
+
+/**
+ * Champs demandés (`fields=id,subject,status`) ; tous les champs par défaut.
+ * @returns {{fields: string[], unknown: string[]}}
+ */
+function parseListFields(param) {
+  if (!param) return { fields: Object.keys(INCOMING_LIST_FIELDS), unknown: [] };
+  const wanted = String(param).split(',').map((f) => f.trim()).filter(Boolean);
+  const unknown = wanted.filter((f) => !INCOMING_LIST_FIELDS[f]);
+  const fields = [...new Set([...CURSOR_FIELDS, ...wanted.filter((f) => INCOMING_LIST_FIELDS[f])])];
+  return { fields, unknown };
+}
+
+function encodeCursor(row) {
+  return Buffer.from(JSON.stringify([row.arrival_date ?? null, row.id])).toString('base64url');
+}
+
+/**
+ * @returns {null|{date: string|null, id: number}} null si le curseur est invalide
+ */
+function decodeCursor(cursor) {
+  try {
+    const [date, id] = JSON.parse(Buffer.from(String(cursor), 'base64url').toString());
+    if (!Number.isInteger(id) || (date !== null && typeof date !== 'string')) return null;
+    return { date, id };
+  } catch (_) {
+    return null;
+  }
+}
+
+/**
+ * Segments à lire après le curseur pour ORDER BY date_reception DESC, id DESC
+ * (les dates NULL viennent en dernier). Chaque segment est une recherche d'intervalle
+ * dans l'index (filtre, date_reception) : la comparaison de ligne (date_reception, id) < (?, ?)
+ * est lue comme date_reception < ?, alors qu'un OR avec « IS NULL » force un parcours complet.
+ * La queue à date NULL est un second segment, lu une fois la plage datée épuisée.
+ */
+function cursorSegments(cursor) {
+  const nullTail = { sql: 'date_reception IS NULL', params: [], order: 'id DESC' };
+  if (!cursor) return [{ sql: null, params: [], order: 'date_reception DESC, id DESC' }];
+  if (cursor.date === null) {
+    return [{ ...nullTail, sql: 'date_reception IS NULL AND id < ?', params: [cursor.id] }];
+  }
+  return [
+    { sql: '(date_reception, id) < (?, ?)', params: [cursor.date, cursor.id], order: 'date_reception DESC, id DESC' },
+    nullTail,
+  ];
+}
+
+/**
+ * Liste des courriers entrants, plus récents d'abord.
+ * Sans `limit` : toutes les lignes (comportement historique). Avec `limit` :
+ * une page lue par l'index (filtre, date_reception) et le curseur de la suivante.
+ *
+ * @param {Object} db
+ * @param {Object} options
+ * @param {string[]} options.conditions - conditions SQL des filtres
+ * @param {Array} options.params
+ * @param {string[]} options.fields - voir parseListFields
+ * @param {number} [options.limit]
+ * @param {{date: string|null, id: number}} [options.cursor]
+ * @returns {Promise<{rows: Object[], nextCursor: string|null}>}
+ */
+async function listIncomingMails(db, { conditions, params, fields, limit, cursor }) {
+  const select = `SELECT ${fields.map((f) => INCOMING_LIST_FIELDS[f]).join(', ')} FROM incoming_mails`;
+  const pageSize = limit ? Math.min(Math.max(limit, 1), MAX_PAGE_SIZE) : null;
+  // Une ligne de plus que la page : indique s'il reste une suite
+  const wanted = pageSize ? pageSize + 1 : null;
+
+  let rows = [];
+  for (const segment of cursorSegments(cursor)) {
+    if (wanted && rows.length >= wanted) break;
+    const where = segment.sql ? [...conditions, segment.sql] : conditions;
+    let sql = select;
+    if (where.length) sql += ` WHERE ${where.join(' AND ')}`;
+    sql += ` ORDER BY ${segment.order}`;
+    const values = [...params, ...segment.params];
+    if (wanted) {
+      sql += ' LIMIT ?';
+      values.push(wanted - rows.length);
+    }
+    rows = rows.concat(await dbAll(db, sql, values));
+  }
+
+  if (!pageSize) {
+    return { rows, nextCursor: null };
+  }
+
+  const hasMore = rows.length > pageSize;
+  const page = hasMore ? rows.slice(0, pageSize) : rows;
+  return { rows: page, nextCursor: hasMore ? encodeCursor(page[page.length - 1]) : null };
+}
+
+/**
+ * Nombre de courriers correspondant aux filtres.
+ * Filtre de statut seul (ou aucun filtre) : compteurs matérialisés kpi_counters, en O(1).
+ * Sinon COUNT borné à COUNT_CAP (au-delà : estimated = true).
+ *
+ * @param {Object} options
+ * @param {string[]|null} options.statuses - statuts filtrés
+ * @param {boolean} options.statusOnly - aucune autre condition que le statut
+ * @returns {Promise<{total: number, estimated: boolean}>}
+ */
+async function countIncomingMails(db, { conditions, params, statuses, statusOnly }) {
+  if (statusOnly) {
+    const counters = await getKpiCounters(db, 'incoming_mails').catch(() => null);
+    const total = counters && (statuses ? sumBuckets(counters, 'statut_global', statuses) : counters.total);
+    if (total !== null && total !== undefined) return { total, estimated: false };
+  }
+
+  const where = conditions.length ? `WHERE ${conditions.join(' AND ')}` : '';
+  const row = await dbGet(
+    db,
+    `SELECT COUNT(*) AS total FROM (SELECT 1 FROM incoming_mails ${where} LIMIT ${COUNT_CAP + 1})`,
+    params,
+  );
+  const total = row?.total || 0;
+  return { total: Math.min(total, COUNT_CAP), estimated: total > COUNT_CAP };
+}
+
+/**
+ * Requête d'export du registre (ordre chronologique), pour utils/streamExport.js.
+ * Période : année (`year`) ou bornes `startDate` / `endDate` (incluses) sur date_reception.
+ * @returns {{sql: string, params: Array}}
+ */
+function incomingMailsExportQuery({ conditions, params, fields, year, startDate, endDate }) {
+  const where = [...conditions];
+  const values = [...params];
+  if (year) {
+    where.push('date_reception >= ? AND date_reception < ?');
+    values.push(`${year}-01-01`, `${Number(year) + 1}-01-01`);
+  }
+  if (startDate) {
+    where.push('date_reception >= ?');
+    values.push(startDate);
+  }
+  if (endDate) {
+    // Borne incluse : toute la journée de endDate
+    where.push("date_reception < date(?, '+1 day')");
+    values.push(endDate);
+  }
+
+  let sql = `SELECT ${fields.map((f) => INCOMING_LIST_FIELDS[f]).join(', ')} FROM incoming_mails`;
+  if (where.length) sql += ` WHERE ${where.join(' AND ')}`;
+  sql += ' ORDER BY date_reception ASC, id ASC';
+  return { sql, params: values };
+}
+
+module.exports = {
+  INCOMING_LIST_FIELDS,
+  MAX_PAGE_SIZE,
+  parseListFields,
+  decodeCursor,
+  listIncomingMails,
+  countIncomingMails,
+  incomingMailsExportQuery,
+};
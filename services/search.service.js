@@ -0,0 +1,254 @@
+const { ftsTable, columnWeights, getSearchIndexes, toFtsQuery } = require('../db/searchIndex');
+
+function dbGet(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.get(sql, params, (err, row) => {
+      if (err) return reject(err);
+      resolve(row);
+    });
+  });
+}
+
+function dbAll(db, sql, params = []) {
+  return new Promise((resolve, reject) => {
+    db.all(sql, params, (err, rows) => {
+      if (err) return reject(err);
+      resolve(rows || []);
+    });
+  });
+}
+
+// Colonnes renvoyées par source (alias m = table source), format commun aux routes de recherche
+const MAIL_SEARCH_SELECTS = {
+  incoming_mails: {
+    select: `m.id, m.ref_code, m.subject, m.sender, m.recipient,
+      m.mail_date,
+      m.date_reception AS arrival_date,
+      m.statut_global AS status,
+      m.file_path,
+      m.summary,
+      m.id_type_document,
+      m.is_mission_doc,
+      m.mission_reference,
+      m.date_retour_mission,
+      m.classeur,
+      'incoming' as source`,
+    like: ['ref_code', 'subject', 'sender', 'recipient', 'extracted_text'],
+  },
+  archives: {
+    select: `m.incoming_mail_id as id,
+      m.reference as ref_code,
+      m.description as subject,
+      m.sender as sender,
+      '' as recipient,
+      m.date as mail_date,
+      m.date as arrival_date,
+      m.status as status,
+      m.file_path,
+      m.summary as summary,
+      NULL as id_type_document,
+      0 as is_mission_doc,
+      '' as mission_reference,
+      NULL as date_retour_mission,
+      m.classeur,
+      'archived' as source`,
+    like: ['reference', 'description', 'category'],
+    filter: 'm.incoming_mail_id IS NOT NULL',
+  },
+  courriers_sortants: {
+    select: `m.id,
+      COALESCE(m.reference_unique, 'CS-' || m.id) as ref_code,
+      m.objet as subject,
+      '' as sender,
+      m.destinataire as recipient,
+      COALESCE(m.date_edition, substr(m.created_at, 1, 10)) as mail_date,
+      COALESCE(m.date_edition, substr(m.created_at, 1, 10)) as arrival_date,
+      m.statut as status,
+      COALESCE(m.original_file_path, m.preview_pdf, '') as file_path,
+      COALESCE(m.extracted_text, '') as summary,
+      NULL as id_type_document,
+      0 as is_mission_doc,
+      '' as mission_reference,
+      NULL as date_retour_mission,
+      '' as classeur,
+      'outgoing' as source`,
+    like: ['objet', 'destinataire', 'extracted_text'],
+  },
+  outgoing_mails: {
+    select: `m.id,
+      'OUT-' || m.id as ref_code,
+      m.subject,
+      '' as sender,
+      m.recipient,
+      m.mail_date as mail_date,
+      m.mail_date as arrival_date,
+      m.status,
+      m.file_path,
+      m.content as summary,
+      NULL as id_type_document,
+      0 as is_mission_doc,
+      '' as mission_reference,
+      NULL as date_retour_mission,
+      '' as classeur,
+      'outgoing_legacy' as source`,
+    like: ['subject', 'recipient', 'content'],
+  },
+};
+
+const SNIPPET_TOKENS = 12;
+const MAX_SEARCH_LIMIT = 200;
+
+// Tables FTS présentes, relues au plus toutes les minutes (et après une erreur)
+const INDEXES_TTL_MS = 60 * 1000;
+const indexesByDb = new WeakMap();
+
+function loadSearchIndexes(db) {
+  const cached = indexesByDb.get(db);
+  if (cached && Date.now() - cached.loadedAt < INDEXES_TTL_MS) return cached.pending;
+  const pending = getSearchIndexes(db).catch(() => ({}));
+  indexesByDb.set(db, { loadedAt: Date.now(), pending });
+  return pending;
+}
+
+function sourceClause(spec, where) {
+  return spec.filter ? `${where} AND ${spec.filter}` : where;
+}
+
+function likeWhere(spec) {
+  return `(${spec.like.map((c) => `m.${c} LIKE ?`).join(' OR ')})`;
+}
+
+/**
+ * Recherche classée sur toutes les sources : MATCH pour les sources indexées, LIKE pour
+ * les autres (index partiel : aucune table ne disparaît des résultats).
+ * bm25 n'est comparable qu'au sein d'une même table FTS : chaque source est classée
+ * séparément (rank = position dans sa source, bm25 puis date), puis les sources sont
+ * entrelacées par position.
+ */
+function buildFtsSearchSql(selects, indexes) {
+  const parts = [];
+  const counts = [];
+  const sources = Object.keys(selects);
+  const ftsSources = sources.filter((source) => indexes[source]);
+
+  for (const source of sources) {
+    const spec = selects[source];
+    if (indexes[source]) {
+      const fts = ftsTable(source);
+      const weights = columnWeights(indexes[source]).join(', ');
+      const where = sourceClause(spec, `${fts} MATCH ?`);
+      parts.push(`
+      SELECT r.*, ROW_NUMBER() OVER (ORDER BY r.score ASC, r.arrival_date DESC) AS rank
+      FROM (
+        SELECT ${spec.select},
+          snippet(${fts}, -1, '<mark>', '</mark>', '…', ${SNIPPET_TOKENS}) AS snippet,
+          bm25(${fts}, ${weights}) AS score
+        FROM ${fts}
+        JOIN ${source} m ON m.id = ${fts}.rowid
+        WHERE ${where}
+      ) r`);
+      counts.push(spec.filter
+        ? `(SELECT COUNT(*) FROM ${fts} JOIN ${source} m ON m.id = ${fts}.rowid WHERE ${where})`
+        : `(SELECT COUNT(*) FROM ${fts} WHERE ${fts} MATCH ?)`);
+    } else {
+      const where = sourceClause(spec, likeWhere(spec));
+      parts.push(`
+      SELECT r.*, ROW_NUMBER() OVER (ORDER BY r.arrival_date DESC) AS rank
+      FROM (
+        SELECT ${spec.select}, NULL AS snippet, NULL AS score
+        FROM ${source} m
+        WHERE ${where}
+      ) r`);
+      counts.push(`(SELECT COUNT(*) FROM ${source} m WHERE ${where})`);
+    }
+  }
+
+  // Paramètres dans l'ordre des sources : requête MATCH ou motifs LIKE
+  const params = (match, term) => sources.flatMap((source) => (
+    indexes[source] ? [match] : selects[source].like.map(() => `%${term}%`)
+  ));
+
+  return {
+    sources,
+    ftsSources,
+    params,
+    sql: `${parts.join('\n\n      UNION ALL\n')}
+      ORDER BY rank ASC, arrival_date DESC
+      LIMIT ? OFFSET ?`,
+    countSql: `SELECT ${counts.join(' + ')} AS total`,
+  };
+}
+
+function buildLikeSearchSql(selects) {
+  const sources = Object.keys(selects);
+  const parts = sources.map((source) => {
+    const spec = selects[source];
+    return `
+      SELECT ${spec.select}
+      FROM ${source} m
+      WHERE ${sourceClause(spec, likeWhere(spec))}`;
+  });
+  return {
+    sources,
+    sql: `${parts.join('\n\n      UNION ALL\n')}
+      ORDER BY arrival_date DESC
+      LIMIT ? OFFSET ?`,
+  };
+}
+
+async function searchWithFts(db, query, term, selects, indexes, limit, offset) {
+  const { sources, ftsSources, params, sql, countSql } = buildFtsSearchSql(selects, indexes);
+  const searchParams = params(query, term);
+  const [rows, count] = await Promise.all([
+    dbAll(db, sql, [...searchParams, limit, offset]),
+    dbGet(db, countSql, searchParams),
+  ]);
+  return { rows, total: count?.total || 0, engine: ftsSources.length === sources.length ? 'fts5' : 'fts5+like' };
+}
+
+async function searchWithLike(db, term, selects, limit, offset) {
+  const { sources, sql } = buildLikeSearchSql(selects);
+  const pattern = `%${term}%`;
+  const params = sources.flatMap((source) => selects[source].like.map(() => pattern));
+  const rows = await dbAll(db, sql, [...params, limit, offset]);
+  return { rows, total: null, engine: 'like' };
+}
+
+/**
+ * Recherche plein texte dans les courriers (entrants, archivés, sortants).
+ * Utilise l'index FTS5 (db/searchIndex.js) classé par bm25 avec extrait surligné, et LIKE
+ * pour les sources pas encore indexées ; sans aucun index, retombe sur l'ancienne
+ * recherche LIKE triée par date.
+ *
+ * @returns {Promise<{rows: object[], total: number|null, engine: 'fts5'|'fts5+like'|'like'}>}
+ */
+async function searchMails({ db, term, limit = 50, offset = 0, selects = MAIL_SEARCH_SELECTS }) {
+  const safeLimit = Math.min(Math.max(parseInt(limit, 10) || 50, 1), MAX_SEARCH_LIMIT);
+  const safeOffset = Math.max(parseInt(offset, 10) || 0, 0);
+
+  const indexes = await loadSearchIndexes(db);
+  if (!Object.keys(selects).some((source) => indexes[source])) {
+    return searchWithLike(db, term, selects, safeLimit, safeOffset);
+  }
+
+  const query = toFtsQuery(term);
+  if (!query) return { rows: [], total: 0, engine: 'fts5' };
+
+  try {
+    return await searchWithFts(db, query, term, selects, indexes, safeLimit, safeOffset);
+  } catch (err) {
+    // Index supprimé ou corrompu : on relit sqlite_master au prochain appel
+    indexesByDb.delete(db);
+    console.warn('⚠️  Recherche FTS5 indisponible, repli LIKE:', err.message);
+    return searchWithLike(db, term, selects, safeLimit, safeOffset);
+  }
+}
+
+module.exports = {
+  MAIL_SEARCH_SELECTS,
+  MAX_SEARCH_LIMIT,
+  buildFtsSearchSql,
+  buildLikeSearchSql,
+  loadSearchIndexes,
+  searchMails,
+};
@@ -0,0 +1,144 @@
+/**
+ * services/searchCache.service.js
+ * Cache partagé des résultats de recherche
+ *
+ * ✅ Clé = type de recherche + périmètre RBAC (rôle, service) + requête normalisée + options (page, filtres…)
+ * ✅ Le calcul reçoit la requête normalisée de la clé : deux requêtes partageant une entrée
+ *    donnent forcément les mêmes lignes
+ * ✅ Invalidation par générations : chaque écriture sur une table recherchée incrémente
+ *    son compteur (db/searchCacheGenerations.js) ; une entrée calculée avec d'anciennes
+ *    générations n'est plus servie
+ * ✅ Budget mémoire (SEARCH_CACHE_MAX_MB) et nombre d'entrées bornés, durée de vie de sécurité
+ * ✅ Requêtes identiques simultanées : un seul calcul partagé
+ * ✅ Métriques search_cache_lookups_total / search_cache_hit_ratio / search_cache_bytes
+ *
+ * Les valeurs servies sont partagées entre requêtes : ne pas les modifier.
+ */
+
+const { LruCache } = require('../utils/lruCache');
+const { getSearchCacheGenerations } = require('../db/searchCacheGenerations');
+const metrics = require('../monitoring/metrics');
+
+const SEARCH_CACHE_ENABLED = process.env.SEARCH_CACHE_ENABLED !== 'false';
+const SEARCH_CACHE_MAX_ENTRIES = parseInt(process.env.SEARCH_CACHE_MAX_ENTRIES || '2000', 10);
+const SEARCH_CACHE_MAX_BYTES = parseFloat(process.env.SEARCH_CACHE_MAX_MB || '32') * 1024 * 1024;
+const SEARCH_CACHE_TTL_MS = parseInt(process.env.SEARCH_CACHE_TTL_SECONDS || '600', 10) * 1000;
+
+// Tables des recherches courrier ; la recherche hybride dépend aussi des embeddings
+const MAIL_SEARCH_SOURCES = ['incoming_mails', 'archives', 'courriers_sortants', 'outgoing_mails'];
+const HYBRID_SEARCH_SOURCES = [...MAIL_SEARCH_SOURCES, 'document_embeddings'];
+
+const cache = new LruCache({
+  max: SEARCH_CACHE_MAX_ENTRIES,
+  ttlMs: SEARCH_CACHE_TTL_MS,
+  maxBytes: SEARCH_CACHE_MAX_BYTES,
+  // Estimation : chaînes JS en UTF-16
+  sizeOf: (entry) => JSON.stringify(entry.value).length * 2,
+});
+const inflight = new Map();
+
+// Générations en mémoire des sources hors base principale (mémoire vectorielle)
+const localGenerations = new Map();
+
+function bumpSearchCacheGeneration(source) {
+  localGenerations.set(source, (localGenerations.get(source) || 0) + 1);
+}
+
+// Pas de passage en minuscules : LIKE ne replie la casse que sur l'ASCII,
+// « ÉTAT » et « état » ne renvoient pas les mêmes lignes
+function normalizeSearchTerm(term) {
+  return String(term || '').normalize('NFC').trim().replace(/\s+/g, ' ');
+}
+
+/**
+ * Périmètre RBAC de la clé : les résultats ne sont partagés qu'entre utilisateurs du même rôle
+ * et du même service. Les recherches ne filtrent aujourd'hui que par rôle (le service attendu
+ * des routes courrier découle de role_id) ; le service, absent du JWT, n'est ajouté que s'il est
+ * connu, pour qu'un filtre par service ajouté plus tard ne partage pas de résultats entre services.
+ */
+function searchScope(user) {
+  if (!user) return 'anonymous';
+  const service = user.service || user.service_name || null;
+  return service
+    ? `role:${user.role_id ?? '-'}|service:${String(service).trim().toUpperCase()}`
+    : `role:${user.role_id ?? '-'}`;
+}
+
+async function generationStamp(db, sources) {
+  const generations = db ? await getSearchCacheGenerations(db) : {};
+  return sources
+    .map((source) => `${source}:${generations[source] ?? 0}.${localGenerations.get(source) || 0}`)
+    .join('|');
+}
+
+function record(kind, result) {
+  metrics.recordSearchCacheLookup(kind, result === 'hit');
+  metrics.setSearchCacheSize(cache.size, cache.bytes);
+}
+
+/**
+ * Résultat d'une recherche, depuis le cache si aucune table source n'a changé.
+ *
+ * @param {Object} params
+ * @param {Object|null} params.db - base des compteurs de génération (null : générations locales seules)
+ * @param {string} params.kind - type de recherche ('search', 'hybrid', 'memory'…)
+ * @param {string} params.scope - voir searchScope
+ * @param {string} params.term
+ * @param {Object} [params.options] - tout ce qui change le résultat (page, limite, filtres)
+ * @param {string[]} params.sources - tables dont dépend le résultat
+ * @param {(term: string) => Promise<any>} params.compute - reçoit la requête normalisée
+ * @returns {Promise<any>}
+ */
+async function cachedSearch({ db, kind, scope, term, options = {}, sources, compute }) {
+  const normalizedTerm = normalizeSearchTerm(term);
+  if (!SEARCH_CACHE_ENABLED || SEARCH_CACHE_MAX_ENTRIES <= 0) return compute(normalizedTerm);
+
+  let stamp;
+  try {
+    stamp = await generationStamp(db, sources);
+  } catch (err) {
+    // Table des générations absente : pas de cache plutôt que des résultats périmés
+    return compute(normalizedTerm);
+  }
+
+  const key = JSON.stringify([kind, scope, normalizedTerm, options]);
+  const entry = cache.get(key);
+  if (entry && entry.stamp === stamp) {
+    record(kind, 'hit');
+    return entry.value;
+  }
+
+  const pendingKey = `${key}#${stamp}`;
+  if (inflight.has(pendingKey)) {
+    record(kind, 'hit');
+    return inflight.get(pendingKey);
+  }
+
+  record(kind, 'miss');
+  const pending = Promise.resolve()
+    .then(() => compute(normalizedTerm))
+    .then((value) => {
+      // Calculé avec les générations lues avant : une écriture pendant le calcul l'invalide
+      cache.set(key, { stamp, value });
+      metrics.setSearchCacheSize(cache.size, cache.bytes);
+      return value;
+    })
+    .finally(() => inflight.delete(pendingKey));
+  inflight.set(pendingKey, pending);
+  return pending;
+}
+
+function clearSearchCache() {
+  cache.clear();
+  metrics.setSearchCacheSize(0, 0);
+}
+
+module.exports = {
+  MAIL_SEARCH_SOURCES,
+  HYBRID_SEARCH_SOURCES,
+  bumpSearchCacheGeneration,
+  normalizeSearchTerm,
+  searchScope,
+  cachedSearch,
+  clearSearchCache,
+};
@@ -1,3 +1,5 @@
+const { getKpiCounters, sumBuckets } = require('../db/kpiCounters');
+
 function dbGet(db, sql, params = []) {
   return new Promise((resolve, reject) => {
     db.get(sql, params, (err, row) => {
@@ -16,9 +18,19 @@ function dbAll(db, sql, params = []) {
   });
 }
 
+// Compteurs matérialisés (db/kpiCounters.js) ; null si indisponibles → requêtes classiques
+async function getIncomingCounters(db) {
+  try {
+    return await getKpiCounters(db, 'incoming_mails');
+  } catch (_) {
+    return null;
+  }
+}
+
 async function getCourriersStats({ db }) {
+  const counters = await getIncomingCounters(db);
   const [totalIncoming, totalOutgoing, totalExternal, totalInternal] = await Promise.all([
-    dbGet(db, 'SELECT COUNT(id) AS count FROM incoming_mails'),
+    counters ? { count: counters.total } : dbGet(db, 'SELECT COUNT(id) AS count FROM incoming_mails'),
     dbGet(db, 'SELECT COUNT(id) AS count FROM outgoing_mails'),
     dbGet(db, 'SELECT COUNT(id) AS count FROM correspondances_externes'),
     dbGet(db, 'SELECT COUNT(id) AS count FROM correspondances_internes'),
@@ -128,13 +140,21 @@ async function getTopSendersStats({ db }) {
 }
 
 async function getKpisStats({ db }) {
+  const counters = await getIncomingCounters(db);
+  const archivedCount = sumBuckets(counters, 'statut_global', ['Archivé']);
+  const pendingCount = sumBuckets(counters, 'statut_global', ['Acquis', 'Indexé']);
+
   const [totalRow, archRow, pendRow, delayRow] = await Promise.all([
-    dbGet(db, 'SELECT COUNT(*) as count FROM incoming_mails'),
-    dbGet(db, "SELECT COUNT(*) as count FROM incoming_mails WHERE statut_global = 'Archivé'"),
-    dbGet(
-      db,
-      "SELECT COUNT(*) as count FROM incoming_mails WHERE statut_global = 'Acquis' OR statut_global = 'Indexé'",
-    ),
+    counters ? { count: counters.total } : dbGet(db, 'SELECT COUNT(*) as count FROM incoming_mails'),
+    archivedCount !== null
+      ? { count: archivedCount }
+      : dbGet(db, "SELECT COUNT(*) as count FROM incoming_mails WHERE statut_global = 'Archivé'"),
+    pendingCount !== null
+      ? { count: pendingCount }
+      : dbGet(
+        db,
+        "SELECT COUNT(*) as count FROM incoming_mails WHERE statut_global = 'Acquis' OR statut_global = 'Indexé'",
+      ),
     dbGet(
       db,
       `
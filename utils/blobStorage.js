@@ -0,0 +1,132 @@
+/**
+ * utils/blobStorage.js
+ * Moteur de stockage multer adressé par contenu (db/blobStore.js)
+ *
+ * ✅ Fichier haché pendant la réception, puis rangé sous uploads/blobs/<aa>/<sha256><ext> :
+ *    un même PDF reçu comme courrier, annexe puis archive temporaire n'est stocké qu'une fois
+ * ✅ req.file reste compatible diskStorage (path, filename relatif à uploads/, size) ;
+ *    en plus : sha256 et deduplicated
+ * ✅ Les fichiers partagés ne sont jamais supprimés par une route : releaseUploadedFile()
+ *    laisse la collecte (collectBlobGarbage) décider
+ */
+
+const crypto = require('crypto');
+const fs = require('fs');
+const fsPromises = require('fs/promises');
+const path = require('path');
+const { pipeline } = require('stream');
+const { createHashStream } = require('./uploadPipeline');
+const { BLOB_DIR, blobRelativePath, registerBlobUpload } = require('../db/blobStore');
+
+const SAFE_EXTENSION = /^\.[a-z0-9]{1,10}$/;
+
+function getDb() {
+  return require('../db/index');
+}
+
+function normalizeExtension(originalName) {
+  const ext = path.extname(originalName || '').toLowerCase();
+  return SAFE_EXTENSION.test(ext) ? ext : '';
+}
+
+/**
+ * Vrai si le chemin désigne un blob partagé (à ne pas supprimer directement).
+ */
+function isBlobPath(filePath) {
+  return /(^|[\\/])uploads[\\/]blobs[\\/]/.test(String(filePath || ''))
+    || String(filePath || '').replace(/\\/g, '/').startsWith(`${BLOB_DIR}/`);
+}
+
+/**
+ * Libère un fichier uploadé dont la route n'a plus besoin :
+ * supprimé s'il est propre à la requête, laissé à la collecte s'il s'agit d'un blob.
+ */
+function releaseUploadedFile(filePath, callback = () => {}) {
+  if (!filePath || isBlobPath(filePath)) return callback(null);
+  return fs.unlink(filePath, callback);
+}
+
+async function storeBlob(uploadsDir, file, tmpPath, sha256, size) {
+  // Ligne enregistrée (last_uploaded_at rafraîchi) avant de regarder le fichier : la collecte
+  // ne peut plus supprimer le blob entre cette vérification et l'enregistrement
+  const row = await registerBlobUpload(getDb(), {
+    sha256,
+    relPath: blobRelativePath(sha256, normalizeExtension(file.originalname)),
+    size,
+    mimeType: file.mimetype || null,
+  });
+  const relPath = row.rel_path;
+  const absPath = path.join(uploadsDir, relPath);
+
+  const present = await fsPromises.stat(absPath).catch(() => null);
+  if (present) {
+    await fsPromises.unlink(tmpPath);
+  } else {
+    // Nouveau contenu (ou blob enregistré mais fichier disparu) : renommage atomique
+    await fsPromises.mkdir(path.dirname(absPath), { recursive: true });
+    await fsPromises.rename(tmpPath, absPath);
+  }
+  return { relPath, absPath, deduplicated: Boolean(present) };
+}
+
+/**
+ * Moteur multer : remplace multer.diskStorage pour les uploads de documents.
+ * @param {Object} options
+ * @param {string} options.uploadsDir - racine servie sous /uploads
+ */
+function createBlobStorage({ uploadsDir }) {
+  const tmpDir = path.join(uploadsDir, BLOB_DIR, 'tmp');
+
+  return {
+    _handleFile(req, file, cb) {
+      fs.mkdir(tmpDir, { recursive: true }, (mkdirErr) => {
+        if (mkdirErr) return cb(mkdirErr);
+        const tmpPath = path.join(tmpDir, `${crypto.randomUUID()}.part`);
+        const hashStream = createHashStream();
+        let truncated = false;
+        file.stream.on('limit', () => {
+          truncated = true;
+        });
+
+        pipeline(file.stream, hashStream, fs.createWriteStream(tmpPath), (err) => {
+          if (err || truncated) {
+            fs.unlink(tmpPath, () => {});
+            // multer signale lui-même LIMIT_FILE_SIZE
+            return cb(err || null, err ? undefined : { path: null, size: hashStream.bytes() });
+          }
+          const sha256 = hashStream.digest();
+          const size = hashStream.bytes();
+          storeBlob(uploadsDir, file, tmpPath, sha256, size)
+            .then(({ relPath, absPath, deduplicated }) => {
+              if (deduplicated) {
+                console.log(`♻️  Upload dédupliqué: ${file.originalname} → ${relPath} (${size} octets économisés)`);
+              }
+              cb(null, {
+                destination: uploadsDir,
+                filename: relPath,
+                path: absPath,
+                size,
+                sha256,
+                deduplicated,
+              });
+            })
+            .catch((storeErr) => {
+              fs.unlink(tmpPath, () => {});
+              cb(storeErr);
+            });
+        });
+      });
+    },
+
+    // Appelé par multer quand la requête échoue : un blob peut être partagé, la collecte s'en charge
+    _removeFile(req, file, cb) {
+      releaseUploadedFile(file.path, () => cb(null));
+    },
+  };
+}
+
+module.exports = {
+  createBlobStorage,
+  isBlobPath,
+  releaseUploadedFile,
+};
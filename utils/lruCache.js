@@ -0,0 +1,67 @@
+/**
+ * Cache LRU en mémoire (Map ordonnée), avec durée de vie optionnelle
+ * et budget mémoire optionnel (taille estimée par sizeOf)
+ */
+
+class LruCache {
+  /**
+   * @param {Object} options
+   * @param {number} options.max - nombre maximal d'entrées
+   * @param {number} [options.ttlMs] - durée de vie d'une entrée (0 = illimitée)
+   * @param {number} [options.maxBytes] - taille totale maximale (0 = illimitée)
+   * @param {(value: any) => number} [options.sizeOf] - taille estimée d'une valeur, en octets
+   */
+  constructor({ max, ttlMs = 0, maxBytes = 0, sizeOf = null }) {
+    this.max = Math.max(1, max);
+    this.ttlMs = ttlMs;
+    this.maxBytes = maxBytes;
+    this.sizeOf = sizeOf;
+    this.bytes = 0;
+    this.entries = new Map();
+  }
+
+  get size() {
+    return this.entries.size;
+  }
+
+  get(key) {
+    const entry = this.entries.get(key);
+    if (!entry) return undefined;
+    if (entry.expiresAt && entry.expiresAt <= Date.now()) {
+      this.delete(key);
+      return undefined;
+    }
+    // Réinsertion : la clé devient la plus récente
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    return entry.value;
+  }
+
+  set(key, value, ttlMs = this.ttlMs) {
+    const bytes = this.sizeOf ? this.sizeOf(value) : 0;
+    this.delete(key);
+    // Valeur plus grosse que tout le budget : non mise en cache
+    if (this.maxBytes && bytes > this.maxBytes) return this;
+    this.entries.set(key, { value, bytes, expiresAt: ttlMs ? Date.now() + ttlMs : 0 });
+    this.bytes += bytes;
+    while (this.entries.size > this.max || (this.maxBytes && this.bytes > this.maxBytes)) {
+      this.delete(this.entries.keys().next().value);
+    }
+    return this;
+  }
+
+  delete(key) {
+    const entry = this.entries.get(key);
+    if (!entry) return false;
+    this.entries.delete(key);
+    this.bytes -= entry.bytes;
+    return true;
+  }
+
+  clear() {
+    this.entries.clear();
+    this.bytes = 0;
+  }
+}
+
+module.exports = { LruCache };
@@ -1,28 +1,209 @@
-const fs = require('fs/promises');
-let PDFParse = null;
+/**
+ * utils/pdf.js
+ * Extraction du texte des PDF hors du thread principal
+ *
+ * ✅ Pool de worker_threads (utils/pdfExtract.worker.js) : un PDF de 300 pages
+ *    ne bloque plus les autres requêtes
+ * ✅ Texte transmis page par page (onPage) au fil de l'extraction
+ * ✅ Cache par sha256 du fichier (db/pdfTextCache.js) : ré-upload et ré-analyse sans re-parsing ;
+ *    extractions simultanées d'un même fichier partagées
+ * ✅ Durée d'extraction par page (pdf_page_extraction_seconds) et succès du cache exposés
+ * ✅ Délai maximal par document (PDF_EXTRACT_TIMEOUT_MS) : worker bloqué remplacé
+ */
+
+const crypto = require('crypto');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const { Worker } = require('worker_threads');
+const metrics = require('../monitoring/metrics');
+const { getPdfTextCache, putPdfTextCache } = require('../db/pdfTextCache');
+
+let pdfParseAvailable = true;
 try {
-  PDFParse = require('pdf-parse');
+  require.resolve('pdf-parse');
 } catch (err) {
   console.warn(
     '⚠️ pdf-parse indisponible: extraction PDF désactivée. Cause:',
     err?.message || err
   );
-  PDFParse = null;
+  pdfParseAvailable = false;
+}
+
+const PDF_WORKERS = Math.max(1, parseInt(process.env.PDF_WORKERS || String(Math.min(Math.max(os.cpus().length - 1, 1), 2)), 10));
+const PDF_EXTRACT_TIMEOUT_MS = parseInt(process.env.PDF_EXTRACT_TIMEOUT_MS || '120000', 10);
+const WORKER_SCRIPT = path.join(__dirname, 'pdfExtract.worker.js');
+
+const idle = [];
+const allWorkers = new Set();
+const queue = [];
+const inflightByHash = new Map();
+let nextTaskId = 1;
+
+function getCacheDb() {
+  return require('../db/index');
+}
+
+/**
+ * sha256 d'un fichier, lu en flux.
+ * @returns {Promise<string>}
+ */
+function hashFile(filePath) {
+  return new Promise((resolve, reject) => {
+    const hash = crypto.createHash('sha256');
+    fs.createReadStream(filePath)
+      .on('error', reject)
+      .on('data', (chunk) => hash.update(chunk))
+      .on('end', () => resolve(hash.digest('hex')));
+  });
+}
+
+function spawnWorker() {
+  const worker = new Worker(WORKER_SCRIPT);
+  worker.task = null;
+  worker.on('message', (message) => {
+    const task = worker.task;
+    if (!task || message.id !== task.id) return;
+    if (message.type === 'start') {
+      task.total = message.total;
+    } else if (message.type === 'page') {
+      metrics.recordPdfPageExtraction(message.ms / 1000);
+      task.pages.push(message.text);
+      try {
+        if (task.onPage) task.onPage({ num: message.num, total: task.total, text: message.text, ms: message.ms });
+      } catch (err) {
+        console.warn('⚠️  Extraction PDF (onPage):', err.message);
+      }
+    } else {
+      finishTask(worker, message.type === 'error' ? new Error(message.message) : null);
+    }
+  });
+  worker.on('error', (err) => {
+    console.error('❌ Worker extraction PDF:', err.message);
+    if (worker.task) return finishTask(worker, err, { replace: true });
+    allWorkers.delete(worker);
+    if (idle.includes(worker)) idle.splice(idle.indexOf(worker), 1);
+  });
+  // Après les écouteurs (qui réarment le port) : le pool ne retient pas le processus
+  worker.unref();
+  allWorkers.add(worker);
+  return worker;
+}
+
+function finishTask(worker, err, { replace = false } = {}) {
+  const task = worker.task;
+  worker.task = null;
+  clearTimeout(task.timer);
+  if (err) task.reject(err);
+  else task.resolve({ pages: task.pages, extractMs: Date.now() - task.startedAt });
+
+  if (replace) {
+    allWorkers.delete(worker);
+    worker.terminate().catch(() => {});
+  } else {
+    idle.push(worker);
+  }
+  pump();
+}
+
+function pump() {
+  while (queue.length) {
+    let worker = idle.pop();
+    if (!worker) {
+      if (allWorkers.size >= PDF_WORKERS) return;
+      worker = spawnWorker();
+    }
+    const task = queue.shift();
+    worker.task = task;
+    task.startedAt = Date.now();
+    task.timer = setTimeout(() => {
+      console.warn(`⚠️  Extraction PDF interrompue après ${PDF_EXTRACT_TIMEOUT_MS} ms: ${task.filePath}`);
+      finishTask(worker, new Error('Délai d\'extraction PDF dépassé'), { replace: true });
+    }, PDF_EXTRACT_TIMEOUT_MS);
+    worker.postMessage({ id: task.id, filePath: task.filePath });
+  }
+}
+
+function runInWorker(filePath, onPage) {
+  return new Promise((resolve, reject) => {
+    queue.push({ id: nextTaskId++, filePath, onPage, pages: [], total: null, resolve, reject });
+    pump();
+  });
+}
+
+async function extractUncached(sha256, filePath, onPage) {
+  const { pages, extractMs } = await runInWorker(filePath, onPage);
+  try {
+    await putPdfTextCache(getCacheDb(), sha256, pages, extractMs);
+  } catch (err) {
+    console.warn('⚠️  Cache texte PDF (écriture):', err.message);
+  }
+  return pages;
+}
+
+/**
+ * Texte d'un PDF, page par page.
+ *
+ * @param {string} filePath
+ * @param {Object} [options]
+ * @param {(page: {num: number, total: number, text: string, ms: number}) => void} [options.onPage]
+ *        appelé à chaque page extraite (ou rejouée depuis le cache)
+ * @returns {Promise<{sha256: string, pages: string[], text: string, cached: boolean}>}
+ */
+async function extractPdfPages(filePath, { onPage = null } = {}) {
+  if (!pdfParseAvailable) throw new Error('pdf-parse indisponible');
+  const sha256 = await hashFile(filePath);
+
+  let cached = null;
+  try {
+    cached = await getPdfTextCache(getCacheDb(), sha256);
+  } catch (err) {
+    console.warn('⚠️  Cache texte PDF (lecture):', err.message);
+  }
+  metrics.recordPdfTextCacheLookup(Boolean(cached));
+
+  let pages;
+  if (cached) {
+    pages = cached.pages;
+    if (onPage) pages.forEach((text, i) => onPage({ num: i + 1, total: pages.length, text, ms: 0 }));
+  } else if (inflightByHash.has(sha256)) {
+    pages = await inflightByHash.get(sha256);
+    if (onPage) pages.forEach((text, i) => onPage({ num: i + 1, total: pages.length, text, ms: 0 }));
+  } else {
+    const pending = extractUncached(sha256, filePath, onPage);
+    inflightByHash.set(sha256, pending);
+    try {
+      pages = await pending;
+    } finally {
+      inflightByHash.delete(sha256);
+    }
+  }
+
+  return {
+    sha256,
+    pages,
+    text: pages.filter(Boolean).join('\n\n').trim(),
+    cached: Boolean(cached),
+  };
 }
 
+/**
+ * Texte complet d'un PDF (vide si échec).
+ * @param {string} filePath
+ * @returns {Promise<string>}
+ */
 async function extractTextFromPDF(filePath) {
   try {
-    if (!PDFParse) {
+    if (!pdfParseAvailable) {
       console.warn('⚠️ Extraction PDF ignorée (pdf-parse indisponible):', filePath);
       return '';
     }
-    const dataBuffer = await fs.readFile(filePath);
-    const pdf = await PDFParse(dataBuffer);
-    return pdf.text.trim();
+    const { text } = await extractPdfPages(filePath);
+    return text;
   } catch (error) {
     console.error('Erreur extraction texte PDF:', error.message);
     return '';
   }
 }
 
-module.exports = { extractTextFromPDF };
+module.exports = { extractTextFromPDF, extractPdfPages, hashFile };
@@ -0,0 +1,42 @@
+/**
+ * utils/pdfExtract.worker.js
+ * Worker d'extraction de texte PDF (pdf-parse v2), piloté par utils/pdf.js
+ *
+ * Messages reçus : { id, filePath }
+ * Messages émis  : { id, type: 'start', total } puis { id, type: 'page', num, text, ms } par page,
+ *                  enfin { id, type: 'done' } ou { id, type: 'error', message }
+ */
+
+const { parentPort } = require('worker_threads');
+const { performance } = require('perf_hooks');
+const fs = require('fs/promises');
+const { PDFParse } = require('pdf-parse');
+
+parentPort.on('message', async ({ id, filePath }) => {
+  let parser = null;
+  try {
+    // Lecture dans le worker : le fichier ne transite pas par le thread principal
+    const data = await fs.readFile(filePath);
+    parser = new PDFParse({ data });
+    const { total } = await parser.getInfo();
+    parentPort.postMessage({ id, type: 'start', total });
+
+    for (let num = 1; num <= total; num += 1) {
+      const startedAt = performance.now();
+      const result = await parser.getText({ partial: [num] });
+      const page = (result.pages || []).find((p) => p.num === num);
+      parentPort.postMessage({
+        id,
+        type: 'page',
+        num,
+        text: ((page ? page.text : result.text) || '').trim(),
+        ms: performance.now() - startedAt,
+      });
+    }
+    parentPort.postMessage({ id, type: 'done' });
+  } catch (err) {
+    parentPort.postMessage({ id, type: 'error', message: err.message });
+  } finally {
+    if (parser) await parser.destroy().catch(() => {});
+  }
+});
@@ -0,0 +1,158 @@
+/**
+ * utils/streamExport.js
+ * Export en flux (NDJSON / CSV) d'une requête SQL vers une réponse HTTP
+ *
+ * ✅ Lecture par curseur (statement.get ligne à ligne) : la ligne suivante n'est lue
+ *    qu'une fois la précédente acceptée par la socket → mémoire constante
+ * ✅ Écriture par blocs (~64 Ko) avec respect du backpressure (événement drain)
+ * ✅ Compression gzip à la volée (optionnelle)
+ * ✅ Arrêt et libération du statement si le client coupe la connexion
+ */
+
+const zlib = require('zlib');
+
+const CHUNK_BYTES = 64 * 1024;
+
+const EXPORT_FORMATS = {
+  ndjson: { contentType: 'application/x-ndjson; charset=utf-8', extension: 'ndjson' },
+  csv: { contentType: 'text/csv; charset=utf-8', extension: 'csv' },
+};
+
+function csvCell(value) {
+  if (value === null || value === undefined) return '';
+  const text = String(value);
+  return /[",\r\n]/.test(text) ? `"${text.replace(/"/g, '""')}"` : text;
+}
+
+function csvLine(values) {
+  return `${values.map(csvCell).join(',')}\r\n`;
+}
+
+/**
+ * Format demandé : ?format=csv|ndjson, sinon en-tête Accept (NDJSON par défaut).
+ * @returns {'ndjson'|'csv'|null} null si le format est inconnu
+ */
+function resolveExportFormat(req) {
+  const wanted = req.query.format ? String(req.query.format).toLowerCase() : null;
+  if (wanted) return EXPORT_FORMATS[wanted] ? wanted : null;
+  return req.accepts(['application/x-ndjson', 'text/csv']) === 'text/csv' ? 'csv' : 'ndjson';
+}
+
+/**
+ * gzip si demandé explicitement (?gzip=1) ou accepté par le client.
+ */
+function wantsGzip(req) {
+  if (req.query.gzip !== undefined) return ['1', 'true', 'yes'].includes(String(req.query.gzip).toLowerCase());
+  return Boolean(req.acceptsEncodings('gzip', 'identity') === 'gzip');
+}
+
+function nextRow(stmt) {
+  return new Promise((resolve, reject) => {
+    stmt.get((err, row) => (err ? reject(err) : resolve(row)));
+  });
+}
+
+function prepare(db, sql, params) {
+  return new Promise((resolve, reject) => {
+    const stmt = db.prepare(sql, params, (err) => (err ? reject(err) : resolve(stmt)));
+  });
+}
+
+/**
+ * Exécute `sql` et envoie les lignes en flux.
+ *
+ * @param {Object} db
+ * @param {import('express').Response} res
+ * @param {Object} options
+ * @param {string} options.sql
+ * @param {Array} [options.params]
+ * @param {'ndjson'|'csv'} [options.format]
+ * @param {boolean} [options.gzip]
+ * @param {string} [options.filename] - nom du fichier proposé (sans extension)
+ * @returns {Promise<{rows: number, aborted: boolean}>}
+ */
+async function streamQuery(db, res, { sql, params = [], format = 'ndjson', gzip = false, filename = 'export' }) {
+  // Erreur de préparation (SQL invalide) : encore possible de répondre en JSON
+  const stmt = await prepare(db, sql, params);
+
+  const spec = EXPORT_FORMATS[format];
+  res.status(200);
+  res.set('Content-Type', spec.contentType);
+  res.set('Content-Disposition', `attachment; filename="${filename}.${spec.extension}"`);
+  res.set('Cache-Control', 'no-store');
+  res.set('Vary', 'Accept, Accept-Encoding');
+
+  let out = res;
+  if (gzip) {
+    res.set('Content-Encoding', 'gzip');
+    out = zlib.createGzip();
+    out.pipe(res);
+  }
+
+  let aborted = false;
+  let wake = null;
+  const onClose = () => {
+    if (res.writableFinished) return;
+    aborted = true;
+    if (wake) wake();
+  };
+  res.on('close', onClose);
+
+  const write = (text) => {
+    if (out.write(text)) return null;
+    return new Promise((resolve) => {
+      wake = resolve;
+      out.once('drain', resolve);
+    }).then(() => {
+      wake = null;
+    });
+  };
+
+  let count = 0;
+  // BOM UTF-8 : accents corrects à l'ouverture dans Excel
+  let chunk = format === 'csv' ? '\uFEFF' : '';
+  let columns = null;
+  try {
+    for (;;) {
+      if (aborted) break;
+      const row = await nextRow(stmt);
+      if (!row) break;
+      if (format === 'csv') {
+        if (!columns) {
+          columns = Object.keys(row);
+          chunk += csvLine(columns);
+        }
+        chunk += csvLine(columns.map((c) => row[c]));
+      } else {
+        chunk += `${JSON.stringify(row)}\n`;
+      }
+      count += 1;
+      if (chunk.length >= CHUNK_BYTES) {
+        const pending = write(chunk);
+        chunk = '';
+        if (pending) await pending;
+      }
+    }
+    if (!aborted) {
+      if (chunk) out.write(chunk);
+      out.end();
+    }
+  } catch (err) {
+    // En-têtes déjà partis : on ne peut que couper le flux
+    console.error('❌ Export interrompu:', err.message);
+    aborted = true;
+    res.destroy(err);
+  } finally {
+    if (aborted && out !== res) out.destroy();
+    res.off('close', onClose);
+    stmt.finalize();
+  }
+  return { rows: count, aborted };
+}
+
+module.exports = {
+  EXPORT_FORMATS,
+  resolveExportFormat,
+  wantsGzip,
+  streamQuery,
+};
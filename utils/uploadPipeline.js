@@ -0,0 +1,306 @@
+/**
+ * utils/uploadPipeline.js
+ * Upload en flux unique : multipart → sha256 → chiffrement AES-GCM (optionnel) → stockage
+ *
+ * ✅ Le fichier n'est lu qu'une fois : plus d'atterrissage disque multer, de passe de hash
+ *    séparée ni de chiffrement en mémoire (readFileSync) avant l'envoi
+ * ✅ Mémoire bornée quelle que soit la taille : contre-pression de bout en bout
+ *    (parties MinIO de MINIO_PART_SIZE_MB, blocs de STORAGE_STREAM_CHUNK_KB)
+ * ✅ Deux backends interchangeables : MinIO (config/minio.config.js) ou système de fichiers local
+ * ✅ Fichier partiel supprimé en cas d'erreur, de dépassement de taille ou de déconnexion client
+ */
+
+const crypto = require('crypto');
+const fs = require('fs');
+const fsPromises = require('fs/promises');
+const path = require('path');
+const { Transform, pipeline } = require('stream');
+const { pipeline: pipelineAsync } = require('stream/promises');
+
+const STORAGE_UPLOAD_MAX_BYTES = parseInt(process.env.STORAGE_UPLOAD_MAX_MB || '1024', 10) * 1024 * 1024;
+const STREAM_CHUNK_BYTES = parseInt(process.env.STORAGE_STREAM_CHUNK_KB || '256', 10) * 1024;
+
+// Types acceptés (mêmes règles que le multer de server.js)
+const UPLOAD_ALLOWED_TYPES = [
+  'application/msword',
+  'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+  'application/pdf',
+  'image/jpeg',
+  'image/jpg',
+  'image/png',
+];
+
+function httpError(status, message) {
+  const err = new Error(message);
+  err.status = status;
+  return err;
+}
+
+/**
+ * Transform qui laisse passer les données en calculant sha256 et taille.
+ * digest() n'est valable qu'une fois le flux terminé.
+ */
+function createHashStream() {
+  const hash = crypto.createHash('sha256');
+  let bytes = 0;
+  const stream = new Transform({
+    highWaterMark: STREAM_CHUNK_BYTES,
+    transform(chunk, encoding, callback) {
+      hash.update(chunk);
+      bytes += chunk.length;
+      callback(null, chunk);
+    },
+  });
+  let digest = null;
+  stream.digest = () => {
+    if (!digest) digest = hash.digest('hex');
+    return digest;
+  };
+  stream.bytes = () => bytes;
+  return stream;
+}
+
+/**
+ * Backend système de fichiers : objets sous rootDir/<bucket>/<objectName>.
+ * Écriture dans un fichier .part renommé à la fin ; métadonnées des objets chiffrés dans <objet>.meta.json.
+ */
+function createLocalBackend(rootDir) {
+  const root = path.resolve(rootDir);
+
+  function resolveObjectPath(bucket, objectName) {
+    const target = path.resolve(root, bucket || '', objectName);
+    if (!target.startsWith(root + path.sep)) {
+      throw httpError(400, `Nom d'objet invalide: ${objectName}`);
+    }
+    return target;
+  }
+
+  return {
+    name: 'local',
+    defaultBucket: '',
+    wormBucket: 'archives',
+    resolveObjectPath,
+
+    async put({ bucket, objectName, body, metadata = {}, finalMetadata }) {
+      const target = resolveObjectPath(bucket, objectName);
+      const partial = `${target}.${crypto.randomBytes(4).toString('hex')}.part`;
+      await fsPromises.mkdir(path.dirname(target), { recursive: true });
+      try {
+        await pipelineAsync(body, fs.createWriteStream(partial, { highWaterMark: STREAM_CHUNK_BYTES }));
+        // Sel, IV et tag indispensables au déchiffrement
+        if (metadata['x-amz-meta-encrypted'] === 'true') {
+          const meta = { ...metadata, ...(finalMetadata ? finalMetadata() : {}) };
+          await fsPromises.writeFile(`${target}.meta.json`, JSON.stringify(meta, null, 2));
+        }
+        await fsPromises.rename(partial, target);
+      } catch (err) {
+        await fsPromises.unlink(partial).catch(() => {});
+        throw err;
+      }
+      return { bucket: bucket || 'local', objectName, etag: null, versionId: null, location: target };
+    },
+  };
+}
+
+/**
+ * Backend MinIO : envoi en parties (putObject sur flux), puis pose des métadonnées
+ * connues seulement en fin de flux (hash, tag GCM) par copie côté serveur.
+ */
+function createMinioBackend(minioConfig) {
+  return {
+    name: 'minio',
+    defaultBucket: minioConfig.BUCKET_NAME,
+    wormBucket: minioConfig.WORM_BUCKET,
+
+    async put({ bucket, objectName, body, metadata = {}, finalMetadata }) {
+      const result = await minioConfig.uploadStreamToMinIO(body, objectName, bucket, metadata, finalMetadata);
+      return { ...result, bucket: result.bucketName, location: `${result.bucketName}/${objectName}` };
+    },
+  };
+}
+
+/**
+ * Backend selon la configuration : MinIO si activé (STORAGE_BACKEND=local pour forcer le disque).
+ */
+function createStorageBackend({ minioConfig = null, baseDir = process.cwd() } = {}) {
+  if (minioConfig && process.env.STORAGE_BACKEND !== 'local') {
+    return createMinioBackend(minioConfig);
+  }
+  return createLocalBackend(path.resolve(baseDir, 'uploads'));
+}
+
+/**
+ * Stocke un flux en un seul passage : hash du clair, chiffrement optionnel, hash du stocké.
+ *
+ * @param {import('stream').Readable} source
+ * @param {Object} options
+ * @param {Object} options.backend - createStorageBackend()
+ * @param {string} [options.bucket]
+ * @param {string} options.objectName
+ * @param {boolean} [options.encrypt] - AES-256-GCM (security/encryption.js)
+ * @param {Object} [options.metadata] - métadonnées x-amz-meta-* additionnelles
+ * @returns {Promise<Object>} hashes, tailles, paramètres de chiffrement et résultat du backend
+ */
+async function storeStream(source, { backend, bucket = backend.defaultBucket, objectName, encrypt = false, metadata = {} }) {
+  const originalHash = createHashStream();
+  const stages = [source, originalHash];
+  let enc = null;
+  let storedHash = originalHash;
+  if (encrypt) {
+    enc = await require('../security/encryption').createEncryptStream();
+    storedHash = createHashStream();
+    stages.push(enc.cipher, storedHash);
+  }
+
+  // Erreurs (source, chiffrement) propagées au dernier maillon, donc au backend
+  const body = pipeline(...stages, () => {});
+
+  const baseMetadata = {
+    ...metadata,
+    'x-amz-meta-upload-date': new Date().toISOString(),
+  };
+  if (enc) {
+    Object.assign(baseMetadata, {
+      'x-amz-meta-encrypted': 'true',
+      'x-amz-meta-algo': enc.algo,
+      'x-amz-meta-salt': enc.salt,
+      'x-amz-meta-iv': enc.iv,
+    });
+  }
+  const finalMetadata = () => {
+    const meta = { 'x-amz-meta-sha256': storedHash.digest() };
+    if (enc) {
+      Object.assign(meta, {
+        'x-amz-meta-tag': enc.getTag(),
+        'x-amz-meta-original-hash': originalHash.digest(),
+        'x-amz-meta-encrypted-hash': storedHash.digest(),
+      });
+    }
+    return meta;
+  };
+
+  const startedAt = Date.now();
+  const stored = await backend.put({ bucket, objectName, body, metadata: baseMetadata, finalMetadata });
+
+  return {
+    ...stored,
+    backend: backend.name,
+    fileHash: storedHash.digest(),
+    originalHash: originalHash.digest(),
+    encryptedHash: enc ? storedHash.digest() : null,
+    size: originalHash.bytes(),
+    storedSize: storedHash.bytes(),
+    encrypted: Boolean(enc),
+    algo: enc ? enc.algo : null,
+    salt: enc ? enc.salt : null,
+    iv: enc ? enc.iv : null,
+    tag: enc ? enc.getTag() : null,
+    durationMs: Date.now() - startedAt,
+  };
+}
+
+/**
+ * Reçoit un fichier multipart en flux (busboy) sans le poser sur disque.
+ * Les champs texte envoyés AVANT le fichier sont transmis à onFile.
+ *
+ * @param {import('http').IncomingMessage} req
+ * @param {Object} options
+ * @param {(file: {stream, filename, mimeType, fields}) => Promise<any>} options.onFile
+ * @param {string} [options.fieldName='file']
+ * @param {number} [options.maxBytes=STORAGE_UPLOAD_MAX_BYTES]
+ * @param {string[]} [options.allowedTypes=UPLOAD_ALLOWED_TYPES]
+ * @returns {Promise<{fields: Object, file: any}>} file : résultat de onFile (null si aucun fichier)
+ * @throws {Error} status 400 / 413 / 415
+ */
+function receiveMultipartFile(req, {
+  onFile,
+  fieldName = 'file',
+  maxBytes = STORAGE_UPLOAD_MAX_BYTES,
+  allowedTypes = UPLOAD_ALLOWED_TYPES,
+}) {
+  const busboy = require('busboy');
+
+  return new Promise((resolve, reject) => {
+    let parser;
+    try {
+      parser = busboy({
+        headers: req.headers,
+        highWaterMark: STREAM_CHUNK_BYTES,
+        limits: { files: 1, fileSize: maxBytes, fields: 50 },
+      });
+    } catch (err) {
+      return reject(httpError(400, 'Requête multipart attendue'));
+    }
+
+    const fields = {};
+    let fileStream = null;
+    let filePromise = null;
+    let failed = false;
+
+    const fail = (err) => {
+      if (failed) return;
+      failed = true;
+      req.unpipe(parser);
+      req.resume();
+      // Le backend voit l'erreur et supprime son fichier partiel
+      if (fileStream && !fileStream.destroyed) fileStream.destroy(err);
+      reject(err);
+    };
+
+    parser.on('field', (name, value) => {
+      fields[name] = value;
+    });
+
+    parser.on('file', (name, stream, info) => {
+      if (name !== fieldName || filePromise) {
+        stream.resume();
+        return;
+      }
+      if (allowedTypes && !allowedTypes.includes(info.mimeType)) {
+        stream.resume();
+        return fail(httpError(415, 'Type de fichier non supporté. Utilisez .doc, .docx, .pdf, .jpg, .jpeg ou .png.'));
+      }
+      fileStream = stream;
+      stream.on('limit', () => {
+        stream.destroy(httpError(413, `Fichier trop volumineux (max ${Math.round(maxBytes / 1024 / 1024)} Mo)`));
+      });
+      filePromise = Promise.resolve()
+        .then(() => onFile({ stream, filename: info.filename, mimeType: info.mimeType, fields: { ...fields } }));
+      filePromise.catch(fail);
+    });
+
+    parser.on('close', () => {
+      if (!filePromise) return failed ? null : resolve({ fields, file: null });
+      filePromise.then((file) => {
+        if (!failed) resolve({ fields, file });
+      }, fail);
+    });
+    parser.on('error', (err) => fail(httpError(400, `Multipart invalide: ${err.message}`)));
+    req.on('close', () => {
+      if (!req.complete) fail(httpError(499, 'Upload interrompu par le client'));
+    });
+
+    req.pipe(parser);
+  });
+}
+
+/**
+ * Nom de fichier local au format du multer de server.js (<ref_code>_<timestamp><ext>).
+ */
+function localUploadFilename(fields, originalName) {
+  const refCode = fields.ref_code || `doc-${Date.now()}`;
+  const safeRefCode = refCode.replace(/[\/\\]/g, '-');
+  return `${safeRefCode}_${Date.now()}${path.extname(originalName || '')}`;
+}
+
+module.exports = {
+  STORAGE_UPLOAD_MAX_BYTES,
+  UPLOAD_ALLOWED_TYPES,
+  createHashStream,
+  createLocalBackend,
+  createMinioBackend,
+  createStorageBackend,
+  storeStream,
+  receiveMultipartFile,
+  localUploadFilename,
+};
@@ -7,6 +7,7 @@ const archivesListValidator = [
   query('status').optional().isString().trim().isLength({ max: 40 }),
   query('limit').optional().isInt({ min: 1, max: 500 }).toInt(),
   query('page').optional().isInt({ min: 1, max: 100000 }).toInt(),
+  query('year').optional().isInt({ min: 1900, max: 2999 }).toInt(),
 ];
 
 const archiveIdParam = [param('id').isInt().toInt()];
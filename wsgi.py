@@ -0,0 +1,16 @@
+# backend/wsgi.py
+#
+# Point d'entrée production de l'agent IA Flask (flask_app.py).
+#
+#   pip install gunicorn
+#   gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Avec preload_app (gunicorn.conf.py), ce module est importé UNE fois dans le
+# processus maître : client OpenAI et cache de schéma sont construits avant
+# le fork, chaque worker ouvre ensuite son propre pool SQLite.
+
+from flask_app import app, warmup
+
+warmup()
+
+__all__ = ["app"]